@@ -29,11 +29,14 @@ class WalkwayErrors(BaseEntityErrors):
     NAME_EMPTY = BaseEntityErrors.NAME_EMPTY_TEMPLATE.format(entity_name=ENTITY_NAME)
     NAME_DUPLICATE = "Ya existe un andador con el nombre '{name}'."
     NOT_FOUND = "andador con ID {walkway_id} no encontrado."
+    INVALID_MAX_CONCURRENT = "El número máximo de riegos simultáneos del andador debe ser un entero entre 1 y {max_value}."
 
 
 class AccessScheduleRuleErrors:
     """Mensajes de error relacionados con el modelo AccessScheduleRule."""
-    INVALID_DAY_OF_WEEK = "El día de la semana no es válido. Debe ser un número entre 0 (lunes) y 6 (domingo)."
+    INVALID_DAY_OF_WEEK = ("El día de la semana no es válido. Debe ser un número entre 0 (lunes) y 6 (domingo) "
+                           "o una lista de días separados por comas.")
+    DAY_OF_WEEK_TOO_LONG = "La lista de días de la semana no puede superar los {max_length} caracteres."
     INVALID_TIME_RANGE = "La hora de inicio ({start_time}) no puede ser posterior o igual a la hora de fin ({end_time})."
     USER_TYPE_NOT_FOUND = "No se puede crear la regla. El tipo de usuario con ID {user_type_id} no existe."
     RULE_NOT_FOUND = "Regla de acceso con ID {rule_id} no encontrada."
@@ -63,6 +66,26 @@ class UserWateringScheduleErrors(BaseEntityErrors):
     SCHEDULE_RULE_MISMATCH = "El horario propuesto no cumple con las reglas de acceso del tipo de usuario para ese día."
     UPDATE_OVERLAPPING_SCHEDULE = "La programación actualizada se superpone con una programación existente del usuario."
     UPDATE_SCHEDULE_RULE_MISMATCH = "El horario actualizado no cumple con las reglas de acceso del tipo de usuario para ese día."
+    WALKWAY_CAPACITY_EXCEEDED = "El andador ya tiene el máximo de {max_concurrent_schedules} riegos simultáneos en ese horario."
+
+class RecurringWateringScheduleErrors(BaseEntityErrors):
+    """Mensajes de error para la entidad RecurringWateringSchedule."""
+    ENTITY_NAME = "programación recurrente"
+
+    NOT_FOUND = BaseEntityErrors.NOT_FOUND_TEMPLATE.format(entity_name=ENTITY_NAME, id_field="recurring_schedule_id")
+    NO_WEEKDAYS = "La programación recurrente debe repetirse al menos un día de la semana."
+    INVALID_DATE_RANGE = "La fecha de inicio ({valid_from}) no puede ser posterior a la fecha de fin ({valid_until})."
+    INVALID_INTERVAL = "El intervalo de semanas debe ser un número entero positivo."
+    OCCURRENCE_NOT_FOUND = "La programación recurrente {recurring_schedule_id} no tiene una ocurrencia pendiente el {occurrence_date}."
+    OVERLAPPING_OCCURRENCE = "La ocurrencia del {occurrence_date} se superpone con una programación existente del usuario."
+    WALKWAY_CAPACITY_EXCEEDED = "La ocurrencia del {occurrence_date} supera el máximo de {max_concurrent_schedules} riegos simultáneos del andador."
+    RULE_MISMATCH = "El horario propuesto no cumple con las reglas de acceso del tipo de usuario para el día {weekday} (0 = lunes)."
+
+
+class TimetableErrors:
+    """Mensajes de error del generador del cuadrante semanal."""
+    INVALID_SESSIONS_PER_USER = "El número de turnos por usuario debe estar entre 1 y {days_per_week}."
+    INVALID_STEP = "El paso entre inicios de turno debe ser positivo."
 
 
 class GeneralErrors:
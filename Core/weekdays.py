@@ -0,0 +1,57 @@
+# Core/weekdays.py
+
+# Interpretación de los días de la semana de las reglas de acceso.
+# Convención: 0 = lunes ... 6 = domingo (la misma que datetime.date.weekday()).
+
+from typing import FrozenSet, Union
+
+WEEKDAY_NAMES = {
+    "mon": 0, "monday": 0, "lun": 0, "lunes": 0,
+    "tue": 1, "tuesday": 1, "mar": 1, "martes": 1,
+    "wed": 2, "wednesday": 2, "mie": 2, "mié": 2, "miercoles": 2, "miércoles": 2,
+    "thu": 3, "thursday": 3, "jue": 3, "jueves": 3,
+    "fri": 4, "friday": 4, "vie": 4, "viernes": 4,
+    "sat": 5, "saturday": 5, "sab": 5, "sáb": 5, "sabado": 5, "sábado": 5,
+    "sun": 6, "sunday": 6, "dom": 6, "domingo": 6,
+}
+
+
+def parse_weekdays(value: Union[int, str]) -> FrozenSet[int]:
+    """
+    Convierte el valor de day_of_week de una regla en el conjunto de días que cubre.
+    Acepta un entero (0-6), su representación como texto ("3") o una lista de días
+    separados por comas, con número o nombre abreviado ("Mon,Tue,Wed" / "Lun,Mar").
+    :raises ValueError: Si algún día no es válido.
+    """
+    if isinstance(value, int):
+        tokens = [str(value)]
+    else:
+        tokens = [token.strip().lower() for token in str(value).split(",") if token.strip()]
+
+    if not tokens:
+        raise ValueError(f"Día de la semana vacío: {value!r}")
+
+    days = set()
+    for token in tokens:
+        if token.isdigit() and 0 <= int(token) <= 6:
+            days.add(int(token))
+        elif token in WEEKDAY_NAMES:
+            days.add(WEEKDAY_NAMES[token])
+        else:
+            raise ValueError(f"Día de la semana no válido: {token!r}")
+    return frozenset(days)
+
+
+def weekdays_to_mask(days) -> int:
+    """
+    Convierte un conjunto de días (0-6) en una máscara de 7 bits: el bit d corresponde al día d.
+    """
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+
+def mask_to_weekdays(mask: int) -> FrozenSet[int]:
+    """Operación inversa de weekdays_to_mask."""
+    return frozenset(day for day in range(7) if mask & (1 << day))
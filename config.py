@@ -28,4 +28,16 @@ class Config:
     # Construir la URL de conexión a la base de datos de SQLAlchemy
     SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DATABASE_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+    # Parámetros del pool de conexiones (QueuePool) usados por database/engine.py
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))              # Conexiones persistentes en el pool
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))       # Conexiones extra permitidas en picos
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))       # Segundos de espera por una conexión libre
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))     # Reciclar antes del wait_timeout de MySQL
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+    # Modo local (SQLite): fichero opcional en el que se guarda el archivo de eventos de riego.
+    # Sin él, las tablas de archivo viven en la misma base de datos que el resto.
+    ARCHIVE_SQLITE_PATH = os.getenv("ARCHIVE_SQLITE_PATH")
+
 config = Config()
\ No newline at end of file
@@ -1,4 +1,9 @@
 # En database/base.py
 # from sqlalchemy.ext.declarative import declarative_base  # Forma antigua
 from sqlalchemy.orm import declarative_base  # Forma nueva (recomendada)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Esquema simbólico de las tablas de archivo (watering_events_archive y sus meses).
+# create_db_engine lo traduce (schema_translate_map) a la propia base de datos o, en el modo
+# local con SQLite, a un fichero aparte adjuntado con ATTACH DATABASE.
+ARCHIVE_SCHEMA = "archive"
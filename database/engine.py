@@ -0,0 +1,132 @@
+# database/engine.py
+
+# Engine y fábrica de sesiones únicos por proceso.
+# Todos los servicios deben obtener sus sesiones de aquí en lugar de llamar a
+# create_engine por su cuenta, para compartir un único pool de conexiones.
+
+import os
+import threading
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from config import config
+from .base import ARCHIVE_SCHEMA
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+# Fábrica de sesiones del proceso. Se enlaza al engine la primera vez que se pide.
+SessionLocal = sessionmaker(autoflush=False)
+
+
+def create_db_engine(url: Optional[str] = None, archive_path: Optional[str] = None, **overrides) -> Engine:
+    """
+    Crea un engine configurado con los parámetros de pool definidos en Config.
+    :param url: URL de conexión. Por defecto, Config.SQLALCHEMY_DATABASE_URL.
+    :param archive_path: Solo SQLite: fichero en el que guardar las tablas de archivo.
+                         Por defecto, Config.ARCHIVE_SQLITE_PATH (si no hay, van en la misma base de datos).
+    :param overrides: Argumentos adicionales para create_engine (tienen prioridad).
+    :return: El engine creado.
+    """
+    url = make_url(url or config.SQLALCHEMY_DATABASE_URL)
+    options = {"echo": config.DB_ECHO}
+    archive_path = archive_path or config.ARCHIVE_SQLITE_PATH
+    attach_archive = url.get_backend_name() == "sqlite" and bool(archive_path)
+    # El esquema de archivo es el fichero adjunto o, si no lo hay, el esquema por defecto
+    options["execution_options"] = {
+        "schema_translate_map": {ARCHIVE_SCHEMA: ARCHIVE_SCHEMA if attach_archive else None}
+    }
+
+    # SQLite (tests y modo local) gestiona su propio pool; el resto usa QueuePool.
+    if url.get_backend_name() != "sqlite":
+        options.update(
+            poolclass=QueuePool,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+    options.update(overrides)
+    engine = create_engine(url, **options)
+    if attach_archive:
+        _attach_sqlite_archive(engine, archive_path)
+    return engine
+
+
+def _attach_sqlite_archive(engine: Engine, archive_path: str) -> None:
+    """
+    Adjunta el fichero de archivo a cada conexión SQLite nueva, con el nombre ARCHIVE_SCHEMA.
+    """
+    @event.listens_for(engine, "connect")
+    def attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path,))
+        finally:
+            cursor.close()
+
+
+def create_session_factory(engine: Engine) -> sessionmaker:
+    """
+    Crea una fábrica de sesiones enlazada a un engine concreto.
+    """
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+def get_engine() -> Engine:
+    """
+    Devuelve el engine del proceso, creándolo en la primera llamada.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine()
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def get_session() -> Session:
+    """
+    Abre una nueva sesión sobre el pool compartido. Quien la abre debe cerrarla.
+    """
+    get_engine()
+    return SessionLocal()
+
+
+def get_db() -> Iterator[Session]:
+    """
+    Generador que entrega una sesión y la cierra al terminar (útil como dependencia).
+    """
+    db = get_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def dispose_engine() -> None:
+    """
+    Cierra todas las conexiones del pool y descarta el engine del proceso.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def _dispose_after_fork() -> None:
+    # Tras un fork, el hijo no debe reutilizar los sockets del padre.
+    # close=False abandona las conexiones heredadas sin cerrarlas, para no romper las del padre.
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
@@ -4,7 +4,9 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database.base import Base
-from sqlalchemy import Integer, String, Time, ForeignKey
+from sqlalchemy import Integer, SmallInteger, String, Time, ForeignKey, Index, event
+
+from Core.weekdays import parse_weekdays, weekdays_to_mask
 
 # Importar el modelo Walkway para la relación
 from database.models.walkway import Walkway
@@ -13,12 +15,24 @@ if TYPE_CHECKING:
     from .user_type import UserType
     from .walkway import Walkway
 
+# Longitud máxima de day_of_week: admite listas de días como "0,1,2,3,4,5,6" o
+# "lunes,martes,miércoles,jueves,viernes,sábado,domingo"
+DAY_OF_WEEK_MAX_LENGTH = 64
+
 class AccessScheduleRule(Base):
     __tablename__ = "access_schedule_rules"
+    __table_args__ = (
+        # Búsqueda de reglas por tipo de usuario y día: el predicado de bits sobre day_mask
+        # se evalúa con el propio índice, sin leer la tabla
+        Index("ix_access_schedule_rules_user_type_id_day_mask", "user_type_id", "day_mask"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     rule_name = mapped_column(String, index=True, nullable=False)
-    day_of_week: Mapped[str] = mapped_column(String(9), nullable=False)
+    day_of_week: Mapped[str] = mapped_column(String(DAY_OF_WEEK_MAX_LENGTH), nullable=False)
+    # Máscara de 7 bits derivada de day_of_week (bit 0 = lunes ... bit 6 = domingo).
+    # Se mantiene automáticamente; 0 indica una fila aún no convertida (ver backfill_day_masks).
+    day_mask: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0, server_default="0")
     start_time: Mapped[Time] = mapped_column(Time, nullable=False)
     end_time: Mapped[Time] = mapped_column(Time, nullable=False)
     user_type_id: Mapped[int] = mapped_column(ForeignKey("user_types.id"), nullable=False)
@@ -32,3 +46,19 @@ class AccessScheduleRule(Base):
     walkway: Mapped["Walkway"] = relationship(
         back_populates="access_schedule_rules"
     )
+
+    @classmethod
+    def prepare_bulk_row(cls, row: dict) -> dict:
+        """
+        Completa day_mask en las filas de bulk_create, que no pasan por los eventos del ORM.
+        """
+        row = dict(row)
+        row['day_mask'] = weekdays_to_mask(parse_weekdays(row['day_of_week']))
+        return row
+
+
+@event.listens_for(AccessScheduleRule, "before_insert")
+@event.listens_for(AccessScheduleRule, "before_update")
+def _sync_day_mask(mapper, connection, target: AccessScheduleRule) -> None:
+    """Recalcula day_mask a partir de day_of_week antes de escribir la fila."""
+    target.day_mask = weekdays_to_mask(parse_weekdays(target.day_of_week))
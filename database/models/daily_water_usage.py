@@ -0,0 +1,58 @@
+# database/models/daily_water_usage.py
+
+from __future__ import annotations
+import datetime
+
+from sqlalchemy import Integer, Date, Float, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from typing import Optional
+
+from ..base import Base
+
+
+class DailyWaterUsage(Base):
+    """
+    Totales diarios de riego por (andador, usuario), según la fecha de inicio de los eventos.
+    Se actualiza en la misma transacción en la que se registran los eventos con WateringEventService
+    (record_watering_event, record_watering_events, import_columnar_history; ver
+    DailyWaterUsageRepository.add_events) y se borra junto con los eventos en UserService.delete_user.
+    Archivar eventos no los cambia. Las escrituras directas con WateringEventRepository
+    (create, bulk_create, bulk_update, bulk_delete...) no los mantienen: tras ellas debe llamarse
+    a WateringEventService.rebuild_usage_rollups para los días afectados.
+    Solo se leen los días cubiertos (ver DailyWaterUsageCoverage); los anteriores se suman sobre
+    los eventos, así que los informes son correctos aunque no se haya hecho la carga inicial.
+    """
+    __tablename__ = 'daily_water_usage'
+    __table_args__ = (
+        # Informes por usuario en un rango de fechas
+        Index('ix_daily_water_usage_user_id_usage_date', 'user_id', 'usage_date'),
+    )
+
+    # La fecha va primero en la clave: los informes de toda la comunidad recorren un rango de días
+    usage_date: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    walkway_id: Mapped[int] = mapped_column(Integer, ForeignKey('walkways.id', ondelete='CASCADE'), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    volume_liters: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    duration_minutes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyWaterUsage(usage_date={self.usage_date}, walkway_id={self.walkway_id}, user_id={self.user_id})>"
+
+
+class DailyWaterUsageCoverage(Base):
+    """
+    Fila única con el primer día desde el que los totales diarios están completos (complete_from;
+    NULL si lo están desde el principio del historial). Sin fila, no se usa ningún total diario.
+    La fija la primera escritura incremental (el día siguiente al último evento existente, porque
+    el historial anterior no tiene totales) y la adelanta rebuild_usage_rollups. Los eventos
+    registrados después con fechas anteriores a complete_from no la mueven: esos días se siguen
+    sumando sobre los eventos.
+    """
+    __tablename__ = 'daily_water_usage_coverage'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, default=1)
+    complete_from: Mapped[Optional[datetime.date]] = mapped_column(Date, nullable=True)
+
+    def __repr__(self):
+        return f"<DailyWaterUsageCoverage(complete_from={self.complete_from})>"
@@ -1,13 +1,18 @@
 from __future__ import annotations 
 
 from typing import List
-from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from ..base import Base
 import datetime
 
 class Notification(Base):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Listados por usuario (filtrados por estado de lectura) ordenados por fecha,
+        # y el UPDATE de mark_all_as_read (user_id, is_read)
+        Index('ix_notifications_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     message: Mapped[str] = mapped_column(String(500), nullable=False)
@@ -16,7 +21,7 @@ class Notification(Base):
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now, nullable=False)
     is_read: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     user: Mapped["User"] = relationship("database.models.user.User", back_populates="notifications")
 
     def __repr__(self):
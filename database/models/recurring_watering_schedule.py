@@ -0,0 +1,90 @@
+from __future__ import annotations
+from typing import Iterator, List, Optional
+
+from sqlalchemy import Integer, SmallInteger, Date, Time, Boolean, ForeignKey, DateTime, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, Mapped, mapped_column
+from ..base import Base
+import datetime
+
+
+class RecurringWateringSchedule(Base):
+    """
+    Plantilla de riego semanal (similar a una RRULE FREQ=WEEKLY;INTERVAL=n;BYDAY=...):
+    se repite los días de weekday_mask, cada interval_weeks semanas, entre valid_from y valid_until.
+    Las ocurrencias no se guardan; solo se materializan como UserWateringSchedule las que se
+    ejecutan, y los cambios puntuales se guardan como RecurringScheduleException.
+    """
+    __tablename__ = 'recurring_watering_schedules'
+    __table_args__ = (
+        # Plantillas de un usuario vigentes en un rango de fechas
+        Index('ix_recurring_watering_schedules_user_id_valid_from', 'user_id', 'valid_from'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Bit 0 = lunes ... bit 6 = domingo (misma convención que AccessScheduleRule.day_mask)
+    weekday_mask: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    start_time: Mapped[datetime.time] = mapped_column(Time, nullable=False)
+    end_time: Mapped[datetime.time] = mapped_column(Time, nullable=False)
+    valid_from: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    valid_until: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    interval_weeks: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now, nullable=False)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, nullable=False)
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    exceptions: Mapped[List["RecurringScheduleException"]] = relationship(
+        back_populates="recurring_schedule", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    def occurrence_dates(self, start_date: datetime.date, end_date: datetime.date) -> Iterator[datetime.date]:
+        """
+        Generador de las fechas de ocurrencia dentro de [start_date, end_date], en orden.
+        Las semanas se cuentan desde la semana (de lunes a domingo) de valid_from.
+        """
+        day = max(start_date, self.valid_from)
+        last = min(end_date, self.valid_until)
+        interval = max(self.interval_weeks or 1, 1)
+        first_monday = self.valid_from - datetime.timedelta(days=self.valid_from.weekday())
+
+        while day <= last:
+            weeks = (day - first_monday).days // 7
+            if weeks % interval:
+                # Semana sin ocurrencias: saltar al lunes de la siguiente semana activa
+                day = first_monday + datetime.timedelta(weeks=weeks + interval - weeks % interval)
+                continue
+            if self.weekday_mask & (1 << day.weekday()):
+                yield day
+            day += datetime.timedelta(days=1)
+
+    def __repr__(self):
+        return (f"<RecurringWateringSchedule(id={self.id}, user_id={self.user_id}, "
+                f"weekday_mask={self.weekday_mask}, start_time={self.start_time}, "
+                f"end_time={self.end_time}, valid_from={self.valid_from}, valid_until={self.valid_until})>")
+
+
+class RecurringScheduleException(Base):
+    """
+    Cambio puntual de una ocurrencia: la cancela o le asigna otro horario ese día.
+    """
+    __tablename__ = 'recurring_schedule_exceptions'
+    __table_args__ = (
+        UniqueConstraint('recurring_schedule_id', 'occurrence_date',
+                         name='uq_recurring_schedule_exceptions_schedule_date'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    occurrence_date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    is_cancelled: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # Horario sustituto; None conserva el de la plantilla
+    start_time: Mapped[Optional[datetime.time]] = mapped_column(Time, nullable=True)
+    end_time: Mapped[Optional[datetime.time]] = mapped_column(Time, nullable=True)
+
+    recurring_schedule_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('recurring_watering_schedules.id', ondelete='CASCADE'), nullable=False
+    )
+    recurring_schedule: Mapped["RecurringWateringSchedule"] = relationship(back_populates="exceptions")
+
+    def __repr__(self):
+        return (f"<RecurringScheduleException(id={self.id}, recurring_schedule_id={self.recurring_schedule_id}, "
+                f"occurrence_date={self.occurrence_date}, is_cancelled={self.is_cancelled})>")
@@ -1,7 +1,7 @@
 # backend/SQLALCHEMY_REGADIO/database/models/user.py
 
 from __future__ import annotations
-from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from ..base import Base
 import datetime
@@ -13,10 +13,18 @@ from .access_schedule_rule import AccessScheduleRule
 from .user_watering_schedule import UserWateringSchedule
 from .watering_event import WateringEvent
 from .notification import Notification
+from .recurring_watering_schedule import RecurringWateringSchedule, RecurringScheduleException
+from .walkway_occupancy import WalkwayOccupancy
+from .daily_water_usage import DailyWaterUsage, DailyWaterUsageCoverage
+from .watering_event_archive import WateringEventArchive, ArchivedMonth
 
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # get_schedules_for_walkway_on_date: usuarios de un andador
+        Index('ix_users_walkway_id', 'walkway_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
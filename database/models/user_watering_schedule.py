@@ -1,7 +1,7 @@
 from __future__ import annotations
-from typing import List
+from typing import List, Optional, Tuple
 
-from sqlalchemy import Integer, Date, Time, Boolean, ForeignKey, DateTime
+from sqlalchemy import Integer, Date, Time, Boolean, ForeignKey, DateTime, Index, event
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from ..base import Base
 import datetime
@@ -9,20 +9,75 @@ import datetime
 
 class UserWateringSchedule(Base):
     __tablename__ = 'user_watering_schedules'
+    __table_args__ = (
+        # get_schedules_for_user / get_schedules_for_walkway_on_date: usuario + fecha, orden por start_time
+        Index('ix_user_watering_schedules_user_id_scheduled_date_start_time', 'user_id', 'scheduled_date', 'start_time'),
+        # get_overlapping_schedules: usuario + comparación de rango sobre start_at / end_at
+        Index('ix_user_watering_schedules_user_id_start_at_end_at', 'user_id', 'start_at', 'end_at'),
+        # get_upcoming_schedules: recorrido de rango por start_at con LIMIT
+        Index('ix_user_watering_schedules_start_at', 'start_at'),
+        # Ocurrencias materializadas de una plantilla recurrente, por fecha
+        Index('ix_user_watering_schedules_recurring_schedule_id_scheduled_date', 'recurring_schedule_id', 'scheduled_date'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     scheduled_date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
     start_time: Mapped[datetime.time] = mapped_column(Time, nullable=False)
     end_time: Mapped[datetime.time] = mapped_column(Time, nullable=False)
+    # Inicio y fin completos (fecha + hora), derivados de scheduled_date/start_time/end_time.
+    # Se mantienen automáticamente y permiten comparar rangos directamente sobre el índice.
+    # NULL indica una fila anterior a estas columnas aún no convertida (ver backfill_time_bounds).
+    start_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True)
+    end_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now, nullable=False)
     updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, nullable=False)
 
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # Plantilla recurrente de la que procede, si es una ocurrencia materializada.
+    # scheduled_date es entonces la fecha de la ocurrencia.
+    recurring_schedule_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey('recurring_watering_schedules.id', ondelete='SET NULL'), nullable=True
+    )
     user: Mapped["User"] = relationship("database.models.user.User", back_populates="user_watering_schedules")
     watering_events: Mapped[List["WateringEvent"]] = relationship(back_populates="schedule")
 
+    # Duración máxima de una programación: end_time == start_time ocupa el día completo.
+    # Acota por abajo start_at en las búsquedas de superposición.
+    MAX_DURATION = datetime.timedelta(days=1)
+
+    @staticmethod
+    def time_bounds(scheduled_date: datetime.date, start_time: datetime.time,
+                    end_time: datetime.time) -> Tuple[datetime.datetime, datetime.datetime]:
+        """
+        Calcula (start_at, end_at). Si end_time no es posterior a start_time,
+        la programación termina al día siguiente (cruza la medianoche).
+        """
+        start_at = datetime.datetime.combine(scheduled_date, start_time)
+        end_at = datetime.datetime.combine(scheduled_date, end_time)
+        if end_at <= start_at:
+            end_at += datetime.timedelta(days=1)
+        return start_at, end_at
+
+    @classmethod
+    def prepare_bulk_row(cls, row: dict) -> dict:
+        """
+        Completa start_at / end_at en las filas de bulk_create, que no pasan por los eventos del ORM.
+        """
+        row = dict(row)
+        row['start_at'], row['end_at'] = cls.time_bounds(row['scheduled_date'], row['start_time'], row['end_time'])
+        return row
+
     def __repr__(self):
         return (f"<UserWateringSchedule(id={self.id}, user_id={self.user_id}, "
                 f"scheduled_date={self.scheduled_date}, start_time={self.start_time}, "
-                f"end_time={self.end_time})>")
\ No newline at end of file
+                f"end_time={self.end_time})>")
+
+
+@event.listens_for(UserWateringSchedule, "before_insert")
+@event.listens_for(UserWateringSchedule, "before_update")
+def _sync_time_bounds(mapper, connection, target: UserWateringSchedule) -> None:
+    """Recalcula start_at / end_at antes de escribir la fila."""
+    target.start_at, target.end_at = UserWateringSchedule.time_bounds(
+        target.scheduled_date, target.start_time, target.end_time
+    )
@@ -0,0 +1,36 @@
+# database/models/walkway_occupancy.py
+
+from __future__ import annotations
+import datetime
+
+from sqlalchemy import Integer, Date, ForeignKey, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base
+
+# Un contador por minuto del día
+MINUTES_PER_DAY = 24 * 60
+# Cada contador ocupa un byte y se satura en este valor
+MAX_COUNTER = 255
+# Mayor capacidad de un andador que los contadores pueden controlar: con capacidad MAX_COUNTER - 1
+# un contador nunca necesita superar MAX_COUNTER para detectar que el andador está lleno
+MAX_TRACKED_CAPACITY = MAX_COUNTER - 1
+
+
+class WalkwayOccupancy(Base):
+    """
+    Ocupación precalculada de un andador en un día: `counters` guarda 1440 bytes, uno por minuto,
+    con el número de programaciones concretas (UserWateringSchedule) en ese minuto (máximo MAX_COUNTER).
+    Las ocurrencias pendientes de las plantillas recurrentes no se guardan: se suman al leer
+    (ver WalkwayOccupancyService.load_counters), así una plantilla larga no crea una fila por fecha.
+    Se mantiene de forma incremental al crear, modificar o eliminar programaciones
+    (ver WalkwayOccupancyRepository.apply) y puede reconstruirse desde las programaciones.
+    """
+    __tablename__ = 'walkway_occupancy'
+
+    walkway_id: Mapped[int] = mapped_column(Integer, ForeignKey('walkways.id', ondelete='CASCADE'), primary_key=True)
+    occupancy_date: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    counters: Mapped[bytes] = mapped_column(LargeBinary(MINUTES_PER_DAY), nullable=False)
+
+    def __repr__(self):
+        return f"<WalkwayOccupancy(walkway_id={self.walkway_id}, occupancy_date={self.occupancy_date})>"
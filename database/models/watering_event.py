@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, Float
+from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, Float, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from ..base import Base
@@ -10,6 +10,14 @@ from typing import List
 
 class WateringEvent(Base):
     __tablename__ = 'watering_events'
+    __table_args__ = (
+        # get_events_for_user: filtro por usuario + rango/orden por start_time
+        Index('ix_watering_events_user_id_start_time', 'user_id', 'start_time'),
+        # get_events_by_schedule: filtro por programación + orden por start_time
+        Index('ix_watering_events_schedule_id_start_time', 'schedule_id', 'start_time'),
+        # get_recent_events (ORDER BY ... LIMIT) y get_total_water_used (rango de fechas)
+        Index('ix_watering_events_start_time', 'start_time'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     start_time: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
@@ -19,9 +27,11 @@ class WateringEvent(Base):
     volume_liters: Mapped[float] = mapped_column(Float, nullable=False)
 
     # Claves Foráneas
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    # ON DELETE CASCADE: en bases de datos que aplican las claves foráneas, borrar el usuario
+    # o la programación elimina también sus eventos. UserService.delete_user no depende de ello.
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
     walkway_id: Mapped[int] = mapped_column(Integer, ForeignKey('walkways.id'))
-    schedule_id: Mapped[int] = mapped_column(Integer, ForeignKey('user_watering_schedules.id'), nullable=False)
+    schedule_id: Mapped[int] = mapped_column(Integer, ForeignKey('user_watering_schedules.id', ondelete='CASCADE'), nullable=False)
 
     # Relaciones
     user: Mapped["User"] = relationship("database.models.user.User", back_populates="watering_events")
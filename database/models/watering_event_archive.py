@@ -0,0 +1,54 @@
+# database/models/watering_event_archive.py
+
+from __future__ import annotations
+import datetime
+
+from sqlalchemy import Integer, Date, DateTime, Float, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..base import Base, ARCHIVE_SCHEMA
+
+
+class WateringEventArchive(Base):
+    """
+    Eventos de riego de meses cerrados, movidos desde watering_events con los mismos IDs y columnas
+    (ver WateringEventArchiveRepository.archive_before). No tiene claves foráneas: el archivo puede
+    guardarse en otra base de datos y sobrevive a las programaciones que referencia.
+    """
+    __tablename__ = 'watering_events_archive'
+    __table_args__ = (
+        # Mismos accesos que watering_events
+        Index('ix_watering_events_archive_user_id_start_time', 'user_id', 'start_time'),
+        Index('ix_watering_events_archive_schedule_id_start_time', 'schedule_id', 'start_time'),
+        Index('ix_watering_events_archive_start_time', 'start_time'),
+        {'schema': ARCHIVE_SCHEMA},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    start_time: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    end_time: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    duration_minutes: Mapped[int] = mapped_column(Integer, nullable=False)
+    volume_liters: Mapped[float] = mapped_column(Float, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    walkway_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    schedule_id: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<WateringEventArchive(id={self.id}, start_time='{self.start_time}', volume_liters={self.volume_liters})>"
+
+
+class ArchivedMonth(Base):
+    """
+    Meses ya movidos al archivo, con el número de eventos archivados de cada uno.
+    Los meses archivados son siempre los más antiguos: todo evento anterior al mes siguiente
+    al último archivado está en el archivo y el resto en watering_events.
+    """
+    __tablename__ = 'watering_event_archive_months'
+    __table_args__ = {'schema': ARCHIVE_SCHEMA}
+
+    month_start: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    archived_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, default=datetime.datetime.now)
+
+    def __repr__(self):
+        return f"<ArchivedMonth(month_start={self.month_start}, event_count={self.event_count})>"
@@ -0,0 +1,68 @@
+# database/unit_of_work.py
+
+# Ámbito transaccional (unit of work) compartido por servicios y repositorios.
+# Un servicio abre un UnitOfWork por operación de negocio; mientras está abierto,
+# los repositorios solo hacen flush y el commit se realiza una única vez al salir.
+
+from sqlalchemy.orm import Session
+
+_DEPTH_KEY = "unit_of_work_depth"
+
+
+class UnitOfWork:
+    """
+    Context manager que agrupa todas las escrituras de una operación en una sola transacción.
+    Admite anidamiento: solo el ámbito más externo hace commit o rollback.
+    """
+
+    def __init__(self, db: Session):
+        """
+        :param db: La sesión de la base de datos sobre la que se abre la transacción.
+        """
+        self.db = db
+
+    def __enter__(self) -> "UnitOfWork":
+        self.db.info[_DEPTH_KEY] = self.db.info.get(_DEPTH_KEY, 0) + 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        depth = self.db.info.get(_DEPTH_KEY, 1) - 1
+        if depth > 0:
+            self.db.info[_DEPTH_KEY] = depth
+            return False
+
+        self.db.info.pop(_DEPTH_KEY, None)
+        if exc_type is not None:
+            self.db.rollback()
+            return False
+
+        try:
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return False
+
+
+def in_unit_of_work(db: Session) -> bool:
+    """
+    Indica si la sesión tiene un UnitOfWork abierto.
+    """
+    return db.info.get(_DEPTH_KEY, 0) > 0
+
+
+def commit_or_flush(db: Session, *entities) -> None:
+    """
+    Persiste los cambios pendientes de la sesión.
+    Dentro de un UnitOfWork solo hace flush (el commit lo hará el ámbito externo);
+    fuera de él mantiene el comportamiento clásico de commit + refresh de las entidades.
+    :param db: La sesión de la base de datos.
+    :param entities: Entidades a refrescar tras el commit.
+    """
+    if in_unit_of_work(db):
+        db.flush()
+        return
+
+    db.commit()
+    for entity in entities:
+        db.refresh(entity)
@@ -1,10 +1,14 @@
 # from shared.exceptions import IntegrityConstraintError # Línea original con error
 from Core.exceptions import IntegrityConstraintError, NotFoundError, OperationFailedError
 from Core.error_messages import AccessScheduleRuleErrors
-from repositories.base_repository import BaseRepository
+from repositories.base_repository import BaseRepository, FilterType, execute_batched_backfill
 from database.models.access_schedule_rule import AccessScheduleRule
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from datetime import time
+
+from Core.weekdays import parse_weekdays, weekdays_to_mask
 
 class AccessScheduleRuleRepository(BaseRepository[AccessScheduleRule]):
     """
@@ -13,18 +17,87 @@ class AccessScheduleRuleRepository(BaseRepository[AccessScheduleRule]):
     def __init__(self, db: Session):
         super().__init__(db, AccessScheduleRule)
 
+    def bulk_update(self, filters: FilterType, values: dict) -> int:
+        """
+        Actualiza todas las reglas que cumplen el filtro con una única sentencia UPDATE.
+        El UPDATE no pasa por los eventos del ORM, así que si cambia day_of_week se recalcula
+        day_mask aquí. day_mask no puede asignarse directamente.
+        :param filters: Diccionario {campo: valor} o secuencia de expresiones.
+        :param values: Diccionario con los valores a asignar.
+        :return: El número de filas actualizadas.
+        :raises ValueError: Si values asigna day_mask o day_of_week no es válido.
+        """
+        if 'day_mask' in values:
+            raise ValueError("day_mask se calcula a partir de day_of_week; no puede asignarse en bulk_update.")
+        if 'day_of_week' in values:
+            values = dict(values)
+            values['day_mask'] = weekdays_to_mask(parse_weekdays(values['day_of_week']))
+        return super().bulk_update(filters, values)
+
     # Aquí se puede añadir métodos específicos para la entidad AccessScheduleRule
     # Por ejemplo, un método para buscar reglas por tipo de usuario o por día de la semana.
     def get_rules_by_user_type_and_day(self, user_type_id: int, day_of_week: int) -> List[AccessScheduleRule]:
         """
         Obtiene las reglas de acceso para un tipo de usuario y día de la semana específicos.
         """
-        # Tu lógica de consulta iría aquí
-        return []
+        return self.get_rules_for_weekday(day_of_week, user_type_id=user_type_id)
+
+    def get_rules_for_weekday(self, day_of_week: int, user_type_id: Optional[int] = None,
+                              walkway_id: Optional[int] = None) -> List[AccessScheduleRule]:
+        """
+        Obtiene las reglas activas un día de la semana (0 = lunes ... 6 = domingo),
+        con filtros opcionales por tipo de usuario y andador.
+        El día se comprueba en la base de datos con un AND de bits sobre day_mask.
+        """
+        query = select(AccessScheduleRule).where(
+            AccessScheduleRule.day_mask.op('&')(1 << day_of_week) != 0
+        )
+        if user_type_id is not None:
+            query = query.where(AccessScheduleRule.user_type_id == user_type_id)
+        if walkway_id is not None:
+            query = query.where(AccessScheduleRule.walkway_id == walkway_id)
+        return self.db.execute(query.order_by(AccessScheduleRule.start_time)).scalars().all()
 
     def get_by_id_and_user_type(self, rule_id: int, user_type_id: int) -> Optional[AccessScheduleRule]:
         """
         Obtiene una regla por su ID, asegurando que pertenece a un tipo de usuario específico.
         """
-        # Tu lógica de consulta iría aquí
-        return None
+        return self.db.execute(
+            select(AccessScheduleRule).filter_by(id=rule_id, user_type_id=user_type_id)
+        ).scalars().first()
+
+    def get_rule_intervals(self, exclude_rule_id: Optional[int] = None) -> List[Tuple[int, int, str, time, time]]:
+        """
+        Obtiene, en una sola consulta, las columnas que necesita el motor de reglas:
+        (user_type_id, walkway_id, day_of_week, start_time, end_time) de todas las reglas,
+        salvo, opcionalmente, una (para simular su eliminación o modificación).
+        """
+        query = select(
+            AccessScheduleRule.user_type_id,
+            AccessScheduleRule.walkway_id,
+            AccessScheduleRule.day_of_week,
+            AccessScheduleRule.start_time,
+            AccessScheduleRule.end_time,
+        )
+        if exclude_rule_id is not None:
+            query = query.where(AccessScheduleRule.id != exclude_rule_id)
+        return self.db.execute(query).all()
+
+    def backfill_day_masks(self, batch_size: int = 500) -> int:
+        """
+        Conversión de las filas existentes: calcula day_mask a partir de day_of_week en las
+        reglas que aún no la tienen (day_mask = 0). Las filas con un day_of_week no reconocible
+        se dejan sin convertir.
+        :param batch_size: Número de reglas leídas y actualizadas por lote.
+        :return: Número de reglas convertidas.
+        """
+        def convert(day_of_week) -> Optional[dict]:
+            try:
+                return {"day_mask": weekdays_to_mask(parse_weekdays(day_of_week))}
+            except ValueError:
+                return None
+
+        return execute_batched_backfill(
+            self.db, AccessScheduleRule, [AccessScheduleRule.day_of_week], AccessScheduleRule.day_mask == 0,
+            convert, batch_size
+        )
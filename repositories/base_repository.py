@@ -1,14 +1,103 @@
-from typing import TypeVar, Generic, Type, Union, List
-from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
+from typing import TypeVar, Generic, Type, Union, List, Sequence, Any, Optional, Iterable, Set, Callable
+from sqlalchemy.orm import Session, MANYTOONE
+from sqlalchemy import select, and_, insert, update, delete
 
 # --- Importaciones corregidas basándonos en la estructura 'Core' ---
 from Core.exceptions import IntegrityConstraintError
 from Core.error_messages import GeneralErrors 
 # -------------------------------------------------------------
+from database.unit_of_work import commit_or_flush
+from repositories.pagination import Page, paginate
 
 ModelType = TypeVar("ModelType")
 
+# Un filtro es un diccionario {campo: valor} (listas/tuplas/sets se traducen a IN)
+# o una secuencia de expresiones SQLAlchemy ya construidas.
+FilterType = Union[dict, Sequence[Any]]
+
+
+def build_filter_clauses(model, filters: FilterType) -> list:
+    """
+    Convierte un filtro en una lista de cláusulas WHERE para el modelo dado.
+    :param model: El modelo de la tabla.
+    :param filters: Diccionario {campo: valor} o secuencia de expresiones.
+    :return: La lista de cláusulas.
+    :raises ValueError: Si el filtro está vacío (evita UPDATE/DELETE sobre toda la tabla).
+    """
+    if isinstance(filters, dict):
+        clauses = []
+        for field_name, value in filters.items():
+            column = getattr(model, field_name)
+            if isinstance(value, (list, tuple, set, frozenset)):
+                clauses.append(column.in_(value))
+            elif value is None:
+                clauses.append(column.is_(None))
+            else:
+                clauses.append(column == value)
+    else:
+        clauses = list(filters)
+
+    if not clauses:
+        raise ValueError(f"Se requiere al menos un filtro para modificar filas de {model.__name__}.")
+    return clauses
+
+
+def execute_bulk_update(db: Session, model, filters: FilterType, values: dict) -> int:
+    """
+    Ejecuta un único UPDATE ... WHERE sobre el modelo y devuelve el número de filas afectadas.
+    """
+    result = db.execute(update(model).where(*build_filter_clauses(model, filters)).values(**values))
+    commit_or_flush(db)
+    return result.rowcount
+
+
+def execute_bulk_delete(db: Session, model, filters: FilterType) -> int:
+    """
+    Ejecuta un único DELETE ... WHERE sobre el modelo y devuelve el número de filas eliminadas.
+    """
+    result = db.execute(delete(model).where(*build_filter_clauses(model, filters)))
+    commit_or_flush(db)
+    return result.rowcount
+
+def execute_batched_backfill(db: Session, model, columns: Sequence[Any], pending: Any,
+                             convert: Callable[..., Optional[dict]], batch_size: int = 500) -> int:
+    """
+    Conversión por lotes de filas existentes, sin cargar las entidades ni toda la tabla.
+    Lee las filas pendientes por clave (WHERE pending AND id > :último ORDER BY id LIMIT batch_size)
+    y actualiza cada lote por clave primaria (executemany) antes de leer el siguiente.
+    :param db: La sesión de la base de datos.
+    :param model: El modelo de la tabla.
+    :param columns: Columnas que se leen de cada fila, además del id.
+    :param pending: Condición de las filas aún sin convertir.
+    :param convert: Recibe los valores de `columns` y devuelve los valores a asignar, o None para dejar la fila sin convertir.
+    :param batch_size: Número de filas leídas y actualizadas por lote.
+    :return: Número de filas convertidas.
+    """
+    converted = 0
+    last_id = None
+    while True:
+        query = select(model.id, *columns).where(pending)
+        if last_id is not None:
+            query = query.where(model.id > last_id)
+        rows = db.execute(query.order_by(model.id).limit(batch_size)).all()
+        if not rows:
+            break
+
+        updates = []
+        for entity_id, *values in rows:
+            converted_values = convert(*values)
+            if converted_values is not None:
+                updates.append({"id": entity_id, **converted_values})
+        if updates:
+            db.execute(update(model), updates)
+            converted += len(updates)
+
+        last_id = rows[-1][0]
+        if len(rows) < batch_size:
+            break
+    commit_or_flush(db)
+    return converted
+
 class BaseRepository(Generic[ModelType]):
     """
     Repositorio base que provee métodos CRUD genéricos.
@@ -43,10 +132,51 @@ class BaseRepository(Generic[ModelType]):
             )
         
         self.db.add(entity)
-        self.db.commit()
-        self.db.refresh(entity)
+        commit_or_flush(self.db, entity)
         return entity
 
+    def bulk_create(self, rows: List[dict]) -> List[int]:
+        """
+        Inserta muchas entidades con una única sentencia INSERT multi-fila.
+        No valida campos únicos ni refresca las entidades: está pensado para ingestas masivas
+        ya validadas por la capa de servicios.
+        :param rows: Lista de diccionarios con los valores de cada fila.
+        :return: Los IDs generados, en el mismo orden que las filas.
+        """
+        if not rows:
+            return []
+
+        # Los modelos con columnas derivadas las completan aquí, ya que el INSERT masivo
+        # no dispara los eventos before_insert del ORM
+        prepare_bulk_row = getattr(self.model, "prepare_bulk_row", None)
+        if prepare_bulk_row is not None:
+            rows = [prepare_bulk_row(row) for row in rows]
+
+        dialect = self.db.get_bind().dialect
+        if dialect.insert_executemany_returning:
+            # insertmanyvalues: INSERT ... VALUES (...), (...) RETURNING id, en lotes.
+            if dialect.name == "sqlite":
+                # SQLite asigna los rowid en orden creciente dentro de cada sentencia y los lotes se
+                # ejecutan secuencialmente en la misma conexión: ordenar los IDs reproduce el orden
+                # de las filas sin sort_by_parameter_order (que en SQLite degrada a fila a fila).
+                stmt = insert(self.model).returning(self.model.id)
+                ids = sorted(self.db.scalars(stmt, rows))
+            else:
+                # PostgreSQL, MariaDB...: el orden de RETURNING no está garantizado (secuencias
+                # compartidas, caché de valores), así que se pide explícitamente el de los parámetros.
+                stmt = insert(self.model).returning(self.model.id, sort_by_parameter_order=True)
+                ids = list(self.db.scalars(stmt, rows))
+        else:
+            # Dialectos sin RETURNING (MySQL): el flush del ORM agrupa los INSERT
+            # y obtiene los IDs de lastrowid, igualmente sin refrescar cada fila.
+            entities = [self.model(**row) for row in rows]
+            self.db.add_all(entities)
+            self.db.flush()
+            ids = [entity.id for entity in entities]
+
+        commit_or_flush(self.db)
+        return ids
+
     def get_all(self, skip: int = 0, limit: int = 100) -> List[ModelType]:
         """
         Obtiene una lista de todas las entidades con paginación.
@@ -58,6 +188,21 @@ class BaseRepository(Generic[ModelType]):
         result = self.db.execute(stmt)
         return result.scalars().all()
 
+    def get_page(self, cursor: Optional[str] = None, limit: int = 100, sort_key: str = "id",
+                 descending: bool = False) -> Page:
+        """
+        Obtiene una página de entidades con paginación por clave (keyset), sin OFFSET.
+        :param cursor: Cursor devuelto por la página anterior, o None para la primera.
+        :param limit: Número máximo de entidades a retornar.
+        :param sort_key: Campo de ordenación; el id desempata. Debería estar indexado.
+        :param descending: Si True, recorre de mayor a menor.
+        :return: La página de entidades y el cursor de la siguiente (None si es la última).
+        """
+        return paginate(
+            self.db, select(self.model), getattr(self.model, sort_key), self.model.id,
+            cursor=cursor, limit=limit, descending=descending
+        )
+
     def get_by_id(self, entity_id: int) -> Union[ModelType, None]:
         """
         Obtiene una entidad por su ID.
@@ -68,6 +213,18 @@ class BaseRepository(Generic[ModelType]):
         result = self.db.execute(stmt)
         return result.scalars().first()
     
+    def get_existing_ids(self, entity_ids: Iterable[int]) -> Set[int]:
+        """
+        Comprueba en una sola consulta qué IDs de un conjunto existen.
+        :param entity_ids: Los IDs a comprobar.
+        :return: El subconjunto de IDs que existen.
+        """
+        entity_ids = set(entity_ids)
+        if not entity_ids:
+            return set()
+        stmt = select(self.model.id).where(self.model.id.in_(entity_ids))
+        return set(self.db.execute(stmt).scalars())
+
     def get_by_unique_fields(self, entity: ModelType) -> Union[ModelType, None]:
         """
         Busca una entidad por sus campos únicos definidos en el modelo.
@@ -117,20 +274,51 @@ class BaseRepository(Generic[ModelType]):
         for key, value in update_data.items():
             setattr(entity, key, value)
         
-        self.db.commit()
-        self.db.refresh(entity)
+        commit_or_flush(self.db, entity)
         return entity
 
+    def bulk_update(self, filters: FilterType, values: dict) -> int:
+        """
+        Actualiza todas las filas que cumplen el filtro con una única sentencia UPDATE.
+        :param filters: Diccionario {campo: valor} o secuencia de expresiones.
+        :param values: Diccionario con los valores a asignar.
+        :return: El número de filas actualizadas.
+        """
+        return execute_bulk_update(self.db, self.model, filters, values)
+
+    def bulk_delete(self, filters: FilterType) -> int:
+        """
+        Elimina todas las filas que cumplen el filtro con una única sentencia DELETE.
+        :param filters: Diccionario {campo: valor} o secuencia de expresiones.
+        :return: El número de filas eliminadas.
+        """
+        return execute_bulk_delete(self.db, self.model, filters)
+
     def delete(self, entity_id: int) -> bool:
         """
         Elimina una entidad por su ID.
         :param entity_id: El ID de la entidad.
         :return: True si la entidad fue eliminada, False si no se encontró.
         """
+        # Si el ORM no tiene que gestionar colecciones hijas (cascadas o desvinculación
+        # de claves foráneas), basta con un DELETE directo, sin cargar la entidad antes.
+        if not self._requires_orm_delete():
+            return self.bulk_delete({"id": entity_id}) > 0
+
         entity = self.get_by_id(entity_id)
         if not entity:
             return False
         
         self.db.delete(entity)
-        self.db.commit()
+        commit_or_flush(self.db)
         return True
+
+    def _requires_orm_delete(self) -> bool:
+        """
+        Indica si borrar una entidad del modelo necesita pasar por el ORM, es decir,
+        si tiene relaciones uno-a-muchos o muchos-a-muchos que el ORM debe procesar.
+        """
+        return any(
+            relationship.direction is not MANYTOONE and not relationship.passive_deletes
+            for relationship in self.model.__mapper__.relationships
+        )
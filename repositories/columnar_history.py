@@ -0,0 +1,251 @@
+# repositories/columnar_history.py
+
+# Formato columnar comprimido para el histórico frío de eventos de riego (auditorías).
+# El fichero es una cabecera seguida de un bloque por (andador, mes). Cada bloque guarda sus
+# columnas como arrays de enteros o reales: los IDs y los inicios codificados como diferencias
+# con el valor anterior, los bytes de cada array reagrupados por posición ("shuffle") y todo
+# comprimido con zlib. La cabecera de cada bloque permite saltarlo sin descomprimirlo y el lector
+# agrega volumen y duración directamente sobre los arrays, sin construir entidades.
+
+import bisect
+import datetime
+import itertools
+import struct
+import sys
+import zlib
+from array import array
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .watering_event_repository import UsageTotal
+
+MAGIC = b"WEVC\x01"
+
+# Cabecera de bloque: andador, mes (año * 12 + mes - 1), número de eventos y bytes comprimidos
+_BLOCK_HEADER = struct.Struct("<iiII")
+
+# (nombre, tipo del array, codificado como diferencias)
+_COLUMNS = (
+    ("ids", "q", True),
+    ("start_offsets", "q", True),   # microsegundos desde el inicio del mes
+    ("elapsed", "q", False),        # microsegundos entre inicio y fin
+    ("duration_minutes", "i", False),
+    ("volume_liters", "d", False),
+    ("user_ids", "i", False),
+    ("schedule_ids", "i", False),
+)
+
+_ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Filas con el orden de columnas de ARCHIVE_COLUMNS:
+# (id, start_time, end_time, duration_minutes, volume_liters, user_id, walkway_id, schedule_id)
+HistoryRow = Tuple[int, datetime.datetime, datetime.datetime, int, float, int, int, int]
+
+
+class EventColumns(NamedTuple):
+    """Un bloque decodificado: los eventos de un andador en un mes, ordenados por inicio."""
+    walkway_id: int
+    month_start: datetime.date
+    ids: array
+    start_offsets: array
+    elapsed: array
+    duration_minutes: array
+    volume_liters: array
+    user_ids: array
+    schedule_ids: array
+
+    def month_begin(self) -> datetime.datetime:
+        return datetime.datetime.combine(self.month_start, datetime.time())
+
+    def slice_between(self, start: Optional[datetime.datetime], end: Optional[datetime.datetime]) -> Tuple[int, int]:
+        """
+        Posiciones [primera, última) de los eventos que empiezan en [start, end), por búsqueda binaria.
+        """
+        begin = self.month_begin()
+        first = 0 if start is None else bisect.bisect_left(self.start_offsets, _microseconds(start - begin))
+        last = len(self.ids) if end is None else bisect.bisect_left(self.start_offsets, _microseconds(end - begin))
+        return first, max(first, last)
+
+
+def _microseconds(delta: datetime.timedelta) -> int:
+    return delta // _ONE_MICROSECOND
+
+
+def _month_index(day: datetime.date) -> int:
+    return day.year * 12 + day.month - 1
+
+
+def _month_from_index(index: int) -> datetime.date:
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _pack_column(values: array, delta: bool) -> bytes:
+    """
+    Codifica un array: diferencias (si procede), little-endian y bytes agrupados por posición.
+    """
+    if delta:
+        values = array(values.typecode, (b - a for a, b in zip(itertools.chain((0,), values), values)))
+    if sys.byteorder == "big":
+        values.byteswap()
+    raw = values.tobytes()
+    # Los bytes altos de enteros pequeños (y los exponentes de reales parecidos) quedan juntos y se comprimen mejor
+    return b"".join(raw[position::values.itemsize] for position in range(values.itemsize))
+
+
+def _unpack_column(data: bytes, typecode: str, count: int, delta: bool) -> array:
+    itemsize = array(typecode).itemsize
+    shuffled = [data[position * count:(position + 1) * count] for position in range(itemsize)]
+    raw = bytearray(count * itemsize)
+    for position, part in enumerate(shuffled):
+        raw[position::itemsize] = part
+    values = array(typecode)
+    values.frombytes(bytes(raw))
+    if sys.byteorder == "big":
+        values.byteswap()
+    if delta:
+        values = array(typecode, itertools.accumulate(values))
+    return values
+
+
+def encode_block(walkway_id: int, month_start: datetime.date, rows: Sequence[HistoryRow]) -> bytes:
+    """
+    Codifica los eventos de un andador en un mes como un bloque con cabecera (ordenados por inicio).
+    """
+    rows = sorted(rows, key=lambda row: row[1])
+    begin = datetime.datetime.combine(month_start, datetime.time())
+    columns = {name: array(typecode) for name, typecode, _ in _COLUMNS}
+    for event_id, start_time, end_time, duration_minutes, volume_liters, user_id, _, schedule_id in rows:
+        columns["ids"].append(event_id)
+        columns["start_offsets"].append(_microseconds(start_time - begin))
+        columns["elapsed"].append(_microseconds(end_time - start_time))
+        columns["duration_minutes"].append(duration_minutes)
+        columns["volume_liters"].append(volume_liters)
+        columns["user_ids"].append(user_id)
+        columns["schedule_ids"].append(schedule_id)
+    payload = zlib.compress(
+        b"".join(_pack_column(columns[name], delta) for name, _, delta in _COLUMNS), 9
+    )
+    return _BLOCK_HEADER.pack(walkway_id, _month_index(month_start), len(rows), len(payload)) + payload
+
+
+def decode_block(walkway_id: int, month_start: datetime.date, count: int, payload: bytes) -> EventColumns:
+    """
+    Decodifica el contenido comprimido de un bloque.
+    """
+    data = zlib.decompress(payload)
+    columns = []
+    offset = 0
+    for _, typecode, delta in _COLUMNS:
+        size = array(typecode).itemsize * count
+        columns.append(_unpack_column(data[offset:offset + size], typecode, count, delta))
+        offset += size
+    return EventColumns(walkway_id, month_start, *columns)
+
+
+def write_history(fileobj: BinaryIO, rows: Iterable[HistoryRow]) -> int:
+    """
+    Escribe el histórico en formato columnar. Las filas deben llegar ordenadas por andador e inicio
+    (como las entrega WateringEventRepository.iter_history_rows); solo se retiene un bloque en memoria.
+    Devuelve el número de eventos escritos.
+    """
+    fileobj.write(MAGIC)
+    written = 0
+    block_key = None
+    block: List[HistoryRow] = []
+    for row in rows:
+        key = (row[6], row[1].date().replace(day=1))
+        if key != block_key:
+            if block:
+                fileobj.write(encode_block(*block_key, block))
+            block_key, block = key, []
+        block.append(row)
+        written += 1
+    if block:
+        fileobj.write(encode_block(*block_key, block))
+    return written
+
+
+class ColumnarHistoryReader:
+    """
+    Lector secuencial de un fichero de histórico columnar. Los bloques que no cumplen los filtros
+    de andador o de fechas se saltan leyendo solo su cabecera.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+
+    def iter_blocks(self, walkway_ids: Optional[Iterable[int]] = None, start: Optional[datetime.datetime] = None,
+                    end: Optional[datetime.datetime] = None) -> Iterator[EventColumns]:
+        """
+        Recorre los bloques de los andadores indicados con eventos que pueden empezar en [start, end)
+        (None para no filtrar).
+        """
+        walkway_ids = set(walkway_ids) if walkway_ids is not None else None
+        first_month = _month_index(start) if start is not None else None
+        last_month = _month_index(end - _ONE_MICROSECOND) if end is not None else None
+        self.fileobj.seek(0)
+        if self.fileobj.read(len(MAGIC)) != MAGIC:
+            raise ValueError("El fichero no tiene formato de histórico columnar de eventos de riego.")
+        while True:
+            header = self.fileobj.read(_BLOCK_HEADER.size)
+            if not header:
+                return
+            if len(header) < _BLOCK_HEADER.size:
+                raise ValueError("Fichero de histórico columnar truncado.")
+            walkway_id, month, count, size = _BLOCK_HEADER.unpack(header)
+            if ((walkway_ids is not None and walkway_id not in walkway_ids)
+                    or (first_month is not None and month < first_month)
+                    or (last_month is not None and month > last_month)):
+                self.fileobj.seek(size, 1)
+                continue
+            payload = self.fileobj.read(size)
+            if len(payload) < size:
+                raise ValueError("Fichero de histórico columnar truncado.")
+            yield decode_block(walkway_id, _month_from_index(month), count, payload)
+
+    def iter_rows(self) -> Iterator[dict]:
+        """
+        Recorre todos los eventos como diccionarios con las columnas de watering_events (para importarlos).
+        """
+        for block in self.iter_blocks():
+            begin = block.month_begin()
+            for position in range(len(block.ids)):
+                start_time = begin + datetime.timedelta(microseconds=block.start_offsets[position])
+                yield {
+                    "id": block.ids[position],
+                    "start_time": start_time,
+                    "end_time": start_time + datetime.timedelta(microseconds=block.elapsed[position]),
+                    "duration_minutes": block.duration_minutes[position],
+                    "volume_liters": block.volume_liters[position],
+                    "user_id": block.user_ids[position],
+                    "walkway_id": block.walkway_id,
+                    "schedule_id": block.schedule_ids[position],
+                }
+
+    def aggregate(self, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                  walkway_id: Optional[int] = None, group_by: Optional[str] = None) -> Dict[Optional[int], UsageTotal]:
+        """
+        Suma volumen, duración y número de eventos que empiezan en [start, end), opcionalmente
+        por andador o usuario (group_by: 'walkway' o 'user'; la clave es None sin agrupar).
+        Trabaja sobre los arrays decodificados: cada bloque se recorta por búsqueda binaria.
+        """
+        if group_by not in (None, "walkway", "user"):
+            raise ValueError(f"Agrupación no soportada: {group_by}. Valores admitidos: walkway, user.")
+        totals: Dict[Optional[int], List] = {}
+        walkway_ids = [walkway_id] if walkway_id is not None else None
+        for block in self.iter_blocks(walkway_ids, start, end):
+            first, last = block.slice_between(start, end)
+            if first == last:
+                continue
+            if group_by == "user":
+                for user_id, volume, duration in zip(block.user_ids[first:last], block.volume_liters[first:last],
+                                                     block.duration_minutes[first:last]):
+                    total = totals.setdefault(user_id, [0.0, 0, 0])
+                    total[0] += volume
+                    total[1] += duration
+                    total[2] += 1
+                continue
+            total = totals.setdefault(block.walkway_id if group_by == "walkway" else None, [0.0, 0, 0])
+            total[0] += sum(block.volume_liters[first:last])
+            total[1] += sum(block.duration_minutes[first:last])
+            total[2] += last - first
+        return {key: UsageTotal(volume, duration, count) for key, (volume, duration, count) in totals.items()}
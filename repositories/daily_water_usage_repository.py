@@ -0,0 +1,156 @@
+# repositories/daily_water_usage_repository.py
+
+import datetime
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from database.models.daily_water_usage import DailyWaterUsage, DailyWaterUsageCoverage
+from database.unit_of_work import commit_or_flush
+from .base_repository import BaseRepository
+from .sql_dialect import date_of, insert_or_add, parse_bucket_start
+from .watering_event_repository import UsageTotal, WateringEventRepository, usage_totals
+
+# Columnas por las que pueden agruparse los totales diarios
+ROLLUP_GROUP_COLUMNS = {
+    "user": DailyWaterUsage.user_id,
+    "walkway": DailyWaterUsage.walkway_id,
+}
+
+_KEY_COLUMNS = ("usage_date", "walkway_id", "user_id")
+_SUM_COLUMNS = ("volume_liters", "duration_minutes", "event_count")
+
+
+class DailyWaterUsageRepository(BaseRepository[DailyWaterUsage]):
+
+    def __init__(self, db: Session):
+        super().__init__(db, DailyWaterUsage)
+
+    def add_events(self, events: Iterable[Mapping]) -> None:
+        """
+        Suma a los totales diarios un conjunto de eventos nuevos (diccionarios con start_time, walkway_id,
+        user_id, volume_liters y duration_minutes). Los eventos se agregan en memoria y se escriben
+        con un único INSERT ... ON CONFLICT/ON DUPLICATE KEY multi-fila, en la transacción en curso.
+        """
+        totals: Dict[Tuple[datetime.date, int, int], list] = {}
+        for event in events:
+            key = (event['start_time'].date(), event['walkway_id'], event['user_id'])
+            row = totals.setdefault(key, [0.0, 0, 0])
+            row[0] += event['volume_liters']
+            row[1] += event['duration_minutes']
+            row[2] += 1
+        if not totals:
+            return
+        rows = [
+            dict(zip(_KEY_COLUMNS + _SUM_COLUMNS, key + tuple(values)))
+            for key, values in totals.items()
+        ]
+        self.db.execute(insert_or_add(DailyWaterUsage, _KEY_COLUMNS, _SUM_COLUMNS, self.db.get_bind().dialect.name), rows)
+        if self.get_coverage() is None:
+            self._start_coverage()
+        commit_or_flush(self.db)
+
+    def get_coverage(self) -> Optional[DailyWaterUsageCoverage]:
+        """
+        Obtiene la cobertura de los totales diarios, o None si todavía no se usa ninguno.
+        Con cobertura, los días desde complete_from (todos, si es None) se leen de los totales diarios
+        y los anteriores deben sumarse sobre los eventos.
+        """
+        return self.db.execute(select(DailyWaterUsageCoverage)).scalars().first()
+
+    def _start_coverage(self) -> None:
+        """
+        Fija la cobertura en la primera escritura incremental: el día siguiente al último evento
+        existente (los eventos nuevos ya están escritos). El historial anterior no tiene totales
+        y el día del último evento puede estar incompleto.
+        """
+        events = WateringEventRepository(self.db).event_source().c
+        last_start = parse_bucket_start(self.db.execute(select(func.max(events.start_time))).scalar())
+        if last_start is not None:
+            self.db.add(DailyWaterUsageCoverage(complete_from=last_start.date() + datetime.timedelta(days=1)))
+
+    def _extend_coverage(self, start_date: Optional[datetime.date], end_date: Optional[datetime.date]) -> None:
+        """
+        Adelanta la cobertura tras reconstruir los días entre start_date y end_date (None para no acotar)
+        si el rango reconstruido llega hasta ella (o hasta el final, si aún no hay cobertura).
+        """
+        coverage = self.get_coverage()
+        if coverage is None:
+            if end_date is None:
+                self.db.add(DailyWaterUsageCoverage(complete_from=start_date))
+            return
+        if coverage.complete_from is None:
+            return
+        if end_date is not None and end_date + datetime.timedelta(days=1) < coverage.complete_from:
+            return
+        if start_date is None or start_date < coverage.complete_from:
+            coverage.complete_from = start_date
+
+    def get_totals(self, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None,
+                   group_by: Optional[str] = None, user_id: Optional[int] = None,
+                   walkway_id: Optional[int] = None) -> Dict[Optional[int], UsageTotal]:
+        """
+        Suma los totales diarios entre start_date y end_date (ambas incluidas; None para no acotar),
+        opcionalmente por usuario o andador (group_by: 'user' o 'walkway'; la clave es None sin agrupar).
+        """
+        group_columns = [ROLLUP_GROUP_COLUMNS[group_by]] if group_by is not None else []
+        query = select(
+            *group_columns,
+            func.sum(DailyWaterUsage.volume_liters),
+            func.sum(DailyWaterUsage.duration_minutes),
+            func.sum(DailyWaterUsage.event_count)
+        )
+        if start_date is not None:
+            query = query.where(DailyWaterUsage.usage_date >= start_date)
+        if end_date is not None:
+            query = query.where(DailyWaterUsage.usage_date <= end_date)
+        if user_id is not None:
+            query = query.where(DailyWaterUsage.user_id == user_id)
+        if walkway_id is not None:
+            query = query.where(DailyWaterUsage.walkway_id == walkway_id)
+        return usage_totals(self.db.execute(query.group_by(*group_columns)).all(), group_by is not None)
+
+    def delete_for_user(self, user_id: int) -> int:
+        """
+        Elimina con un único DELETE los totales diarios de un usuario.
+        Devuelve el número de filas eliminadas.
+        """
+        return self.bulk_delete({"user_id": user_id})
+
+    def rebuild(self, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None) -> int:
+        """
+        Recalcula desde los eventos (activos y archivados) los totales diarios entre start_date y end_date
+        (ambas incluidas; None para no acotar): un DELETE del rango y un INSERT ... SELECT agrupado
+        que se evalúa en la base de datos. Sirve para la carga inicial y para corregir desajustes
+        (por ejemplo, tras modificar o borrar eventos fuera de los servicios).
+        Devuelve el número de filas escritas.
+        """
+        cleanup = delete(DailyWaterUsage)
+        # Los eventos pueden estar en la tabla de eventos, en el archivo o en ambos
+        events = WateringEventRepository(self.db).event_source(
+            start_date, end_date + datetime.timedelta(days=1) if end_date is not None else None
+        ).c
+        day = date_of(events.start_time, self.db.get_bind().dialect.name)
+        source = select(
+            day, events.walkway_id, events.user_id,
+            func.sum(events.volume_liters),
+            func.sum(events.duration_minutes),
+            func.count(events.id)
+        )
+        if start_date is not None:
+            cleanup = cleanup.where(DailyWaterUsage.usage_date >= start_date)
+            source = source.where(events.start_time >= start_date)
+        if end_date is not None:
+            cleanup = cleanup.where(DailyWaterUsage.usage_date <= end_date)
+            source = source.where(events.start_time < end_date + datetime.timedelta(days=1))
+        source = source.group_by(day, events.walkway_id, events.user_id)
+
+        self.db.execute(cleanup)
+        written = self.db.execute(
+            insert(DailyWaterUsage).from_select(list(_KEY_COLUMNS + _SUM_COLUMNS), source)
+        ).rowcount
+        self._extend_coverage(start_date, end_date)
+        commit_or_flush(self.db)
+        return written
+
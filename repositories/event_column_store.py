@@ -0,0 +1,160 @@
+# repositories/event_column_store.py
+
+# Almacén en memoria, por columnas, de eventos de riego para analítica ad hoc (mapas de calor por
+# hora, comparativas entre andadores...). Cada columna es un array.array de tipo fijo, así que un
+# evento ocupa 28 bytes y millones de eventos caben en decenas de MB, sin entidades ORM.
+# Los eventos se guardan ordenados por inicio: los filtros por fecha son búsquedas binarias y
+# cortes de arrays; el resto de filtros y agrupaciones recorren las columnas con zip/compress.
+
+import bisect
+import datetime
+import itertools
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_SECONDS_PER_DAY = 24 * 60 * 60
+# El 1 de enero de 1970 fue jueves (3 con el criterio de Python: 0 = lunes)
+_EPOCH_WEEKDAY = 3
+
+# Filas de carga: (start_time, user_id, walkway_id, volume_liters, duration_minutes), ordenadas por start_time
+AnalyticsRow = Tuple[datetime.datetime, int, int, float, int]
+
+
+def to_epoch(value: datetime.datetime) -> int:
+    """Segundos desde 1970-01-01 de un datetime sin zona horaria (se interpreta tal cual, sin conversiones)."""
+    return int((value - _EPOCH).total_seconds())
+
+
+def from_epoch(seconds: int) -> datetime.datetime:
+    """Inverso de to_epoch."""
+    return _EPOCH + datetime.timedelta(seconds=seconds)
+
+
+# Claves de agrupación calculadas a partir de los segundos de inicio
+_TIME_KEYS: Dict[str, Callable[[int], object]] = {
+    "hour": lambda seconds: seconds // 3600 % 24,
+    "weekday": lambda seconds: (seconds // _SECONDS_PER_DAY + _EPOCH_WEEKDAY) % 7,
+    "day": lambda seconds: _EPOCH.date() + datetime.timedelta(days=seconds // _SECONDS_PER_DAY),
+}
+
+# Valores que pueden sumarse
+VALUE_COLUMNS = ("volume_liters", "duration_minutes")
+
+
+class EventColumnStore:
+    """
+    Columnas de eventos de riego ordenadas por inicio: start_epoch, user_ids, walkway_ids,
+    volume_liters y duration_minutes. Los filtros devuelven un almacén nuevo; los originales no cambian.
+    """
+    __slots__ = ("start_epoch", "user_ids", "walkway_ids", "volume_liters", "duration_minutes")
+
+    def __init__(self, start_epoch: Optional[array] = None, user_ids: Optional[array] = None,
+                 walkway_ids: Optional[array] = None, volume_liters: Optional[array] = None,
+                 duration_minutes: Optional[array] = None):
+        self.start_epoch = start_epoch if start_epoch is not None else array("q")
+        self.user_ids = user_ids if user_ids is not None else array("i")
+        self.walkway_ids = walkway_ids if walkway_ids is not None else array("i")
+        self.volume_liters = volume_liters if volume_liters is not None else array("d")
+        self.duration_minutes = duration_minutes if duration_minutes is not None else array("i")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[AnalyticsRow]) -> "EventColumnStore":
+        """
+        Construye el almacén a partir de filas ordenadas por inicio (por ejemplo, en streaming desde
+        WateringEventRepository.iter_analytics_rows). Solo se retiene cada fila mientras se añade.
+        """
+        store = cls()
+        for start_time, user_id, walkway_id, volume_liters, duration_minutes in rows:
+            store.start_epoch.append(to_epoch(start_time))
+            store.user_ids.append(user_id)
+            store.walkway_ids.append(walkway_id)
+            store.volume_liters.append(volume_liters)
+            store.duration_minutes.append(duration_minutes)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.start_epoch)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria ocupada por los datos de las columnas, en bytes."""
+        return sum(len(column) * column.itemsize for column in self._columns())
+
+    def _columns(self) -> List[array]:
+        return [self.start_epoch, self.user_ids, self.walkway_ids, self.volume_liters, self.duration_minutes]
+
+    def between(self, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None) -> "EventColumnStore":
+        """
+        Eventos que empiezan en [start, end): dos búsquedas binarias y un corte por columna.
+        """
+        first = 0 if start is None else bisect.bisect_left(self.start_epoch, to_epoch(start))
+        last = len(self) if end is None else bisect.bisect_left(self.start_epoch, to_epoch(end))
+        return EventColumnStore(*(column[first:max(first, last)] for column in self._columns()))
+
+    def where(self, user_ids: Optional[Iterable[int]] = None, walkway_ids: Optional[Iterable[int]] = None,
+              hours: Optional[Iterable[int]] = None, min_volume: Optional[float] = None) -> "EventColumnStore":
+        """
+        Filtra por usuarios, andadores, horas del día de inicio o volumen mínimo (los criterios se combinan con Y).
+        Se calcula una máscara por criterio y las columnas se seleccionan con itertools.compress.
+        """
+        masks: List[Iterator[bool]] = []
+        if user_ids is not None:
+            masks.append(map(set(user_ids).__contains__, self.user_ids))
+        if walkway_ids is not None:
+            masks.append(map(set(walkway_ids).__contains__, self.walkway_ids))
+        if hours is not None:
+            masks.append(map(set(hours).__contains__, map(_TIME_KEYS["hour"], self.start_epoch)))
+        if min_volume is not None:
+            # float(): int.__le__(float) devuelve NotImplemented, que se evaluaría como verdadero
+            masks.append(map(float(min_volume).__le__, self.volume_liters))
+        if not masks:
+            return self
+        mask = bytes(map(all, zip(*masks)))
+        return EventColumnStore(
+            *(array(column.typecode, itertools.compress(column, mask)) for column in self._columns())
+        )
+
+    def total(self, value: str = "volume_liters") -> float:
+        """Suma de una columna de valores ('volume_liters' o 'duration_minutes')."""
+        return sum(self._value_column(value))
+
+    def group_sum(self, key: str, value: str = "volume_liters") -> Dict[object, float]:
+        """
+        Suma de una columna de valores (o número de eventos, con value='count') por clave:
+        'user', 'walkway', o la 'hour' (0-23), el 'weekday' (0 = lunes) o el 'day' (fecha) de inicio.
+        """
+        keys = self._key_column(key)
+        totals: Dict[object, float] = {}
+        if value == "count":
+            for group in keys:
+                totals[group] = totals.get(group, 0) + 1
+            return totals
+        for group, amount in zip(keys, self._value_column(value)):
+            totals[group] = totals.get(group, 0) + amount
+        return totals
+
+    def heatmap(self, value: str = "volume_liters") -> List[List[float]]:
+        """
+        Matriz 7 x 24 (día de la semana x hora de inicio) con la suma de la columna de valores,
+        o el número de eventos con value='count'.
+        """
+        grid = [[0] * 24 for _ in range(7)]
+        amounts = itertools.repeat(1) if value == "count" else self._value_column(value)
+        for seconds, amount in zip(self.start_epoch, amounts):
+            grid[(seconds // _SECONDS_PER_DAY + _EPOCH_WEEKDAY) % 7][seconds // 3600 % 24] += amount
+        return grid
+
+    def _key_column(self, key: str) -> Iterable:
+        if key == "user":
+            return self.user_ids
+        if key == "walkway":
+            return self.walkway_ids
+        if key in _TIME_KEYS:
+            return map(_TIME_KEYS[key], self.start_epoch)
+        raise ValueError(f"Clave de agrupación no soportada: {key}. Valores admitidos: user, walkway, {', '.join(_TIME_KEYS)}.")
+
+    def _value_column(self, value: str) -> array:
+        if value not in VALUE_COLUMNS:
+            raise ValueError(f"Columna no soportada: {value}. Valores admitidos: {', '.join(VALUE_COLUMNS)}.")
+        return getattr(self, value)
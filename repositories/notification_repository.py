@@ -5,9 +5,12 @@ from typing import Optional, List
 from uuid import UUID
 
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, insert, select
 
 from database.models.notification import Notification
+from database.unit_of_work import commit_or_flush
+from repositories.base_repository import FilterType, execute_bulk_update, execute_bulk_delete
+from repositories.pagination import Page, paginate
 
 # Configuración de logging para una mejor visibilidad
 logging.basicConfig(level=logging.INFO)
@@ -27,10 +30,25 @@ class NotificationRepository:
             is_read=False
         )
         self.db_session.add(new_notification)
-        self.db_session.commit()
-        self.db_session.refresh(new_notification)
+        commit_or_flush(self.db_session, new_notification)
         return new_notification
 
+    def bulk_create_notifications(self, rows: List[dict]) -> int:
+        """
+        Crea muchas notificaciones con una única sentencia INSERT (executemany).
+
+        Args:
+            rows (List[dict]): Diccionarios con user_id, title, message y type.
+
+        Returns:
+            int: El número de notificaciones creadas.
+        """
+        if not rows:
+            return 0
+        self.db_session.execute(insert(Notification), [{"is_read": False, **row} for row in rows])
+        commit_or_flush(self.db_session)
+        return len(rows)
+
     def get_all_by_user_id(self, user_id: UUID, status: str = "all") -> List[Notification]:
         """
         Obtiene todas las notificaciones para un usuario, opcionalmente filtradas por estado.
@@ -52,6 +70,31 @@ class NotificationRepository:
         logger.info(f"Obtenidas {len(notifications)} notificaciones para el usuario: {user_id} con estado: {status}")
         return notifications
 
+    def get_page_by_user_id(self, user_id: int, status: str = "all", cursor: Optional[str] = None, limit: int = 50) -> Page:
+        """
+        Obtiene una página de notificaciones de un usuario, de la más reciente a la más antigua,
+        con paginación por clave (created_at, id) en lugar de OFFSET.
+        
+        Args:
+            user_id (int): El ID del usuario.
+            status (str): "all", "read" o "unread" para filtrar.
+            cursor (Optional[str]): Cursor devuelto por la página anterior, o None para la primera.
+            limit (int): Número máximo de notificaciones a retornar.
+            
+        Returns:
+            Page: Las notificaciones de la página y el cursor de la siguiente (None si es la última).
+        """
+        stmt = select(Notification).where(Notification.user_id == user_id)
+        if status == "read":
+            stmt = stmt.where(Notification.is_read == True)
+        elif status == "unread":
+            stmt = stmt.where(Notification.is_read == False)
+
+        return paginate(
+            self.db_session, stmt, Notification.created_at, Notification.id,
+            cursor=cursor, limit=limit, descending=True
+        )
+
     def mark_as_read(self, notification_id: UUID) -> Optional[Notification]:
         """
         Marca una notificación específica como leída.
@@ -66,8 +109,7 @@ class NotificationRepository:
             notification = self.db_session.query(Notification).filter_by(id=notification_id).first()
             if notification:
                 notification.is_read = True
-                self.db_session.commit()
-                self.db_session.refresh(notification)
+                commit_or_flush(self.db_session, notification)
                 logger.info(f"Notificación con ID: {notification_id} marcada como leída.")
             else:
                 logger.warning(f"No se encontró ninguna notificación con ID: {notification_id} para marcar como leída.")
@@ -88,12 +130,10 @@ class NotificationRepository:
             int: El número de notificaciones actualizadas.
         """
         try:
-            notifications = self.db_session.query(Notification).filter_by(user_id=user_id, is_read=False).all()
-            for notification in notifications:
-                notification.is_read = True
-            self.db_session.commit()
-            logger.info(f"{len(notifications)} notificaciones para el usuario {user_id} marcadas como leídas.")
-            return len(notifications)
+            # Un único UPDATE ... WHERE: no se cargan las notificaciones en memoria
+            updated_count = self.bulk_update({"user_id": user_id, "is_read": False}, {"is_read": True})
+            logger.info(f"{updated_count} notificaciones para el usuario {user_id} marcadas como leídas.")
+            return updated_count
         except Exception as e:
             self.db_session.rollback()
             logger.error(f"Error al marcar todas las notificaciones para el usuario {user_id} como leídas: {e}")
@@ -113,7 +153,7 @@ class NotificationRepository:
             notification = self.db_session.query(Notification).filter_by(id=notification_id).first()
             if notification:
                 self.db_session.delete(notification)
-                self.db_session.commit()
+                commit_or_flush(self.db_session)
                 logger.info(f"Notificación con ID: {notification_id} eliminada exitosamente.")
                 return True
             logger.warning(f"No se encontró la notificación con ID: {notification_id} para eliminar.")
@@ -122,3 +162,28 @@ class NotificationRepository:
             self.db_session.rollback()
             logger.error(f"Error al eliminar la notificación con ID {notification_id}: {e}")
             return False
+
+    def bulk_update(self, filters: FilterType, values: dict) -> int:
+        """
+        Actualiza todas las notificaciones que cumplen el filtro con una única sentencia UPDATE.
+        
+        Args:
+            filters (FilterType): Diccionario {campo: valor} o secuencia de expresiones.
+            values (dict): Los valores a asignar.
+            
+        Returns:
+            int: El número de notificaciones actualizadas.
+        """
+        return execute_bulk_update(self.db_session, Notification, filters, values)
+
+    def bulk_delete(self, filters: FilterType) -> int:
+        """
+        Elimina todas las notificaciones que cumplen el filtro con una única sentencia DELETE.
+        
+        Args:
+            filters (FilterType): Diccionario {campo: valor} o secuencia de expresiones.
+            
+        Returns:
+            int: El número de notificaciones eliminadas.
+        """
+        return execute_bulk_delete(self.db_session, Notification, filters)
@@ -0,0 +1,96 @@
+# repositories/pagination.py
+
+# Paginación por clave (keyset / seek) compartida por los repositorios.
+# En lugar de OFFSET, cada página continúa a partir de la última fila vista,
+# de modo que las páginas profundas cuestan lo mismo que la primera.
+
+import base64
+import datetime
+import json
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from Core.exceptions import ValidationError
+
+
+class Page(NamedTuple):
+    """Una página de resultados y el cursor para pedir la siguiente (None si no hay más)."""
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(sort_value: Any, entity_id: int) -> str:
+    """
+    Codifica la posición (valor de ordenación, id) de la última fila en un cursor opaco.
+    """
+    if isinstance(sort_value, datetime.datetime):
+        value = {"dt": sort_value.isoformat()}
+    elif isinstance(sort_value, datetime.date):
+        value = {"d": sort_value.isoformat()}
+    elif isinstance(sort_value, datetime.time):
+        value = {"t": sort_value.isoformat()}
+    else:
+        value = {"v": sort_value}
+    payload = json.dumps([value, entity_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """
+    Decodifica un cursor generado por encode_cursor.
+    :raises ValidationError: Si el cursor no es válido.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, entity_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if "dt" in value:
+            return datetime.datetime.fromisoformat(value["dt"]), int(entity_id)
+        if "d" in value:
+            return datetime.date.fromisoformat(value["d"]), int(entity_id)
+        if "t" in value:
+            return datetime.time.fromisoformat(value["t"]), int(entity_id)
+        return value["v"], int(entity_id)
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValidationError(f"Cursor de paginación inválido: {e}")
+
+
+def paginate(db: Session, stmt, sort_column, id_column, cursor: Optional[str] = None,
+             limit: int = 100, descending: bool = False) -> Page:
+    """
+    Ejecuta una consulta paginada por (sort_column, id_column).
+    :param db: La sesión de la base de datos.
+    :param stmt: La consulta select() base, con sus filtros ya aplicados.
+    :param sort_column: Columna de ordenación (idealmente indexada junto con el id).
+    :param id_column: Columna id, que desempata filas con el mismo valor de ordenación.
+    :param cursor: Cursor devuelto por la página anterior, o None para la primera.
+    :param limit: Número máximo de filas por página.
+    :param descending: Si True, recorre de mayor a menor.
+    :return: La página de entidades y el cursor siguiente.
+    """
+    if cursor is not None:
+        last_value, last_id = decode_cursor(cursor)
+        if sort_column is id_column:
+            stmt = stmt.where(id_column < last_id if descending else id_column > last_id)
+        # La condición redundante sobre sort_column permite al planificador buscar
+        # directamente en el índice en lugar de evaluar el OR fila a fila.
+        elif descending:
+            stmt = stmt.where(and_(sort_column <= last_value, or_(sort_column < last_value, id_column < last_id)))
+        else:
+            stmt = stmt.where(and_(sort_column >= last_value, or_(sort_column > last_value, id_column > last_id)))
+
+    order_columns = [sort_column] if sort_column is id_column else [sort_column, id_column]
+    if descending:
+        stmt = stmt.order_by(*[column.desc() for column in order_columns])
+    else:
+        stmt = stmt.order_by(*order_columns)
+
+    # Se pide una fila de más para saber si existe una página siguiente sin hacer COUNT
+    items = list(db.execute(stmt.limit(limit + 1)).scalars())
+    if len(items) <= limit:
+        return Page(items, None)
+
+    items = items[:limit]
+    last = items[-1]
+    return Page(items, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key)))
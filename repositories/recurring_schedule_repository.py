@@ -0,0 +1,213 @@
+# repositories/recurring_schedule_repository.py
+
+import bisect
+import datetime
+import heapq
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session
+
+from database.models.recurring_watering_schedule import RecurringWateringSchedule, RecurringScheduleException
+from database.models.user_watering_schedule import UserWateringSchedule
+from database.unit_of_work import commit_or_flush
+from .base_repository import BaseRepository
+
+
+class Occurrence(NamedTuple):
+    """Una ocurrencia expandida (no guardada) de una plantilla recurrente."""
+    recurring_schedule_id: Optional[int]
+    user_id: int
+    occurrence_date: datetime.date
+    start_at: datetime.datetime
+    end_at: datetime.datetime
+
+
+def expand_template(template: RecurringWateringSchedule, start_date: datetime.date, end_date: datetime.date,
+                    exceptions: Optional[Dict[Tuple[int, datetime.date], RecurringScheduleException]] = None,
+                    materialized: Optional[Set[Tuple[int, datetime.date]]] = None) -> Iterator[Occurrence]:
+    """
+    Generador de las ocurrencias de una plantilla entre start_date y end_date, en orden.
+    Omite las canceladas y las ya materializadas (que existen como UserWateringSchedule)
+    y aplica el horario sustituto de las excepciones.
+    """
+    exceptions = exceptions or {}
+    materialized = materialized or set()
+    for day in template.occurrence_dates(start_date, end_date):
+        key = (template.id, day)
+        if key in materialized:
+            continue
+        start_time, end_time = template.start_time, template.end_time
+        exception = exceptions.get(key)
+        if exception is not None:
+            if exception.is_cancelled:
+                continue
+            start_time = exception.start_time or start_time
+            end_time = exception.end_time or end_time
+        start_at, end_at = UserWateringSchedule.time_bounds(day, start_time, end_time)
+        yield Occurrence(template.id, template.user_id, day, start_at, end_at)
+
+
+def _merge_day_ranges(day_ranges: Iterable[Tuple[datetime.date, datetime.date]]) -> List[Tuple[datetime.date, datetime.date]]:
+    """
+    Une rangos de días [primero, último] (ambos incluidos) que se solapan o son contiguos, en orden.
+    """
+    merged: List[Tuple[datetime.date, datetime.date]] = []
+    for first_day, last_day in sorted(day_ranges):
+        if merged and first_day <= merged[-1][1] + datetime.timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last_day))
+        else:
+            merged.append((first_day, last_day))
+    return merged
+
+
+class RecurringScheduleRepository(BaseRepository[RecurringWateringSchedule]):
+
+    def __init__(self, db: Session):
+        super().__init__(db, RecurringWateringSchedule)
+
+    def get_active_for_users(self, user_ids: Iterable[int] | None, start_date: datetime.date | None,
+                             end_date: datetime.date | None) -> List[RecurringWateringSchedule]:
+        """
+        Obtiene las plantillas activas de un conjunto de usuarios (o de todos, si user_ids es None)
+        vigentes en algún día de [start_date, end_date]. Las fechas pueden ser None para no acotar.
+        """
+        query = select(RecurringWateringSchedule).where(RecurringWateringSchedule.is_active.is_(True))
+        if end_date is not None:
+            query = query.where(RecurringWateringSchedule.valid_from <= end_date)
+        if start_date is not None:
+            query = query.where(RecurringWateringSchedule.valid_until >= start_date)
+        if user_ids is not None:
+            user_ids = set(user_ids)
+            if not user_ids:
+                return []
+            query = query.where(RecurringWateringSchedule.user_id.in_(user_ids))
+        return self.db.execute(query.order_by(RecurringWateringSchedule.id)).scalars().all()
+
+    def get_exceptions(self, recurring_schedule_ids: Iterable[int], start_date: datetime.date,
+                       end_date: datetime.date) -> Dict[Tuple[int, datetime.date], RecurringScheduleException]:
+        """
+        Obtiene, en una sola consulta, las excepciones de un conjunto de plantillas en un rango de fechas,
+        indexadas por (recurring_schedule_id, occurrence_date).
+        """
+        return self._get_exceptions(recurring_schedule_ids, [(start_date, end_date)])
+
+    def _get_exceptions(self, recurring_schedule_ids: Iterable[int],
+                        day_ranges: List[Tuple[datetime.date, datetime.date]]) -> Dict[Tuple[int, datetime.date], RecurringScheduleException]:
+        recurring_schedule_ids = set(recurring_schedule_ids)
+        if not recurring_schedule_ids:
+            return {}
+        exceptions = self.db.execute(
+            select(RecurringScheduleException).where(
+                RecurringScheduleException.recurring_schedule_id.in_(recurring_schedule_ids),
+                or_(*(RecurringScheduleException.occurrence_date.between(first_day, last_day)
+                      for first_day, last_day in day_ranges))
+            )
+        ).scalars().all()
+        return {(exception.recurring_schedule_id, exception.occurrence_date): exception for exception in exceptions}
+
+    def get_materialized_dates(self, recurring_schedule_ids: Iterable[int], start_date: datetime.date,
+                               end_date: datetime.date) -> Set[Tuple[int, datetime.date]]:
+        """
+        Obtiene, en una sola consulta, las ocurrencias ya materializadas como UserWateringSchedule,
+        como pares (recurring_schedule_id, fecha).
+        """
+        return self._get_materialized_dates(recurring_schedule_ids, [(start_date, end_date)])
+
+    def _get_materialized_dates(self, recurring_schedule_ids: Iterable[int],
+                                day_ranges: List[Tuple[datetime.date, datetime.date]]) -> Set[Tuple[int, datetime.date]]:
+        recurring_schedule_ids = set(recurring_schedule_ids)
+        if not recurring_schedule_ids:
+            return set()
+        rows = self.db.execute(
+            select(UserWateringSchedule.recurring_schedule_id, UserWateringSchedule.scheduled_date).where(
+                UserWateringSchedule.recurring_schedule_id.in_(recurring_schedule_ids),
+                or_(*(UserWateringSchedule.scheduled_date.between(first_day, last_day)
+                      for first_day, last_day in day_ranges))
+            )
+        ).all()
+        return {(recurring_schedule_id, day) for recurring_schedule_id, day in rows}
+
+    def iter_occurrences(self, user_ids: Iterable[int] | None, start: datetime.datetime,
+                         end: datetime.datetime, exclude_recurring_schedule_id: Optional[int] = None) -> Iterator[Occurrence]:
+        """
+        Generador de las ocurrencias pendientes que se superponen con [start, end), en orden de inicio.
+        Carga plantillas, excepciones y materializaciones con tres consultas y expande cada
+        plantilla de forma perezosa, sin construir la lista completa de ocurrencias.
+        """
+        return self.iter_occurrences_in_windows(user_ids, [(start, end)], exclude_recurring_schedule_id)
+
+    def iter_occurrences_in_windows(self, user_ids: Iterable[int] | None,
+                                    windows: List[Tuple[datetime.datetime, datetime.datetime]],
+                                    exclude_recurring_schedule_id: Optional[int] = None) -> Iterator[Occurrence]:
+        """
+        Como iter_occurrences, pero para las ocurrencias que se superponen con alguna de varias ventanas
+        [start, end) disjuntas y ordenadas (ver day_windows). Sigue usando tres consultas, y las
+        excepciones y materializaciones se cargan y las plantillas se expanden solo para los días de
+        las ventanas, no para todo el rango entre la primera y la última.
+        """
+        if not windows:
+            return
+        # Un día antes de cada ventana, por las ocurrencias que cruzan la medianoche
+        day_ranges = _merge_day_ranges((start.date() - datetime.timedelta(days=1), end.date()) for start, end in windows)
+        templates = [
+            template for template in self.get_active_for_users(user_ids, day_ranges[0][0], day_ranges[-1][1])
+            if template.id != exclude_recurring_schedule_id
+        ]
+        if not templates:
+            return
+
+        template_ids = [template.id for template in templates]
+        exceptions = self._get_exceptions(template_ids, day_ranges)
+        materialized = self._get_materialized_dates(template_ids, day_ranges)
+
+        streams = [
+            expand_template(template, first_day, last_day, exceptions, materialized)
+            for first_day, last_day in day_ranges for template in templates
+        ]
+        window_ends = [end for _, end in windows]
+        for occurrence in heapq.merge(*streams, key=lambda occurrence: occurrence.start_at):
+            # Primera ventana que termina después del inicio de la ocurrencia
+            position = bisect.bisect_right(window_ends, occurrence.start_at)
+            if position == len(windows):
+                return
+            if windows[position][0] < occurrence.end_at:
+                yield occurrence
+
+    def delete_for_user(self, user_id: int) -> Tuple[int, int]:
+        """
+        Elimina las plantillas de un usuario y sus excepciones con una sentencia DELETE por tabla.
+        Las ocurrencias materializadas se eliminan aparte, como programaciones del usuario.
+        :return: (excepciones eliminadas, plantillas eliminadas).
+        """
+        template_ids = select(RecurringWateringSchedule.id).where(RecurringWateringSchedule.user_id == user_id)
+        deleted_exceptions = self.db.execute(
+            delete(RecurringScheduleException).where(RecurringScheduleException.recurring_schedule_id.in_(template_ids))
+        ).rowcount
+        deleted_templates = self.db.execute(
+            delete(RecurringWateringSchedule).where(RecurringWateringSchedule.user_id == user_id)
+        ).rowcount
+        commit_or_flush(self.db)
+        return deleted_exceptions, deleted_templates
+
+    def save_exception(self, recurring_schedule_id: int, occurrence_date: datetime.date, is_cancelled: bool,
+                       start_time: Optional[datetime.time] = None,
+                       end_time: Optional[datetime.time] = None) -> RecurringScheduleException:
+        """
+        Crea o sustituye la excepción de una ocurrencia.
+        """
+        exception = self.db.execute(
+            select(RecurringScheduleException).filter_by(
+                recurring_schedule_id=recurring_schedule_id, occurrence_date=occurrence_date
+            )
+        ).scalars().first()
+        if exception is None:
+            exception = RecurringScheduleException(
+                recurring_schedule_id=recurring_schedule_id, occurrence_date=occurrence_date
+            )
+            self.db.add(exception)
+        exception.is_cancelled = is_cancelled
+        exception.start_time = start_time
+        exception.end_time = end_time
+        commit_or_flush(self.db, exception)
+        return exception
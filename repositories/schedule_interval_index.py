@@ -0,0 +1,162 @@
+# repositories/schedule_interval_index.py
+
+# Índice en memoria de los intervalos de programación por (user_id, scheduled_date).
+# Permite comprobar superposiciones en O(log n) sin consultar la base de datos:
+# lo usan la creación por lotes, las cargas masivas y las simulaciones "qué pasaría si".
+
+import bisect
+import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+IndexKey = Tuple[int, datetime.date]
+
+
+def day_windows(days: Iterable[datetime.date]) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Agrupa un conjunto de días en ventanas [inicio, fin) de días consecutivos, en orden.
+    Sirve para consultar solo los días que toca un lote en lugar de todo el rango entre el primero y el último.
+    """
+    windows: List[Tuple[datetime.datetime, datetime.datetime]] = []
+    for day in sorted(set(days)):
+        start = datetime.datetime.combine(day, datetime.time())
+        end = start + datetime.timedelta(days=1)
+        if windows and windows[-1][1] == start:
+            windows[-1] = (windows[-1][0], end)
+        else:
+            windows.append((start, end))
+    return windows
+
+
+class _DayIntervals:
+    """
+    Intervalos de un usuario en un día, ordenados por inicio.
+    max_ends[i] es el mayor fin entre los intervalos 0..i, de modo que la búsqueda sigue
+    siendo correcta aunque los datos existentes contengan intervalos superpuestos.
+    """
+    __slots__ = ("starts", "ends", "ids", "max_ends")
+
+    def __init__(self):
+        self.starts: List[datetime.datetime] = []
+        self.ends: List[datetime.datetime] = []
+        self.ids: List[Optional[int]] = []
+        self.max_ends: List[datetime.datetime] = []
+
+    def insert(self, start: datetime.datetime, end: datetime.datetime, schedule_id: Optional[int]) -> None:
+        position = bisect.bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, schedule_id)
+        self.max_ends.insert(position, end)
+        self._refresh_max_ends(position)
+
+    def remove(self, schedule_id: int) -> None:
+        position = self.ids.index(schedule_id)
+        for values in (self.starts, self.ends, self.ids, self.max_ends):
+            del values[position]
+        self._refresh_max_ends(position)
+
+    def _refresh_max_ends(self, position: int) -> None:
+        running = self.max_ends[position - 1] if position > 0 else None
+        for i in range(position, len(self.ends)):
+            running = self.ends[i] if running is None or self.ends[i] > running else running
+            self.max_ends[i] = running
+
+    def overlapping(self, start: datetime.datetime, end: datetime.datetime) -> Iterator[int]:
+        """Posiciones de los intervalos que se superponen con [start, end), de la última a la primera."""
+        # Solo pueden superponerse los intervalos que empiezan antes de `end`
+        position = bisect.bisect_left(self.starts, end) - 1
+        while position >= 0 and self.max_ends[position] > start:
+            if self.ends[position] > start:
+                yield position
+            position -= 1
+
+
+class ScheduleIntervalIndex:
+    """
+    Intervalos [start_at, end_at) de programaciones agrupados por (user_id, scheduled_date).
+    Un intervalo que cruza la medianoche se registra en cada día que toca.
+    """
+
+    def __init__(self):
+        self._days: Dict[IndexKey, _DayIntervals] = {}
+        self._size = 0
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, int, datetime.datetime, datetime.datetime]]) -> "ScheduleIntervalIndex":
+        """
+        Construye el índice a partir de tuplas (id, user_id, start_at, end_at),
+        como las que devuelve UserWateringScheduleRepository.get_intervals_for_users.
+        """
+        index = cls()
+        for schedule_id, user_id, start_at, end_at in rows:
+            index.add(user_id, start_at, end_at, schedule_id)
+        return index
+
+    @staticmethod
+    def _dates(start: datetime.datetime, end: datetime.datetime) -> Iterator[datetime.date]:
+        day = start.date()
+        last = max(start, end - datetime.timedelta(microseconds=1)).date()
+        while day <= last:
+            yield day
+            day += datetime.timedelta(days=1)
+
+    def add(self, user_id: int, start: datetime.datetime, end: datetime.datetime,
+            schedule_id: Optional[int] = None) -> None:
+        """Registra un intervalo; schedule_id puede ser None para programaciones aún no guardadas."""
+        for day in self._dates(start, end):
+            self._days.setdefault((user_id, day), _DayIntervals()).insert(start, end, schedule_id)
+        self._size += 1
+
+    def remove(self, user_id: int, start: datetime.datetime, end: datetime.datetime, schedule_id: int) -> None:
+        """Elimina un intervalo registrado con su schedule_id."""
+        for day in self._dates(start, end):
+            self._days[(user_id, day)].remove(schedule_id)
+        self._size -= 1
+
+    def find_overlapping(self, user_id: int, start: datetime.datetime, end: datetime.datetime,
+                         exclude_schedule_id: Optional[int] = None) -> List[Tuple[Optional[int], datetime.datetime, datetime.datetime]]:
+        """
+        Devuelve los intervalos (schedule_id, start_at, end_at) del usuario que se superponen con [start, end),
+        ordenados por inicio.
+        """
+        found = {}
+        for day in self._dates(start, end):
+            intervals = self._days.get((user_id, day))
+            if intervals is None:
+                continue
+            for position in intervals.overlapping(start, end):
+                schedule_id = intervals.ids[position]
+                if schedule_id is not None and schedule_id == exclude_schedule_id:
+                    continue
+                interval = (schedule_id, intervals.starts[position], intervals.ends[position])
+                found[interval] = None
+        return sorted(found, key=lambda interval: interval[1])
+
+    def overlaps(self, user_id: int, start: datetime.datetime, end: datetime.datetime,
+                 exclude_schedule_id: Optional[int] = None) -> bool:
+        """Indica si algún intervalo del usuario se superpone con [start, end)."""
+        for day in self._dates(start, end):
+            intervals = self._days.get((user_id, day))
+            if intervals is None:
+                continue
+            for position in intervals.overlapping(start, end):
+                schedule_id = intervals.ids[position]
+                if schedule_id is None or schedule_id != exclude_schedule_id:
+                    return True
+        return False
+
+    def copy(self) -> "ScheduleIntervalIndex":
+        """Copia independiente, útil para simulaciones que no deben alterar el original."""
+        clone = ScheduleIntervalIndex()
+        for key, intervals in self._days.items():
+            copied = _DayIntervals()
+            copied.starts = list(intervals.starts)
+            copied.ends = list(intervals.ends)
+            copied.ids = list(intervals.ids)
+            copied.max_ends = list(intervals.max_ends)
+            clone._days[key] = copied
+        clone._size = self._size
+        return clone
+
+    def __len__(self) -> int:
+        return self._size
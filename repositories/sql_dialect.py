@@ -0,0 +1,113 @@
+# repositories/sql_dialect.py
+
+# Expresiones SQL que cada motor escribe de forma distinta. Los repositorios las piden con el
+# nombre del dialecto de su sesión (self.db.get_bind().dialect.name), de modo que las consultas
+# se evalúan en la base de datos tanto en MySQL como en SQLite (tests) o PostgreSQL.
+# Con cualquier otro motor las funciones lanzan ValueError.
+
+import datetime
+from typing import Sequence
+
+from sqlalchemy import Date, Integer, cast, extract, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql.elements import ColumnElement
+
+SUPPORTED_DIALECTS = ("sqlite", "mysql", "mariadb", "postgresql")
+
+
+def _unsupported(dialect_name: str) -> ValueError:
+    return ValueError(f"Dialecto no soportado: {dialect_name}. Motores admitidos: {', '.join(SUPPORTED_DIALECTS)}.")
+
+
+def weekday(column, dialect_name: str) -> ColumnElement:
+    """
+    Día de la semana de una columna de fecha, con el criterio de Python: 0 = lunes ... 6 = domingo.
+    """
+    if dialect_name == "sqlite":
+        # strftime('%w') empieza en domingo = 0
+        return (cast(func.strftime('%w', column), Integer) + 6) % 7
+    if dialect_name in ("mysql", "mariadb"):
+        return func.weekday(column)
+    if dialect_name == "postgresql":
+        return cast(extract('isodow', column), Integer) - 1
+    raise _unsupported(dialect_name)
+
+
+# Granularidades admitidas por bucket_start
+TIME_BUCKETS = ("hour", "day", "week", "month")
+
+
+def bucket_start(column, bucket: str, dialect_name: str) -> ColumnElement:
+    """
+    Inicio del intervalo (hora, día, semana empezando en lunes o mes) al que pertenece una columna
+    de fecha y hora. Según el motor el resultado es una fecha, un datetime o un texto ISO:
+    normalícese con parse_bucket_start.
+    """
+    if bucket not in TIME_BUCKETS:
+        raise ValueError(f"Granularidad no soportada: {bucket}. Valores admitidos: {', '.join(TIME_BUCKETS)}.")
+    if dialect_name == "sqlite":
+        if bucket == "hour":
+            return func.strftime('%Y-%m-%d %H:00:00', column)
+        if bucket == "day":
+            return func.date(column)
+        if bucket == "week":
+            # 'weekday 0' avanza hasta el domingo (o se queda en él); seis días antes es el lunes
+            return func.date(column, 'weekday 0', '-6 days')
+        return func.strftime('%Y-%m-01', column)
+    if dialect_name in ("mysql", "mariadb"):
+        if bucket == "hour":
+            return func.date_format(column, '%Y-%m-%d %H:00:00')
+        if bucket == "day":
+            return func.date(column)
+        if bucket == "week":
+            return func.subdate(func.date(column), func.weekday(column))
+        return func.date_format(column, '%Y-%m-01')
+    if dialect_name == "postgresql":
+        # date_trunc('week') ya empieza en lunes (semana ISO)
+        return func.date_trunc(bucket, column)
+    raise _unsupported(dialect_name)
+
+
+def parse_bucket_start(value) -> datetime.datetime | None:
+    """
+    Convierte a datetime el valor devuelto por bucket_start, sea cual sea el motor.
+    """
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(value)
+
+
+def date_of(column, dialect_name: str) -> ColumnElement:
+    """
+    Fecha (sin hora) de una columna de fecha y hora, en el formato en el que el motor guarda las fechas.
+    """
+    if dialect_name == "sqlite":
+        # CAST(... AS DATE) en SQLite convierte a número; date() devuelve 'AAAA-MM-DD'
+        return func.date(column)
+    if dialect_name in ("mysql", "mariadb", "postgresql"):
+        return cast(column, Date)
+    raise _unsupported(dialect_name)
+
+
+def insert_or_add(model, key_columns: Sequence[str], sum_columns: Sequence[str], dialect_name: str):
+    """
+    Sentencia INSERT que, si la fila ya existe (misma clave), suma los valores nuevos de
+    sum_columns a los guardados en lugar de fallar. Admite ejecución multi-fila (executemany).
+    """
+    if dialect_name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect_name == "sqlite" else postgresql_insert
+        statement = dialect_insert(model)
+        return statement.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={column: getattr(model, column) + statement.excluded[column] for column in sum_columns}
+        )
+    if dialect_name in ("mysql", "mariadb"):
+        statement = mysql_insert(model)
+        return statement.on_duplicate_key_update(
+            {column: getattr(model, column) + statement.inserted[column] for column in sum_columns}
+        )
+    raise _unsupported(dialect_name)
@@ -1,11 +1,14 @@
 # backend/SQLALCHEMY_REGADIO/repositories/user_repository.py
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Iterable, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from database.models.user import User
+from database.unit_of_work import commit_or_flush
+from repositories.base_repository import FilterType, execute_bulk_update, execute_bulk_delete
+from repositories.pagination import Page, paginate
 
 
 class UserRepository:
@@ -37,8 +40,7 @@ class UserRepository:
         """
         new_user = User(**user_data)
         self.db.add(new_user)
-        self.db.commit()
-        self.db.refresh(new_user)
+        commit_or_flush(self.db, new_user)
         return new_user
 
     def get_by_id(self, user_id: int) -> Optional[User]:
@@ -55,6 +57,19 @@ class UserRepository:
             select(User).filter_by(id=user_id)
         ).scalar_one_or_none()
 
+    def get_page(self, cursor: Optional[str] = None, limit: int = 100) -> Page:
+        """
+        Obtiene una página de usuarios ordenados por ID, con paginación por clave (keyset).
+
+        Args:
+            cursor (Optional[str]): Cursor devuelto por la página anterior, o None para la primera.
+            limit (int): Número máximo de usuarios a retornar.
+
+        Returns:
+            Page: Los usuarios de la página y el cursor de la siguiente (None si es la última).
+        """
+        return paginate(self.db, select(User), User.id, User.id, cursor=cursor, limit=limit)
+
     def get_by_username(self, username: str) -> Optional[User]:
         """
         Obtiene un usuario por su nombre de usuario.
@@ -81,6 +96,88 @@ class UserRepository:
         # CORRECCIÓN: Usamos `self.db` en lugar de `self.session` para acceder a la sesión
         return self.db.execute(select(User).filter_by(email=email)).scalar_one_or_none()
 
+    def get_walkway_ids_by_user_ids(self, user_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Obtiene, en una sola consulta, el andador de cada usuario de un conjunto.
+
+        Args:
+            user_ids (Iterable[int]): Los IDs de los usuarios.
+
+        Returns:
+            Dict[int, int]: Un diccionario user_id -> walkway_id con los usuarios existentes.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return {}
+        rows = self.db.execute(
+            select(User.id, User.walkway_id).where(User.id.in_(user_ids))
+        ).all()
+        return {user_id: walkway_id for user_id, walkway_id in rows}
+
+    def get_walkway_ids_by_walkways(self, walkway_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Obtiene, en una sola consulta, los usuarios de un conjunto de andadores con el andador de cada uno.
+
+        Args:
+            walkway_ids (Iterable[int]): Los IDs de los andadores.
+
+        Returns:
+            Dict[int, int]: Un diccionario user_id -> walkway_id.
+        """
+        walkway_ids = set(walkway_ids)
+        if not walkway_ids:
+            return {}
+        rows = self.db.execute(
+            select(User.id, User.walkway_id).where(User.walkway_id.in_(walkway_ids))
+        ).all()
+        return {user_id: walkway_id for user_id, walkway_id in rows}
+
+    def get_ids_by_access_key(self, user_type_id: int, walkway_id: int) -> List[int]:
+        """
+        Obtiene los IDs de los usuarios de un tipo en un andador (los que evalúan las mismas reglas de acceso).
+
+        Args:
+            user_type_id (int): El ID del tipo de usuario.
+            walkway_id (int): El ID del andador.
+
+        Returns:
+            List[int]: Los IDs de esos usuarios.
+        """
+        return list(self.db.execute(
+            select(User.id).where(User.user_type_id == user_type_id, User.walkway_id == walkway_id)
+        ).scalars())
+
+    def get_access_keys_by_user_ids(self, user_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+        """
+        Obtiene, en una sola consulta, el tipo de usuario y el andador de cada usuario de un conjunto
+        (la clave con la que se evalúan sus reglas de acceso).
+
+        Args:
+            user_ids (Iterable[int]): Los IDs de los usuarios.
+
+        Returns:
+            Dict[int, Tuple[int, int]]: Un diccionario user_id -> (user_type_id, walkway_id) con los usuarios existentes.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return {}
+        rows = self.db.execute(
+            select(User.id, User.user_type_id, User.walkway_id).where(User.id.in_(user_ids))
+        ).all()
+        return {user_id: (user_type_id, walkway_id) for user_id, user_type_id, walkway_id in rows}
+
+    def get_active_access_keys(self) -> Dict[int, Tuple[int, int]]:
+        """
+        Obtiene, en una sola consulta, el tipo de usuario y el andador de todos los usuarios activos.
+
+        Returns:
+            Dict[int, Tuple[int, int]]: Un diccionario user_id -> (user_type_id, walkway_id).
+        """
+        rows = self.db.execute(
+            select(User.id, User.user_type_id, User.walkway_id).where(User.is_active.is_(True))
+        ).all()
+        return {user_id: (user_type_id, walkway_id) for user_id, user_type_id, walkway_id in rows}
+
     def update(self, user_id: int, update_data: Dict[str, Any]) -> Optional[User]:
         """
         Actualiza un usuario existente.
@@ -96,8 +193,7 @@ class UserRepository:
         if user:
             for key, value in update_data.items():
                 setattr(user, key, value)
-            self.db.commit()
-            self.db.refresh(user)
+            commit_or_flush(self.db, user)
             return user
         return None
 
@@ -114,6 +210,31 @@ class UserRepository:
         user = self.get_by_id(user_id)
         if user:
             self.db.delete(user)
-            self.db.commit()
+            commit_or_flush(self.db)
             return True
         return False
+
+    def bulk_update(self, filters: FilterType, values: Dict[str, Any]) -> int:
+        """
+        Actualiza todos los usuarios que cumplen el filtro con una única sentencia UPDATE.
+
+        Args:
+            filters (FilterType): Diccionario {campo: valor} o secuencia de expresiones.
+            values (Dict[str, Any]): Los valores a asignar.
+
+        Returns:
+            int: El número de usuarios actualizados.
+        """
+        return execute_bulk_update(self.db, User, filters, values)
+
+    def bulk_delete(self, filters: FilterType) -> int:
+        """
+        Elimina todos los usuarios que cumplen el filtro con una única sentencia DELETE.
+
+        Args:
+            filters (FilterType): Diccionario {campo: valor} o secuencia de expresiones.
+
+        Returns:
+            int: El número de usuarios eliminados.
+        """
+        return execute_bulk_delete(self.db, User, filters)
@@ -1,13 +1,36 @@
 # repositories/user_watering_schedule_repository.py
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import and_, or_, select
+from typing import List, Dict, FrozenSet, Iterable, Optional, Tuple
 import datetime
 
 from database.models.user_watering_schedule import UserWateringSchedule
 from database.models.user import User
-from .base_repository import BaseRepository
+from .base_repository import BaseRepository, FilterType, execute_batched_backfill
+from .schedule_interval_index import ScheduleIntervalIndex
+from .sql_dialect import weekday
+
+# Columnas a partir de las que se calculan start_at / end_at
+_TIME_SOURCE_COLUMNS = ("scheduled_date", "start_time", "end_time")
+
+
+def _overlaps(start: datetime.datetime | None, end: datetime.datetime | None) -> list:
+    """
+    Condiciones para que una programación se superponga con [start, end) (None = sin acotar ese extremo).
+    Además de end_at > start, acota start_at por abajo con la duración máxima de una programación,
+    de modo que la consulta es un rango cerrado sobre start_at y no recorre todo el historial anterior.
+    """
+    conditions = []
+    if end is not None:
+        conditions.append(UserWateringSchedule.start_at < end)
+    if start is not None:
+        conditions.append(UserWateringSchedule.start_at > start - UserWateringSchedule.MAX_DURATION)
+        conditions.append(UserWateringSchedule.end_at > start)
+    return conditions
+
+# Tramo de una regla de acceso: (días de la semana, hora de inicio, hora de fin o None = medianoche)
+RuleSegment = Tuple[FrozenSet[int], datetime.time, Optional[datetime.time]]
 
 
 class UserWateringScheduleRepository(BaseRepository[UserWateringSchedule]):
@@ -15,6 +38,49 @@ class UserWateringScheduleRepository(BaseRepository[UserWateringSchedule]):
     def __init__(self, db: Session):
         super().__init__(db, UserWateringSchedule)
 
+    def bulk_update(self, filters: FilterType, values: dict) -> int:
+        """
+        Actualiza todas las programaciones que cumplen el filtro con una única sentencia UPDATE.
+        El UPDATE no pasa por los eventos del ORM, así que start_at / end_at se recalculan aquí:
+        solo se admite cambiar scheduled_date, start_time y end_time a la vez (los tres valores
+        son comunes a todas las filas). start_at / end_at no pueden asignarse directamente.
+        :param filters: Diccionario {campo: valor} o secuencia de expresiones.
+        :param values: Diccionario con los valores a asignar.
+        :return: El número de filas actualizadas.
+        :raises ValueError: Si values asigna start_at / end_at o solo parte de las columnas de origen.
+        """
+        if 'start_at' in values or 'end_at' in values:
+            raise ValueError("start_at y end_at se calculan a partir de scheduled_date, start_time y end_time; "
+                             "no pueden asignarse en bulk_update.")
+        changed = [column for column in _TIME_SOURCE_COLUMNS if column in values]
+        if changed:
+            if len(changed) != len(_TIME_SOURCE_COLUMNS):
+                raise ValueError("bulk_update solo admite cambiar scheduled_date, start_time y end_time a la vez; "
+                                 "para cambios parciales actualice cada programación por separado.")
+            values = dict(values)
+            values['start_at'], values['end_at'] = UserWateringSchedule.time_bounds(
+                values['scheduled_date'], values['start_time'], values['end_time']
+            )
+        return super().bulk_update(filters, values)
+
+    def backfill_time_bounds(self, batch_size: int = 500) -> int:
+        """
+        Conversión de las filas existentes: calcula start_at / end_at a partir de scheduled_date,
+        start_time y end_time en las programaciones que aún no los tienen (NULL).
+        :param batch_size: Número de programaciones leídas y actualizadas por lote.
+        :return: Número de programaciones convertidas.
+        """
+        def convert(scheduled_date, start_time, end_time) -> dict:
+            start_at, end_at = UserWateringSchedule.time_bounds(scheduled_date, start_time, end_time)
+            return {"start_at": start_at, "end_at": end_at}
+
+        return execute_batched_backfill(
+            self.db, UserWateringSchedule,
+            [getattr(UserWateringSchedule, column) for column in _TIME_SOURCE_COLUMNS],
+            or_(UserWateringSchedule.start_at.is_(None), UserWateringSchedule.end_at.is_(None)),
+            convert, batch_size
+        )
+
     def get_schedules_for_user(self, user_id: int, date: datetime.date | None) -> List[UserWateringSchedule]:
         """
         Obtiene las programaciones de riego para un usuario específico.
@@ -26,15 +92,162 @@ class UserWateringScheduleRepository(BaseRepository[UserWateringSchedule]):
         
         return self.db.execute(query.order_by(UserWateringSchedule.start_time)).scalars().all()
 
+    def get_user_ids_by_schedule_ids(self, schedule_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Obtiene, en una sola consulta, el usuario propietario de cada programación de un conjunto.
+        Devuelve un diccionario schedule_id -> user_id con las programaciones existentes.
+        """
+        schedule_ids = set(schedule_ids)
+        if not schedule_ids:
+            return {}
+        rows = self.db.execute(
+            select(UserWateringSchedule.id, UserWateringSchedule.user_id)
+            .where(UserWateringSchedule.id.in_(schedule_ids))
+        ).all()
+        return {schedule_id: user_id for schedule_id, user_id in rows}
+
+    def get_intervals_for_users(self, user_ids: Iterable[int] | None, start: datetime.datetime | None,
+                                end: datetime.datetime | None) -> List[Tuple[int, int, datetime.datetime, datetime.datetime]]:
+        """
+        Obtiene, en una sola consulta, las programaciones de un conjunto de usuarios (o de todos,
+        si user_ids es None) que se superponen con [start, end), como tuplas (id, user_id, start_at, end_at).
+        start y end pueden ser None para no acotar el rango por ese extremo.
+        Sirve para comprobar superposiciones de muchos horarios en memoria.
+        """
+        query = select(
+            UserWateringSchedule.id,
+            UserWateringSchedule.user_id,
+            UserWateringSchedule.start_at,
+            UserWateringSchedule.end_at,
+        )
+        query = query.where(*_overlaps(start, end))
+        return self._get_user_intervals(query, user_ids)
+
+    def get_intervals_in_windows(self, user_ids: Iterable[int] | None,
+                                 windows: List[Tuple[datetime.datetime, datetime.datetime]]) -> List[Tuple[int, int, datetime.datetime, datetime.datetime]]:
+        """
+        Como get_intervals_for_users, pero para las programaciones que se superponen con alguna de
+        varias ventanas [start, end), en una sola consulta. Las operaciones por lotes pasan solo los
+        días que tocan, en lugar de un único rango entre el primero y el último.
+        """
+        if not windows:
+            return []
+        query = select(
+            UserWateringSchedule.id,
+            UserWateringSchedule.user_id,
+            UserWateringSchedule.start_at,
+            UserWateringSchedule.end_at,
+        ).where(or_(*(and_(*_overlaps(start, end)) for start, end in windows)))
+        return self._get_user_intervals(query, user_ids)
+
+    def _get_user_intervals(self, query, user_ids: Iterable[int] | None) -> List[Tuple[int, int, datetime.datetime, datetime.datetime]]:
+        """Restringe la consulta de intervalos a un conjunto de usuarios (None = todos) y la ejecuta."""
+        if user_ids is not None:
+            user_ids = set(user_ids)
+            if not user_ids:
+                return []
+            query = query.where(UserWateringSchedule.user_id.in_(user_ids))
+        return self.db.execute(query).all()
+
+    def get_intervals_for_walkway(self, walkway_id: int, start: datetime.datetime,
+                                  end: datetime.datetime) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Obtiene, en una sola consulta, los intervalos (start_at, end_at) de las programaciones de los
+        usuarios de un andador que se superponen con [start, end).
+        """
+        return self.db.execute(
+            select(UserWateringSchedule.start_at, UserWateringSchedule.end_at)
+            .join(User)
+            .where(
+                User.walkway_id == walkway_id,
+                *_overlaps(start, end)
+            )
+        ).all()
+
+    def get_walkway_intervals(self, start: datetime.datetime,
+                              end: datetime.datetime) -> List[Tuple[int, datetime.datetime, datetime.datetime]]:
+        """
+        Obtiene, en una sola consulta, las programaciones de todos los andadores que se superponen
+        con [start, end), como tuplas (walkway_id, start_at, end_at).
+        """
+        return self.db.execute(
+            select(User.walkway_id, UserWateringSchedule.start_at, UserWateringSchedule.end_at)
+            .join(User)
+            .where(*_overlaps(start, end))
+        ).all()
+
+    def get_future_schedules_in_rule_window(self, user_type_id: int, walkway_id: int, segments: List[RuleSegment],
+                                            after: datetime.datetime) -> List[Tuple[int, int, datetime.datetime, datetime.datetime]]:
+        """
+        Obtiene, en una sola consulta, las programaciones que empiezan después de `after`, de los usuarios
+        de un tipo en un andador, que tocan alguno de los tramos de una regla (mismo día de la semana
+        y horas superpuestas, incluida la parte del día siguiente de las que cruzan la medianoche),
+        como tuplas (id, user_id, start_at, end_at).
+        Son las únicas que un cambio en esa regla puede invalidar.
+        """
+        if not segments:
+            return []
+        schedule_weekday = weekday(UserWateringSchedule.scheduled_date, self.db.get_bind().dialect.name)
+        crosses_midnight = UserWateringSchedule.end_time <= UserWateringSchedule.start_time
+
+        conditions = []
+        for days, start_time, end_time in segments:
+            same_day = [
+                schedule_weekday.in_(sorted(days)),
+                or_(UserWateringSchedule.end_time > start_time, crosses_midnight),
+            ]
+            if end_time is not None:
+                same_day.append(UserWateringSchedule.start_time < end_time)
+            conditions.append(and_(*same_day))
+            # Programaciones del día anterior que terminan dentro del tramo
+            conditions.append(and_(
+                schedule_weekday.in_(sorted((day - 1) % 7 for day in days)),
+                crosses_midnight,
+                UserWateringSchedule.end_time > start_time,
+            ))
+
+        return self.db.execute(
+            select(
+                UserWateringSchedule.id,
+                UserWateringSchedule.user_id,
+                UserWateringSchedule.start_at,
+                UserWateringSchedule.end_at,
+            )
+            .join(User)
+            .where(
+                User.walkway_id == walkway_id,
+                User.user_type_id == user_type_id,
+                UserWateringSchedule.start_at > after,
+                or_(*conditions)
+            )
+            .order_by(UserWateringSchedule.start_at, UserWateringSchedule.id)
+        ).all()
+
+    def load_interval_index(self, user_ids: Iterable[int] | None, start: datetime.datetime,
+                            end: datetime.datetime) -> ScheduleIntervalIndex:
+        """
+        Carga en un índice en memoria, con una sola consulta, las programaciones de los usuarios
+        que se superponen con [start, end). Las comprobaciones posteriores no consultan la base de datos.
+        """
+        return ScheduleIntervalIndex.from_rows(self.get_intervals_for_users(user_ids, start, end))
+
+    def load_interval_index_in_windows(self, user_ids: Iterable[int] | None,
+                                       windows: List[Tuple[datetime.datetime, datetime.datetime]]) -> ScheduleIntervalIndex:
+        """
+        Como load_interval_index, pero para las programaciones que se superponen con alguna de varias ventanas.
+        """
+        return ScheduleIntervalIndex.from_rows(self.get_intervals_in_windows(user_ids, windows))
+
     def get_overlapping_schedules(self, user_id: int, start_time: datetime.datetime, end_time: datetime.datetime, exclude_schedule_id: int | None = None) -> List[UserWateringSchedule]:
         """
         Obtiene programaciones que se superponen con un rango de tiempo dado para un usuario.
+        Compara directamente las columnas indexadas start_at / end_at, con start_at acotado por
+        ambos extremos, por lo que la consulta es un recorrido de rango sobre el índice
+        (user_id, start_at, end_at).
         """
         query = select(UserWateringSchedule).filter(
             UserWateringSchedule.user_id == user_id,
-            UserWateringSchedule.scheduled_date == start_time.date(), 
-            func.time(UserWateringSchedule.start_time) < end_time.time(), 
-            func.time(UserWateringSchedule.end_time) > start_time.time() 
+            *_overlaps(start_time, end_time)
         )
 
         if exclude_schedule_id:
@@ -42,18 +255,24 @@ class UserWateringScheduleRepository(BaseRepository[UserWateringSchedule]):
             
         return self.db.execute(query).scalars().all()
 
-    def get_upcoming_schedules(self, limit: int = 10) -> List[UserWateringSchedule]:
+    def get_upcoming_schedules(self, limit: int = 10, user_id: int | None = None,
+                               walkway_id: int | None = None) -> List[UserWateringSchedule]:
         """
         Obtiene las próximas programaciones de riego que aún no han comenzado.
+        Recorre el índice de start_at desde el instante actual y se detiene en `limit` filas.
+        Puede filtrar opcionalmente por usuario y/o por andador (para el sondeo de los controladores).
         """
         now = datetime.datetime.now()
 
+        query = select(UserWateringSchedule).filter(UserWateringSchedule.start_at > now)
+        if user_id is not None:
+            query = query.filter(UserWateringSchedule.user_id == user_id)
+        if walkway_id is not None:
+            query = query.join(User).filter(User.walkway_id == walkway_id)
+
         return self.db.execute(
-            select(UserWateringSchedule)
-            .filter(
-                func.datetime(UserWateringSchedule.scheduled_date, UserWateringSchedule.start_time) > now
-            )
-            .order_by(UserWateringSchedule.scheduled_date, UserWateringSchedule.start_time)
+            query
+            .order_by(UserWateringSchedule.start_at, UserWateringSchedule.id)
             .limit(limit)
         ).scalars().all()
 
@@ -0,0 +1,226 @@
+# repositories/walkway_occupancy_repository.py
+
+import datetime
+from typing import Dict, Iterable, Iterator, List, Mapping, Set, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from database.models.walkway_occupancy import WalkwayOccupancy, MINUTES_PER_DAY, MAX_COUNTER
+from database.unit_of_work import commit_or_flush
+from .base_repository import BaseRepository
+
+# (walkway_id, start_at, end_at, delta): +1 al reservar un intervalo, -1 al liberarlo
+OccupancyChange = Tuple[int, datetime.datetime, datetime.datetime, int]
+
+_EMPTY_DAY = bytes(MINUTES_PER_DAY)
+
+
+def day_segments(start_at: datetime.datetime,
+                 end_at: datetime.datetime) -> Iterator[Tuple[datetime.date, int, int]]:
+    """
+    Divide [start_at, end_at) en tramos (fecha, primer minuto, minuto final exclusivo).
+    Un minuto cuenta como ocupado si el intervalo lo toca, aunque sea en parte.
+    """
+    day = start_at.date()
+    while True:
+        day_start = datetime.datetime.combine(day, datetime.time())
+        next_day = day_start + datetime.timedelta(days=1)
+        segment_start = max(start_at, day_start)
+        segment_end = min(end_at, next_day)
+        if segment_end <= segment_start:
+            return
+        first_minute = int((segment_start - day_start).total_seconds()) // 60
+        last_minute = -(-int((segment_end - day_start).total_seconds()) // 60)
+        yield day, first_minute, last_minute
+        if end_at <= next_day:
+            return
+        day += datetime.timedelta(days=1)
+
+
+def add_interval(counters: Dict[datetime.date, bytearray], start_at: datetime.datetime,
+                 end_at: datetime.datetime, delta: int = 1) -> None:
+    """
+    Suma delta a los contadores en memoria de [start_at, end_at), creando los días que falten.
+    Los contadores se saturan en 0 y MAX_COUNTER.
+    """
+    for day, first_minute, last_minute in day_segments(start_at, end_at):
+        day_counters = counters.setdefault(day, bytearray(MINUTES_PER_DAY))
+        for minute in range(first_minute, last_minute):
+            day_counters[minute] = min(max(day_counters[minute] + delta, 0), MAX_COUNTER)
+
+
+def window_max(counters: Mapping[datetime.date, bytes], start_at: datetime.datetime, end_at: datetime.datetime) -> int:
+    """
+    Mayor contador de [start_at, end_at) en unos contadores en memoria (los días ausentes valen 0).
+    """
+    return max(
+        (max(counters[day][first_minute:last_minute], default=0)
+         for day, first_minute, last_minute in day_segments(start_at, end_at) if day in counters),
+        default=0
+    )
+
+
+def build_counters(intervals: Iterable[Tuple[datetime.datetime, datetime.datetime]]) -> Dict[datetime.date, bytes]:
+    """
+    Calcula desde cero los contadores por minuto de un conjunto de intervalos (start_at, end_at).
+    """
+    counters: Dict[datetime.date, bytearray] = {}
+    for start_at, end_at in intervals:
+        add_interval(counters, start_at, end_at)
+    return {day: bytes(day_counters) for day, day_counters in counters.items()}
+
+
+def interval_days(intervals: Iterable[Tuple[datetime.datetime, datetime.datetime]]) -> Set[datetime.date]:
+    """
+    Conjunto de días que tocan los intervalos (start_at, end_at).
+    """
+    return {day for start_at, end_at in intervals for day, _, _ in day_segments(start_at, end_at)}
+
+
+def occupied_runs(day_counters: bytes, threshold: int = 1) -> Iterator[Tuple[int, int]]:
+    """
+    Recorre los tramos (primer minuto, minuto final exclusivo) de un día en los que el contador
+    alcanza `threshold`, en orden.
+    """
+    run_start = None
+    for minute, count in enumerate(day_counters):
+        if count >= threshold:
+            if run_start is None:
+                run_start = minute
+        elif run_start is not None:
+            yield run_start, minute
+            run_start = None
+    if run_start is not None:
+        yield run_start, len(day_counters)
+
+
+class WalkwayOccupancyRepository(BaseRepository[WalkwayOccupancy]):
+
+    def __init__(self, db: Session):
+        super().__init__(db, WalkwayOccupancy)
+
+    def get_counters(self, walkway_id: int, dates: Iterable[datetime.date]) -> Dict[datetime.date, bytes]:
+        """
+        Obtiene, en una sola consulta, los contadores por minuto de un andador en varios días.
+        Los días sin fila no tienen ocupación y se devuelven como 1440 ceros.
+        """
+        dates = set(dates)
+        if not dates:
+            return {}
+        rows = self.db.execute(
+            select(WalkwayOccupancy.occupancy_date, WalkwayOccupancy.counters).where(
+                WalkwayOccupancy.walkway_id == walkway_id,
+                WalkwayOccupancy.occupancy_date.in_(dates)
+            )
+        ).all()
+        counters = {day: _EMPTY_DAY for day in dates}
+        counters.update({day: bytes(day_counters) for day, day_counters in rows})
+        return counters
+
+    def load_counters(self, walkway_ids: Iterable[int], dates: Iterable[datetime.date],
+                      for_update: bool = False) -> Dict[int, Dict[datetime.date, bytearray]]:
+        """
+        Carga, en una sola consulta, copias modificables de los contadores de varios andadores en varios
+        días, para simular en memoria nuevas reservas con add_interval antes de guardarlas.
+        Con for_update, las filas quedan bloqueadas (en los motores que lo soportan) hasta el final de la
+        transacción: la comprobación de capacidad y el apply posterior ven los mismos contadores.
+        Los días sin fila no se pueden bloquear; si dos transacciones los reservan a la vez, el INSERT
+        de la segunda falla por la clave primaria en lugar de superar la capacidad.
+        """
+        walkway_ids, dates = set(walkway_ids), set(dates)
+        counters = {walkway_id: {day: bytearray(MINUTES_PER_DAY) for day in dates} for walkway_id in walkway_ids}
+        if not walkway_ids or not dates:
+            return counters
+        query = select(WalkwayOccupancy.walkway_id, WalkwayOccupancy.occupancy_date, WalkwayOccupancy.counters).where(
+            WalkwayOccupancy.walkway_id.in_(walkway_ids),
+            WalkwayOccupancy.occupancy_date.in_(dates)
+        )
+        if for_update:
+            query = query.with_for_update()
+        rows = self.db.execute(query).all()
+        for walkway_id, day, day_counters in rows:
+            counters[walkway_id][day] = bytearray(day_counters)
+        return counters
+
+    def iter_window(self, walkway_id: int, start_at: datetime.datetime,
+                    end_at: datetime.datetime) -> Iterator[Tuple[datetime.date, int, bytes]]:
+        """
+        Recorre los contadores de [start_at, end_at) como tramos (fecha, primer minuto, contadores del tramo).
+        """
+        segments = list(day_segments(start_at, end_at))
+        counters = self.get_counters(walkway_id, [day for day, _, _ in segments])
+        for day, first_minute, last_minute in segments:
+            yield day, first_minute, counters[day][first_minute:last_minute]
+
+    def get_max_occupancy(self, walkway_id: int, start_at: datetime.datetime, end_at: datetime.datetime) -> int:
+        """
+        Obtiene el mayor número de riegos simultáneos del andador en [start_at, end_at).
+        """
+        return max((max(window, default=0) for _, _, window in self.iter_window(walkway_id, start_at, end_at)), default=0)
+
+    def apply(self, changes: Iterable[OccupancyChange]) -> None:
+        """
+        Aplica de forma incremental las reservas (+1) y liberaciones (-1) de intervalos.
+        Lee las filas afectadas con una consulta (bloqueándolas en los motores que lo soportan)
+        y las escribe con un UPDATE y un INSERT multi-fila. Los contadores se saturan en 0 y MAX_COUNTER.
+        """
+        segments: Dict[Tuple[int, datetime.date], List[Tuple[int, int, int]]] = {}
+        for walkway_id, start_at, end_at, delta in changes:
+            if not delta:
+                continue
+            for day, first_minute, last_minute in day_segments(start_at, end_at):
+                segments.setdefault((walkway_id, day), []).append((first_minute, last_minute, delta))
+        if not segments:
+            return
+
+        rows = self.db.execute(
+            select(WalkwayOccupancy.walkway_id, WalkwayOccupancy.occupancy_date, WalkwayOccupancy.counters)
+            .where(
+                WalkwayOccupancy.walkway_id.in_({walkway_id for walkway_id, _ in segments}),
+                WalkwayOccupancy.occupancy_date.in_({day for _, day in segments})
+            )
+            .with_for_update()
+        ).all()
+        existing = {(walkway_id, day): counters for walkway_id, day, counters in rows}
+
+        updates = []
+        inserts = []
+        for key, key_segments in segments.items():
+            counters = bytearray(existing.get(key, _EMPTY_DAY))
+            for first_minute, last_minute, delta in key_segments:
+                for minute in range(first_minute, last_minute):
+                    counters[minute] = min(max(counters[minute] + delta, 0), MAX_COUNTER)
+            walkway_id, day = key
+            values = {"walkway_id": walkway_id, "occupancy_date": day, "counters": bytes(counters)}
+            if key in existing:
+                updates.append(values)
+            elif any(counters):
+                inserts.append(values)
+
+        if updates:
+            # UPDATE por clave primaria (executemany)
+            self.db.execute(update(WalkwayOccupancy), updates)
+        if inserts:
+            self.db.execute(insert(WalkwayOccupancy), inserts)
+        commit_or_flush(self.db)
+
+    def replace_range(self, walkway_id: int, start_date: datetime.date, end_date: datetime.date,
+                      counters: Dict[datetime.date, bytes]) -> None:
+        """
+        Sustituye la ocupación del andador entre dos fechas (ambas incluidas) por la indicada.
+        """
+        self.db.execute(
+            delete(WalkwayOccupancy).where(
+                WalkwayOccupancy.walkway_id == walkway_id,
+                WalkwayOccupancy.occupancy_date.between(start_date, end_date)
+            )
+        )
+        rows = [
+            {"walkway_id": walkway_id, "occupancy_date": day, "counters": day_counters}
+            for day, day_counters in counters.items()
+            if start_date <= day <= end_date and any(day_counters)
+        ]
+        if rows:
+            self.db.execute(insert(WalkwayOccupancy), rows)
+        commit_or_flush(self.db)
@@ -1,8 +1,9 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from repositories.base_repository import BaseRepository
 from database.models.walkway import Walkway
+from database.unit_of_work import commit_or_flush
 from Core.exceptions import NotFoundError, IntegrityConstraintError, OperationFailedError
 
 class WalkwayRepository(BaseRepository[Walkway]):
@@ -32,14 +33,39 @@ class WalkwayRepository(BaseRepository[Walkway]):
         """
         return self.db.execute(select(self.model)).scalars().all()
 
+    def get_capacities(self, walkway_ids: Optional[List[int]] = None, active_only: bool = False,
+                       for_update: bool = False) -> Dict[int, int]:
+        """
+        Obtiene, en una sola consulta, el máximo de riegos simultáneos de cada pasarela.
+
+        Args:
+            walkway_ids (Optional[List[int]]): Los IDs de las pasarelas, o None para todas.
+            active_only (bool): Si es True, solo se devuelven las pasarelas activas.
+            for_update (bool): Si es True, las filas quedan bloqueadas hasta el final de la transacción
+                (en los motores que lo soportan), para serializar las admisiones en cada pasarela.
+
+        Returns:
+            Dict[int, int]: Un diccionario walkway_id -> max_concurrent_schedules.
+        """
+        query = select(self.model.id, self.model.max_concurrent_schedules)
+        if active_only:
+            query = query.where(self.model.is_active.is_(True))
+        if walkway_ids is not None:
+            walkway_ids = set(walkway_ids)
+            if not walkway_ids:
+                return {}
+            query = query.where(self.model.id.in_(walkway_ids))
+        if for_update:
+            query = query.with_for_update()
+        return {walkway_id: capacity for walkway_id, capacity in self.db.execute(query).all()}
+
     def create(self, data: dict) -> Walkway:
         """
         Crea una nueva pasarela a partir de un diccionario de datos.
         """
         new_walkway = Walkway(**data)
         self.db.add(new_walkway)
-        self.db.commit()
-        self.db.refresh(new_walkway)
+        commit_or_flush(self.db, new_walkway)
         return new_walkway
 
     def update(self, walkway_id: int, data: dict) -> Optional[Walkway]:
@@ -53,8 +79,7 @@ class WalkwayRepository(BaseRepository[Walkway]):
         for key, value in data.items():
             setattr(walkway, key, value)
         
-        self.db.commit()
-        self.db.refresh(walkway)
+        commit_or_flush(self.db, walkway)
         return walkway
     
     def delete(self, walkway_id: int) -> bool:
@@ -64,6 +89,6 @@ class WalkwayRepository(BaseRepository[Walkway]):
         walkway = self.get_by_id(walkway_id)
         if walkway:
             self.db.delete(walkway)
-            self.db.commit()
+            commit_or_flush(self.db)
             return True
         return False
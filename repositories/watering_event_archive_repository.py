@@ -0,0 +1,119 @@
+# repositories/watering_event_archive_repository.py
+
+import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, event, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from database.models.user_watering_schedule import UserWateringSchedule
+from database.models.watering_event import WateringEvent
+from database.models.watering_event_archive import WateringEventArchive, ArchivedMonth
+from database.unit_of_work import commit_or_flush
+from .base_repository import BaseRepository
+from .sql_dialect import bucket_start, insert_or_add, parse_bucket_start
+
+# Columnas que se copian tal cual de watering_events al archivo
+ARCHIVE_COLUMNS = ('id', 'start_time', 'end_time', 'duration_minutes', 'volume_liters',
+                   'user_id', 'walkway_id', 'schedule_id')
+
+# Clave de session.info en la que se guarda el horizonte del archivo durante la transacción
+_HORIZON_KEY = "watering_event_archive_horizon"
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _discard_horizon(session: Session) -> None:
+    """
+    Descarta el horizonte guardado al terminar la transacción: otra sesión puede haber archivado
+    meses entretanto, o el archivado de esta puede haberse deshecho.
+    """
+    session.info.pop(_HORIZON_KEY, None)
+
+
+def first_of_month(day: datetime.date) -> datetime.date:
+    """Primer día del mes de una fecha."""
+    return day.replace(day=1)
+
+
+def add_months(month_start: datetime.date, months: int) -> datetime.date:
+    """Primer día del mes que está `months` meses después (o antes, si es negativo) de month_start."""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+class WateringEventArchiveRepository(BaseRepository[WateringEventArchive]):
+
+    def __init__(self, db: Session):
+        super().__init__(db, WateringEventArchive)
+
+    def get_horizon(self) -> Optional[datetime.datetime]:
+        """
+        Obtiene el horizonte del archivo: el inicio del mes siguiente al último archivado.
+        Los eventos que empiezan antes están en el archivo y el resto en watering_events.
+        Devuelve None si no hay nada archivado. Se consulta una vez por transacción.
+        """
+        if _HORIZON_KEY not in self.db.info:
+            last_month = self.db.execute(select(func.max(ArchivedMonth.month_start))).scalar_one_or_none()
+            self.db.info[_HORIZON_KEY] = (
+                datetime.datetime.combine(add_months(last_month, 1), datetime.time()) if last_month else None
+            )
+        return self.db.info[_HORIZON_KEY]
+
+    def reset_horizon(self) -> None:
+        """
+        Descarta el horizonte guardado en la sesión (tras archivar o deshacer un archivado).
+        """
+        self.db.info.pop(_HORIZON_KEY, None)
+
+    def get_archived_months(self) -> List[ArchivedMonth]:
+        """
+        Obtiene los meses archivados, del más antiguo al más reciente.
+        """
+        return self.db.execute(select(ArchivedMonth).order_by(ArchivedMonth.month_start)).scalars().all()
+
+    def archive_before(self, cutoff: datetime.date) -> Dict[datetime.date, int]:
+        """
+        Mueve al archivo todos los eventos que empiezan antes de cutoff (el primer día de un mes):
+        un INSERT ... SELECT, un DELETE y el alta de los meses archivados, en la transacción en curso.
+        Al mover siempre todo lo anterior a cutoff, los meses archivados son los más antiguos.
+        :return: Número de eventos archivados por mes.
+        """
+        if cutoff != first_of_month(cutoff):
+            raise ValueError("El límite del archivado debe ser el primer día de un mes.")
+        month = bucket_start(WateringEvent.start_time, "month", self.db.get_bind().dialect.name)
+        counts = {
+            parse_bucket_start(month_start).date(): count
+            for month_start, count in self.db.execute(
+                select(month, func.count(WateringEvent.id))
+                .where(WateringEvent.start_time < cutoff)
+                .group_by(month)
+            ).all()
+        }
+        if not counts:
+            return {}
+
+        self.db.execute(
+            insert(WateringEventArchive).from_select(
+                list(ARCHIVE_COLUMNS),
+                select(*(getattr(WateringEvent, column) for column in ARCHIVE_COLUMNS)).where(WateringEvent.start_time < cutoff)
+            )
+        )
+        self.db.execute(delete(WateringEvent).where(WateringEvent.start_time < cutoff))
+        self.db.execute(
+            insert_or_add(ArchivedMonth, ("month_start",), ("event_count",), self.db.get_bind().dialect.name),
+            [{"month_start": month_start, "event_count": count} for month_start, count in counts.items()]
+        )
+        self.reset_horizon()
+        commit_or_flush(self.db)
+        return counts
+
+    def delete_for_user(self, user_id: int) -> int:
+        """
+        Elimina con un único DELETE los eventos archivados de un usuario y los de sus programaciones.
+        Devuelve el número de eventos eliminados.
+        """
+        user_schedule_ids = select(UserWateringSchedule.id).where(UserWateringSchedule.user_id == user_id)
+        return self.bulk_delete([
+            or_(WateringEventArchive.user_id == user_id, WateringEventArchive.schedule_id.in_(user_schedule_ids))
+        ])
@@ -2,69 +2,406 @@
 
 import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import insert, select, func, or_, and_, true, union_all
+from sqlalchemy.sql import FromClause
+from typing import Dict, List, Iterator, NamedTuple, Optional, Sequence, Tuple, Type, Union
 
 # Importamos el modelo WateringEvent
 from database.models.watering_event import WateringEvent
 from database.models.user import User # Posiblemente para filtrar por usuario
+from database.models.user_watering_schedule import UserWateringSchedule
+from database.models.watering_event_archive import WateringEventArchive
+from database.unit_of_work import commit_or_flush
 
 # Importamos nuestro BaseRepository genérico
 from .base_repository import BaseRepository
+from .sql_dialect import bucket_start, parse_bucket_start
+from .watering_event_archive_repository import WateringEventArchiveRepository, ARCHIVE_COLUMNS
+
+
+# Evento leído por los métodos de lectura: de watering_events o del archivo (mismas columnas, sin relaciones)
+AnyWateringEvent = Union[WateringEvent, WateringEventArchive]
+
+
+class UsageBucket(NamedTuple):
+    """
+    Totales de un intervalo de tiempo y, si se agrupa, de un usuario, andador o programación.
+    """
+    bucket_start: datetime.datetime
+    group_id: Optional[int]
+    volume_liters: float
+    duration_minutes: int
+    event_count: int
+
+
+class UsageTotal(NamedTuple):
+    """Totales de un grupo (usuario, andador o programación) en un rango de tiempo."""
+    volume_liters: float
+    duration_minutes: int
+    event_count: int
+
+
+def usage_totals(rows, grouped: bool) -> Dict[Optional[int], UsageTotal]:
+    """
+    Convierte filas (grupo, volumen, duración, eventos), o (volumen, duración, eventos) sin agrupar,
+    en UsageTotal por grupo (la clave es None sin agrupar). Las sumas sin filas se omiten.
+    """
+    totals = {}
+    for row in rows:
+        volume, duration, count = row[-3:]
+        if count:
+            totals[row[0] if grouped else None] = UsageTotal(float(volume), int(duration), int(count))
+    return totals
+
+
+# Columnas por las que pueden agruparse aggregate_usage y get_usage_totals
+USAGE_GROUP_COLUMNS = {
+    "user": "user_id",
+    "walkway": "walkway_id",
+    "schedule": "schedule_id",
+}
 
 
 class WateringEventRepository(BaseRepository[WateringEvent]):
     """
     Repositorio específico para el modelo WateringEvent, heredando las operaciones CRUD básicas
     y añadiendo métodos específicos para la gestión de eventos de riego.
+    Los métodos de lectura consultan de forma transparente la tabla de eventos, el archivo de meses
+    cerrados (WateringEventArchive) o ambos, según el rango de fechas pedido y el horizonte del archivo.
+    Cuando se consultan ambos, los eventos del archivo son siempre los más antiguos.
+    Los eventos archivados se devuelven como WateringEventArchive (AnyWateringEvent): tienen las mismas
+    columnas que WateringEvent, pero no sus relaciones (user, walkway, schedule).
     """
     def __init__(self, db: Session):
         super().__init__(db, WateringEvent)
+        self.archive_repo = WateringEventArchiveRepository(db)
 
-    def get_events_for_user(self, user_id: int, start_date: datetime.date | None = None, end_date: datetime.date | None = None) -> List[WateringEvent]:
+    def get_by_id(self, entity_id: int) -> Optional[AnyWateringEvent]:
+        """
+        Obtiene un evento por su ID. Si no está en watering_events y hay meses archivados,
+        se busca en el archivo (los eventos conservan su ID al archivarse).
+        """
+        event = super().get_by_id(entity_id)
+        if event is None and self.archive_repo.get_horizon() is not None:
+            event = self.archive_repo.get_by_id(entity_id)
+        return event
+
+    def update(self, entity_id: int, update_data: dict) -> Optional[WateringEvent]:
+        """
+        Actualiza un evento de watering_events. Los eventos archivados no se modifican: devuelve None.
+        """
+        if isinstance(self.get_by_id(entity_id), WateringEventArchive):
+            return None
+        return super().update(entity_id, update_data)
+
+    def get_events_for_user(self, user_id: int, start_date: datetime.date | None = None, end_date: datetime.date | None = None) -> List[AnyWateringEvent]:
         """
         Obtiene los eventos de riego para un usuario específico, opcionalmente filtrados por un rango de fechas.
         """
-        query = select(WateringEvent).join(User).filter(User.id == user_id)
+        events = []
+        for model in self._route(start_date, self._end_bound(end_date)):
+            query = self._events_for_user_query(model, user_id, start_date, end_date)
+            events.extend(self.db.execute(query).scalars().all())
+        return events
+
+    def stream_events_for_user(self, user_id: int, start_date: datetime.date | None = None, end_date: datetime.date | None = None,
+                               chunk_size: int = 1000) -> Iterator[List[AnyWateringEvent]]:
+        """
+        Variante en streaming de get_events_for_user: entrega los eventos en bloques de chunk_size
+        usando un cursor del servidor (yield_per), de modo que la memoria no crece con el historial.
+        """
+        for model in self._route(start_date, self._end_bound(end_date)):
+            yield from self._stream(self._events_for_user_query(model, user_id, start_date, end_date), chunk_size)
+
+    def _events_for_user_query(self, model: Type, user_id: int, start_date: datetime.date | None, end_date: datetime.date | None):
+        """
+        Construye la consulta de eventos de un usuario, del más reciente al más antiguo,
+        sobre la tabla de eventos o la del archivo.
+        """
+        # Se filtra por la propia columna de eventos (sin JOIN) para usar el índice (user_id, start_time)
+        query = select(model).filter(model.user_id == user_id)
         
         if start_date:
-            query = query.filter(WateringEvent.start_time >= start_date)
+            query = query.filter(model.start_time >= start_date)
         if end_date:
             # Asegura que el final del día de end_date se incluya
-            query = query.filter(WateringEvent.start_time <= (end_date + datetime.timedelta(days=1)))
+            query = query.filter(model.start_time <= (end_date + datetime.timedelta(days=1)))
             
-        return self.db.execute(query.order_by(WateringEvent.start_time.desc())).scalars().all()
+        return query.order_by(model.start_time.desc())
+
+    def _stream(self, query, chunk_size: int) -> Iterator[List[AnyWateringEvent]]:
+        """
+        Ejecuta la consulta con yield_per (que activa stream_results) y entrega bloques de entidades.
+        """
+        result = self.db.execute(query.execution_options(yield_per=chunk_size))
+        try:
+            for chunk in result.scalars().partitions():
+                yield chunk
+        finally:
+            # Libera el cursor aunque el consumidor abandone el generador a medias
+            result.close()
 
-    def get_events_by_schedule(self, schedule_id: int) -> List[WateringEvent]:
+    def _route(self, start: datetime.date | None, end: datetime.date | None) -> List[Type]:
+        """
+        Decide qué tablas contienen eventos que empiezan en [start, end] (None para no acotar):
+        la de eventos, la del archivo o ambas, en este orden (de los más recientes a los más antiguos).
+        """
+        horizon = self.archive_repo.get_horizon()
+        if horizon is None:
+            return [WateringEvent]
+        models = []
+        if end is None or self._as_datetime(end) >= horizon:
+            models.append(WateringEvent)
+        if start is None or self._as_datetime(start) < horizon:
+            models.append(WateringEventArchive)
+        return models
+
+    def event_source(self, start: datetime.date | None = None, end: datetime.date | None = None) -> FromClause:
+        """
+        Origen de filas de eventos para consultas agregadas sobre [start, end]: la propia tabla si basta
+        con una, o un UNION ALL de las columnas de ambas si el rango cruza el horizonte del archivo.
+        """
+        models = self._route(start, end)
+        if len(models) == 1:
+            return models[0].__table__
+        return union_all(*(
+            select(*(model.__table__.c[column] for column in ARCHIVE_COLUMNS)) for model in models
+        )).subquery("watering_events_all")
+
+    @staticmethod
+    def _end_bound(end_date: datetime.date | None) -> datetime.date | None:
+        """
+        Límite superior (incluido) de start_time de las consultas que incluyen el día end_date completo.
+        """
+        return end_date + datetime.timedelta(days=1) if end_date else None
+
+    @staticmethod
+    def _as_datetime(value: datetime.date) -> datetime.datetime:
+        """
+        Convierte una fecha en la medianoche de ese día; los datetime se devuelven tal cual.
+        """
+        if isinstance(value, datetime.datetime):
+            return value
+        return datetime.datetime.combine(value, datetime.time())
+
+    def iter_history_rows(self, start_date: datetime.date | None = None, end_date: datetime.date | None = None,
+                          chunk_size: int = 1000) -> Iterator[Tuple]:
+        """
+        Recorre en streaming, sin construir entidades, las columnas de los eventos (activos y archivados)
+        que empiezan entre start_date y end_date (ambas incluidas), ordenados por andador e inicio.
+        Cada fila sigue el orden de ARCHIVE_COLUMNS.
+        """
+        end = end_date + datetime.timedelta(days=1) if end_date else None
+        events = self.event_source(start_date, end).c
+        query = select(*(events[column] for column in ARCHIVE_COLUMNS))
+        if start_date:
+            query = query.where(events.start_time >= start_date)
+        if end:
+            query = query.where(events.start_time < end)
+        result = self.db.execute(
+            query.order_by(events.walkway_id, events.start_time, events.id).execution_options(yield_per=chunk_size)
+        )
+        try:
+            for row in result:
+                yield tuple(row)
+        finally:
+            result.close()
+
+    def iter_analytics_rows(self, start_date: datetime.date | None = None, end_date: datetime.date | None = None,
+                            walkway_id: int | None = None, user_id: int | None = None,
+                            chunk_size: int = 10000) -> Iterator[Tuple]:
+        """
+        Recorre en streaming, sin construir entidades, las columnas que usa la analítica en memoria
+        (start_time, user_id, walkway_id, volume_liters, duration_minutes) de los eventos activos y
+        archivados entre start_date y end_date (ambas incluidas), ordenados por inicio.
+        """
+        end = end_date + datetime.timedelta(days=1) if end_date else None
+        events = self.event_source(start_date, end).c
+        query = select(events.start_time, events.user_id, events.walkway_id, events.volume_liters, events.duration_minutes)
+        if start_date:
+            query = query.where(events.start_time >= start_date)
+        if end:
+            query = query.where(events.start_time < end)
+        if walkway_id is not None:
+            query = query.where(events.walkway_id == walkway_id)
+        if user_id is not None:
+            query = query.where(events.user_id == user_id)
+        result = self.db.execute(query.order_by(events.start_time).execution_options(yield_per=chunk_size))
+        try:
+            for row in result:
+                yield tuple(row)
+        finally:
+            result.close()
+
+    def insert_history_rows(self, rows: List[dict]) -> None:
+        """
+        Inserta eventos históricos con sus IDs originales (diccionarios con ARCHIVE_COLUMNS):
+        los anteriores al horizonte del archivo en el archivo y el resto en la tabla de eventos,
+        con un INSERT multi-fila por tabla.
+        """
+        horizon = self.archive_repo.get_horizon()
+        archived = [row for row in rows if horizon is not None and row['start_time'] < horizon]
+        current = [row for row in rows if horizon is None or row['start_time'] >= horizon]
+        if archived:
+            self.db.execute(insert(WateringEventArchive), archived)
+        if current:
+            self.db.execute(insert(WateringEvent), current)
+        commit_or_flush(self.db)
+
+    def delete_for_user(self, user_id: int) -> int:
+        """
+        Elimina con un único DELETE los eventos de un usuario y los que apuntan a sus programaciones
+        (y, si hay archivo, con otro DELETE los archivados). Devuelve el número de eventos eliminados.
+        """
+        user_schedule_ids = select(UserWateringSchedule.id).where(UserWateringSchedule.user_id == user_id)
+        deleted = self.bulk_delete([
+            or_(WateringEvent.user_id == user_id, WateringEvent.schedule_id.in_(user_schedule_ids))
+        ])
+        if self.archive_repo.get_horizon() is not None:
+            deleted += self.archive_repo.delete_for_user(user_id)
+        return deleted
+
+    def get_events_by_schedule(self, schedule_id: int) -> List[AnyWateringEvent]:
         """
         Obtiene todos los eventos de riego asociados a una programación de riego específica.
         """
-        return self.db.execute(
-            select(WateringEvent).filter_by(schedule_id=schedule_id)
-            .order_by(WateringEvent.start_time.desc())
-        ).scalars().all()
+        events = []
+        for model in self._route(None, None):
+            events.extend(self.db.execute(self._events_by_schedule_query(model, schedule_id)).scalars().all())
+        return events
 
-    def get_recent_events(self, limit: int = 10) -> List[WateringEvent]:
+    def stream_events_by_schedule(self, schedule_id: int, chunk_size: int = 1000) -> Iterator[List[AnyWateringEvent]]:
+        """
+        Variante en streaming de get_events_by_schedule: entrega los eventos en bloques de chunk_size.
+        """
+        for model in self._route(None, None):
+            yield from self._stream(self._events_by_schedule_query(model, schedule_id), chunk_size)
+
+    def _events_by_schedule_query(self, model: Type, schedule_id: int):
+        """
+        Construye la consulta de eventos de una programación, del más reciente al más antiguo.
+        """
+        return (
+            select(model).filter_by(schedule_id=schedule_id)
+            .order_by(model.start_time.desc())
+        )
+
+    def get_recent_events(self, limit: int = 10) -> List[AnyWateringEvent]:
         """
         Obtiene los eventos de riego más recientes.
+        Solo se consulta el archivo si la tabla de eventos no tiene suficientes.
         """
-        return self.db.execute(
-            select(WateringEvent)
-            .order_by(WateringEvent.start_time.desc())
-            .limit(limit)
-        ).scalars().all()
+        events = []
+        for model in self._route(None, None):
+            events.extend(self.db.execute(
+                select(model)
+                .order_by(model.start_time.desc())
+                .limit(limit - len(events))
+            ).scalars().all())
+            if len(events) >= limit:
+                break
+        return events
 
     def get_total_water_used(self, start_date: datetime.date | None = None, end_date: datetime.date = None) -> float:
         """
         Calcula el volumen total de agua utilizada en un rango de fechas.
         Asume que WateringEvent tiene un campo 'volume_liters' o similar.
         """
-        query = select(func.sum(WateringEvent.volume_liters)) 
-        
+        total_volume = 0.0
+        for model in self._route(start_date, self._end_bound(end_date)):
+            query = select(func.sum(model.volume_liters))
+
+            if start_date:
+                query = query.filter(model.start_time >= start_date)
+            if end_date:
+                query = query.filter(model.start_time <= (end_date + datetime.timedelta(days=1)))
+
+            total_volume += self.db.execute(query).scalar_one_or_none() or 0.0
+        return float(total_volume)
+
+    def aggregate_usage(self, bucket: str = "day", group_by: str | None = None,
+                        start_date: datetime.date | None = None, end_date: datetime.date | None = None,
+                        user_id: int | None = None, walkway_id: int | None = None) -> List[UsageBucket]:
+        """
+        Calcula con una única consulta GROUP BY el volumen, la duración y el número de eventos
+        por intervalo (bucket: 'hour', 'day', 'week' o 'month') y, opcionalmente, por
+        usuario, andador o programación (group_by: 'user', 'walkway' o 'schedule').
+        Filtra por la fecha de inicio de los eventos entre start_date y end_date (ambas incluidas)
+        y, si se indican, por usuario y andador. Devuelve filas compactas (UsageBucket),
+        ordenadas por intervalo y grupo, sin cargar entidades.
+        """
+        if group_by is not None and group_by not in USAGE_GROUP_COLUMNS:
+            raise ValueError(
+                f"Agrupación no soportada: {group_by}. Valores admitidos: {', '.join(USAGE_GROUP_COLUMNS)}."
+            )
+        events = self.event_source(start_date, self._end_bound(end_date)).c
+        bucket_column = bucket_start(events.start_time, bucket, self.db.get_bind().dialect.name)
+        group_columns = [bucket_column]
+        if group_by is not None:
+            group_columns.append(events[USAGE_GROUP_COLUMNS[group_by]])
+
+        query = select(
+            *group_columns,
+            func.sum(events.volume_liters),
+            func.sum(events.duration_minutes),
+            func.count(events.id)
+        )
         if start_date:
-            query = query.filter(WateringEvent.start_time >= start_date)
+            query = query.where(events.start_time >= start_date)
         if end_date:
-            query = query.filter(WateringEvent.start_time <= (end_date + datetime.timedelta(days=1)))
-            
-        total_volume = self.db.execute(query).scalar_one_or_none()
-        return float(total_volume) if total_volume is not None else 0.0
\ No newline at end of file
+            query = query.where(events.start_time < end_date + datetime.timedelta(days=1))
+        if user_id is not None:
+            query = query.where(events.user_id == user_id)
+        if walkway_id is not None:
+            query = query.where(events.walkway_id == walkway_id)
+
+        rows = self.db.execute(query.group_by(*group_columns).order_by(*group_columns)).all()
+        return [
+            UsageBucket(
+                parse_bucket_start(row[0]),
+                row[1] if group_by is not None else None,
+                float(row[-3]), int(row[-2]), row[-1]
+            )
+            for row in rows
+        ]
+
+    def get_usage_totals(self, ranges: Sequence[Tuple[datetime.datetime | None, datetime.datetime | None]],
+                         group_by: str | None = None, user_id: int | None = None,
+                         walkway_id: int | None = None) -> Dict[Optional[int], UsageTotal]:
+        """
+        Suma con una única consulta los eventos que empiezan en alguno de los rangos [inicio, fin)
+        (None para no acotar ese extremo), opcionalmente por usuario, andador o programación.
+        """
+        if group_by is not None and group_by not in USAGE_GROUP_COLUMNS:
+            raise ValueError(
+                f"Agrupación no soportada: {group_by}. Valores admitidos: {', '.join(USAGE_GROUP_COLUMNS)}."
+            )
+        if not ranges:
+            return {}
+        starts = [start for start, _ in ranges]
+        ends = [end for _, end in ranges]
+        events = self.event_source(
+            None if None in starts else min(starts),
+            None if None in ends else max(ends)
+        ).c
+        group_columns = [events[USAGE_GROUP_COLUMNS[group_by]]] if group_by is not None else []
+        query = select(
+            *group_columns,
+            func.sum(events.volume_liters),
+            func.sum(events.duration_minutes),
+            func.count(events.id)
+        )
+        conditions = []
+        for start, end in ranges:
+            bounds = []
+            if start is not None:
+                bounds.append(events.start_time >= start)
+            if end is not None:
+                bounds.append(events.start_time < end)
+            conditions.append(and_(true(), *bounds))
+        query = query.where(or_(*conditions))
+        if user_id is not None:
+            query = query.where(events.user_id == user_id)
+        if walkway_id is not None:
+            query = query.where(events.walkway_id == walkway_id)
+        return usage_totals(self.db.execute(query.group_by(*group_columns)).all(), group_by is not None)
@@ -0,0 +1,202 @@
+# services/access_rule_engine.py
+
+# Motor de evaluación de reglas de acceso.
+# Compila todas las AccessScheduleRule en listas de intervalos ordenados y fusionados por
+# (user_type_id, walkway_id, día de la semana), de modo que comprobar si un horario está
+# permitido es una búsqueda binaria en lugar de un recorrido de las reglas.
+
+import bisect
+import datetime
+import itertools
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from Core.weekdays import parse_weekdays
+from database.models.access_schedule_rule import AccessScheduleRule
+from repositories.access_schedule_rule_repository import AccessScheduleRuleRepository
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# (user_type_id, walkway_id, weekday)
+RuleKey = Tuple[int, int, int]
+
+
+def _seconds(value: datetime.time) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+class AccessRuleEngine:
+    """
+    Conjunto compilado de reglas de acceso.
+    Para cada clave guarda dos listas paralelas (inicios, fines) en segundos desde la
+    medianoche, ordenadas y sin solapes: los intervalos contiguos o superpuestos de
+    varias reglas se fusionan, así un horario que abarca dos reglas seguidas es válido.
+    """
+
+    def __init__(self, intervals: Dict[RuleKey, Tuple[List[int], List[int]]]):
+        self._intervals = intervals
+
+    @classmethod
+    def compile(cls, rules: Iterable[Tuple[int, int, str, datetime.time, datetime.time]]) -> "AccessRuleEngine":
+        """
+        Compila las reglas, dadas como tuplas (user_type_id, walkway_id, day_of_week, start_time, end_time).
+        Las reglas cuyo fin no es posterior al inicio cruzan la medianoche y se reparten entre
+        ese día y el siguiente. Las reglas con un day_of_week no reconocible se ignoran.
+        """
+        raw: Dict[RuleKey, List[Tuple[int, int]]] = {}
+        for user_type_id, walkway_id, day_of_week, start_time, end_time in rules:
+            try:
+                weekdays = parse_weekdays(day_of_week)
+            except ValueError:
+                continue
+            start, end = _seconds(start_time), _seconds(end_time)
+            for weekday in weekdays:
+                if start < end:
+                    raw.setdefault((user_type_id, walkway_id, weekday), []).append((start, end))
+                else:
+                    raw.setdefault((user_type_id, walkway_id, weekday), []).append((start, SECONDS_PER_DAY))
+                    if end > 0:
+                        raw.setdefault((user_type_id, walkway_id, (weekday + 1) % 7), []).append((0, end))
+
+        intervals = {}
+        for key, spans in raw.items():
+            starts: List[int] = []
+            ends: List[int] = []
+            for start, end in sorted(spans):
+                if starts and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            intervals[key] = (starts, ends)
+        return cls(intervals)
+
+    def _covers(self, key: RuleKey, start: int, end: int) -> bool:
+        """Indica si un único intervalo compilado de la clave contiene [start, end]."""
+        spans = self._intervals.get(key)
+        if not spans:
+            return False
+        starts, ends = spans
+        position = bisect.bisect_right(starts, start) - 1
+        return position >= 0 and ends[position] >= end
+
+    def get_day_intervals(self, user_type_id: int, walkway_id: int, weekday: int) -> List[Tuple[int, int]]:
+        """
+        Devuelve los intervalos permitidos (inicio, fin) en segundos desde la medianoche para un
+        día de la semana, ordenados y sin solapes.
+        """
+        starts, ends = self._intervals.get((user_type_id, walkway_id, weekday), ([], []))
+        return list(zip(starts, ends))
+
+    def is_allowed(self, user_type_id: int, walkway_id: int,
+                   start: datetime.datetime, end: datetime.datetime) -> bool:
+        """
+        Comprueba si el horario [start, end] está cubierto por las reglas del tipo de usuario
+        en el andador. Un horario que cruza la medianoche debe estar cubierto en ambos días.
+        """
+        if end <= start:
+            return False
+
+        day = start.date()
+        while True:
+            day_start = datetime.datetime.combine(day, datetime.time())
+            segment_start = max(start, day_start)
+            segment_end = min(end, day_start + datetime.timedelta(days=1))
+            if not self._covers(
+                (user_type_id, walkway_id, day.weekday()),
+                int((segment_start - day_start).total_seconds()),
+                int((segment_end - day_start).total_seconds()),
+            ):
+                return False
+            if segment_end >= end:
+                return True
+            day += datetime.timedelta(days=1)
+
+
+# Segundos durante los que un motor compilado se da por vigente. Las escrituras de reglas hechas
+# en este proceso lo invalidan al confirmarse (ver _invalidate_after_commit); el TTL acota cuánto
+# tarda en verse un cambio hecho por otro proceso o directamente en la base de datos.
+RULES_TTL_SECONDS = 60.0
+
+# Motores compilados por motor de base de datos, como (motor, instante de compilación);
+# desaparecen junto con el Engine. El contador de generación evita guardar un motor compilado
+# antes de una invalidación que ocurrió mientras se compilaba.
+_compiled: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_generation = 0
+_lock = threading.Lock()
+_clock = time.monotonic
+
+# Clave de session.info que marca una transacción que ha escrito reglas de acceso
+_RULES_CHANGED_KEY = "access_rules_changed"
+
+
+def get_access_rule_engine(db: Session) -> AccessRuleEngine:
+    """
+    Devuelve el motor compilado para la base de datos de la sesión, compilándolo
+    con una única consulta la primera vez, tras una invalidación o al caducar (RULES_TTL_SECONDS).
+    Una transacción que ya ha escrito reglas no usa el motor compartido: compila uno propio, que ve
+    sus cambios aún sin confirmar y no se comparte.
+    """
+    if db.info.get(_RULES_CHANGED_KEY):
+        return AccessRuleEngine.compile(AccessScheduleRuleRepository(db).get_rule_intervals())
+
+    bind = db.get_bind()
+    now = _clock()
+    with _lock:
+        cached = _compiled.get(bind)
+        generation = _generation
+    if cached is not None and now - cached[1] < RULES_TTL_SECONDS:
+        return cached[0]
+    engine = AccessRuleEngine.compile(AccessScheduleRuleRepository(db).get_rule_intervals())
+    with _lock:
+        if generation == _generation and not db.info.get(_RULES_CHANGED_KEY):
+            _compiled[bind] = (engine, now)
+    return engine
+
+
+def invalidate_access_rule_engine(db: Session) -> None:
+    """
+    Descarta el motor compilado de la base de datos de la sesión.
+    Las escrituras de reglas a través de la sesión lo hacen solas al confirmarse.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        _compiled.pop(db.get_bind(), None)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_rules(session: Session, flush_context) -> None:
+    """Marca la transacción si el flush crea, modifica o elimina reglas de acceso."""
+    if any(isinstance(entity, AccessScheduleRule)
+           for entity in itertools.chain(session.new, session.dirty, session.deleted)):
+        session.info[_RULES_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_rule_statements(state: ORMExecuteState) -> None:
+    """
+    Marca la transacción si ejecuta un INSERT, UPDATE o DELETE sobre las reglas de acceso
+    (bulk_create, bulk_update, backfill_day_masks...), que no pasan por el flush.
+    """
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is AccessScheduleRule.__mapper__:
+        state.session.info[_RULES_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    """Invalida el motor compilado cuando se confirma una transacción que ha escrito reglas."""
+    if session.info.pop(_RULES_CHANGED_KEY, False):
+        invalidate_access_rule_engine(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rule_changes(session: Session) -> None:
+    """Invalida el motor compilado cuando se deshace una transacción que había escrito reglas."""
+    if session.info.pop(_RULES_CHANGED_KEY, False):
+        invalidate_access_rule_engine(session)
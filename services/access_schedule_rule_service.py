@@ -1,13 +1,20 @@
 # services/access_schedule_rule_service.py
 
 from sqlalchemy.orm import Session
-from typing import Dict, Any, List
-from datetime import time, datetime
+from typing import Dict, Any, List, NamedTuple, Optional
+from datetime import time, datetime, timedelta
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from repositories.access_schedule_rule_repository import AccessScheduleRuleRepository
+from repositories.notification_repository import NotificationRepository
+from repositories.recurring_schedule_repository import RecurringScheduleRepository
+from repositories.user_repository import UserRepository
 from repositories.user_type_repository import UserTypeRepository
-from database.models.access_schedule_rule import AccessScheduleRule
+from repositories.user_watering_schedule_repository import UserWateringScheduleRepository, RuleSegment
+from database.models.access_schedule_rule import AccessScheduleRule, DAY_OF_WEEK_MAX_LENGTH
+from database.unit_of_work import UnitOfWork
+from services.access_rule_engine import AccessRuleEngine
+from Core.weekdays import parse_weekdays
 
 from Core.exceptions import (
     NotFoundError,
@@ -18,10 +25,62 @@ from Core.exceptions import (
 )
 from Core.error_messages import AccessScheduleRuleErrors, GeneralErrors
 
+
+class RuleViolation(NamedTuple):
+    """
+    Programación futura que deja de cumplir las reglas de acceso tras un cambio. Las ocurrencias
+    pendientes de una plantilla recurrente no tienen schedule_id e indican su recurring_schedule_id.
+    """
+    schedule_id: Optional[int]
+    user_id: int
+    start_at: datetime
+    end_at: datetime
+    recurring_schedule_id: Optional[int] = None
+
+
+def rule_segments(day_of_week: str, start_time: time, end_time: time) -> List[RuleSegment]:
+    """
+    Tramos (días, inicio, fin o None = medianoche) que cubre una regla. Una regla cuyo fin no es
+    posterior al inicio cruza la medianoche y continúa al día siguiente.
+    """
+    try:
+        days = frozenset(parse_weekdays(day_of_week))
+    except ValueError:
+        return []
+    if start_time < end_time:
+        return [(days, start_time, end_time)]
+    segments = [(days, start_time, None)]
+    if end_time > time(0, 0):
+        segments.append((frozenset((day + 1) % 7 for day in days), time(0, 0), end_time))
+    return segments
+
+
+def touches_segments(segments: List[RuleSegment], start_at: datetime, end_at: datetime) -> bool:
+    """
+    Indica si un horario toca alguno de los tramos de una regla: el mismo criterio que
+    get_future_schedules_in_rule_window aplica en SQL, para horarios que no están guardados.
+    """
+    start_time, end_time = start_at.time(), end_at.time()
+    crosses_midnight = end_at.date() > start_at.date()
+    weekday = start_at.weekday()
+    for days, segment_start, segment_end in segments:
+        if (weekday in days and (end_time > segment_start or crosses_midnight)
+                and (segment_end is None or start_time < segment_end)):
+            return True
+        # La parte del día siguiente de los que cruzan la medianoche
+        if crosses_midnight and (weekday + 1) % 7 in days and end_time > segment_start:
+            return True
+    return False
+
+
 class AccessScheduleRuleService:
     def __init__(self, db: Session):
         self.access_rule_repo = AccessScheduleRuleRepository(db)
         self.user_type_repo = UserTypeRepository(db)
+        self.user_watering_schedule_repo = UserWateringScheduleRepository(db)
+        self.recurring_schedule_repo = RecurringScheduleRepository(db)
+        self.user_repo = UserRepository(db)
+        self.notification_repo = NotificationRepository(db)
         self.db = db
 
     def create_access_rule(self, rule_data: Dict[str, Any]) -> AccessScheduleRule:
@@ -36,9 +95,7 @@ class AccessScheduleRuleService:
                 message=AccessScheduleRuleErrors.USER_TYPE_NOT_FOUND.format(user_type_id=user_type_id)
             )
 
-        day_of_week = rule_data.get('day_of_week')
-        if not (0 <= day_of_week <= 6):
-            raise ValidationError(AccessScheduleRuleErrors.INVALID_DAY_OF_WEEK)
+        rule_data['day_of_week'] = self._normalize_day_of_week(rule_data.get('day_of_week'))
 
         start_time_str = rule_data.get('start_time')
         end_time_str = rule_data.get('end_time')
@@ -57,7 +114,9 @@ class AccessScheduleRuleService:
         rule_data['end_time'] = end_time
 
         try:
-            return self.access_rule_repo.create(rule_data)
+            with UnitOfWork(self.db):
+                new_rule = self.access_rule_repo.create(rule_data)
+            return new_rule
         except SQLAlchemyError as e:
             self.db.rollback()
             raise OperationFailedError(
@@ -66,9 +125,10 @@ class AccessScheduleRuleService:
                 original_exception=e
             )
 
-    def delete_access_rule(self, rule_id: int) -> bool:
+    def delete_access_rule(self, rule_id: int, notify_affected: bool = True) -> bool:
         """
-        Elimina una regla de acceso existente.
+        Elimina una regla de acceso existente. Si notify_affected, avisa en la misma transacción
+        a los usuarios cuyas programaciones futuras dejan de cumplir las reglas.
         """
         rule = self.access_rule_repo.get_by_id(rule_id)
         if not rule:
@@ -79,10 +139,13 @@ class AccessScheduleRuleService:
                 message=AccessScheduleRuleErrors.RULE_NOT_FOUND.format(rule_id=rule_id)
             )
         
+        violations = self.analyze_rule_change(rule_id) if notify_affected else []
         try:
-            is_deleted = self.access_rule_repo.delete(rule_id)
-            if not is_deleted:
-                raise OperationFailedError(entity_name="regla de acceso", operation="eliminar")
+            with UnitOfWork(self.db):
+                is_deleted = self.access_rule_repo.delete(rule_id)
+                if not is_deleted:
+                    raise OperationFailedError(entity_name="regla de acceso", operation="eliminar")
+                self._notify_violations(violations)
             return is_deleted
         except IntegrityError as e:
             self.db.rollback()
@@ -94,3 +157,153 @@ class AccessScheduleRuleService:
                 operation="eliminar",
                 original_exception=e
             )
+
+    def update_access_rule(self, rule_id: int, rule_data: Dict[str, Any], notify_affected: bool = True) -> Dict[str, Any]:
+        """
+        Modifica los días ('day_of_week') o el horario ('start_time'/'end_time', 'HH:MM' o time)
+        de una regla. Si notify_affected, avisa en la misma transacción a los usuarios cuyas
+        programaciones futuras dejan de cumplir las reglas.
+        :return: {"rule": regla actualizada, "violations": lista de RuleViolation}.
+        """
+        rule = self._get_rule(rule_id)
+        changes = self._validate_rule_changes(rule, rule_data)
+        violations = self.analyze_rule_change(rule_id, changes)
+        try:
+            with UnitOfWork(self.db):
+                updated_rule = self.access_rule_repo.update(rule_id, changes)
+                if notify_affected:
+                    self._notify_violations(violations)
+            return {"rule": updated_rule, "violations": violations}
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            raise OperationFailedError(
+                entity_name="regla de acceso",
+                operation="actualizar",
+                original_exception=e
+            )
+
+    def analyze_rule_change(self, rule_id: int, rule_data: Optional[Dict[str, Any]] = None,
+                            now: Optional[datetime] = None) -> List[RuleViolation]:
+        """
+        Simulación ("qué pasaría si") de eliminar una regla (rule_data None) o de modificarla con
+        rule_data, sin guardar nada. Solo se consultan las programaciones futuras de los usuarios del
+        tipo y andador de la regla que tocan sus días y horas actuales (las demás no dependen de ella),
+        y cada una se comprueba contra las reglas resultantes compiladas en memoria.
+        Las ocurrencias pendientes de las plantillas recurrentes de esos usuarios se expanden sin
+        guardarlas y se comprueban igual. El resultado está en orden cronológico.
+        """
+        rule = self._get_rule(rule_id)
+        replacement = []
+        if rule_data is not None:
+            changes = self._validate_rule_changes(rule, rule_data)
+            replacement.append((
+                rule.user_type_id,
+                rule.walkway_id,
+                changes.get('day_of_week', rule.day_of_week),
+                changes.get('start_time', rule.start_time),
+                changes.get('end_time', rule.end_time),
+            ))
+        engine = AccessRuleEngine.compile(list(self.access_rule_repo.get_rule_intervals(exclude_rule_id=rule_id)) + replacement)
+
+        now = now or datetime.now()
+        segments = rule_segments(rule.day_of_week, rule.start_time, rule.end_time)
+        candidates = self.user_watering_schedule_repo.get_future_schedules_in_rule_window(
+            rule.user_type_id, rule.walkway_id, segments, now
+        )
+        violations = [
+            RuleViolation(*row) for row in candidates
+            if not engine.is_allowed(rule.user_type_id, rule.walkway_id, row.start_at, row.end_at)
+        ]
+
+        templates = self.recurring_schedule_repo.get_active_for_users(
+            self.user_repo.get_ids_by_access_key(rule.user_type_id, rule.walkway_id), now.date(), None
+        )
+        if templates:
+            # Las ocurrencias pendientes terminan como muy tarde el día siguiente al fin de vigencia
+            end = datetime.combine(max(template.valid_until for template in templates) + timedelta(days=2), time())
+            violations.extend(
+                RuleViolation(None, occurrence.user_id, occurrence.start_at, occurrence.end_at, occurrence.recurring_schedule_id)
+                for occurrence in self.recurring_schedule_repo.iter_occurrences(
+                    {template.user_id for template in templates}, now, end
+                )
+                if occurrence.start_at > now
+                and touches_segments(segments, occurrence.start_at, occurrence.end_at)
+                and not engine.is_allowed(rule.user_type_id, rule.walkway_id, occurrence.start_at, occurrence.end_at)
+            )
+            # Orden estable: las programaciones del mismo instante conservan su orden por id
+            violations.sort(key=lambda violation: violation.start_at)
+        return violations
+
+    def _get_rule(self, rule_id: int) -> AccessScheduleRule:
+        rule = self.access_rule_repo.get_by_id(rule_id)
+        if not rule:
+            raise NotFoundError(
+                entity_name="Regla de acceso",
+                entity_id=rule_id,
+                message=AccessScheduleRuleErrors.RULE_NOT_FOUND.format(rule_id=rule_id)
+            )
+        return rule
+
+    @staticmethod
+    def _normalize_day_of_week(value: Any) -> str:
+        """
+        Valida day_of_week (un día 0-6 o una lista de días separados por comas) y lo devuelve como
+        texto, comprobando que cabe en la columna.
+        """
+        if value is None or isinstance(value, bool):
+            raise ValidationError(AccessScheduleRuleErrors.INVALID_DAY_OF_WEEK)
+        day_of_week = str(value)
+        if len(day_of_week) > DAY_OF_WEEK_MAX_LENGTH:
+            raise ValidationError(AccessScheduleRuleErrors.DAY_OF_WEEK_TOO_LONG.format(max_length=DAY_OF_WEEK_MAX_LENGTH))
+        try:
+            parse_weekdays(day_of_week)
+        except ValueError:
+            raise ValidationError(AccessScheduleRuleErrors.INVALID_DAY_OF_WEEK)
+        return day_of_week
+
+    @staticmethod
+    def _validate_rule_changes(rule: AccessScheduleRule, rule_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Valida y normaliza los campos modificables de una regla. Devuelve solo los que cambian de valor.
+        """
+        changes = {}
+        if rule_data.get('day_of_week') is not None:
+            changes['day_of_week'] = AccessScheduleRuleService._normalize_day_of_week(rule_data['day_of_week'])
+        for key in ('start_time', 'end_time'):
+            value = rule_data.get(key)
+            if isinstance(value, str):
+                try:
+                    value = datetime.strptime(value, '%H:%M').time()
+                except ValueError:
+                    raise ValidationError("Formato de hora inválido. Se espera 'HH:MM'.")
+            if value is not None:
+                changes[key] = value
+
+        start_time = changes.get('start_time', rule.start_time)
+        end_time = changes.get('end_time', rule.end_time)
+        if start_time >= end_time:
+            raise ValidationError(AccessScheduleRuleErrors.INVALID_TIME_RANGE.format(start_time=start_time, end_time=end_time))
+        return {key: value for key, value in changes.items() if getattr(rule, key) != value}
+
+    def _notify_violations(self, violations: List[RuleViolation]) -> int:
+        """
+        Crea, con un solo INSERT, una notificación por usuario afectado con las fechas de sus
+        programaciones que ya no cumplen las reglas.
+        """
+        by_user: Dict[int, List[RuleViolation]] = {}
+        for violation in violations:
+            by_user.setdefault(violation.user_id, []).append(violation)
+
+        rows = []
+        for user_id, user_violations in by_user.items():
+            listed = ", ".join(v.start_at.strftime('%d/%m/%Y %H:%M') for v in user_violations[:5])
+            if len(user_violations) > 5:
+                listed += f" y {len(user_violations) - 5} más"
+            rows.append({
+                "user_id": user_id,
+                "title": "Programaciones fuera de horario",
+                "message": (f"Tras un cambio en las reglas de acceso, {len(user_violations)} de tus programaciones "
+                            f"ya no cumplen el horario permitido: {listed}. Por favor, reprográmalas."),
+                "type": "warning",
+            })
+        return self.notification_repo.bulk_create_notifications(rows)
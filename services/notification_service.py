@@ -7,6 +7,8 @@ import datetime
 # Importamos los repositorios que este servicio necesitará
 from repositories.notification_repository import NotificationRepository
 from repositories.user_repository import UserRepository # Para validar el user_id y obtener detalles del usuario
+from repositories.pagination import Page
+from database.unit_of_work import UnitOfWork
 
 # Excepciones y mensajes de error personalizados
 from Core.exceptions import NotFoundError, OperationFailedError, EmptyValueError
@@ -56,12 +58,13 @@ class NotificationService:
 
         # 2. Llamar al repositorio para crear la notificación
         try:
-            new_notification = self.notification_repo.create_notification(
-                user_id=user_id,
-                title=title,
-                message=message,
-                type=type
-            )
+            with UnitOfWork(self.db):
+                new_notification = self.notification_repo.create_notification(
+                    user_id=user_id,
+                    title=title,
+                    message=message,
+                    type=type
+                )
             return new_notification
         except Exception as e:
             # En caso de un fallo inesperado, hacemos rollback y lanzamos una excepción de operación fallida.
@@ -84,6 +87,13 @@ class NotificationService:
         """
         return self.notification_repo.get_notifications_for_user(user_id, is_read, start_date, end_date)
 
+    def get_notifications_page(self, user_id: int, status: str = "all", cursor: Optional[str] = None, limit: int = 50) -> Page:
+        """
+        Obtiene una página de notificaciones de un usuario, de la más reciente a la más antigua.
+        Para pedir la siguiente, se pasa el next_cursor recibido.
+        """
+        return self.notification_repo.get_page_by_user_id(user_id, status=status, cursor=cursor, limit=limit)
+
     def mark_notification_as_read(self, notification_id: int) -> Optional[Notification]:
         """
         Marca una notificación específica como leída.
@@ -94,7 +104,7 @@ class NotificationService:
         """
         Marca todas las notificaciones no leídas de un usuario como leídas.
         """
-        return self.notification_repo.mark_all_as_read_for_user(user_id)
+        return self.notification_repo.mark_all_as_read(user_id)
 
     def get_unread_count_for_user(self, user_id: int) -> int:
         """
@@ -0,0 +1,285 @@
+# services/recurring_schedule_service.py
+
+from __future__ import annotations
+
+import datetime
+import heapq
+import itertools
+from typing import Iterable, Iterator, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from Core.error_messages import (
+    UserErrors,
+    UserWateringScheduleErrors,
+    RecurringWateringScheduleErrors,
+    GeneralErrors
+)
+from Core.weekdays import parse_weekdays, weekdays_to_mask, mask_to_weekdays
+from database.models.recurring_watering_schedule import RecurringWateringSchedule, RecurringScheduleException
+from database.models.user_watering_schedule import UserWateringSchedule
+from database.unit_of_work import UnitOfWork
+from repositories.base_repository import execute_bulk_delete, execute_bulk_update
+from repositories.recurring_schedule_repository import RecurringScheduleRepository, Occurrence, expand_template
+from repositories.user_repository import UserRepository
+from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
+from repositories.walkway_occupancy_repository import WalkwayOccupancyRepository
+from services.access_rule_engine import get_access_rule_engine
+from services.user_watering_schedule_service import UserWateringScheduleService
+from services.walkway_occupancy_service import WalkwayOccupancyService
+
+
+def _first_conflict(proposed: Iterable[Occurrence],
+                    existing: Iterable[Tuple[datetime.datetime, datetime.datetime]]) -> Optional[Occurrence]:
+    """
+    Recorre a la vez dos flujos ordenados por inicio y devuelve la primera ocurrencia propuesta
+    que se superpone con algún intervalo existente, o None.
+    Memoria constante: solo se recuerda el mayor fin de los intervalos existentes ya consumidos.
+    """
+    existing = iter(existing)
+    pending = next(existing, None)
+    max_end = None
+    for occurrence in proposed:
+        # Consumir los existentes que empiezan antes de que acabe esta ocurrencia
+        while pending is not None and pending[0] < occurrence.end_at:
+            if max_end is None or pending[1] > max_end:
+                max_end = pending[1]
+            pending = next(existing, None)
+        if max_end is not None and max_end > occurrence.start_at:
+            return occurrence
+    return None
+
+
+class RecurringScheduleService:
+    def __init__(self, db: Session):
+        self.recurring_schedule_repo = RecurringScheduleRepository(db)
+        self.user_watering_schedule_repo = UserWateringScheduleRepository(db)
+        self.user_repo = UserRepository(db)
+        self.occupancy_repo = WalkwayOccupancyRepository(db)
+        self.occupancy_service = WalkwayOccupancyService(db)
+        self.db = db
+
+    def create_recurring_schedule(self, data: dict) -> RecurringWateringSchedule:
+        """
+        Crea una plantilla semanal. data contiene 'user_id', 'weekdays' (lista de días 0-6 o texto
+        como "Mon,Wed,Fri"), 'start_time'/'end_time' (time), 'valid_from'/'valid_until' (date) y,
+        opcionalmente, 'interval_weeks'.
+        Las reglas de acceso son semanales, así que basta con comprobar cada día de la semana una vez;
+        las superposiciones se comprueban recorriendo las ocurrencias sin guardarlas.
+        """
+        user_id = data['user_id']
+        user = self.user_repo.get_by_id(user_id)
+        if not user:
+            raise ValueError(UserErrors.NOT_FOUND.format(user_id=user_id))
+
+        weekdays = data['weekdays']
+        if isinstance(weekdays, (str, int)):
+            weekdays = parse_weekdays(weekdays)
+        weekday_mask = weekdays_to_mask(weekdays)
+        if not weekday_mask:
+            raise ValueError(RecurringWateringScheduleErrors.NO_WEEKDAYS)
+
+        valid_from, valid_until = data['valid_from'], data['valid_until']
+        if valid_from > valid_until:
+            raise ValueError(RecurringWateringScheduleErrors.INVALID_DATE_RANGE.format(valid_from=valid_from, valid_until=valid_until))
+
+        interval_weeks = data.get('interval_weeks', 1)
+        if not isinstance(interval_weeks, int) or interval_weeks < 1:
+            raise ValueError(RecurringWateringScheduleErrors.INVALID_INTERVAL)
+
+        template = RecurringWateringSchedule(
+            user_id=user_id,
+            weekday_mask=weekday_mask,
+            start_time=data['start_time'],
+            end_time=data['end_time'],
+            valid_from=valid_from,
+            valid_until=valid_until,
+            interval_weeks=interval_weeks,
+            is_active=True,
+        )
+
+        # Como en las ocurrencias, un fin no posterior al inicio termina al día siguiente
+        start_at, end_at = UserWateringSchedule.time_bounds(valid_from, data['start_time'], data['end_time'])
+        error = UserWateringScheduleService.get_time_range_error(start_at, end_at)
+        if error:
+            raise ValueError(error)
+
+        rule_engine = get_access_rule_engine(self.db)
+        for weekday in sorted(mask_to_weekdays(weekday_mask)):
+            # Cualquier fecha de ese día de la semana sirve para evaluar las reglas
+            day = valid_from + datetime.timedelta(days=(weekday - valid_from.weekday()) % 7)
+            if not rule_engine.is_allowed(user.user_type_id, user.walkway_id,
+                                          *UserWateringSchedule.time_bounds(day, template.start_time, template.end_time)):
+                raise ValueError(RecurringWateringScheduleErrors.RULE_MISMATCH.format(weekday=weekday))
+
+        conflict = self._find_conflict(template)
+        if conflict is not None:
+            raise ValueError(RecurringWateringScheduleErrors.OVERLAPPING_OCCURRENCE.format(occurrence_date=conflict.occurrence_date))
+
+        try:
+            with UnitOfWork(self.db):
+                # El andador queda bloqueado desde la comprobación de capacidad hasta guardar la plantilla;
+                # sus ocurrencias no se guardan en la ocupación, que las suma al leer
+                over_capacity = self.occupancy_service.first_over_capacity(
+                    user.walkway_id,
+                    ((occurrence.start_at, occurrence.end_at) for occurrence in expand_template(template, valid_from, valid_until))
+                )
+                if over_capacity:
+                    position, capacity = over_capacity
+                    # Solo se vuelve a expandir hasta la ocurrencia rechazada
+                    occurrence = next(itertools.islice(expand_template(template, valid_from, valid_until), position, None))
+                    raise ValueError(RecurringWateringScheduleErrors.WALKWAY_CAPACITY_EXCEEDED.format(
+                        occurrence_date=occurrence.occurrence_date, max_concurrent_schedules=capacity
+                    ))
+                return self.recurring_schedule_repo.create(template)
+        except ValueError:
+            raise
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="crear", entity_name="programación recurrente", detail=str(e)))
+
+    def _find_conflict(self, template: RecurringWateringSchedule) -> Optional[Occurrence]:
+        """
+        Busca la primera ocurrencia de la plantilla que choca con las programaciones concretas del
+        usuario o con las ocurrencias de sus otras plantillas en el periodo de vigencia.
+        """
+        start = datetime.datetime.combine(template.valid_from, datetime.time())
+        # Un día más, por las ocurrencias que cruzan la medianoche
+        end = datetime.datetime.combine(template.valid_until + datetime.timedelta(days=2), datetime.time())
+
+        concrete = sorted(
+            (start_at, end_at) for _, _, start_at, end_at
+            in self.user_watering_schedule_repo.get_intervals_for_users([template.user_id], start, end)
+        )
+        recurring = (
+            (occurrence.start_at, occurrence.end_at)
+            for occurrence in self.recurring_schedule_repo.iter_occurrences(
+                [template.user_id], start, end, exclude_recurring_schedule_id=template.id
+            )
+        )
+        proposed = expand_template(template, template.valid_from, template.valid_until)
+        return _first_conflict(proposed, heapq.merge(concrete, recurring))
+
+    def get_recurring_schedule_by_id(self, recurring_schedule_id: int) -> Optional[RecurringWateringSchedule]:
+        return self.recurring_schedule_repo.get_by_id(recurring_schedule_id)
+
+    def iter_occurrences(self, user_id: int, start_date: datetime.date, end_date: datetime.date) -> Iterator[Occurrence]:
+        """
+        Generador de las ocurrencias pendientes de las plantillas de un usuario entre dos fechas
+        (ambas incluidas), en orden cronológico. Nada se guarda en la base de datos.
+        """
+        start = datetime.datetime.combine(start_date, datetime.time())
+        end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time())
+        return self.recurring_schedule_repo.iter_occurrences([user_id], start, end)
+
+    def cancel_occurrence(self, recurring_schedule_id: int, occurrence_date: datetime.date) -> RecurringScheduleException:
+        """
+        Cancela una ocurrencia concreta sin modificar la plantilla.
+        """
+        self._get_pending_occurrence(recurring_schedule_id, occurrence_date)
+        try:
+            with UnitOfWork(self.db):
+                return self.recurring_schedule_repo.save_exception(recurring_schedule_id, occurrence_date, is_cancelled=True)
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="cancelar", entity_name="ocurrencia", detail=str(e)))
+
+    def reschedule_occurrence(self, recurring_schedule_id: int, occurrence_date: datetime.date,
+                              start_time: datetime.time, end_time: datetime.time) -> RecurringScheduleException:
+        """
+        Cambia el horario de una ocurrencia concreta (el mismo día), con las mismas
+        validaciones que una programación nueva.
+        """
+        template, occurrence = self._get_pending_occurrence(recurring_schedule_id, occurrence_date)
+        start_at, end_at = UserWateringSchedule.time_bounds(occurrence_date, start_time, end_time)
+
+        error = UserWateringScheduleService.get_time_range_error(start_at, end_at)
+        if error:
+            raise ValueError(error)
+
+        user = self.user_repo.get_by_id(template.user_id)
+        if not get_access_rule_engine(self.db).is_allowed(user.user_type_id, user.walkway_id, start_at, end_at):
+            raise ValueError(UserWateringScheduleErrors.SCHEDULE_RULE_MISMATCH)
+
+        # Solo se excluye la propia ocurrencia: las demás de la plantilla (la del día siguiente, si el
+        # nuevo horario cruza la medianoche) siguen contando
+        if (self.user_watering_schedule_repo.get_overlapping_schedules(template.user_id, start_at, end_at)
+                or any(other.recurring_schedule_id != recurring_schedule_id or other.occurrence_date != occurrence_date
+                       for other in self.recurring_schedule_repo.iter_occurrences([template.user_id], start_at, end_at))):
+            raise ValueError(UserWateringScheduleErrors.OVERLAPPING_SCHEDULE)
+
+        try:
+            with UnitOfWork(self.db):
+                # El andador queda bloqueado desde la comprobación de capacidad hasta guardar la excepción
+                over_capacity = self.occupancy_service.first_over_capacity(
+                    user.walkway_id, [(start_at, end_at)], released=[(occurrence.start_at, occurrence.end_at)]
+                )
+                if over_capacity:
+                    raise ValueError(UserWateringScheduleErrors.WALKWAY_CAPACITY_EXCEEDED.format(max_concurrent_schedules=over_capacity[1]))
+                return self.recurring_schedule_repo.save_exception(
+                    recurring_schedule_id, occurrence_date, is_cancelled=False, start_time=start_time, end_time=end_time
+                )
+        except ValueError:
+            raise
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="reprogramar", entity_name="ocurrencia", detail=str(e)))
+
+    def materialize_occurrence(self, recurring_schedule_id: int, occurrence_date: datetime.date) -> UserWateringSchedule:
+        """
+        Guarda una ocurrencia como UserWateringSchedule, por ejemplo al ejecutarse,
+        para que los eventos de riego puedan referenciarla.
+        El intervalo pasa de ocurrencia pendiente (sumada al leer la ocupación) a programación concreta
+        (guardada en los contadores del andador).
+        """
+        template, occurrence = self._get_pending_occurrence(recurring_schedule_id, occurrence_date)
+        user = self.user_repo.get_by_id(template.user_id)
+        try:
+            with UnitOfWork(self.db):
+                self.occupancy_repo.apply([(user.walkway_id, occurrence.start_at, occurrence.end_at, 1)])
+                return self.user_watering_schedule_repo.create({
+                    'user_id': occurrence.user_id,
+                    'scheduled_date': occurrence.occurrence_date,
+                    'start_time': occurrence.start_at.time(),
+                    'end_time': occurrence.end_at.time(),
+                    'recurring_schedule_id': recurring_schedule_id,
+                })
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="materializar", entity_name="ocurrencia", detail=str(e)))
+
+    def delete_recurring_schedule(self, recurring_schedule_id: int) -> bool:
+        """
+        Elimina una plantilla y sus excepciones. Las ocurrencias ya materializadas se conservan
+        como programaciones independientes.
+        """
+        if not self.recurring_schedule_repo.get_by_id(recurring_schedule_id):
+            return False
+
+        try:
+            with UnitOfWork(self.db):
+                execute_bulk_update(self.db, UserWateringSchedule,
+                                    {"recurring_schedule_id": recurring_schedule_id}, {"recurring_schedule_id": None})
+                execute_bulk_delete(self.db, RecurringScheduleException, {"recurring_schedule_id": recurring_schedule_id})
+                return self.recurring_schedule_repo.delete(recurring_schedule_id)
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="eliminar", entity_name="programación recurrente", detail=str(e)))
+
+    def _get_pending_occurrence(self, recurring_schedule_id: int,
+                                occurrence_date: datetime.date) -> Tuple[RecurringWateringSchedule, Occurrence]:
+        """
+        Obtiene la plantilla y su ocurrencia pendiente (no cancelada ni materializada) en una fecha.
+        """
+        template = self.recurring_schedule_repo.get_by_id(recurring_schedule_id)
+        if not template:
+            raise ValueError(RecurringWateringScheduleErrors.NOT_FOUND.format(recurring_schedule_id=recurring_schedule_id))
+
+        exceptions = self.recurring_schedule_repo.get_exceptions([template.id], occurrence_date, occurrence_date)
+        materialized = self.recurring_schedule_repo.get_materialized_dates([template.id], occurrence_date, occurrence_date)
+        occurrence = next(expand_template(template, occurrence_date, occurrence_date, exceptions, materialized), None)
+        if occurrence is None:
+            raise ValueError(RecurringWateringScheduleErrors.OCCURRENCE_NOT_FOUND.format(
+                recurring_schedule_id=recurring_schedule_id, occurrence_date=occurrence_date
+            ))
+        return template, occurrence
@@ -0,0 +1,225 @@
+# services/timetable_service.py
+
+# Generador del cuadrante semanal de riego de toda la comunidad.
+# Asigna a cada usuario sus turnos de la semana dentro de las ventanas de acceso de su tipo de
+# usuario en su andador, sin solaparse con lo ya reservado y sin superar la capacidad de los
+# andadores. Todo se carga con unas pocas consultas por conjuntos y se resuelve en memoria con
+# una heurística voraz: primero los usuarios con menos margen y, para cada uno, el primer hueco
+# que cabe (empezando por un día distinto para repartir la carga de la semana).
+
+from __future__ import annotations
+
+import datetime
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from Core.error_messages import GeneralErrors, TimetableErrors
+from database.unit_of_work import UnitOfWork
+from repositories.recurring_schedule_repository import RecurringScheduleRepository
+from repositories.user_repository import UserRepository
+from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
+from repositories.walkway_occupancy_repository import (
+    WalkwayOccupancyRepository,
+    add_interval,
+    window_max
+)
+from repositories.walkway_repository import WalkwayRepository
+from repositories.schedule_interval_index import ScheduleIntervalIndex
+from services.access_rule_engine import get_access_rule_engine
+from services.user_watering_schedule_service import UserWateringScheduleService
+from services.walkway_occupancy_service import WalkwayOccupancyService
+
+DAYS_PER_WEEK = 7
+
+# Reloj del presupuesto de tiempo (inyectable en las pruebas)
+_clock = time.monotonic
+
+
+class Assignment(NamedTuple):
+    """Un turno asignado por el generador."""
+    user_id: int
+    start_at: datetime.datetime
+    end_at: datetime.datetime
+
+
+class TimetableResult(NamedTuple):
+    """
+    Resultado de una generación: los turnos asignados, los usuarios a los que les falta algún turno,
+    los IDs de las programaciones creadas (vacío en modo simulación) y si se agotó el tiempo.
+    """
+    assignments: List[Assignment]
+    unassigned: List[int]
+    created_ids: List[int]
+    timed_out: bool
+
+
+class TimetableService:
+    def __init__(self, db: Session):
+        self.user_repo = UserRepository(db)
+        self.walkway_repo = WalkwayRepository(db)
+        self.user_watering_schedule_repo = UserWateringScheduleRepository(db)
+        self.recurring_schedule_repo = RecurringScheduleRepository(db)
+        self.occupancy_repo = WalkwayOccupancyRepository(db)
+        self.occupancy_service = WalkwayOccupancyService(db)
+        self.db = db
+
+    def generate_weekly_timetable(self, week_start: datetime.date,
+                                  duration: datetime.timedelta = datetime.timedelta(minutes=30),
+                                  sessions_per_user: int = 1,
+                                  user_ids: Optional[List[int]] = None,
+                                  step: datetime.timedelta = datetime.timedelta(minutes=15),
+                                  time_budget_seconds: float = 5.0,
+                                  dry_run: bool = False) -> TimetableResult:
+        """
+        Genera el cuadrante de los siete días desde week_start: `sessions_per_user` turnos de `duration`
+        por usuario activo (o por cada usuario de user_ids) de un andador activo, en días distintos y con inicios múltiplos
+        de `step` dentro de sus ventanas de acceso. Los turnos que el usuario ya tiene esa semana
+        (programaciones u ocurrencias recurrentes) cuentan, así que volver a generar no duplica nada.
+        Si se agota time_budget_seconds, los usuarios pendientes quedan sin asignar.
+        Salvo en dry_run, los turnos se insertan con una sentencia multi-fila en una única transacción.
+        """
+        error = UserWateringScheduleService.get_time_range_error(
+            datetime.datetime.combine(week_start, datetime.time()),
+            datetime.datetime.combine(week_start, datetime.time()) + duration
+        )
+        if error:
+            raise ValueError(error)
+        if sessions_per_user < 1 or sessions_per_user > DAYS_PER_WEEK:
+            raise ValueError(TimetableErrors.INVALID_SESSIONS_PER_USER.format(days_per_week=DAYS_PER_WEEK))
+        if step <= datetime.timedelta(0):
+            raise ValueError(TimetableErrors.INVALID_STEP)
+
+        deadline = _clock() + time_budget_seconds
+        week_days = [week_start + datetime.timedelta(days=offset) for offset in range(DAYS_PER_WEEK)]
+        week_begin = datetime.datetime.combine(week_start, datetime.time())
+        week_end = week_begin + datetime.timedelta(days=DAYS_PER_WEEK)
+
+        # 1. Carga por conjuntos: usuarios, capacidades, reservas y ocupación de la semana
+        if user_ids is None:
+            access_keys = self.user_repo.get_active_access_keys()
+        else:
+            access_keys = self.user_repo.get_access_keys_by_user_ids(user_ids)
+        # Los andadores inactivos no reciben turnos
+        capacities = self.walkway_repo.get_capacities({walkway_id for _, walkway_id in access_keys.values()}, active_only=True)
+        access_keys = {user_id: key for user_id, key in access_keys.items() if key[1] in capacities}
+        if not access_keys:
+            return TimetableResult([], [], [], False)
+
+        rows = self.user_watering_schedule_repo.get_intervals_for_users(access_keys, week_begin, week_end)
+        booked = ScheduleIntervalIndex.from_rows(rows)
+        # Solo cuentan los días de la semana: una reserva del domingo anterior que cruza la
+        # medianoche ocupa su hueco del lunes, pero no es un turno de esta semana
+        week_day_set = set(week_days)
+        booked_days: Dict[int, Set[datetime.date]] = {}
+        for _, user_id, start_at, _ in rows:
+            if start_at.date() in week_day_set:
+                booked_days.setdefault(user_id, set()).add(start_at.date())
+        for occurrence in self.recurring_schedule_repo.iter_occurrences(access_keys, week_begin, week_end):
+            booked.add(occurrence.user_id, occurrence.start_at, occurrence.end_at)
+            if occurrence.start_at.date() in week_day_set:
+                booked_days.setdefault(occurrence.user_id, set()).add(occurrence.start_at.date())
+
+        # 2. Turnos candidatos por (tipo de usuario, andador), en orden cronológico por día
+        rule_engine = get_access_rule_engine(self.db)
+        candidates: Dict[Tuple[int, int], List[List[datetime.datetime]]] = {}
+        for key in set(access_keys.values()):
+            per_day = []
+            for day in week_days:
+                day_begin = datetime.datetime.combine(day, datetime.time())
+                starts = []
+                for allowed_start, allowed_end in rule_engine.get_day_intervals(*key, day.weekday()):
+                    start_at = day_begin + datetime.timedelta(seconds=allowed_start)
+                    # Los inicios se alinean a `step` desde la medianoche
+                    start_at = day_begin + step * -(-(start_at - day_begin) // step)
+                    while start_at + duration <= day_begin + datetime.timedelta(seconds=allowed_end):
+                        starts.append(start_at)
+                        start_at += step
+                per_day.append(starts)
+            candidates[key] = per_day
+
+        if dry_run:
+            occupancy = self.occupancy_service.load_counters(capacities, week_days)
+            assignments, unassigned, timed_out = self._assign_sessions(
+                access_keys, capacities, occupancy, booked, booked_days, candidates,
+                week_days, duration, sessions_per_user, deadline
+            )
+            return TimetableResult(assignments, unassigned, [], timed_out)
+
+        # 3 y 4. Los contadores se leen bloqueados y los turnos se guardan en la misma transacción,
+        # que termina también cuando no hay nada que guardar
+        try:
+            with UnitOfWork(self.db):
+                occupancy = self.occupancy_service.load_counters(capacities, week_days, for_update=True)
+                assignments, unassigned, timed_out = self._assign_sessions(
+                    access_keys, capacities, occupancy, booked, booked_days, candidates,
+                    week_days, duration, sessions_per_user, deadline
+                )
+                created_ids = self.user_watering_schedule_repo.bulk_create([
+                    UserWateringScheduleService.to_schedule_columns({
+                        'user_id': assignment.user_id,
+                        'start_time': assignment.start_at,
+                        'end_time': assignment.end_at,
+                    })
+                    for assignment in assignments
+                ])
+                self.occupancy_repo.apply(
+                    (access_keys[assignment.user_id][1], assignment.start_at, assignment.end_at, 1)
+                    for assignment in assignments
+                )
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="generar", entity_name="cuadrante semanal", detail=str(e)))
+        return TimetableResult(assignments, unassigned, created_ids, timed_out)
+
+    @staticmethod
+    def _assign_sessions(access_keys: Dict[int, Tuple[int, int]], capacities: Dict[int, int],
+                         occupancy: Dict[int, Dict[datetime.date, bytearray]], booked: ScheduleIntervalIndex,
+                         booked_days: Dict[int, Set[datetime.date]],
+                         candidates: Dict[Tuple[int, int], List[List[datetime.datetime]]],
+                         week_days: List[datetime.date], duration: datetime.timedelta,
+                         sessions_per_user: int, deadline: float) -> Tuple[List[Assignment], List[int], bool]:
+        """
+        Voraz en memoria: primero los usuarios con menos inicios posibles y, para cada uno, el primer
+        hueco que cabe. Actualiza occupancy, booked y booked_days con los turnos asignados.
+        :return: (turnos asignados, usuarios a los que les falta algún turno, si se agotó el tiempo).
+        """
+        candidate_counts = {key: sum(map(len, per_day)) for key, per_day in candidates.items()}
+        order = sorted(access_keys, key=lambda user_id: (candidate_counts[access_keys[user_id]], user_id))
+        assignments: List[Assignment] = []
+        unassigned: List[int] = []
+        timed_out = False
+        for position, user_id in enumerate(order):
+            if _clock() > deadline:
+                timed_out = True
+                unassigned.extend(
+                    pending_id for pending_id in order[position:]
+                    if len(booked_days.get(pending_id, ())) < sessions_per_user
+                )
+                break
+
+            walkway_id = access_keys[user_id][1]
+            counters = occupancy[walkway_id]
+            capacity = capacities[walkway_id]
+            used_days = booked_days.setdefault(user_id, set())
+            per_day = candidates[access_keys[user_id]]
+            # Cada usuario empieza a buscar en un día distinto para repartir la carga
+            first_day = position % DAYS_PER_WEEK
+            for offset in range(DAYS_PER_WEEK):
+                if len(used_days) >= sessions_per_user:
+                    break
+                day_index = (first_day + offset) % DAYS_PER_WEEK
+                if week_days[day_index] in used_days:
+                    continue
+                for start_at in per_day[day_index]:
+                    end_at = start_at + duration
+                    if window_max(counters, start_at, end_at) < capacity and not booked.overlaps(user_id, start_at, end_at):
+                        add_interval(counters, start_at, end_at)
+                        booked.add(user_id, start_at, end_at)
+                        used_days.add(week_days[day_index])
+                        assignments.append(Assignment(user_id, start_at, end_at))
+                        break
+            if len(used_days) < sessions_per_user:
+                unassigned.append(user_id)
+        return assignments, sorted(unassigned), timed_out
@@ -1,14 +1,21 @@
 # services/user_service.py
 
+import datetime
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Dict, Iterator, Tuple, Union
 
 # Importamos los repositorios que este servicio necesitará
 from repositories.user_repository import UserRepository
 from repositories.user_type_repository import UserTypeRepository # Necesario para verificar el rol
 from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
 from repositories.watering_event_repository import WateringEventRepository
+from repositories.daily_water_usage_repository import DailyWaterUsageRepository
 from repositories.notification_repository import NotificationRepository
+from repositories.recurring_schedule_repository import RecurringScheduleRepository
+from repositories.walkway_occupancy_repository import WalkwayOccupancyRepository, OccupancyChange
+from repositories.pagination import Page
+from database.unit_of_work import UnitOfWork
+from services.walkway_occupancy_service import WalkwayOccupancyService
 
 # Modelos para tipificación
 from database.models.user import User
@@ -21,6 +28,10 @@ class UserService:
         self.user_watering_schedule_repo = UserWateringScheduleRepository(db)
         self.watering_event_repo = WateringEventRepository(db)
         self.notification_repo = NotificationRepository(db) 
+        self.recurring_schedule_repo = RecurringScheduleRepository(db)
+        self.occupancy_repo = WalkwayOccupancyRepository(db)
+        self.daily_usage_repo = DailyWaterUsageRepository(db)
+        self.occupancy_service = WalkwayOccupancyService(db)
         self.db = db
 
     def create_user(
@@ -81,7 +92,8 @@ class UserService:
         }
         
         try:
-            new_user = self.user_repo.create(user_data)
+            with UnitOfWork(self.db):
+                new_user = self.user_repo.create(user_data)
             return new_user
         except Exception as e:
             self.db.rollback()
@@ -96,8 +108,11 @@ class UserService:
     def get_user_by_email(self, email: str) -> Optional[User]:
         return self.user_repo.get_by_email(email)
 
-    def get_all_users(self, skip: int = 0, limit: int = 100) -> List[User]:
-        return self.user_repo.get_all(skip=skip, limit=limit)
+    def get_all_users(self, cursor: Optional[str] = None, limit: int = 100) -> Page:
+        """
+        Obtiene una página de usuarios. Para pedir la siguiente, se pasa el next_cursor recibido.
+        """
+        return self.user_repo.get_page(cursor=cursor, limit=limit)
 
     def update_user(self, user_id: int, update_data: dict, performing_user_id: int) -> Optional[User]:
         """
@@ -125,17 +140,38 @@ class UserService:
             if new_user_type and new_user_type.name != "Admin":
                 raise PermissionError("Un administrador no puede degradar su propio rol.")
 
+        # Al cambiar de andador, las reservas pendientes del usuario pasan del andador anterior al nuevo:
+        # las programaciones concretas se trasladan en los contadores guardados y las ocurrencias
+        # recurrentes, que se suman al leer, siguen al usuario sin más
+        new_walkway_id = update_data.get('walkway_id', user_to_update.walkway_id)
+        moving = new_walkway_id != user_to_update.walkway_id
+
         try:
-            updated_user = self.user_repo.update(user_id, update_data)
+            with UnitOfWork(self.db):
+                if moving:
+                    moved_intervals = self._get_future_intervals(user_id)
+                    # Las reservas trasladadas deben caber en el andador nuevo, como cualquier admisión
+                    booked = sorted(moved_intervals + list(self._iter_future_occurrences(user_id)))
+                    over_capacity = self.occupancy_service.first_over_capacity(new_walkway_id, booked)
+                    if over_capacity:
+                        start_at, _ = booked[over_capacity[0]]
+                        raise ValueError(f"No se puede cambiar de andador: la reserva del {start_at} supera el máximo de "
+                                         f"{over_capacity[1]} riegos simultáneos del andador con ID {new_walkway_id}.")
+                    self.occupancy_repo.apply(self._get_move_changes(user_to_update.walkway_id, new_walkway_id, moved_intervals))
+                updated_user = self.user_repo.update(user_id, update_data)
             return updated_user
+        except ValueError:
+            raise
         except Exception as e:
             self.db.rollback()
             raise RuntimeError(f"Error al actualizar el usuario: {e}")
 
-    def delete_user(self, user_id: int, performing_user_id: int) -> bool:
+    def delete_user(self, user_id: int, performing_user_id: int) -> Union[Dict[str, int], bool]:
         """
-        Elimina un usuario.
+        Elimina un usuario y todas sus dependencias en una única transacción.
         Solo permitido para administradores. Un administrador no puede eliminarse a sí mismo.
+        Devuelve el número de filas eliminadas por tabla (en el orden de borrado),
+        o False si el usuario no existe.
         """
         user_to_delete = self.user_repo.get_by_id(user_id)
         if not user_to_delete:
@@ -154,29 +190,79 @@ class UserService:
         # Lógica de negocio para manejar las relaciones (cascada, reasignación, etc.)
         # Antes de eliminar el usuario, hay que manejar sus dependencias (UserWateringSchedule, WateringEvent, Notification)
         # Esto es crucial para la integridad de los datos.
-        
-        # 1. Eliminar o reasignar UserWateringSchedules asociados
-        user_schedules = self.user_watering_schedule_repo.get_schedules_by_user_id(user_id)
-        for schedule in user_schedules:
-            self.user_watering_schedule_repo.delete(schedule.id)
-            
-        # 2. Eliminar WateringEvents asociados
-        user_events = self.watering_event_repo.get_events_by_user_id(user_id)
-        for event in user_events:
-            self.watering_event_repo.delete(event.id)
-
-        # 3. Eliminar Notificaciones asociadas
-        user_notifications = self.notification_repo.get_notifications_for_user(user_id)
-        for notification in user_notifications:
-            self.notification_repo.delete(notification.id)
-
+        # Se emite un único DELETE por tabla, en el orden que imponen las claves foráneas,
+        # todo dentro de un UnitOfWork: un solo commit al final.
         try:
-            is_deleted = self.user_repo.delete(user_id)
-            return is_deleted
+            with UnitOfWork(self.db):
+                # Liberar en la ocupación del andador lo que el usuario tenía reservado
+                self.occupancy_repo.apply(self._get_release_changes(user_to_delete))
+                deleted_counts = {}
+                # 1. WateringEvents (referencian al usuario y a sus programaciones)
+                deleted_counts["watering_events"] = self.watering_event_repo.delete_for_user(user_id)
+                # 2. Totales diarios de riego del usuario
+                deleted_counts["daily_water_usage"] = self.daily_usage_repo.delete_for_user(user_id)
+                # 3. UserWateringSchedules
+                deleted_counts["user_watering_schedules"] = self.user_watering_schedule_repo.bulk_delete({"user_id": user_id})
+                # 4. Plantillas recurrentes y sus excepciones (las ocurrencias materializadas ya se borraron en 3)
+                (deleted_counts["recurring_schedule_exceptions"],
+                 deleted_counts["recurring_watering_schedules"]) = self.recurring_schedule_repo.delete_for_user(user_id)
+                # 5. Notificaciones
+                deleted_counts["notifications"] = self.notification_repo.bulk_delete({"user_id": user_id})
+                # 6. El propio usuario
+                deleted_counts["users"] = self.user_repo.bulk_delete({"id": user_id})
+            return deleted_counts
         except Exception as e:
             self.db.rollback()
             raise RuntimeError(f"Error al eliminar el usuario: {e}")
 
+    def _get_release_changes(self, user: User) -> List[OccupancyChange]:
+        """
+        Método auxiliar: cambios de ocupación que liberan en el andador del usuario
+        sus programaciones desde hoy (ver _get_future_intervals).
+        """
+        return [(user.walkway_id, start_at, end_at, -1) for start_at, end_at in self._get_future_intervals(user.id)]
+
+    @staticmethod
+    def _get_move_changes(old_walkway_id: int, new_walkway_id: int,
+                          intervals: List[Tuple[datetime.datetime, datetime.datetime]]) -> List[OccupancyChange]:
+        """
+        Método auxiliar: cambios de ocupación que trasladan las programaciones del usuario desde hoy
+        (ver _get_future_intervals) de su andador actual al nuevo (-1 en el anterior y +1 en el nuevo, por intervalo).
+        """
+        changes = []
+        for start_at, end_at in intervals:
+            changes.append((old_walkway_id, start_at, end_at, -1))
+            changes.append((new_walkway_id, start_at, end_at, 1))
+        return changes
+
+    def _get_future_intervals(self, user_id: int) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Método auxiliar: intervalos (start_at, end_at) de las programaciones concretas del usuario que
+        terminan a partir de hoy, las que cuentan los contadores guardados de su andador.
+        Los días pasados no se cargan: su ocupación ya no interviene en ninguna reserva.
+        """
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        return [
+            (start_at, end_at)
+            for _, _, start_at, end_at in self.user_watering_schedule_repo.get_intervals_for_users([user_id], start, None)
+        ]
+
+    def _iter_future_occurrences(self, user_id: int) -> Iterator[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Método auxiliar: generador de los intervalos (start_at, end_at), en orden, de las ocurrencias
+        pendientes de las plantillas recurrentes del usuario que terminan a partir de hoy.
+        """
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        templates = self.recurring_schedule_repo.get_active_for_users([user_id], start.date(), None)
+        if not templates:
+            return
+        # Las ocurrencias pendientes terminan como muy tarde el día siguiente al fin de vigencia
+        end = datetime.datetime.combine(
+            max(template.valid_until for template in templates) + datetime.timedelta(days=1), datetime.time()
+        )
+        for occurrence in self.recurring_schedule_repo.iter_occurrences([user_id], start, end):
+            yield occurrence.start_at, occurrence.end_at
+
     def _get_user_type_name(self, user_id: int) -> Optional[str]:
         """
         Método auxiliar para obtener el nombre del tipo de usuario (rol) dado un user_id.
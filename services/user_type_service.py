@@ -6,6 +6,7 @@ from typing import List, Optional
 
 from repositories.user_type_repository import UserTypeRepository
 from database.models.user_type import UserType
+from database.unit_of_work import UnitOfWork
 from Core.exceptions import NotFoundError, IntegrityConstraintError, OperationFailedError, EmptyValueError
 from Core.error_messages import UserTypeErrors, GeneralErrors
 
@@ -30,7 +31,8 @@ class UserTypeService:
 
 
         try:
-            return self.user_type_repo.create({"name": name})
+            with UnitOfWork(self.db):
+                return self.user_type_repo.create({"name": name})
         except IntegrityError as e:
             self.db.rollback()
             raise IntegrityConstraintError(
@@ -56,7 +58,8 @@ class UserTypeService:
 
 
         try:
-            return self.user_type_repo.update(user_type_id, {"name": name})
+            with UnitOfWork(self.db):
+                return self.user_type_repo.update(user_type_id, {"name": name})
         except IntegrityError as e:
             self.db.rollback()
             raise IntegrityConstraintError(
@@ -78,7 +81,8 @@ class UserTypeService:
             raise NotFoundError(entity_name="Tipo de usuario", entity_id=user_type_id)
         
         try:
-            return self.user_type_repo.delete(user_type_id)
+            with UnitOfWork(self.db):
+                return self.user_type_repo.delete(user_type_id)
         except IntegrityError as e:
             self.db.rollback()
             raise IntegrityConstraintError(
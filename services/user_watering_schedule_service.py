@@ -1,8 +1,11 @@
 # services/user_watering_schedule_service.py
 
+from __future__ import annotations
+
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Iterable, Tuple
 import datetime
+import heapq
 
 from Core.error_messages import (
     UserErrors,
@@ -14,20 +17,71 @@ from Core.error_messages import (
 from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
 from repositories.user_repository import UserRepository
 from repositories.access_schedule_rule_repository import AccessScheduleRuleRepository
+from repositories.recurring_schedule_repository import RecurringScheduleRepository
+from repositories.walkway_occupancy_repository import (
+    WalkwayOccupancyRepository,
+    add_interval,
+    interval_days,
+    occupied_runs,
+    window_max
+)
 from repositories.walkway_repository import WalkwayRepository
+from repositories.schedule_interval_index import day_windows
+from repositories.pagination import Page
+from database.unit_of_work import UnitOfWork
+from services.access_rule_engine import get_access_rule_engine
+from services.walkway_occupancy_service import WalkwayOccupancyService
+
+
+Interval = Tuple[datetime.datetime, datetime.datetime]
+
+
+def _free_windows(allowed: Iterable[Interval], busy: Iterable[Interval],
+                  min_length: datetime.timedelta) -> List[Interval]:
+    """
+    Barrido único sobre dos flujos ordenados por inicio: los intervalos permitidos (sin solapes)
+    y los ocupados (pueden solaparse). Devuelve los tramos maximales permitidos y libres que
+    duran al menos min_length.
+    """
+    windows = []
+    busy = iter(busy)
+    pending = next(busy, None)
+    busy_until = None
+    for allowed_start, allowed_end in allowed:
+        free_from = allowed_start if busy_until is None else max(allowed_start, busy_until)
+        while pending is not None and pending[0] < allowed_end:
+            busy_start, busy_end = pending
+            if busy_start > free_from and busy_start - free_from >= min_length:
+                windows.append((free_from, busy_start))
+            free_from = max(free_from, busy_end)
+            busy_until = busy_end if busy_until is None else max(busy_until, busy_end)
+            pending = next(busy, None)
+        if allowed_end > free_from and allowed_end - free_from >= min_length:
+            windows.append((free_from, allowed_end))
+    return windows
 
 
 class UserWateringScheduleService:
+    # Duración máxima de una programación
+    MAX_DURATION_MINUTES = 120
+
     def __init__(self, db: Session):
         self.user_watering_schedule_repo = UserWateringScheduleRepository(db)
         self.user_repo = UserRepository(db)
         self.access_rule_repo = AccessScheduleRuleRepository(db)
+        self.recurring_schedule_repo = RecurringScheduleRepository(db)
+        self.occupancy_repo = WalkwayOccupancyRepository(db)
         self.walkway_repo = WalkwayRepository(db)
+        self.occupancy_service = WalkwayOccupancyService(db)
         self.db = db
 
     def create_schedule(self, schedule_data: dict) -> Optional[UserWateringScheduleRepository.model]:
+        """
+        Crea una programación. schedule_data contiene 'user_id' y 'start_time'/'end_time' como datetime;
+        'access_schedule_rule_id' es opcional y, si se indica, debe existir.
+        """
         user_id = schedule_data['user_id']
-        access_rule_id = schedule_data['access_schedule_rule_id']
+        access_rule_id = schedule_data.get('access_schedule_rule_id')
         start_time = schedule_data['start_time']
         end_time = schedule_data['end_time']
 
@@ -35,51 +89,157 @@ class UserWateringScheduleService:
         if not user:
             raise ValueError(UserErrors.NOT_FOUND.format(user_id=user_id))
 
-        access_rule = self.access_rule_repo.get_by_id(access_rule_id)
-        if not access_rule:
-            raise ValueError(AccessScheduleRuleErrors.RULE_NOT_FOUND.format(rule_id=access_rule_id))
-
-        if start_time >= end_time:
-            raise ValueError(AccessScheduleRuleErrors.INVALID_TIME_RANGE.format(start_time=start_time.time(), end_time=end_time.time()))
+        if access_rule_id is not None:
+            access_rule = self.access_rule_repo.get_by_id(access_rule_id)
+            if not access_rule:
+                raise ValueError(AccessScheduleRuleErrors.RULE_NOT_FOUND.format(rule_id=access_rule_id))
 
-        max_duration_minutes = 120
-        if (end_time - start_time).total_seconds() / 60 > max_duration_minutes:
-            raise ValueError(UserWateringScheduleErrors.MAX_DURATION_EXCEEDED.format(max_duration_minutes=max_duration_minutes))
+        error = self.get_time_range_error(start_time, end_time)
+        if error:
+            raise ValueError(error)
 
         overlapping_schedules = self.user_watering_schedule_repo.get_overlapping_schedules(
             user_id=user_id,
             start_time=start_time,
             end_time=end_time
         )
-        if overlapping_schedules:
+        if overlapping_schedules or self._overlaps_recurring(user_id, start_time, end_time):
             raise ValueError(UserWateringScheduleErrors.OVERLAPPING_SCHEDULE)
-        
-        proposed_day_of_week = start_time.weekday()
-
-        user_type_access_rules = self.access_rule_repo.get_by_user_type_and_day(
-            user_type_id=user.user_type_id,
-            day_of_week=proposed_day_of_week
-        )
 
-        is_allowed = False
-        for rule in user_type_access_rules:
-            proposed_start_time_only = start_time.time()
-            proposed_end_time_only = end_time.time()
-
-            if rule.start_time <= proposed_start_time_only and rule.end_time >= proposed_end_time_only:
-                is_allowed = True
-                break
-        
-        if not is_allowed:
+        # Búsqueda binaria sobre las reglas compiladas del tipo de usuario en su andador
+        if not get_access_rule_engine(self.db).is_allowed(user.user_type_id, user.walkway_id, start_time, end_time):
             raise ValueError(UserWateringScheduleErrors.SCHEDULE_RULE_MISMATCH)
 
         try:
-            new_schedule = self.user_watering_schedule_repo.create(schedule_data)
+            with UnitOfWork(self.db):
+                # Los contadores quedan bloqueados desde la comprobación de capacidad hasta el apply
+                over_capacity = self.occupancy_service.first_over_capacity(user.walkway_id, [(start_time, end_time)])
+                if over_capacity:
+                    raise ValueError(UserWateringScheduleErrors.WALKWAY_CAPACITY_EXCEEDED.format(max_concurrent_schedules=over_capacity[1]))
+                new_schedule = self.user_watering_schedule_repo.create(self.to_schedule_columns(schedule_data))
+                self.occupancy_repo.apply([(user.walkway_id, new_schedule.start_at, new_schedule.end_at, 1)])
             return new_schedule
+        except ValueError:
+            raise
         except Exception as e:
             self.db.rollback()
             raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="crear", entity_name="programación de riego", detail=str(e)))
 
+    def create_schedules(self, batch: List[dict]) -> dict:
+        """
+        Crea un lote de programaciones (mismo formato que create_schedule) con un número
+        constante de consultas: usuarios, reglas de acceso y programaciones existentes se
+        cargan por conjuntos, las superposiciones (con la base de datos y dentro del propio
+        lote) se comprueban en memoria y las filas válidas se insertan en una sola sentencia.
+        A diferencia de create_schedule, los elementos inválidos no detienen el lote.
+        :return: {"created": {índice: id}, "errors": {índice: mensaje}}.
+        """
+        if not batch:
+            return {"created": {}, "errors": {}}
+
+        errors = {}
+        # 1. Validaciones que no necesitan la base de datos
+        candidates = []
+        for index, schedule_data in enumerate(batch):
+            error = self.get_time_range_error(schedule_data['start_time'], schedule_data['end_time'])
+            if error:
+                errors[index] = error
+            else:
+                candidates.append((index, schedule_data))
+
+        # 2. Búsquedas por conjuntos
+        access_keys = self.user_repo.get_access_keys_by_user_ids({data['user_id'] for _, data in candidates})
+        rule_ids = {data['access_schedule_rule_id'] for _, data in candidates
+                    if data.get('access_schedule_rule_id') is not None}
+        existing_rule_ids = self.access_rule_repo.get_existing_ids(rule_ids)
+        # Solo los días que toca el lote (y no todo el rango entre el primero y el último)
+        batch_days = interval_days((data['start_time'], data['end_time']) for _, data in candidates)
+        windows = day_windows(batch_days)
+        booked = self.user_watering_schedule_repo.load_interval_index_in_windows(access_keys, windows)
+        # Las ocurrencias de las plantillas recurrentes ocupan su hueco sin estar guardadas
+        for occurrence in self.recurring_schedule_repo.iter_occurrences_in_windows(access_keys, windows):
+            booked.add(occurrence.user_id, occurrence.start_at, occurrence.end_at)
+        rule_engine = get_access_rule_engine(self.db)
+        # Ocupación de los andadores en memoria, para respetar su capacidad dentro del lote
+        capacities = self.walkway_repo.get_capacities({walkway_id for _, walkway_id in access_keys.values()})
+        occupancy = self.occupancy_service.load_counters(capacities, batch_days, for_update=True) if capacities else {}
+
+        # 3. Validación en memoria, en orden: cada programación aceptada ocupa su hueco
+        # para las siguientes del lote
+        rows = []
+        row_indexes = []
+        occupancy_changes = []
+        for index, schedule_data in candidates:
+            user_id = schedule_data['user_id']
+            access_rule_id = schedule_data.get('access_schedule_rule_id')
+            start_time = schedule_data['start_time']
+            end_time = schedule_data['end_time']
+
+            if user_id not in access_keys:
+                errors[index] = UserErrors.NOT_FOUND.format(user_id=user_id)
+            elif access_rule_id is not None and access_rule_id not in existing_rule_ids:
+                errors[index] = AccessScheduleRuleErrors.RULE_NOT_FOUND.format(rule_id=access_rule_id)
+            elif booked.overlaps(user_id, start_time, end_time):
+                errors[index] = UserWateringScheduleErrors.OVERLAPPING_SCHEDULE
+            elif not rule_engine.is_allowed(*access_keys[user_id], start_time, end_time):
+                errors[index] = UserWateringScheduleErrors.SCHEDULE_RULE_MISMATCH
+            elif window_max(occupancy[access_keys[user_id][1]], start_time, end_time) >= capacities[access_keys[user_id][1]]:
+                errors[index] = UserWateringScheduleErrors.WALKWAY_CAPACITY_EXCEEDED.format(
+                    max_concurrent_schedules=capacities[access_keys[user_id][1]]
+                )
+            else:
+                booked.add(user_id, start_time, end_time)
+                add_interval(occupancy[access_keys[user_id][1]], start_time, end_time)
+                occupancy_changes.append((access_keys[user_id][1], start_time, end_time, 1))
+                rows.append(self.to_schedule_columns(schedule_data))
+                row_indexes.append(index)
+
+        # 4. Inserción multi-fila en una única transacción
+        try:
+            with UnitOfWork(self.db):
+                ids = self.user_watering_schedule_repo.bulk_create(rows)
+                self.occupancy_repo.apply(occupancy_changes)
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="crear", entity_name="programación de riego", detail=str(e)))
+
+        return {"created": dict(zip(row_indexes, ids)), "errors": dict(sorted(errors.items()))}
+
+    def _overlaps_recurring(self, user_id: int, start_time: datetime.datetime, end_time: datetime.datetime) -> bool:
+        """
+        Indica si alguna ocurrencia pendiente de las plantillas recurrentes del usuario se superpone
+        con el rango. Las ocurrencias se expanden solo para ese rango y no se guardan.
+        """
+        return any(self.recurring_schedule_repo.iter_occurrences([user_id], start_time, end_time))
+
+    @classmethod
+    def get_time_range_error(cls, start_time: datetime.datetime, end_time: datetime.datetime) -> Optional[str]:
+        """
+        Valida el rango horario de una programación (también lo usan las plantillas recurrentes
+        y el cuadrante semanal). Devuelve el mensaje de error, o None si el rango es correcto.
+        """
+        if start_time >= end_time:
+            return AccessScheduleRuleErrors.INVALID_TIME_RANGE.format(start_time=start_time.time(), end_time=end_time.time())
+        if (end_time - start_time).total_seconds() / 60 > cls.MAX_DURATION_MINUTES:
+            return UserWateringScheduleErrors.MAX_DURATION_EXCEEDED.format(max_duration_minutes=cls.MAX_DURATION_MINUTES)
+        return None
+
+    @staticmethod
+    def to_schedule_columns(data: dict) -> dict:
+        """
+        Traduce los datetime 'start_time'/'end_time' de la capa de servicio a las columnas
+        del modelo (scheduled_date, start_time, end_time) y descarta claves que no son columnas.
+        Sirve a cualquier servicio que cree programaciones a partir de datetime.
+        """
+        columns = {key: value for key, value in data.items() if key != 'access_schedule_rule_id'}
+        if isinstance(columns.get('start_time'), datetime.datetime):
+            start_time = columns['start_time']
+            columns['scheduled_date'] = start_time.date()
+            columns['start_time'] = start_time.time()
+        if isinstance(columns.get('end_time'), datetime.datetime):
+            columns['end_time'] = columns['end_time'].time()
+        return columns
+
     def get_schedule_by_id(self, schedule_id: int) -> Optional[UserWateringScheduleRepository.model]:
         return self.user_watering_schedule_repo.get_by_id(schedule_id)
 
@@ -91,43 +251,30 @@ class UserWateringScheduleService:
         if not schedule:
             raise ValueError(UserWateringScheduleErrors.NOT_FOUND.format(schedule_id=schedule_id))
 
+        user = self.user_repo.get_by_id(schedule.user_id)
+
         if 'start_time' in update_data and 'end_time' in update_data:
             if update_data['start_time'] >= update_data['end_time']:
                 raise ValueError(AccessScheduleRuleErrors.INVALID_TIME_RANGE.format(start_time=update_data['start_time'].time(), end_time=update_data['end_time'].time()))
 
-            user = self.user_repo.get_by_id(schedule.user_id)
-            
             overlapping_schedules = self.user_watering_schedule_repo.get_overlapping_schedules(
                 user_id=schedule.user_id,
                 start_time=update_data['start_time'],
                 end_time=update_data['end_time'],
                 exclude_schedule_id=schedule_id
             )
-            if overlapping_schedules:
+            if overlapping_schedules or self._overlaps_recurring(schedule.user_id, update_data['start_time'], update_data['end_time']):
                 raise ValueError(UserWateringScheduleErrors.UPDATE_OVERLAPPING_SCHEDULE)
 
-            if 'access_schedule_rule_id' in update_data:
-                 new_access_rule_id = update_data['access_schedule_rule_id']
-            else:
-                 new_access_rule_id = schedule.access_schedule_rule_id
-                 
-            access_rule = self.access_rule_repo.get_by_id(new_access_rule_id)
-            if not access_rule:
-                raise ValueError(AccessScheduleRuleErrors.RULE_NOT_FOUND.format(rule_id=new_access_rule_id))
+            if update_data.get('access_schedule_rule_id') is not None:
+                new_access_rule_id = update_data['access_schedule_rule_id']
+                access_rule = self.access_rule_repo.get_by_id(new_access_rule_id)
+                if not access_rule:
+                    raise ValueError(AccessScheduleRuleErrors.RULE_NOT_FOUND.format(rule_id=new_access_rule_id))
 
-            proposed_day_of_week = update_data['start_time'].weekday()
-            user_type_access_rules = self.access_rule_repo.get_by_user_type_and_day(
-                user_type_id=user.user_type_id,
-                day_of_week=proposed_day_of_week
-            )
-            is_allowed = False
-            for rule in user_type_access_rules:
-                proposed_start_time_only = update_data['start_time'].time()
-                proposed_end_time_only = update_data['end_time'].time()
-                if rule.start_time <= proposed_start_time_only and rule.end_time >= proposed_end_time_only:
-                    is_allowed = True
-                    break
-            if not is_allowed:
+            if not get_access_rule_engine(self.db).is_allowed(
+                user.user_type_id, user.walkway_id, update_data['start_time'], update_data['end_time']
+            ):
                 raise ValueError(UserWateringScheduleErrors.UPDATE_SCHEDULE_RULE_MISMATCH)
 
         for key in ['id', 'user_id', 'created_at']:
@@ -136,22 +283,94 @@ class UserWateringScheduleService:
         if not update_data:
             return schedule
 
+        old_start_at, old_end_at = schedule.start_at, schedule.end_at
         try:
-            updated_schedule = self.user_watering_schedule_repo.update(schedule_id, update_data)
+            with UnitOfWork(self.db):
+                if 'start_time' in update_data and 'end_time' in update_data:
+                    # Los contadores quedan bloqueados desde la comprobación de capacidad hasta el apply
+                    over_capacity = self.occupancy_service.first_over_capacity(
+                        user.walkway_id, [(update_data['start_time'], update_data['end_time'])],
+                        released=[(old_start_at, old_end_at)]
+                    )
+                    if over_capacity:
+                        raise ValueError(UserWateringScheduleErrors.WALKWAY_CAPACITY_EXCEEDED.format(max_concurrent_schedules=over_capacity[1]))
+                updated_schedule = self.user_watering_schedule_repo.update(schedule_id, self.to_schedule_columns(update_data))
+                if (updated_schedule.start_at, updated_schedule.end_at) != (old_start_at, old_end_at):
+                    self.occupancy_repo.apply([
+                        (user.walkway_id, old_start_at, old_end_at, -1),
+                        (user.walkway_id, updated_schedule.start_at, updated_schedule.end_at, 1),
+                    ])
             return updated_schedule
+        except ValueError:
+            raise
         except Exception as e:
             self.db.rollback()
             raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="actualizar", entity_name="programación de riego", detail=str(e)))
 
     def delete_schedule(self, schedule_id: int) -> bool:
+        schedule = self.user_watering_schedule_repo.get_by_id(schedule_id)
+        if not schedule:
+            return False
+        user = self.user_repo.get_by_id(schedule.user_id)
+        start_at, end_at = schedule.start_at, schedule.end_at
+
         try:
-            return self.user_watering_schedule_repo.delete(schedule_id)
+            with UnitOfWork(self.db):
+                is_deleted = self.user_watering_schedule_repo.delete(schedule_id)
+                if is_deleted:
+                    self.occupancy_repo.apply([(user.walkway_id, start_at, end_at, -1)])
+                return is_deleted
         except Exception as e:
             self.db.rollback()
             raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="eliminar", entity_name="programación de riego", detail=str(e)))
 
-    def get_all_schedules(self, skip: int = 0, limit: int = 100) -> List[UserWateringScheduleRepository.model]:
-        return self.user_watering_schedule_repo.get_all(skip=skip, limit=limit)
+    def get_all_schedules(self, cursor: Optional[str] = None, limit: int = 100) -> Page:
+        """
+        Obtiene una página de programaciones. Para pedir la siguiente, se pasa el next_cursor recibido.
+        """
+        return self.user_watering_schedule_repo.get_page(cursor=cursor, limit=limit)
 
     def get_schedules_for_walkway_on_date(self, walkway_id: int, date: datetime.date) -> List[UserWateringScheduleRepository.model]:
-        return self.user_watering_schedule_repo.get_schedules_for_walkway_on_date(walkway_id, date)
\ No newline at end of file
+        return self.user_watering_schedule_repo.get_schedules_for_walkway_on_date(walkway_id, date)
+
+    def find_free_slots(self, user_id: int, date: datetime.date, duration: datetime.timedelta) -> List[Interval]:
+        """
+        Devuelve los tramos (inicio, fin) del día en los que el usuario puede programar un riego de
+        la duración indicada: los intervalos de sus reglas de acceso menos lo ya reservado por el
+        propio usuario (programaciones y ocurrencias recurrentes pendientes) y los minutos en que su
+        andador ya está a plena capacidad.
+        Cada tramo es maximal; cualquier inicio entre el del tramo y su fin menos la duración es válido.
+        """
+        user = self.user_repo.get_by_id(user_id)
+        if not user:
+            raise ValueError(UserErrors.NOT_FOUND.format(user_id=user_id))
+
+        day_start = datetime.datetime.combine(date, datetime.time())
+        day_end = day_start + datetime.timedelta(days=1)
+        error = self.get_time_range_error(day_start, day_start + duration)
+        if error:
+            raise ValueError(error)
+
+        allowed = [
+            (day_start + datetime.timedelta(seconds=start), day_start + datetime.timedelta(seconds=end))
+            for start, end in get_access_rule_engine(self.db).get_day_intervals(user.user_type_id, user.walkway_id, date.weekday())
+        ]
+        if not allowed:
+            return []
+
+        own = sorted(
+            (start_at, end_at) for _, _, start_at, end_at
+            in self.user_watering_schedule_repo.get_intervals_for_users([user_id], day_start, day_end)
+        )
+        recurring = (
+            (occurrence.start_at, occurrence.end_at)
+            for occurrence in self.recurring_schedule_repo.iter_occurrences([user_id], day_start, day_end)
+        )
+        # El andador está ocupado donde ya alcanza su máximo de riegos simultáneos
+        capacity = self.walkway_repo.get_capacities([user.walkway_id]).get(user.walkway_id, 1)
+        walkway = (
+            (day_start + datetime.timedelta(minutes=first_minute), day_start + datetime.timedelta(minutes=last_minute))
+            for first_minute, last_minute
+            in occupied_runs(self.occupancy_service.get_day_counters(user.walkway_id, date), threshold=capacity)
+        )
+        return _free_windows(allowed, heapq.merge(own, recurring, walkway), duration)
@@ -0,0 +1,212 @@
+# services/walkway_occupancy_service.py
+
+from __future__ import annotations
+
+import datetime
+import itertools
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from Core.error_messages import GeneralErrors
+from database.unit_of_work import UnitOfWork
+from repositories.recurring_schedule_repository import RecurringScheduleRepository
+from repositories.schedule_interval_index import day_windows
+from repositories.user_repository import UserRepository
+from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
+from repositories.walkway_occupancy_repository import (
+    WalkwayOccupancyRepository,
+    add_interval,
+    build_counters,
+    interval_days,
+    window_max
+)
+from repositories.walkway_repository import WalkwayRepository
+
+Interval = Tuple[datetime.datetime, datetime.datetime]
+
+# Intervalos que first_over_capacity comprueba con cada lectura de ocupación (un año de ocurrencias diarias)
+_CAPACITY_CHECK_CHUNK = 366
+
+
+class OverCapacityWindow(NamedTuple):
+    """Tramo maximal en el que un andador tiene más riegos simultáneos de los que admite."""
+    walkway_id: int
+    start_at: datetime.datetime
+    end_at: datetime.datetime
+    peak: int
+    max_concurrent_schedules: int
+
+
+def _over_capacity_windows(events: Iterable[Tuple[int, datetime.datetime, int]],
+                           capacities: Dict[int, int]) -> List[OverCapacityWindow]:
+    """
+    Barrido único sobre eventos (walkway_id, instante, +1/-1) ordenados por andador e instante,
+    con las liberaciones antes que las reservas en el mismo instante (los intervalos contiguos
+    no coinciden). Lleva un contador de riegos activos por andador y abre un tramo cuando supera
+    la capacidad y lo cierra cuando vuelve a caber. Los andadores sin capacidad conocida admiten uno.
+    """
+    windows = []
+    current_walkway = None
+    active = 0
+    window_start = None
+    peak = 0
+    for walkway_id, instant, delta in events:
+        if walkway_id != current_walkway:
+            current_walkway, active, window_start = walkway_id, 0, None
+        capacity = capacities.get(walkway_id, 1)
+        active += delta
+        if active > capacity:
+            if window_start is None:
+                window_start, peak = instant, active
+                # Un tramo que se cierra y se reabre en el mismo instante es el mismo tramo
+                if windows and windows[-1].walkway_id == walkway_id and windows[-1].end_at == instant:
+                    window_start, peak = windows[-1].start_at, windows.pop().peak
+            peak = max(peak, active)
+        elif window_start is not None:
+            windows.append(OverCapacityWindow(walkway_id, window_start, instant, peak, capacity))
+            window_start = None
+    return windows
+
+
+class WalkwayOccupancyService:
+    """
+    Consultas de disponibilidad de los andadores sobre la ocupación precalculada por minuto.
+    Los contadores guardados solo cuentan programaciones concretas; las ocurrencias pendientes de las
+    plantillas recurrentes se suman al leer, expandidas solo para los días consultados.
+    """
+
+    def __init__(self, db: Session):
+        self.occupancy_repo = WalkwayOccupancyRepository(db)
+        self.user_watering_schedule_repo = UserWateringScheduleRepository(db)
+        self.recurring_schedule_repo = RecurringScheduleRepository(db)
+        self.user_repo = UserRepository(db)
+        self.walkway_repo = WalkwayRepository(db)
+        self.db = db
+
+    def is_walkway_free(self, walkway_id: int, start_at: datetime.datetime, end_at: datetime.datetime,
+                        capacity: Optional[int] = None) -> bool:
+        """
+        Indica si el andador admite un riego más en todo [start_at, end_at) sin superar `capacity`
+        riegos simultáneos (por defecto, el máximo configurado en el andador).
+        """
+        if capacity is None:
+            capacity = self.walkway_repo.get_capacities([walkway_id]).get(walkway_id, 1)
+        return self.get_max_concurrency(walkway_id, start_at, end_at) < capacity
+
+    def get_max_concurrency(self, walkway_id: int, start_at: datetime.datetime, end_at: datetime.datetime) -> int:
+        """
+        Obtiene el mayor número de riegos simultáneos del andador en [start_at, end_at).
+        """
+        counters = self.load_counters([walkway_id], interval_days([(start_at, end_at)]))[walkway_id]
+        return window_max(counters, start_at, end_at)
+
+    def get_day_counters(self, walkway_id: int, day: datetime.date) -> bytes:
+        """
+        Obtiene los 1440 contadores (uno por minuto) del andador en un día.
+        """
+        return bytes(self.load_counters([walkway_id], [day])[walkway_id][day])
+
+    def load_counters(self, walkway_ids: Iterable[int], dates: Iterable[datetime.date],
+                      for_update: bool = False) -> Dict[int, Dict[datetime.date, bytearray]]:
+        """
+        Carga copias modificables de la ocupación de varios andadores en varios días: los contadores
+        guardados más las ocurrencias pendientes de las plantillas de sus usuarios en esos días.
+        Usa un número fijo de consultas, sea cual sea el número de andadores y de días.
+        Con for_update, bloquea además las filas de los andadores: la creación de una plantilla no escribe
+        contadores, así que es ese bloqueo el que serializa las admisiones concurrentes en un andador.
+        """
+        walkway_ids, dates = set(walkway_ids), set(dates)
+        if for_update and walkway_ids:
+            self.walkway_repo.get_capacities(walkway_ids, for_update=True)
+        counters = self.occupancy_repo.load_counters(walkway_ids, dates, for_update=for_update)
+        if not walkway_ids or not dates:
+            return counters
+        user_walkways = self.user_repo.get_walkway_ids_by_walkways(walkway_ids)
+        for occurrence in self.recurring_schedule_repo.iter_occurrences_in_windows(user_walkways, day_windows(dates)):
+            add_interval(counters[user_walkways[occurrence.user_id]], occurrence.start_at, occurrence.end_at)
+        # add_interval crea los días vecinos que toca una ocurrencia que cruza la medianoche;
+        # sin sus contadores guardados estarían incompletos
+        for walkway_counters in counters.values():
+            for day in set(walkway_counters) - dates:
+                del walkway_counters[day]
+        return counters
+
+    def first_over_capacity(self, walkway_id: int, intervals: Iterable[Interval],
+                            released: Iterable[Interval] = ()) -> Optional[Tuple[int, int]]:
+        """
+        Comprueba si el andador admite los intervalos como riegos nuevos, uno tras otro (cada intervalo
+        admitido ocupa su hueco para los siguientes). `intervals` puede ser un generador: se consume por
+        lotes de _CAPACITY_CHECK_CHUNK, con una lectura de ocupación por lote, sin expandirlo entero.
+        `released` son intervalos que se liberan a la vez, por ejemplo el horario anterior al modificar.
+        El andador y sus contadores se leen bloqueados: debe llamarse dentro del UnitOfWork que guarda la
+        reserva, para que ninguna otra admisión concurrente los cambie entre la comprobación y la escritura
+        y para que los bloqueos se liberen al cerrarse ese ámbito, se admita o no la reserva.
+        :return: (posición del primer intervalo que no cabe, capacidad del andador), o None si caben todos.
+        """
+        released = list(released)
+        capacity = self.walkway_repo.get_capacities([walkway_id], for_update=True).get(walkway_id)
+        if capacity is None:
+            return None
+        intervals = iter(intervals)
+        position = 0
+        admitted: List[Interval] = []
+        while True:
+            chunk = list(itertools.islice(intervals, _CAPACITY_CHECK_CHUNK))
+            if not chunk:
+                return None
+            # De los lotes anteriores solo importan los admitidos que llegan hasta este
+            chunk_start = min(start_at for start_at, _ in chunk)
+            admitted = [(start_at, end_at) for start_at, end_at in admitted if end_at > chunk_start]
+            counters = self.load_counters(
+                [walkway_id], interval_days(chunk + released + admitted), for_update=True
+            )[walkway_id]
+            for start_at, end_at in released:
+                add_interval(counters, start_at, end_at, -1)
+            for start_at, end_at in admitted:
+                add_interval(counters, start_at, end_at)
+            for start_at, end_at in chunk:
+                if window_max(counters, start_at, end_at) >= capacity:
+                    return position, capacity
+                add_interval(counters, start_at, end_at)
+                position += 1
+            admitted.extend(chunk)
+
+    def get_over_capacity_windows(self, start_date: datetime.date, end_date: datetime.date) -> List[OverCapacityWindow]:
+        """
+        Informe de los tramos en los que algún andador supera su máximo de riegos simultáneos entre dos
+        fechas (ambas incluidas), calculado desde las programaciones y las ocurrencias recurrentes pendientes
+        de todos los andadores con un único barrido ordenado.
+        """
+        start = datetime.datetime.combine(start_date, datetime.time())
+        end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time())
+
+        intervals = list(self.user_watering_schedule_repo.get_walkway_intervals(start, end))
+        occurrences = list(self.recurring_schedule_repo.iter_occurrences(None, start, end))
+        access_keys = self.user_repo.get_access_keys_by_user_ids({occurrence.user_id for occurrence in occurrences})
+        intervals.extend(
+            (access_keys[occurrence.user_id][1], occurrence.start_at, occurrence.end_at)
+            for occurrence in occurrences if occurrence.user_id in access_keys
+        )
+
+        events = sorted(itertools.chain.from_iterable(
+            ((walkway_id, max(start_at, start), 1), (walkway_id, min(end_at, end), -1))
+            for walkway_id, start_at, end_at in intervals
+        ), key=lambda event: (event[0], event[1], event[2]))
+        return _over_capacity_windows(events, self.walkway_repo.get_capacities())
+
+    def rebuild(self, walkway_id: int, start_date: datetime.date, end_date: datetime.date) -> None:
+        """
+        Recalcula desde las programaciones concretas la ocupación guardada del andador entre dos fechas,
+        ambas incluidas (las ocurrencias recurrentes pendientes no se guardan, ver load_counters).
+        Útil tras cargas masivas, que no actualizan la ocupación de forma incremental.
+        """
+        start = datetime.datetime.combine(start_date, datetime.time())
+        end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time())
+
+        counters = build_counters(self.user_watering_schedule_repo.get_intervals_for_walkway(walkway_id, start, end))
+        try:
+            with UnitOfWork(self.db):
+                self.occupancy_repo.replace_range(walkway_id, start_date, end_date, counters)
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(GeneralErrors.UNEXPECTED_ERROR.format(operation="reconstruir", entity_name="ocupación del andador", detail=str(e)))
@@ -6,8 +6,10 @@ from sqlalchemy.exc import IntegrityError
 
 from repositories.walkway_repository import WalkwayRepository
 from database.models.walkway import Walkway
-from Core.exceptions import NotFoundError, OperationFailedError, EmptyValueError, IntegrityConstraintError, DuplicateNameError
-from Core.error_messages import GeneralErrors
+from database.models.walkway_occupancy import MAX_TRACKED_CAPACITY
+from database.unit_of_work import UnitOfWork
+from Core.exceptions import NotFoundError, OperationFailedError, EmptyValueError, IntegrityConstraintError, DuplicateNameError, ValidationError
+from Core.error_messages import GeneralErrors, WalkwayErrors
 
 class WalkwayService:
     def __init__(self, db: Session):
@@ -22,21 +24,25 @@ class WalkwayService:
         """Obtiene una pasarela por su ID."""
         return self.walkway_repo.get_by_id(walkway_id)
 
-    def create_walkway(self, name: str, location_description: str, is_active: bool) -> Walkway:
+    def create_walkway(self, name: str, location_description: str, is_active: bool,
+                       max_concurrent_schedules: int = 1) -> Walkway:
         """Crea una nueva pasarela con validación."""
         if not name or not name.strip():
             raise EmptyValueError(field_name="nombre")
+        self._validate_max_concurrent_schedules(max_concurrent_schedules)
         
         existing_walkway = self.walkway_repo.get_by_name(name)
         if existing_walkway:
             raise DuplicateNameError(name=name, entity_name="pasarela")
 
         try:
-            return self.walkway_repo.create({
-                "name": name,
-                "location_description": location_description, 
-                "is_active": is_active
-            })
+            with UnitOfWork(self.db):
+                return self.walkway_repo.create({
+                    "name": name,
+                    "location_description": location_description, 
+                    "is_active": is_active,
+                    "max_concurrent_schedules": max_concurrent_schedules
+                })
         except Exception as e:
             self.db.rollback()
             raise OperationFailedError(
@@ -45,10 +51,13 @@ class WalkwayService:
                 original_exception=e
             )
 
-    def update_walkway(self, walkway_id: int, name: str, location_description: str, is_active: bool) -> Walkway:
-        """Actualiza una pasarela existente."""
+    def update_walkway(self, walkway_id: int, name: str, location_description: str, is_active: bool,
+                       max_concurrent_schedules: Optional[int] = None) -> Walkway:
+        """Actualiza una pasarela existente. Si max_concurrent_schedules es None se conserva el actual."""
         if not name or not name.strip():
             raise EmptyValueError(field_name="nombre")
+        if max_concurrent_schedules is not None:
+            self._validate_max_concurrent_schedules(max_concurrent_schedules)
         
         walkway = self.walkway_repo.get_by_id(walkway_id)
         if not walkway:
@@ -59,11 +68,15 @@ class WalkwayService:
             raise DuplicateNameError(name=name, entity_name="pasarela")
 
         try:
-            return self.walkway_repo.update(walkway_id, {
-                "name": name,
-                "location_description": location_description, 
-                "is_active": is_active
-            })
+            with UnitOfWork(self.db):
+                update_data = {
+                    "name": name,
+                    "location_description": location_description, 
+                    "is_active": is_active
+                }
+                if max_concurrent_schedules is not None:
+                    update_data["max_concurrent_schedules"] = max_concurrent_schedules
+                return self.walkway_repo.update(walkway_id, update_data)
         except IntegrityError as e:
             self.db.rollback()
             raise IntegrityConstraintError(
@@ -85,7 +98,8 @@ class WalkwayService:
             raise NotFoundError(entity_name="Pasarela", entity_id=walkway_id)
         
         try:
-            return self.walkway_repo.delete(walkway_id)
+            with UnitOfWork(self.db):
+                return self.walkway_repo.delete(walkway_id)
         except IntegrityError as e:
             self.db.rollback()
             raise IntegrityConstraintError(
@@ -99,3 +113,13 @@ class WalkwayService:
                 operation="eliminar",
                 original_exception=e
             )
+
+    @staticmethod
+    def _validate_max_concurrent_schedules(max_concurrent_schedules: int) -> None:
+        """
+        Comprueba que el máximo de riegos simultáneos sea un entero positivo que los contadores
+        de ocupación (un byte por minuto) puedan controlar.
+        """
+        if (isinstance(max_concurrent_schedules, bool) or not isinstance(max_concurrent_schedules, int)
+                or not 1 <= max_concurrent_schedules <= MAX_TRACKED_CAPACITY):
+            raise ValidationError(WalkwayErrors.INVALID_MAX_CONCURRENT.format(max_value=MAX_TRACKED_CAPACITY))
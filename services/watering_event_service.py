@@ -1,20 +1,35 @@
 # services/watering_event_service.py
 
+from __future__ import annotations
+
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Iterator, Iterable, Dict, BinaryIO
 import datetime
+import itertools
 
 # Importamos los repositorios que este servicio necesitará
-from repositories.watering_event_repository import WateringEventRepository
+from repositories.watering_event_repository import WateringEventRepository, UsageTotal, AnyWateringEvent
+from repositories.daily_water_usage_repository import DailyWaterUsageRepository, ROLLUP_GROUP_COLUMNS
+from repositories.watering_event_archive_repository import add_months, first_of_month
+from repositories.columnar_history import ColumnarHistoryReader, write_history
+from repositories.event_column_store import EventColumnStore
 from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
 from repositories.user_repository import UserRepository # Para obtener detalles del usuario si es necesario
+from database.unit_of_work import UnitOfWork
 
 
 class WateringEventService:
+    # Columnas de las exportaciones, en orden (útil como cabecera de CSV)
+    EXPORT_FIELDS = (
+        'id', 'user_id', 'walkway_id', 'schedule_id',
+        'start_time', 'end_time', 'duration_minutes', 'volume_liters'
+    )
+
     def __init__(self, db: Session):
         self.watering_event_repo = WateringEventRepository(db)
         self.user_watering_schedule_repo = UserWateringScheduleRepository(db)
         self.user_repo = UserRepository(db) # Para validaciones o para enriquecer datos
+        self.daily_usage_repo = DailyWaterUsageRepository(db)
         self.db = db
 
     def record_watering_event(self, event_data: dict) -> Optional[WateringEventRepository.model]:
@@ -25,10 +40,6 @@ class WateringEventService:
         """
         user_id = event_data['user_id']
         schedule_id = event_data['schedule_id']
-        start_time = event_data['start_time']
-        end_time = event_data['end_time']
-        volume_liters = event_data['volume_liters']
-        duration_minutes = event_data['duration_minutes']
 
         # 1. Validaciones de Negocio
         # A. Validar que el usuario existe
@@ -37,7 +48,7 @@ class WateringEventService:
             raise ValueError(f"Usuario con ID {user_id} no encontrado.")
 
         # B. Validar que la programación de riego existe
-        schedule = self.user_watering_schedule_repo.get_schedule_by_id(schedule_id)
+        schedule = self.user_watering_schedule_repo.get_by_id(schedule_id)
         if not schedule:
             raise ValueError(f"Programación de riego con ID {schedule_id} no encontrada.")
         
@@ -45,56 +56,315 @@ class WateringEventService:
         if schedule.user_id != user_id:
             raise ValueError(f"La programación {schedule_id} no pertenece al usuario {user_id}.")
 
-        # D. Validar tiempos: start_time debe ser anterior a end_time
-        if start_time >= end_time:
-            raise ValueError("La hora de inicio del evento debe ser anterior a la hora de fin.")
-
+        # D. Validar tiempos, volumen y duración
         # E. Opcional: Validar que el evento ocurra dentro del rango de la programación
         # Esto es complejo porque un evento puede ser parte de una programación,
         # pero no tiene que coincidir exactamente. Podríamos validar si se superpone.
         # Por ahora, simplemente verificamos que la programación existe.
+        error = self._get_event_values_error(event_data) or self._get_archived_month_error(
+            event_data, self.watering_event_repo.archive_repo.get_horizon()
+        )
+        if error:
+            raise ValueError(error)
 
-        # F. Validar que el volumen de agua y la duración sean positivos
-        if volume_liters <= 0:
-            raise ValueError("El volumen de agua debe ser un valor positivo.")
-        if duration_minutes <= 0:
-            raise ValueError("La duración del riego debe ser un valor positivo.")
+        # F. El andador del evento es, por defecto, el del usuario
+        event_data.setdefault('walkway_id', user.walkway_id)
 
         # 2. Llamar al repositorio para crear el evento
         try:
-            new_event = self.watering_event_repo.create(event_data)
+            with UnitOfWork(self.db):
+                new_event = self.watering_event_repo.create(event_data)
+                self.daily_usage_repo.add_events([event_data])
             return new_event
         except Exception as e:
             self.db.rollback()
             raise RuntimeError(f"Error al registrar el evento de riego: {e}")
 
-    def get_event_by_id(self, event_id: int) -> Optional[WateringEventRepository.model]:
+    def record_watering_events(self, batch: List[dict]) -> List[int]:
+        """
+        Registra un lote de eventos de riego con un número constante de consultas.
+        Cada elemento del lote tiene el mismo formato que en record_watering_event.
+        El lote se valida completo antes de insertar nada: si algún evento es inválido
+        se lanza un ValueError con todos los errores y no se registra ninguno.
+        :return: Los IDs generados, en el mismo orden que el lote.
+        """
+        if not batch:
+            return []
+
+        # 1. Búsquedas por conjuntos: una consulta para usuarios y otra para programaciones
+        user_walkways = self.user_repo.get_walkway_ids_by_user_ids({event['user_id'] for event in batch})
+        schedule_owners = self.user_watering_schedule_repo.get_user_ids_by_schedule_ids(
+            {event['schedule_id'] for event in batch}
+        )
+
+        archive_horizon = self.watering_event_repo.archive_repo.get_horizon()
+
+        # 2. Validación en memoria de todo el lote
+        rows = []
+        errors = []
+        for index, event_data in enumerate(batch):
+            user_id = event_data['user_id']
+            schedule_id = event_data['schedule_id']
+
+            if user_id not in user_walkways:
+                error = f"Usuario con ID {user_id} no encontrado."
+            elif schedule_id not in schedule_owners:
+                error = f"Programación de riego con ID {schedule_id} no encontrada."
+            elif schedule_owners[schedule_id] != user_id:
+                error = f"La programación {schedule_id} no pertenece al usuario {user_id}."
+            else:
+                error = self._get_event_values_error(event_data) or self._get_archived_month_error(event_data, archive_horizon)
+
+            if error:
+                errors.append(f"Evento {index}: {error}")
+                continue
+
+            row = dict(event_data)
+            row.setdefault('walkway_id', user_walkways[user_id])
+            rows.append(row)
+
+        if errors:
+            raise ValueError("\n".join(errors))
+
+        # 3. Inserción multi-fila y totales diarios en una única transacción
+        try:
+            with UnitOfWork(self.db):
+                ids = self.watering_event_repo.bulk_create(rows)
+                self.daily_usage_repo.add_events(rows)
+            return ids
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(f"Error al registrar los eventos de riego: {e}")
+
+    @staticmethod
+    def _get_event_values_error(event_data: dict) -> Optional[str]:
+        """
+        Valida los tiempos, el volumen y la duración de un evento.
+        Devuelve el mensaje de error, o None si los valores son correctos.
+        """
+        # start_time debe ser anterior a end_time
+        if event_data['start_time'] >= event_data['end_time']:
+            return "La hora de inicio del evento debe ser anterior a la hora de fin."
+
+        # El volumen de agua y la duración deben ser positivos
+        if event_data['volume_liters'] <= 0:
+            return "El volumen de agua debe ser un valor positivo."
+        if event_data['duration_minutes'] <= 0:
+            return "La duración del riego debe ser un valor positivo."
+        return None
+
+    @staticmethod
+    def _get_archived_month_error(event_data: dict, archive_horizon: Optional[datetime.datetime]) -> Optional[str]:
+        """
+        Los meses archivados están cerrados: no se registran eventos que empiecen antes del horizonte del archivo.
+        """
+        if archive_horizon is not None and event_data['start_time'] < archive_horizon:
+            return f"El mes del evento ya está archivado (el archivo llega hasta {archive_horizon.date()})."
+        return None
+
+    def archive_closed_months(self, keep_months: int = 3, today: Optional[datetime.date] = None) -> Dict[datetime.date, int]:
+        """
+        Mueve al archivo los eventos de los meses cerrados, conservando en la tabla de eventos el mes
+        en curso y los `keep_months` meses anteriores. Los totales diarios no cambian.
+        Devuelve el número de eventos archivados por mes.
+        """
+        if keep_months < 0:
+            raise ValueError("El número de meses a conservar no puede ser negativo.")
+        cutoff = add_months(first_of_month(today or datetime.date.today()), -keep_months)
+        archive_repo = self.watering_event_repo.archive_repo
+        try:
+            with UnitOfWork(self.db):
+                return archive_repo.archive_before(cutoff)
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(f"Error al archivar los eventos de riego: {e}")
+        finally:
+            # Tanto si se confirma como si se deshace, el horizonte se vuelve a leer
+            archive_repo.reset_horizon()
+
+    def export_columnar_history(self, fileobj: BinaryIO, start_date: Optional[datetime.date] = None,
+                                end_date: Optional[datetime.date] = None, chunk_size: int = 1000) -> int:
+        """
+        Exporta en formato columnar comprimido (ver repositories/columnar_history.py) los eventos,
+        activos y archivados, entre start_date y end_date (ambas incluidas). Los eventos se leen en
+        streaming como tuplas de columnas y se escriben bloque a bloque (andador, mes).
+        Devuelve el número de eventos exportados.
+        """
+        rows = self.watering_event_repo.iter_history_rows(start_date, end_date, chunk_size=chunk_size)
+        return write_history(fileobj, rows)
+
+    def import_columnar_history(self, fileobj: BinaryIO, batch_size: int = 1000) -> int:
+        """
+        Importa un histórico columnar con sus IDs originales, en una única transacción: los eventos de
+        meses archivados van al archivo y el resto a la tabla de eventos. También se suman a los totales diarios.
+        Si algún evento ya existe, no se importa ninguno.
+        Devuelve el número de eventos importados.
+        """
+        rows = ColumnarHistoryReader(fileobj).iter_rows()
+        imported = 0
+        try:
+            with UnitOfWork(self.db):
+                while True:
+                    batch = list(itertools.islice(rows, batch_size))
+                    if not batch:
+                        break
+                    self.watering_event_repo.insert_history_rows(batch)
+                    self.daily_usage_repo.add_events(batch)
+                    imported += len(batch)
+            return imported
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(f"Error al importar el histórico de eventos de riego: {e}")
+
+    def load_analytics_store(self, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None,
+                             walkway_id: Optional[int] = None, user_id: Optional[int] = None,
+                             chunk_size: int = 10000) -> EventColumnStore:
+        """
+        Carga en un EventColumnStore (columnas en arrays, sin entidades) los eventos activos y archivados
+        entre start_date y end_date (ambas incluidas), opcionalmente de un andador o de un usuario,
+        para analítica ad hoc en memoria: mapas de calor por hora, comparativas por andador...
+        """
+        return EventColumnStore.from_rows(
+            self.watering_event_repo.iter_analytics_rows(start_date, end_date, walkway_id, user_id, chunk_size=chunk_size)
+        )
+
+    def get_event_by_id(self, event_id: int) -> Optional[AnyWateringEvent]:
         """
         Obtiene un evento de riego por su ID.
         """
         return self.watering_event_repo.get_by_id(event_id)
 
-    def get_events_for_user(self, user_id: int, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None) -> List[WateringEventRepository.model]:
+    def get_events_for_user(self, user_id: int, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None) -> List[AnyWateringEvent]:
         """
         Obtiene los eventos de riego para un usuario específico, con filtros opcionales de fecha.
         """
         # Si un administrador consulta, no habría restricción de user_id.
         return self.watering_event_repo.get_events_for_user(user_id, start_date, end_date)
 
+    def export_events_for_user(self, user_id: int, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None,
+                               chunk_size: int = 1000) -> Iterator[dict]:
+        """
+        Generador que recorre el historial de un usuario con memoria acotada.
+        Produce un diccionario por evento con EXPORT_FIELDS y fechas en ISO 8601,
+        listo para csv.DictWriter o para serializar como JSONL.
+        """
+        chunks = self.watering_event_repo.stream_events_for_user(user_id, start_date, end_date, chunk_size=chunk_size)
+        yield from self._export_rows(chunks)
+
+    def export_events_by_schedule(self, schedule_id: int, chunk_size: int = 1000) -> Iterator[dict]:
+        """
+        Generador que recorre los eventos de una programación con memoria acotada
+        (mismo formato que export_events_for_user).
+        """
+        chunks = self.watering_event_repo.stream_events_by_schedule(schedule_id, chunk_size=chunk_size)
+        yield from self._export_rows(chunks)
+
+    def _export_rows(self, chunks: Iterable[List[AnyWateringEvent]]) -> Iterator[dict]:
+        """
+        Convierte bloques de eventos en diccionarios planos para exportación.
+        """
+        for chunk in chunks:
+            for event in chunk:
+                yield {
+                    'id': event.id,
+                    'user_id': event.user_id,
+                    'walkway_id': event.walkway_id,
+                    'schedule_id': event.schedule_id,
+                    'start_time': event.start_time.isoformat(),
+                    'end_time': event.end_time.isoformat(),
+                    'duration_minutes': event.duration_minutes,
+                    'volume_liters': event.volume_liters,
+                }
+
     def get_total_water_used(self, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None) -> float:
         """
-        Calcula el volumen total de agua utilizada en un rango de fechas.
+        Calcula el volumen total de agua utilizada en un rango de fechas (ambas incluidas),
+        a partir de los totales diarios (ver get_water_usage).
         """
         # Este es un buen lugar para añadir lógica de agregación o permisos sobre los datos totales.
-        return self.watering_event_repo.get_total_water_used(start_date, end_date)
+        end_at = end_date + datetime.timedelta(days=1) if end_date else None
+        total = self.get_water_usage(start_date, end_at).get(None)
+        return total.volume_liters if total else 0.0
+
+    def get_water_usage(self, start_at: Optional[datetime.datetime] = None, end_at: Optional[datetime.datetime] = None,
+                        group_by: Optional[str] = None, user_id: Optional[int] = None,
+                        walkway_id: Optional[int] = None) -> Dict[Optional[int], UsageTotal]:
+        """
+        Volumen, duración y número de eventos que empiezan en [start_at, end_at) (None para no acotar),
+        opcionalmente por usuario o andador (group_by: 'user' o 'walkway'; la clave es None sin agrupar).
+        Los días completos del rango se leen de los totales diarios y solo los tramos de día
+        incompletos de los extremos, y los días anteriores a la cobertura de los totales (si aún no
+        se ha hecho la carga inicial con rebuild_usage_rollups), se suman sobre los eventos
+        (tres consultas como mucho).
+        """
+        if group_by is not None and group_by not in ROLLUP_GROUP_COLUMNS:
+            raise ValueError(
+                f"Agrupación no soportada: {group_by}. Valores admitidos: {', '.join(ROLLUP_GROUP_COLUMNS)}."
+            )
+        start_at, end_at = self._as_datetime(start_at), self._as_datetime(end_at)
+        if start_at is not None and end_at is not None and start_at >= end_at:
+            return {}
+
+        # Días completos: desde la primera medianoche >= start_at hasta la última medianoche <= end_at
+        first_day = None
+        if start_at is not None:
+            first_day = start_at.date() if start_at.time() == datetime.time() else start_at.date() + datetime.timedelta(days=1)
+        end_day = end_at.date() if end_at is not None else None
+
+        # Los días anteriores a la cobertura de los totales diarios se suman sobre los eventos
+        coverage = self.daily_usage_repo.get_coverage()
+        if coverage is None:
+            return self.watering_event_repo.get_usage_totals([(start_at, end_at)], group_by, user_id, walkway_id)
+        if coverage.complete_from is not None and (first_day is None or first_day < coverage.complete_from):
+            first_day = coverage.complete_from
+        if first_day is not None and end_day is not None and first_day >= end_day:
+            # Sin ningún día completo cubierto: todo sale de los eventos
+            return self.watering_event_repo.get_usage_totals([(start_at, end_at)], group_by, user_id, walkway_id)
+
+        edges = []
+        if first_day is not None and (start_at is None or start_at < self._as_datetime(first_day)):
+            edges.append((start_at, self._as_datetime(first_day)))
+        if end_day is not None and self._as_datetime(end_day) < end_at:
+            edges.append((self._as_datetime(end_day), end_at))
+
+        totals = self.daily_usage_repo.get_totals(
+            first_day, end_day - datetime.timedelta(days=1) if end_day is not None else None,
+            group_by, user_id, walkway_id
+        )
+        for group_id, edge in self.watering_event_repo.get_usage_totals(edges, group_by, user_id, walkway_id).items():
+            total = totals.get(group_id)
+            totals[group_id] = edge if total is None else UsageTotal(*(a + b for a, b in zip(total, edge)))
+        return totals
+
+    def rebuild_usage_rollups(self, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None) -> int:
+        """
+        Recalcula desde los eventos los totales diarios entre start_date y end_date (ambas incluidas;
+        None para todo el historial). Sirve como carga inicial (backfill) y para corregir desajustes.
+        Devuelve el número de filas de totales escritas.
+        """
+        try:
+            with UnitOfWork(self.db):
+                return self.daily_usage_repo.rebuild(start_date, end_date)
+        except Exception as e:
+            self.db.rollback()
+            raise RuntimeError(f"Error al reconstruir los totales diarios de riego: {e}")
+
+    @staticmethod
+    def _as_datetime(value) -> Optional[datetime.datetime]:
+        """
+        Convierte una fecha en la medianoche de ese día; los datetime y None se devuelven tal cual.
+        """
+        if value is None or isinstance(value, datetime.datetime):
+            return value
+        return datetime.datetime.combine(value, datetime.time())
 
-    def get_events_by_schedule(self, schedule_id: int) -> List[WateringEventRepository.model]:
+    def get_events_by_schedule(self, schedule_id: int) -> List[AnyWateringEvent]:
         """
         Obtiene todos los eventos de riego asociados a una programación específica.
         """
         return self.watering_event_repo.get_events_by_schedule(schedule_id)
 
-    def get_recent_events(self, limit: int = 10) -> List[WateringEventRepository.model]:
+    def get_recent_events(self, limit: int = 10) -> List[AnyWateringEvent]:
         """
         Obtiene los eventos de riego más recientes (para un dashboard, por ejemplo).
         """
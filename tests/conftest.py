@@ -1,6 +1,7 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 import sys
 import os
 
@@ -23,6 +24,7 @@ else:
 
 # Importar todos los modelos para que la base de datos los conozca
 from database.base import Base
+from database.engine import create_db_engine, create_session_factory
 from database.models.access_schedule_rule import AccessScheduleRule
 from database.models.user_type import UserType
 from database.models.walkway import Walkway
@@ -30,6 +32,10 @@ from database.models.user import User
 from database.models.user_watering_schedule import UserWateringSchedule
 from database.models.watering_event import WateringEvent
 from database.models.notification import Notification
+from database.models.recurring_watering_schedule import RecurringWateringSchedule, RecurringScheduleException
+from database.models.walkway_occupancy import WalkwayOccupancy
+from database.models.daily_water_usage import DailyWaterUsage, DailyWaterUsageCoverage
+from database.models.watering_event_archive import WateringEventArchive, ArchivedMonth
 
 # Importar repositorios y servicios para las fixtures
 from repositories.user_repository import UserRepository
@@ -49,18 +55,43 @@ def db_session() -> Session:
     """
     Fixture que proporciona una sesión de base de datos aislada para cada función de test.
     """
-    engine = create_engine("sqlite:///:memory:")
+    engine = create_db_engine("sqlite:///:memory:")
     
     # Crea todas las tablas
     Base.metadata.create_all(engine)
     
-    db: Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    db: Session = create_session_factory(engine)()
     
     try:
         yield db
     finally:
         db.close()
         Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def count_statements(db_session: Session):
+    """
+    Fixture que devuelve un gestor de contexto que registra las sentencias SQL enviadas
+    a la base de datos dentro del bloque:
+
+        with count_statements() as statements:
+            ...
+        assert len(statements) == 1
+    """
+    @contextmanager
+    def capture():
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+    return capture
 
 
 # --- FIXTURES DE REPOSITORIO ---
@@ -0,0 +1,75 @@
+# tests/database/test_engine.py
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from config import config
+from database import engine as db_engine
+
+
+@pytest.fixture
+def file_database_url(tmp_path, monkeypatch) -> str:
+    """Apunta la configuración a una base de datos SQLite temporal y limpia el engine global."""
+    url = f"sqlite:///{tmp_path / 'engine_test.db'}"
+    monkeypatch.setattr(config, "SQLALCHEMY_DATABASE_URL", url)
+    db_engine.dispose_engine()
+    yield url
+    db_engine.dispose_engine()
+
+
+def test_create_db_engine_sqlite_connects():
+    """Verifica que el engine para SQLite se crea y ejecuta consultas."""
+    engine = db_engine.create_db_engine("sqlite:///:memory:")
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+    engine.dispose()
+
+
+def test_create_db_engine_mysql_uses_queue_pool():
+    """Verifica que para MySQL se aplican los parámetros de QueuePool de Config."""
+    pytest.importorskip("pymysql")
+    engine = db_engine.create_db_engine()
+
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == config.DB_POOL_SIZE
+    assert engine.pool._recycle == config.DB_POOL_RECYCLE
+    assert engine.pool._pre_ping == config.DB_POOL_PRE_PING
+
+
+def test_get_engine_is_process_wide(file_database_url: str):
+    """Verifica que get_engine devuelve siempre el mismo engine y que las sesiones lo usan."""
+    engine = db_engine.get_engine()
+    assert db_engine.get_engine() is engine
+    assert str(engine.url) == file_database_url
+
+    session = db_engine.get_session()
+    try:
+        assert session.get_bind() is engine
+        assert session.execute(text("SELECT 1")).scalar() == 1
+    finally:
+        session.close()
+
+
+def test_get_db_closes_session(file_database_url: str):
+    """Verifica que get_db entrega una sesión utilizable y la cierra al terminar."""
+    generator = db_engine.get_db()
+    session = next(generator)
+    session.execute(text("SELECT 1"))
+    assert session.in_transaction()
+
+    with pytest.raises(StopIteration):
+        next(generator)
+    assert not session.in_transaction()
+
+
+def test_dispose_after_fork_keeps_engine_usable(file_database_url: str):
+    """Verifica que la limpieza post-fork descarta el pool sin dejar el engine inservible."""
+    engine = db_engine.get_engine()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    db_engine._dispose_after_fork()
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
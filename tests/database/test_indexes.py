@@ -0,0 +1,84 @@
+# tests/database/test_indexes.py
+
+# Comprueba con EXPLAIN QUERY PLAN de SQLite que las consultas que emiten los
+# repositorios usan los índices declarados en los modelos.
+
+import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from repositories.access_schedule_rule_repository import AccessScheduleRuleRepository
+from repositories.notification_repository import NotificationRepository
+from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
+from repositories.walkway_repository import WalkwayRepository
+from repositories.watering_event_repository import WateringEventRepository
+
+
+def query_plan(db_session: Session, action) -> str:
+    """
+    Ejecuta la acción capturando la última sentencia SQL emitida y devuelve su plan de ejecución.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    rows = db_session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("action, index_name", [
+    (lambda db: WateringEventRepository(db).get_events_for_user(1, datetime.date(2024, 1, 1), datetime.date(2024, 1, 31)),
+     "ix_watering_events_user_id_start_time"),
+    (lambda db: WateringEventRepository(db).get_events_by_schedule(1),
+     "ix_watering_events_schedule_id_start_time"),
+    (lambda db: WateringEventRepository(db).get_recent_events(10),
+     "ix_watering_events_start_time"),
+    (lambda db: WateringEventRepository(db).get_total_water_used(datetime.date(2024, 1, 1), datetime.date(2024, 1, 31)),
+     "ix_watering_events_start_time"),
+    (lambda db: NotificationRepository(db).get_all_by_user_id(1, status="unread"),
+     "ix_notifications_user_id_is_read_created_at"),
+    (lambda db: NotificationRepository(db).mark_all_as_read(1),
+     "ix_notifications_user_id_is_read_created_at"),
+    (lambda db: UserWateringScheduleRepository(db).get_schedules_for_user(1, datetime.date(2024, 1, 1)),
+     "ix_user_watering_schedules_user_id_scheduled_date_start_time"),
+    (lambda db: UserWateringScheduleRepository(db).get_overlapping_schedules(
+        1, datetime.datetime(2024, 1, 1, 8, 0), datetime.datetime(2024, 1, 1, 9, 0)),
+     "ix_user_watering_schedules_user_id_start_at_end_at"),
+    (lambda db: UserWateringScheduleRepository(db).get_upcoming_schedules(),
+     "ix_user_watering_schedules_start_at"),
+    (lambda db: UserWateringScheduleRepository(db).get_upcoming_schedules(user_id=1),
+     "ix_user_watering_schedules_user_id_start_at_end_at"),
+    (lambda db: UserWateringScheduleRepository(db).get_schedules_for_walkway_on_date(1, datetime.date(2024, 1, 1)),
+     "ix_users_walkway_id"),
+    (lambda db: UserWateringScheduleRepository(db).get_future_schedules_in_rule_window(
+        1, 1, [(frozenset({0}), datetime.time(8, 0), datetime.time(12, 0))], datetime.datetime(2024, 1, 1)),
+     "ix_users_walkway_id"),
+    (lambda db: WalkwayRepository(db).get_by_name("Andador"),
+     "ix_walkways_name"),
+    (lambda db: AccessScheduleRuleRepository(db).get_rules_by_user_type_and_day(1, 0),
+     "ix_access_schedule_rules_user_type_id_day_mask"),
+])
+def test_repository_queries_use_indexes(db_session: Session, action, index_name: str):
+    """Verifica que cada consulta de los repositorios se resuelve con su índice."""
+    plan = query_plan(db_session, lambda: action(db_session))
+
+    assert index_name in plan, plan
+
+
+def test_overlap_queries_bound_start_at_on_both_sides(db_session: Session):
+    """Verifica que la búsqueda de superposiciones es un rango cerrado sobre start_at dentro del índice."""
+    plan = query_plan(db_session, lambda: UserWateringScheduleRepository(db_session).get_overlapping_schedules(
+        1, datetime.datetime(2024, 1, 1, 8, 0), datetime.datetime(2024, 1, 1, 9, 0)))
+
+    assert "ix_user_watering_schedules_user_id_start_at_end_at (user_id=? AND start_at>? AND start_at<?)" in plan, plan
@@ -0,0 +1,70 @@
+# tests/database/test_unit_of_work.py
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database.models.user_type import UserType
+from database.unit_of_work import UnitOfWork, in_unit_of_work
+from repositories.user_type_repository import UserTypeRepository
+
+
+@pytest.fixture
+def commit_counter(db_session: Session) -> list:
+    """Registra cada commit real que se hace sobre la sesión."""
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(session))
+    return commits
+
+
+def test_unit_of_work_commits_once(db_session: Session, commit_counter: list):
+    """Verifica que varias escrituras dentro del ámbito generan un único commit."""
+    repo = UserTypeRepository(db_session)
+
+    with UnitOfWork(db_session):
+        first = repo.create({"name": "Admin"})
+        second = repo.create({"name": "Regante"})
+        # El flush asigna los IDs sin necesidad de commit
+        assert first.id is not None and second.id is not None
+        repo.update(first.id, {"name": "Administrador"})
+        assert commit_counter == []
+
+    assert len(commit_counter) == 1
+    assert db_session.get(UserType, first.id).name == "Administrador"
+
+
+def test_unit_of_work_rolls_back_on_error(db_session: Session, commit_counter: list):
+    """Verifica que una excepción descarta todas las escrituras del ámbito."""
+    repo = UserTypeRepository(db_session)
+
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(db_session):
+            repo.create({"name": "Temporal"})
+            raise RuntimeError("fallo simulado")
+
+    assert commit_counter == []
+    assert repo.get_by_name("Temporal") is None
+    assert not in_unit_of_work(db_session)
+
+
+def test_nested_unit_of_work_defers_to_outer_scope(db_session: Session, commit_counter: list):
+    """Verifica que solo el ámbito más externo hace commit."""
+    repo = UserTypeRepository(db_session)
+
+    with UnitOfWork(db_session):
+        with UnitOfWork(db_session):
+            repo.create({"name": "Interno"})
+        assert in_unit_of_work(db_session)
+        assert commit_counter == []
+
+    assert len(commit_counter) == 1
+    assert not in_unit_of_work(db_session)
+
+
+def test_repository_outside_unit_of_work_commits(db_session: Session, commit_counter: list):
+    """Verifica que fuera de un UnitOfWork el repositorio conserva el commit por operación."""
+    repo = UserTypeRepository(db_session)
+
+    repo.create({"name": "Invitado"})
+
+    assert len(commit_counter) == 1
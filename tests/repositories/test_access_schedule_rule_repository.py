@@ -1,12 +1,17 @@
 # backend/SQLALCHEMY_REGADIO/tests/repositories/test_access_schedule_rule_repository.py
+import datetime
 from datetime import time
 import pytest
+from sqlalchemy import text, update
 from sqlalchemy.orm import Session
 from services.access_schedule_rule_service import AccessScheduleRuleService
 from services.user_type_service import UserTypeService
 from services.walkway_service import WalkwayService
 from database.models.access_schedule_rule import AccessScheduleRule
 from Core.exceptions import ValidationError, NotFoundError
+from repositories.access_schedule_rule_repository import AccessScheduleRuleRepository
+from services import access_rule_engine
+from services.access_rule_engine import AccessRuleEngine, get_access_rule_engine
 
 
 def test_service_create_access_rule_success(access_rule_service: AccessScheduleRuleService, user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
@@ -84,6 +89,31 @@ def test_service_create_access_rule_invalid_day_of_week(access_rule_service: Acc
     with pytest.raises(ValidationError, match="El día de la semana no es válido. Debe ser un número entre 0 \\(lunes\\) y 6 \\(domingo\\)."):
         access_rule_service.create_access_rule(rule_data)
 
+def test_service_create_access_rule_day_list(access_rule_service: AccessScheduleRuleService, user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
+    """Verifica que se aceptan listas de días completas y se rechazan las que no caben en la columna."""
+    user_type = user_type_service.create_user_type("Admin")
+    walkway = walkway_service.create_walkway("Walkway I", "Description for Walkway I", True)
+    db_session.flush()
+
+    rule_data = {
+        "user_type_id": user_type.id,
+        "walkway_id": walkway.id,
+        "rule_name": "Toda la semana",
+        "day_of_week": "0,1,2,3,4,5,6",
+        "start_time": "07:00",
+        "end_time": "08:00"
+    }
+    new_rule = access_rule_service.create_access_rule(rule_data)
+    db_session.refresh(new_rule)
+    assert new_rule.day_of_week == "0,1,2,3,4,5,6"
+    assert new_rule.day_mask == 0b1111111
+
+    too_long = ",".join(["Mon"] * 20)
+    with pytest.raises(ValidationError, match="no puede superar los 64 caracteres"):
+        access_rule_service.create_access_rule(dict(rule_data, day_of_week=too_long))
+    with pytest.raises(ValidationError, match="no puede superar los 64 caracteres"):
+        access_rule_service.update_access_rule(new_rule.id, {"day_of_week": too_long})
+
 def test_service_create_access_rule_invalid_time_range(access_rule_service: AccessScheduleRuleService, user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
     """Verifica el manejo de error para un rango de tiempo inválido."""
     # Arrange
@@ -109,3 +139,330 @@ def test_service_delete_access_rule_not_found(access_rule_service: AccessSchedul
     # Act & Assert
     with pytest.raises(NotFoundError, match="Regla de acceso con ID 999 no encontrada."):
         access_rule_service.delete_access_rule(999)
+
+
+# --- Motor compilado de reglas de acceso ---
+
+def test_access_rule_engine_merges_and_bisects():
+    """Verifica que las reglas contiguas se fusionan y que los días se interpretan en todos los formatos."""
+    engine = AccessRuleEngine.compile([
+        (1, 1, "Mon,Tue", time(8, 0), time(12, 0)),
+        (1, 1, "0", time(12, 0), time(14, 0)),
+        (1, 1, "Lun", time(18, 0), time(20, 0)),
+        (1, 2, "Mon", time(6, 0), time(7, 0)),
+    ])
+    monday = datetime.date(2024, 1, 1)
+
+    def at(day, hour, minute=0):
+        return datetime.datetime.combine(day, time(hour, minute))
+
+    # 11:00-13:00 abarca dos reglas contiguas del lunes
+    assert engine.is_allowed(1, 1, at(monday, 11), at(monday, 13))
+    # El martes solo cubre hasta las 12:00
+    assert not engine.is_allowed(1, 1, at(monday + datetime.timedelta(days=1), 11), at(monday + datetime.timedelta(days=1), 13))
+    # Hueco entre reglas, otro andador y otro tipo de usuario
+    assert not engine.is_allowed(1, 1, at(monday, 15), at(monday, 16))
+    assert engine.is_allowed(1, 2, at(monday, 6), at(monday, 7))
+    assert not engine.is_allowed(2, 1, at(monday, 9), at(monday, 10))
+    assert engine.is_allowed(1, 1, at(monday, 18, 30), at(monday, 20))
+
+
+def test_access_rule_engine_across_midnight():
+    """Verifica que una regla que cruza la medianoche cubre ambos días."""
+    engine = AccessRuleEngine.compile([(1, 1, "Sun", time(22, 0), time(2, 0))])
+    sunday = datetime.datetime(2024, 1, 7, 23, 0)
+
+    assert engine.is_allowed(1, 1, sunday, sunday + datetime.timedelta(hours=2))
+    assert not engine.is_allowed(1, 1, sunday, sunday + datetime.timedelta(hours=4))
+
+
+def test_service_invalidates_compiled_rules(access_rule_service: AccessScheduleRuleService, user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
+    """Verifica que crear y eliminar reglas desde el servicio invalida el motor compilado."""
+    user_type = user_type_service.create_user_type("Regante")
+    walkway = walkway_service.create_walkway("Walkway E", "Description for Walkway E", True)
+    monday_nine = datetime.datetime(2024, 1, 1, 9, 0)
+    monday_ten = datetime.datetime(2024, 1, 1, 10, 0)
+
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+    rule = access_rule_service.create_access_rule({
+        "user_type_id": user_type.id,
+        "walkway_id": walkway.id,
+        "rule_name": "Mañanas",
+        "day_of_week": 0,
+        "start_time": "08:00",
+        "end_time": "12:00"
+    })
+    assert get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+    access_rule_service.delete_access_rule(rule.id)
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+
+def test_get_rules_by_user_type_and_day(access_rule_repo: AccessScheduleRuleRepository, user_type_service: UserTypeService, walkway_service: WalkwayService):
+    """Verifica la búsqueda de reglas por tipo de usuario y día de la semana."""
+    user_type = user_type_service.create_user_type("Invitado")
+    walkway = walkway_service.create_walkway("Walkway F", "Description for Walkway F", True)
+    weekdays = access_rule_repo.create({"rule_name": "Laborables", "day_of_week": "Mon,Tue,Wed,Thu,Fri", "start_time": time(8, 0),
+                                        "end_time": time(9, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+    access_rule_repo.create({"rule_name": "Domingo", "day_of_week": "6", "start_time": time(8, 0),
+                             "end_time": time(9, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+
+    assert [rule.id for rule in access_rule_repo.get_rules_by_user_type_and_day(user_type.id, 2)] == [weekdays.id]
+    assert access_rule_repo.get_rules_by_user_type_and_day(user_type.id, 5) == []
+
+
+def test_day_mask_maintained_and_backfilled(access_rule_repo: AccessScheduleRuleRepository, user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
+    """Verifica que day_mask se deriva de day_of_week y que las filas antiguas se pueden convertir."""
+    user_type = user_type_service.create_user_type("Mantenimiento")
+    walkway = walkway_service.create_walkway("Walkway G", "Description for Walkway G", True)
+    rule = access_rule_repo.create({"rule_name": "Fin de semana", "day_of_week": "Sat,Sun", "start_time": time(8, 0),
+                                    "end_time": time(9, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+    assert rule.day_mask == 0b1100000
+
+    access_rule_repo.update(rule.id, {"day_of_week": "Mon"})
+    assert rule.day_mask == 0b0000001
+
+    # Filas anteriores a la columna: day_mask = 0
+    db_session.execute(update(AccessScheduleRule).values(day_mask=0))
+    db_session.commit()
+    assert access_rule_repo.get_rules_for_weekday(0) == []
+
+    assert access_rule_repo.backfill_day_masks() == 1
+    assert [r.id for r in access_rule_repo.get_rules_for_weekday(0, user_type_id=user_type.id, walkway_id=walkway.id)] == [rule.id]
+    assert access_rule_repo.get_rules_for_weekday(0, walkway_id=walkway.id + 1) == []
+
+def test_backfill_day_masks_reads_in_batches(access_rule_repo: AccessScheduleRuleRepository, user_type_service: UserTypeService,
+                                             walkway_service: WalkwayService, db_session: Session, count_statements):
+    """Verifica que la conversión lee por lotes y no se detiene en las filas que no puede convertir."""
+    user_type = user_type_service.create_user_type("Mantenimiento")
+    walkway = walkway_service.create_walkway("Walkway B", "Description for Walkway B", True)
+    access_rule_repo.bulk_create([
+        {"rule_name": f"Regla {i}", "day_of_week": "Mon", "start_time": time(8, 0), "end_time": time(9, 0),
+         "user_type_id": user_type.id, "walkway_id": walkway.id}
+        for i in range(5)
+    ])
+    db_session.execute(update(AccessScheduleRule).values(day_mask=0))
+    # Las dos primeras no son reconocibles y siguen pendientes tras cada lote
+    first_ids = db_session.query(AccessScheduleRule.id).order_by(AccessScheduleRule.id).limit(2).scalar_subquery()
+    db_session.execute(update(AccessScheduleRule).where(AccessScheduleRule.id.in_(first_ids)).values(day_of_week="Funday"))
+    db_session.commit()
+
+    with count_statements() as statements:
+        assert access_rule_repo.backfill_day_masks(batch_size=2) == 3
+
+    assert len([statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]) == 3
+    assert db_session.query(AccessScheduleRule).filter(AccessScheduleRule.day_mask == 0).count() == 2
+
+
+
+def test_bulk_update_keeps_day_mask_in_sync(access_rule_repo: AccessScheduleRuleRepository, user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
+    """Verifica que bulk_update recalcula day_mask al cambiar day_of_week y no permite asignarla."""
+    user_type = user_type_service.create_user_type("Riego masivo")
+    walkway = walkway_service.create_walkway("Walkway H", "Description for Walkway H", True)
+    rule = access_rule_repo.create({"rule_name": "Lunes", "day_of_week": "Mon", "start_time": time(8, 0),
+                                    "end_time": time(9, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+
+    assert access_rule_repo.bulk_update({"user_type_id": user_type.id}, {"day_of_week": "Sat,Sun"}) == 1
+    db_session.refresh(rule)
+    assert rule.day_mask == 0b1100000
+    assert [r.id for r in access_rule_repo.get_rules_for_weekday(6, user_type_id=user_type.id)] == [rule.id]
+
+    with pytest.raises(ValueError):
+        access_rule_repo.bulk_update({"id": rule.id}, {"day_mask": 0b0000001})
+
+def test_rule_change_impact_analysis(access_rule_service: AccessScheduleRuleService, access_rule_repo: AccessScheduleRuleRepository,
+                                     user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
+    """Verifica la simulación y la aplicación de cambios de reglas sobre las programaciones futuras."""
+    from database.models.notification import Notification
+    from database.models.user import User
+    from database.models.user_watering_schedule import UserWateringSchedule
+
+    user_type = user_type_service.create_user_type("Regante")
+    other_type = user_type_service.create_user_type("Visitante")
+    walkway = walkway_service.create_walkway("Walkway H", "Description for Walkway H", True)
+    mornings = access_rule_repo.create({"rule_name": "Mañanas", "day_of_week": "Mon,Tue,Wed,Thu,Fri", "start_time": time(8, 0),
+                                        "end_time": time(12, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+    noon = access_rule_repo.create({"rule_name": "Mediodía", "day_of_week": "Mon", "start_time": time(12, 0),
+                                    "end_time": time(14, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+    users = [
+        User(name=f"Regante {i}", username=f"regante_h{i}", email=f"regante_h{i}@example.com", password_hash="hashed_password",
+             first_name="Re", last_name="Gante", user_type_id=type_id, walkway_id=walkway.id, access_schedule_rule_id=mornings.id)
+        for i, type_id in enumerate([user_type.id, user_type.id, other_type.id])
+    ]
+    db_session.add_all(users)
+    db_session.flush()
+    monday = datetime.date(2030, 1, 7)
+
+    def schedule(user, day, start, end):
+        return UserWateringSchedule(user_id=user.id, scheduled_date=day, start_time=start, end_time=end)
+
+    schedules = {
+        "monday_early": schedule(users[0], monday, time(9, 0), time(10, 0)),
+        "monday_span": schedule(users[0], monday, time(11, 30), time(12, 30)),
+        "tuesday": schedule(users[1], monday + datetime.timedelta(days=1), time(10, 0), time(11, 0)),
+        "wednesday": schedule(users[0], monday + datetime.timedelta(days=2), time(9, 0), time(10, 0)),
+        "monday_noon": schedule(users[1], monday, time(13, 0), time(14, 0)),
+        "past": schedule(users[0], datetime.date(2024, 1, 1), time(11, 0), time(12, 0)),
+        "other_type": schedule(users[2], monday, time(11, 0), time(12, 0)),
+    }
+    db_session.add_all(schedules.values())
+    db_session.commit()
+    ids = {name: s.id for name, s in schedules.items()}
+
+    # Simulaciones: no guardan nada
+    narrowed = access_rule_service.analyze_rule_change(mornings.id, {"end_time": "10:00"})
+    assert [v.schedule_id for v in narrowed] == [ids["monday_span"], ids["tuesday"]]
+    fewer_days = access_rule_service.analyze_rule_change(mornings.id, {"day_of_week": "Mon,Tue"})
+    assert [v.schedule_id for v in fewer_days] == [ids["wednesday"]]
+    assert [v.schedule_id for v in access_rule_service.analyze_rule_change(noon.id)] == [ids["monday_span"], ids["monday_noon"]]
+    assert db_session.get(AccessScheduleRule, mornings.id).end_time == time(12, 0)
+
+    # Cambio real: se avisa a cada usuario afectado con una notificación
+    result = access_rule_service.update_access_rule(mornings.id, {"end_time": "10:00"})
+    assert result["rule"].end_time == time(10, 0)
+    assert [v.schedule_id for v in result["violations"]] == [ids["monday_span"], ids["tuesday"]]
+    notified = db_session.query(Notification.user_id).filter(Notification.type == "warning").order_by(Notification.user_id).all()
+    assert [user_id for user_id, in notified] == [users[0].id, users[1].id]
+
+    access_rule_service.delete_access_rule(noon.id)
+    assert db_session.query(Notification).count() == 4
+    with pytest.raises(ValidationError):
+        access_rule_service.analyze_rule_change(mornings.id, {"start_time": "11:00"})
+
+
+def test_rule_change_analysis_includes_recurring_occurrences(access_rule_service: AccessScheduleRuleService, access_rule_repo: AccessScheduleRuleRepository,
+                                                            user_type_service: UserTypeService, walkway_service: WalkwayService, db_session: Session):
+    """Verifica que las ocurrencias pendientes de las plantillas recurrentes se revalidan como las programaciones."""
+    from database.models.recurring_watering_schedule import RecurringWateringSchedule
+    from database.models.user import User
+    from database.models.user_watering_schedule import UserWateringSchedule
+
+    user_type = user_type_service.create_user_type("Regante")
+    walkway = walkway_service.create_walkway("Walkway R", "Description for Walkway R", True)
+    mornings = access_rule_repo.create({"rule_name": "Mañanas", "day_of_week": "Mon,Tue,Wed,Thu,Fri", "start_time": time(8, 0),
+                                        "end_time": time(12, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+    user = User(name="Regante R", username="regante_r", email="regante_r@example.com", password_hash="hashed_password",
+                first_name="Re", last_name="Gante", user_type_id=user_type.id, walkway_id=walkway.id, access_schedule_rule_id=mornings.id)
+    db_session.add(user)
+    db_session.flush()
+    monday = datetime.date(2030, 1, 7)
+    # Lunes y miércoles de 11:00 a 12:00 durante dos semanas; la segunda ocurrencia ya está materializada
+    template = RecurringWateringSchedule(user_id=user.id, weekday_mask=0b0000101, start_time=time(11, 0), end_time=time(12, 0),
+                                         valid_from=monday, valid_until=monday + datetime.timedelta(days=13))
+    early = RecurringWateringSchedule(user_id=user.id, weekday_mask=0b0000001, start_time=time(8, 0), end_time=time(9, 0),
+                                      valid_from=monday, valid_until=monday + datetime.timedelta(days=6))
+    db_session.add_all([template, early])
+    db_session.flush()
+    materialized = UserWateringSchedule(user_id=user.id, scheduled_date=monday + datetime.timedelta(days=2), start_time=time(11, 0),
+                                        end_time=time(12, 0), recurring_schedule_id=template.id)
+    db_session.add(materialized)
+    db_session.commit()
+
+    violations = access_rule_service.analyze_rule_change(mornings.id, {"end_time": "10:00"}, now=datetime.datetime(2030, 1, 1))
+
+    assert [(v.schedule_id, v.recurring_schedule_id, v.start_at) for v in violations] == [
+        (None, template.id, datetime.datetime(2030, 1, 7, 11, 0)),
+        (materialized.id, None, datetime.datetime(2030, 1, 9, 11, 0)),
+        (None, template.id, datetime.datetime(2030, 1, 14, 11, 0)),
+        (None, template.id, datetime.datetime(2030, 1, 16, 11, 0)),
+    ]
+    # Las ocurrencias ya pasadas no se revalidan
+    later = access_rule_service.analyze_rule_change(mornings.id, now=datetime.datetime(2030, 1, 15))
+    assert [v.start_at for v in later] == [datetime.datetime(2030, 1, 16, 11, 0)]
+
+def test_repository_writes_invalidate_compiled_rules(access_rule_repo: AccessScheduleRuleRepository, user_type_service: UserTypeService,
+                                                     walkway_service: WalkwayService, db_session: Session):
+    """Verifica que las escrituras directas del repositorio invalidan el motor compilado al confirmarse."""
+    user_type = user_type_service.create_user_type("Regante")
+    walkway = walkway_service.create_walkway("Walkway F", "Description for Walkway F", True)
+    monday_nine = datetime.datetime(2024, 1, 1, 9, 0)
+    monday_ten = datetime.datetime(2024, 1, 1, 10, 0)
+    access_rule_repo.bulk_create([{
+        "rule_name": "Tardes", "day_of_week": "Mon", "start_time": time(16, 0), "end_time": time(20, 0),
+        "user_type_id": user_type.id, "walkway_id": walkway.id,
+    }])
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+    access_rule_repo.bulk_update({"walkway_id": walkway.id}, {"start_time": time(8, 0)})
+    assert get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+    access_rule_repo.bulk_update({"walkway_id": walkway.id}, {"day_of_week": "Tue"})
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+
+def test_compiled_rules_expire_after_ttl(access_rule_repo: AccessScheduleRuleRepository, user_type_service: UserTypeService,
+                                        walkway_service: WalkwayService, db_session: Session, monkeypatch):
+    """Verifica que un cambio hecho fuera de la sesión (otro proceso) se ve al caducar el motor compilado."""
+    now = [1000.0]
+    monkeypatch.setattr(access_rule_engine, "_clock", lambda: now[0])
+    user_type = user_type_service.create_user_type("Regante")
+    walkway = walkway_service.create_walkway("Walkway G", "Description for Walkway G", True)
+    monday_nine = datetime.datetime(2024, 1, 1, 9, 0)
+    monday_ten = datetime.datetime(2024, 1, 1, 10, 0)
+    access_rule_repo.bulk_create([{
+        "rule_name": "Mañanas", "day_of_week": "Mon", "start_time": time(8, 0), "end_time": time(12, 0),
+        "user_type_id": user_type.id, "walkway_id": walkway.id,
+    }])
+    assert get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+    # SQL directo: la sesión no sabe que las reglas han cambiado
+    db_session.execute(text("DELETE FROM access_schedule_rules"))
+    db_session.commit()
+    now[0] += access_rule_engine.RULES_TTL_SECONDS - 1
+    assert get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+    now[0] += 1
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+
+def test_rolled_back_rules_are_not_cached(user_type_service: UserTypeService, walkway_service: WalkwayService,
+                                          db_session: Session, monkeypatch):
+    """Verifica que una regla deshecha con rollback no queda en el motor compilado compartido."""
+    now = [1000.0]
+    monkeypatch.setattr(access_rule_engine, "_clock", lambda: now[0])
+    user_type = user_type_service.create_user_type("Regante")
+    walkway = walkway_service.create_walkway("Walkway H", "Description for Walkway H", True)
+    monday_nine = datetime.datetime(2024, 1, 1, 9, 0)
+    monday_ten = datetime.datetime(2024, 1, 1, 10, 0)
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+    db_session.add(AccessScheduleRule(rule_name="Mañanas", day_of_week="Mon", start_time=time(8, 0), end_time=time(12, 0),
+                                      user_type_id=user_type.id, walkway_id=walkway.id))
+    db_session.flush()
+    now[0] += access_rule_engine.RULES_TTL_SECONDS
+    # La propia transacción ve su regla sin confirmar
+    assert get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+    db_session.rollback()
+
+    assert db_session.query(AccessScheduleRule).count() == 0
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_nine, monday_ten)
+
+
+def test_rule_write_is_seen_by_admission_in_same_unit_of_work(access_rule_repo: AccessScheduleRuleRepository, user_type_service: UserTypeService,
+                                                              walkway_service: WalkwayService, db_session: Session):
+    """Verifica que una transacción que ha escrito reglas no usa el motor compartido ya compilado."""
+    from database.models.user import User
+    from database.unit_of_work import UnitOfWork
+    from services.user_watering_schedule_service import UserWateringScheduleService
+
+    user_type = user_type_service.create_user_type("Regante")
+    walkway = walkway_service.create_walkway("Walkway U", "Description for Walkway U", True)
+    rule = access_rule_repo.create({"rule_name": "Temprano", "day_of_week": "Mon", "start_time": time(6, 0),
+                                    "end_time": time(7, 0), "user_type_id": user_type.id, "walkway_id": walkway.id})
+    user = User(name="Regante U", username="regante_u", email="regante_u@example.com", password_hash="hashed_password",
+                first_name="Re", last_name="Gante", user_type_id=user_type.id, walkway_id=walkway.id, access_schedule_rule_id=rule.id)
+    db_session.add(user)
+    db_session.commit()
+    monday_noon = datetime.datetime(2030, 1, 7, 12, 0)
+    monday_one = datetime.datetime(2030, 1, 7, 13, 0)
+    # Motor compartido en caché con la regla de 6:00 a 7:00
+    assert not get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_noon, monday_one)
+
+    with UnitOfWork(db_session):
+        access_rule_repo.update(rule.id, {"start_time": time(0, 0), "end_time": time(23, 59)})
+        schedule = UserWateringScheduleService(db_session).create_schedule(
+            {'user_id': user.id, 'start_time': monday_noon, 'end_time': monday_one}
+        )
+
+    assert schedule.id is not None
+    assert get_access_rule_engine(db_session).is_allowed(user_type.id, walkway.id, monday_noon, monday_one)
@@ -0,0 +1,104 @@
+# test_columnar_history.py
+
+import datetime
+import io
+import json
+import random
+
+import pytest
+from sqlalchemy.orm import Session
+
+from database.models.daily_water_usage import DailyWaterUsage
+from database.models.watering_event import WateringEvent
+from database.models.watering_event_archive import WateringEventArchive
+from repositories.columnar_history import ColumnarHistoryReader, write_history
+from repositories.watering_event_repository import WateringEventRepository
+from services.watering_event_service import WateringEventService
+
+
+def _history(walkway_ids=(1, 2), months=3, seed=7) -> list:
+    """Eventos sintéticos ordenados por andador e inicio, con el orden de columnas de ARCHIVE_COLUMNS."""
+    rng = random.Random(seed)
+    rows = []
+    event_id = 1
+    end = datetime.datetime(2025, 5 + months, 1)
+    for walkway_id in walkway_ids:
+        start_time = datetime.datetime(2025, 5, 1, 6, 0)
+        while start_time < end:
+            minutes = rng.choice((15, 20, 30, 45))
+            rows.append((event_id, start_time, start_time + datetime.timedelta(minutes=minutes), minutes,
+                         round(rng.uniform(5, 60), 1), rng.randint(1, 300), walkway_id, rng.randint(1, 5000)))
+            event_id += 1
+            start_time += datetime.timedelta(minutes=rng.choice((30, 45, 60)))
+    return rows
+
+
+def test_round_trip_and_compression_ratio():
+    rows = _history()
+    buffer = io.BytesIO()
+
+    assert write_history(buffer, rows) == len(rows)
+
+    columns = ('id', 'start_time', 'end_time', 'duration_minutes', 'volume_liters', 'user_id', 'walkway_id', 'schedule_id')
+    assert [tuple(row[column] for column in columns) for row in ColumnarHistoryReader(buffer).iter_rows()] == rows
+    # Frente a la exportación fila a fila (JSONL), al menos un orden de magnitud menos
+    row_form = sum(
+        len(json.dumps(dict(zip(columns, row)), default=datetime.datetime.isoformat)) + 1 for row in rows
+    )
+    assert len(buffer.getvalue()) * 10 < row_form
+
+
+def test_aggregate_scans_columns_and_skips_blocks():
+    rows = _history()
+    buffer = io.BytesIO()
+    write_history(buffer, rows)
+    reader = ColumnarHistoryReader(buffer)
+    start, end = datetime.datetime(2025, 6, 10, 12, 0), datetime.datetime(2025, 7, 3)
+
+    selected = [row for row in rows if start <= row[1] < end and row[6] == 2]
+    total = reader.aggregate(start, end, walkway_id=2)[None]
+    assert total.event_count == len(selected)
+    assert total.duration_minutes == sum(row[3] for row in selected)
+    assert total.volume_liters == pytest.approx(sum(row[4] for row in selected))
+
+    by_walkway = reader.aggregate(group_by="walkway")
+    assert {walkway_id: total.event_count for walkway_id, total in by_walkway.items()} == {
+        walkway_id: sum(1 for row in rows if row[6] == walkway_id) for walkway_id in (1, 2)
+    }
+    by_user = reader.aggregate(end=datetime.datetime(2025, 5, 2), group_by="user")
+    assert sum(total.event_count for total in by_user.values()) == sum(1 for row in rows if row[1] < datetime.datetime(2025, 5, 2))
+    # Solo se decodifican los bloques del andador y los meses pedidos
+    assert [(block.walkway_id, block.month_start) for block in reader.iter_blocks([1], start, end)] == [
+        (1, datetime.date(2025, 6, 1)), (1, datetime.date(2025, 7, 1))
+    ]
+    with pytest.raises(ValueError):
+        ColumnarHistoryReader(io.BytesIO(b"no es un historico")).aggregate()
+
+
+def test_service_exports_and_reimports_history(db_session: Session):
+    rows = _history(months=2)
+    columns = ('id', 'start_time', 'end_time', 'duration_minutes', 'volume_liters', 'user_id', 'walkway_id', 'schedule_id')
+    repo = WateringEventRepository(db_session)
+    # Sin claves foráneas activas en SQLite: bastan IDs arbitrarios
+    repo.bulk_create([dict(zip(columns, row)) for row in rows])
+    service = WateringEventService(db_session)
+    service.rebuild_usage_rollups()
+    # Mayo queda en el archivo y junio en la tabla de eventos
+    service.archive_closed_months(keep_months=0, today=datetime.date(2025, 6, 15))
+    expected = service.get_water_usage(group_by="walkway")
+    assert sum(total.event_count for total in expected.values()) == len(rows)
+
+    buffer = io.BytesIO()
+    assert service.export_columnar_history(buffer, chunk_size=500) == len(rows)
+    repo.bulk_delete([WateringEvent.id > 0])
+    repo.archive_repo.bulk_delete([WateringEventArchive.id > 0])
+    db_session.query(DailyWaterUsage).delete()
+    db_session.commit()
+
+    assert service.import_columnar_history(buffer, batch_size=700) == len(rows)
+    assert list(repo.iter_history_rows()) == rows
+    assert db_session.query(WateringEventArchive).count() == sum(1 for row in rows if row[1] < datetime.datetime(2025, 6, 1))
+    assert service.get_water_usage(group_by="walkway").keys() == expected.keys()
+    for walkway_id, total in service.get_water_usage(group_by="walkway").items():
+        assert total.event_count == expected[walkway_id].event_count
+        assert total.volume_liters == pytest.approx(expected[walkway_id].volume_liters)
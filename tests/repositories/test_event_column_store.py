@@ -0,0 +1,84 @@
+# test_event_column_store.py
+
+import datetime
+import random
+
+import pytest
+from sqlalchemy.orm import Session
+
+from repositories.event_column_store import EventColumnStore, from_epoch, to_epoch
+from repositories.watering_event_repository import WateringEventRepository
+from services.watering_event_service import WateringEventService
+
+MONDAY = datetime.datetime(2025, 8, 4)
+
+
+def _rows(count: int, seed: int = 3) -> list:
+    """Filas (start_time, user_id, walkway_id, volume_liters, duration_minutes) ordenadas por inicio."""
+    rng = random.Random(seed)
+    return [
+        (MONDAY + datetime.timedelta(minutes=17 * i), rng.randint(1, 50), rng.randint(1, 4),
+         round(rng.uniform(5, 60), 1), rng.choice((15, 30, 45)))
+        for i in range(count)
+    ]
+
+
+def test_epoch_round_trip():
+    assert to_epoch(datetime.datetime(1970, 1, 2)) == 86400
+    assert from_epoch(to_epoch(MONDAY)) == MONDAY
+
+
+def test_min_volume_accepts_int_threshold():
+    store = EventColumnStore.from_rows([(MONDAY, 1, 1, 2.0, 15), (MONDAY + datetime.timedelta(hours=1), 1, 1, 7.5, 15)])
+
+    assert list(store.where(min_volume=5).volume_liters) == [7.5]
+    assert list(store.where(min_volume=2).volume_liters) == [2.0, 7.5]
+
+
+def test_filters_and_group_sums_match_row_by_row():
+    rows = _rows(5000)
+    store = EventColumnStore.from_rows(rows)
+
+    assert len(store) == 5000
+    # 28 bytes por evento: un millón de eventos ocupa unos 28 MB
+    assert store.nbytes == 5000 * 28
+
+    start, end = MONDAY + datetime.timedelta(days=3), MONDAY + datetime.timedelta(days=20)
+    window = store.between(start, end).where(walkway_ids=[2, 3], min_volume=10.0)
+    selected = [row for row in rows if start <= row[0] < end and row[2] in (2, 3) and row[3] >= 10.0]
+    assert len(window) == len(selected)
+    assert window.total() == pytest.approx(sum(row[3] for row in selected))
+    assert window.total("duration_minutes") == sum(row[4] for row in selected)
+
+    by_walkway = window.group_sum("walkway")
+    assert by_walkway.keys() == {2, 3}
+    assert by_walkway[2] == pytest.approx(sum(row[3] for row in selected if row[2] == 2))
+    assert store.group_sum("user", "count")[rows[0][1]] == sum(1 for row in rows if row[1] == rows[0][1])
+    assert store.group_sum("day", "count")[MONDAY.date()] == sum(1 for row in rows if row[0].date() == MONDAY.date())
+
+    heatmap = store.heatmap("count")
+    assert heatmap[0][0] == sum(1 for row in rows if row[0].weekday() == 0 and row[0].hour == 0)
+    assert sum(map(sum, heatmap)) == 5000
+    assert len(store.where(hours=[6])) == sum(1 for row in rows if row[0].hour == 6)
+    with pytest.raises(ValueError):
+        store.group_sum("month")
+    with pytest.raises(ValueError):
+        store.total("user_ids")
+
+
+def test_service_loads_store_from_repository(db_session: Session):
+    rows = _rows(300)
+    # Sin claves foráneas activas en SQLite: bastan IDs arbitrarios
+    WateringEventRepository(db_session).bulk_create([
+        {"start_time": start_time, "end_time": start_time + datetime.timedelta(minutes=duration),
+         "user_id": user_id, "walkway_id": walkway_id, "schedule_id": 1,
+         "volume_liters": volume, "duration_minutes": duration}
+        for start_time, user_id, walkway_id, volume, duration in reversed(rows)
+    ])
+
+    service = WateringEventService(db_session)
+    store = service.load_analytics_store(chunk_size=64)
+    assert list(store.start_epoch) == [to_epoch(row[0]) for row in rows]
+
+    walkway_store = service.load_analytics_store(end_date=MONDAY.date(), walkway_id=1)
+    assert len(walkway_store) == sum(1 for row in rows if row[2] == 1 and row[0].date() == MONDAY.date())
@@ -267,3 +267,75 @@ def test_delete_notification_not_found(notification_repo: NotificationRepository
     non_existent_id = uuid4()
     result = notification_repo.delete_notification(non_existent_id)
     assert result is False
+
+def test_mark_all_as_read_issues_single_update(notification_repo: NotificationRepository, user_fixture: User, db_session: Session,
+                                                count_statements):
+    """
+    Verifica que marcar todas como leídas se resuelve con un único UPDATE, sin cargar las notificaciones.
+    """
+    db_session.add_all([
+        Notification(user_id=user_fixture.id, title=f"N{i}", message="Mensaje", is_read=False, type="info")
+        for i in range(20)
+    ])
+    db_session.commit()
+    user_id = user_fixture.id
+
+    with count_statements() as statements:
+        updated_count = notification_repo.mark_all_as_read(user_id)
+
+    assert updated_count == 20
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE notifications")
+
+
+def test_bulk_delete_by_filter(notification_repo: NotificationRepository, user_fixture: User, db_session: Session):
+    """
+    Verifica que bulk_delete elimina solo las filas del filtro y devuelve cuántas eliminó.
+    """
+    db_session.add_all([
+        Notification(user_id=user_fixture.id, title="Leída", message="Mensaje", is_read=True, type="info"),
+        Notification(user_id=user_fixture.id, title="Leída 2", message="Mensaje", is_read=True, type="info"),
+        Notification(user_id=user_fixture.id, title="No leída", message="Mensaje", is_read=False, type="info"),
+    ])
+    db_session.commit()
+
+    deleted_count = notification_repo.bulk_delete({"user_id": user_fixture.id, "is_read": True})
+
+    assert deleted_count == 2
+    remaining = notification_repo.get_all_by_user_id(user_fixture.id)
+    assert [n.title for n in remaining] == ["No leída"]
+
+
+def test_bulk_operations_require_filter(notification_repo: NotificationRepository):
+    """
+    Verifica que no se permite un UPDATE/DELETE masivo sin filtro.
+    """
+    with pytest.raises(ValueError):
+        notification_repo.bulk_delete({})
+    with pytest.raises(ValueError):
+        notification_repo.bulk_update([], {"is_read": True})
+
+
+def test_get_page_by_user_id_orders_newest_first(notification_repo: NotificationRepository, user_fixture: User, db_session: Session):
+    """
+    Verifica la paginación por (created_at, id) de las notificaciones, incluidas marcas de tiempo repetidas.
+    """
+    import datetime
+
+    same_moment = datetime.datetime(2025, 1, 1, 12, 0, 0)
+    db_session.add_all([
+        Notification(user_id=user_fixture.id, title=f"N{i}", message="Mensaje", type="info",
+                     is_read=(i % 2 == 0), created_at=same_moment if i < 3 else same_moment + datetime.timedelta(hours=i))
+        for i in range(6)
+    ])
+    db_session.commit()
+
+    first = notification_repo.get_page_by_user_id(user_fixture.id, limit=4)
+    second = notification_repo.get_page_by_user_id(user_fixture.id, cursor=first.next_cursor, limit=4)
+
+    assert [n.title for n in first.items] == ["N5", "N4", "N3", "N2"]
+    assert [n.title for n in second.items] == ["N1", "N0"]
+    assert second.next_cursor is None
+
+    unread = notification_repo.get_page_by_user_id(user_fixture.id, status="unread", limit=10)
+    assert [n.title for n in unread.items] == ["N5", "N3", "N1"]
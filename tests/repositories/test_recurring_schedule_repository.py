@@ -0,0 +1,210 @@
+# test_recurring_schedule_repository.py
+
+import datetime
+from itertools import islice
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.orm import Session
+
+from database.models.access_schedule_rule import AccessScheduleRule
+from database.models.recurring_watering_schedule import RecurringWateringSchedule
+from database.models.user import User
+from database.models.user_type import UserType
+from database.models.user_watering_schedule import UserWateringSchedule
+from database.models.walkway import Walkway
+from repositories.recurring_schedule_repository import RecurringScheduleRepository
+from services.access_rule_engine import invalidate_access_rule_engine
+from services.recurring_schedule_service import RecurringScheduleService
+from services.user_watering_schedule_service import UserWateringScheduleService
+
+
+# 2025-08-04 es lunes
+MONDAY = datetime.date(2025, 8, 4)
+
+
+@pytest.fixture(scope="function")
+def user_fixture(db_session: Session) -> User:
+    user_type = UserType(name="Regante")
+    walkway = Walkway(name="Andador Recurrente", location_description="Norte")
+    db_session.add_all([user_type, walkway])
+    db_session.flush()
+    rule = AccessScheduleRule(rule_name="Laborables", day_of_week="Mon,Tue,Wed,Thu,Fri", start_time=datetime.time(6, 0),
+                              end_time=datetime.time(20, 0), user_type_id=user_type.id, walkway_id=walkway.id)
+    db_session.add(rule)
+    db_session.flush()
+    user = User(name="Recurrente", username="recurrente", email=f"recurrente_{uuid4()}@example.com", password_hash="hashed_password",
+                first_name="Re", last_name="Currente", user_type_id=user_type.id, walkway_id=walkway.id, access_schedule_rule_id=rule.id)
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+@pytest.fixture(scope="function")
+def recurring_service(db_session: Session) -> RecurringScheduleService:
+    return RecurringScheduleService(db_session)
+
+def _template_data(user: User, **overrides) -> dict:
+    data = {
+        'user_id': user.id,
+        'weekdays': "Mon,Wed",
+        'start_time': datetime.time(7, 0),
+        'end_time': datetime.time(8, 0),
+        'valid_from': MONDAY,
+        'valid_until': MONDAY + datetime.timedelta(weeks=26),
+    }
+    data.update(overrides)
+    return data
+
+
+def test_occurrence_dates_every_other_week():
+    template = RecurringWateringSchedule(weekday_mask=0b0000101, start_time=datetime.time(7, 0), end_time=datetime.time(8, 0),
+                                         valid_from=MONDAY + datetime.timedelta(days=2), valid_until=MONDAY + datetime.timedelta(weeks=5),
+                                         interval_weeks=2)
+
+    dates = list(template.occurrence_dates(MONDAY, MONDAY + datetime.timedelta(weeks=10)))
+
+    # Semana 0: solo el miércoles (valid_from); semanas 2 y 4: lunes y miércoles
+    assert dates == [
+        MONDAY + datetime.timedelta(days=2),
+        MONDAY + datetime.timedelta(weeks=2), MONDAY + datetime.timedelta(weeks=2, days=2),
+        MONDAY + datetime.timedelta(weeks=4), MONDAY + datetime.timedelta(weeks=4, days=2),
+    ]
+
+def test_create_and_expand_lazily(recurring_service: RecurringScheduleService, user_fixture: User, db_session: Session):
+    template = recurring_service.create_recurring_schedule(_template_data(user_fixture))
+
+    occurrences = recurring_service.iter_occurrences(user_fixture.id, MONDAY, MONDAY + datetime.timedelta(weeks=26))
+    first = list(islice(occurrences, 3))
+
+    assert [o.occurrence_date for o in first] == [MONDAY, MONDAY + datetime.timedelta(days=2), MONDAY + datetime.timedelta(weeks=1)]
+    assert first[0].start_at == datetime.datetime.combine(MONDAY, datetime.time(7, 0))
+    assert first[0].recurring_schedule_id == template.id
+    # Solo la plantilla se guarda
+    assert db_session.query(UserWateringSchedule).count() == 0
+
+def test_exceptions_and_materialization(recurring_service: RecurringScheduleService, user_fixture: User, db_session: Session):
+    template = recurring_service.create_recurring_schedule(_template_data(user_fixture))
+    wednesday = MONDAY + datetime.timedelta(days=2)
+    next_monday = MONDAY + datetime.timedelta(weeks=1)
+
+    recurring_service.cancel_occurrence(template.id, MONDAY)
+    recurring_service.reschedule_occurrence(template.id, wednesday, datetime.time(9, 0), datetime.time(10, 0))
+    schedule = recurring_service.materialize_occurrence(template.id, next_monday)
+
+    occurrences = list(recurring_service.iter_occurrences(user_fixture.id, MONDAY, next_monday + datetime.timedelta(days=2)))
+    assert [(o.occurrence_date, o.start_at.time()) for o in occurrences] == [
+        (wednesday, datetime.time(9, 0)),
+        (next_monday + datetime.timedelta(days=2), datetime.time(7, 0)),
+    ]
+    assert schedule.recurring_schedule_id == template.id
+    assert schedule.start_at == datetime.datetime.combine(next_monday, datetime.time(7, 0))
+
+    with pytest.raises(ValueError, match="no tiene una ocurrencia pendiente"):
+        recurring_service.materialize_occurrence(template.id, next_monday)
+    with pytest.raises(ValueError, match="no tiene una ocurrencia pendiente"):
+        recurring_service.cancel_occurrence(template.id, MONDAY + datetime.timedelta(days=1))
+
+def test_overlap_checks_use_expanded_occurrences(recurring_service: RecurringScheduleService, user_fixture: User):
+    schedule_service = UserWateringScheduleService(recurring_service.db)
+    # Programación concreta que choca con la ocurrencia del miércoles de la semana 10
+    clash_day = MONDAY + datetime.timedelta(weeks=10, days=2)
+    schedule_service.create_schedule({
+        'user_id': user_fixture.id,
+        'start_time': datetime.datetime.combine(clash_day, datetime.time(7, 30)),
+        'end_time': datetime.datetime.combine(clash_day, datetime.time(8, 30)),
+    })
+
+    with pytest.raises(ValueError, match=str(clash_day)):
+        recurring_service.create_recurring_schedule(_template_data(user_fixture))
+
+    # Otra plantilla sin conflicto, y después una programación concreta que choca con ella
+    recurring_service.create_recurring_schedule(_template_data(user_fixture, weekdays=[1, 3]))
+    thursday = MONDAY + datetime.timedelta(weeks=3, days=3)
+    with pytest.raises(ValueError, match="superpone"):
+        schedule_service.create_schedule({
+            'user_id': user_fixture.id,
+            'start_time': datetime.datetime.combine(thursday, datetime.time(7, 45)),
+            'end_time': datetime.datetime.combine(thursday, datetime.time(8, 15)),
+        })
+    result = schedule_service.create_schedules([{
+        'user_id': user_fixture.id,
+        'start_time': datetime.datetime.combine(thursday, datetime.time(7, 45)),
+        'end_time': datetime.datetime.combine(thursday, datetime.time(8, 15)),
+    }])
+    assert list(result["errors"]) == [0]
+
+    # Dos plantillas con los mismos días chocan entre sí
+    with pytest.raises(ValueError, match="superpone"):
+        recurring_service.create_recurring_schedule(_template_data(user_fixture, weekdays="Thu", valid_from=MONDAY + datetime.timedelta(weeks=5)))
+
+def test_access_rules_checked_per_weekday(recurring_service: RecurringScheduleService, user_fixture: User):
+    with pytest.raises(ValueError, match="día 5"):
+        recurring_service.create_recurring_schedule(_template_data(user_fixture, weekdays="Mon,Sat"))
+
+def test_template_crossing_midnight(recurring_service: RecurringScheduleService, user_fixture: User, db_session: Session):
+    db_session.add(AccessScheduleRule(rule_name="Noches", day_of_week="Mon", start_time=datetime.time(22, 0),
+                                      end_time=datetime.time(2, 0), user_type_id=user_fixture.user_type_id,
+                                      walkway_id=user_fixture.walkway_id))
+    db_session.commit()
+    invalidate_access_rule_engine(db_session)
+
+    template = recurring_service.create_recurring_schedule(
+        _template_data(user_fixture, weekdays="Mon", start_time=datetime.time(23, 0), end_time=datetime.time(0, 30))
+    )
+
+    first = next(recurring_service.iter_occurrences(user_fixture.id, MONDAY, MONDAY + datetime.timedelta(weeks=1)))
+    assert first.recurring_schedule_id == template.id
+    assert first.start_at == datetime.datetime.combine(MONDAY, datetime.time(23, 0))
+    assert first.end_at == datetime.datetime.combine(MONDAY + datetime.timedelta(days=1), datetime.time(0, 30))
+
+    # Más largo que la duración máxima al cruzar la medianoche
+    with pytest.raises(ValueError):
+        recurring_service.create_recurring_schedule(
+            _template_data(user_fixture, weekdays="Tue", start_time=datetime.time(8, 0), end_time=datetime.time(7, 0))
+        )
+
+def test_reschedule_checks_the_templates_other_occurrences(recurring_service: RecurringScheduleService, user_fixture: User,
+                                                          db_session: Session):
+    db_session.add_all([
+        AccessScheduleRule(rule_name="Madrugadas", day_of_week="Mon,Tue", start_time=datetime.time(0, 0),
+                           end_time=datetime.time(2, 0), user_type_id=user_fixture.user_type_id, walkway_id=user_fixture.walkway_id),
+        AccessScheduleRule(rule_name="Noches", day_of_week="Mon", start_time=datetime.time(22, 0),
+                           end_time=datetime.time(2, 0), user_type_id=user_fixture.user_type_id, walkway_id=user_fixture.walkway_id),
+    ])
+    db_session.commit()
+    invalidate_access_rule_engine(db_session)
+    template = recurring_service.create_recurring_schedule(
+        _template_data(user_fixture, weekdays="Mon,Tue", start_time=datetime.time(0, 0), end_time=datetime.time(0, 30))
+    )
+
+    # 23:30-01:00 del lunes choca con la ocurrencia del martes a las 00:00 de la misma plantilla
+    with pytest.raises(ValueError, match="se superpone"):
+        recurring_service.reschedule_occurrence(template.id, MONDAY, datetime.time(23, 30), datetime.time(1, 0))
+    # Superponerse con su propio horario anterior sí está permitido
+    exception = recurring_service.reschedule_occurrence(template.id, MONDAY, datetime.time(0, 15), datetime.time(0, 45))
+    assert exception.start_time == datetime.time(0, 15)
+
+def test_get_active_for_users(user_fixture: User, recurring_service: RecurringScheduleService, db_session: Session):
+    recurring_service.create_recurring_schedule(_template_data(user_fixture, valid_until=MONDAY + datetime.timedelta(weeks=1)))
+    repo = RecurringScheduleRepository(db_session)
+
+    assert len(repo.get_active_for_users([user_fixture.id], MONDAY, MONDAY)) == 1
+    assert repo.get_active_for_users([user_fixture.id], MONDAY + datetime.timedelta(weeks=2), MONDAY + datetime.timedelta(weeks=3)) == []
+
+def test_iter_occurrences_in_windows(recurring_service: RecurringScheduleService, user_fixture: User, db_session: Session):
+    """Verifica que solo se expanden las ocurrencias de los días de las ventanas, incluidas las que cruzan la medianoche."""
+    recurring_service.create_recurring_schedule(_template_data(user_fixture, weekdays="Mon,Tue,Wed,Thu,Fri"))
+    repo = RecurringScheduleRepository(db_session)
+    at = lambda offset, hour=0: datetime.datetime.combine(MONDAY + datetime.timedelta(days=offset), datetime.time(hour))
+
+    windows = [(at(1), at(3)), (at(14), at(15)), (at(33), at(34))]
+    occurrences = list(repo.iter_occurrences_in_windows([user_fixture.id], windows))
+
+    # Martes y miércoles de la primera semana, lunes de la tercera; el día 33 es sábado
+    assert [occurrence.occurrence_date for occurrence in occurrences] == [
+        MONDAY + datetime.timedelta(days=1), MONDAY + datetime.timedelta(days=2), MONDAY + datetime.timedelta(days=14),
+    ]
+    # Una sola ventana equivale a iter_occurrences
+    assert list(repo.iter_occurrences_in_windows([user_fixture.id], [(at(0), at(7))])) == list(
+        repo.iter_occurrences([user_fixture.id], at(0), at(7)))
+    assert list(repo.iter_occurrences_in_windows([user_fixture.id], [])) == []
@@ -0,0 +1,24 @@
+# test_sql_dialect.py
+
+import pytest
+
+from database.models.daily_water_usage import DailyWaterUsage
+from database.models.watering_event import WateringEvent
+from repositories.sql_dialect import bucket_start, date_of, insert_or_add, weekday
+
+
+@pytest.mark.parametrize("build", [
+    lambda dialect: weekday(WateringEvent.start_time, dialect),
+    lambda dialect: bucket_start(WateringEvent.start_time, "day", dialect),
+    lambda dialect: date_of(WateringEvent.start_time, dialect),
+    lambda dialect: insert_or_add(DailyWaterUsage, ["usage_date", "walkway_id", "user_id"], ["volume_liters"], dialect),
+])
+def test_unsupported_dialect_raises_value_error(build):
+    with pytest.raises(ValueError, match="Dialecto no soportado: oracle"):
+        build("oracle")
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "mysql", "mariadb", "postgresql"])
+def test_supported_dialects(dialect):
+    assert weekday(WateringEvent.start_time, dialect) is not None
+    assert date_of(WateringEvent.start_time, dialect) is not None
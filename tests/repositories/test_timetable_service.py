@@ -0,0 +1,161 @@
+# test_timetable_service.py
+
+import datetime
+import itertools
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from database.models.access_schedule_rule import AccessScheduleRule
+from database.models.user import User
+from database.models.user_type import UserType
+from database.models.user_watering_schedule import UserWateringSchedule
+from database.models.walkway import Walkway
+from services.access_rule_engine import get_access_rule_engine
+from services import timetable_service
+from services.timetable_service import TimetableService
+from services.user_watering_schedule_service import UserWateringScheduleService
+from services.walkway_occupancy_service import WalkwayOccupancyService
+
+
+WEEK_START = datetime.date(2025, 9, 1)  # lunes
+
+
+def _community(db_session: Session, users_per_walkway: int, capacity: int, walkways: int = 2):
+    """Crea andadores con una regla de lunes a viernes de 6:00 a 12:00 y sus usuarios, por inserción masiva."""
+    user_type = UserType(name="Comunero")
+    db_session.add(user_type)
+    db_session.flush()
+    walkway_ids = []
+    for index in range(walkways):
+        walkway = Walkway(name=f"Andador {index}", location_description="Vega", max_concurrent_schedules=capacity)
+        db_session.add(walkway)
+        db_session.flush()
+        db_session.add(AccessScheduleRule(rule_name="Mañanas", day_of_week="Mon,Tue,Wed,Thu,Fri", start_time=datetime.time(6, 0),
+                                          end_time=datetime.time(12, 0), user_type_id=user_type.id, walkway_id=walkway.id))
+        walkway_ids.append(walkway.id)
+    db_session.flush()
+    rule_id = db_session.execute(select(AccessScheduleRule.id)).scalars().first()
+    db_session.execute(insert(User), [
+        {"name": f"Comunero {w}-{i}", "username": f"comunero_{w}_{i}", "email": f"comunero_{w}_{i}@example.com",
+         "password_hash": "hashed_password", "first_name": "Co", "last_name": "Munero", "user_type_id": user_type.id,
+         "walkway_id": walkway_id, "access_schedule_rule_id": rule_id}
+        for w, walkway_id in enumerate(walkway_ids) for i in range(users_per_walkway)
+    ])
+    db_session.commit()
+    return walkway_ids
+
+
+def test_generated_timetable_respects_rules_capacity_and_existing_bookings(db_session: Session):
+    walkway_ids = _community(db_session, users_per_walkway=30, capacity=2)
+    first_user_id = db_session.execute(select(User.id).order_by(User.id)).scalars().first()
+    UserWateringScheduleService(db_session).create_schedule({
+        'user_id': first_user_id,
+        'start_time': datetime.datetime(2025, 9, 3, 6, 0),
+        'end_time': datetime.datetime(2025, 9, 3, 7, 0),
+    })
+    service = TimetableService(db_session)
+
+    result = service.generate_weekly_timetable(WEEK_START, duration=datetime.timedelta(minutes=30), sessions_per_user=2)
+
+    assert not result.timed_out and result.unassigned == []
+    # 60 usuarios x 2 turnos, menos el que ya tenía el primer usuario
+    assert len(result.assignments) == len(result.created_ids) == 119
+    engine = get_access_rule_engine(db_session)
+    for user_id, start_at, end_at in result.assignments:
+        user = db_session.get(User, user_id)
+        assert engine.is_allowed(user.user_type_id, user.walkway_id, start_at, end_at)
+    days = {}
+    for user_id, start_at, _ in result.assignments:
+        days.setdefault(user_id, []).append(start_at.date())
+    assert all(len(set(user_days)) == len(user_days) for user_days in days.values())
+    assert datetime.date(2025, 9, 3) not in days[first_user_id]
+    assert WalkwayOccupancyService(db_session).get_over_capacity_windows(WEEK_START, WEEK_START + datetime.timedelta(days=6)) == []
+    assert all(WalkwayOccupancyService(db_session).get_max_concurrency(
+        walkway_id, datetime.datetime.combine(WEEK_START, datetime.time()), datetime.datetime.combine(WEEK_START, datetime.time()) + datetime.timedelta(days=7)
+    ) <= 2 for walkway_id in walkway_ids)
+
+    # Volver a generar no añade nada
+    assert service.generate_weekly_timetable(WEEK_START, sessions_per_user=2).assignments == []
+
+def test_previous_week_booking_across_midnight_does_not_count(db_session: Session):
+    _community(db_session, users_per_walkway=1, capacity=1, walkways=1)
+    user_id = db_session.execute(select(User.id)).scalars().first()
+    # Domingo de la semana anterior, de 23:30 a 00:30 del lunes
+    db_session.add(UserWateringSchedule(user_id=user_id, scheduled_date=WEEK_START - datetime.timedelta(days=1),
+                                        start_time=datetime.time(23, 30), end_time=datetime.time(0, 30)))
+    db_session.commit()
+
+    result = TimetableService(db_session).generate_weekly_timetable(WEEK_START, sessions_per_user=1)
+
+    assert [assigned_user_id for assigned_user_id, _, _ in result.assignments] == [user_id]
+    assert result.unassigned == []
+
+def test_regeneration_without_assignments_ends_the_transaction(db_session: Session):
+    _community(db_session, users_per_walkway=2, capacity=1, walkways=1)
+    service = TimetableService(db_session)
+    assert len(service.generate_weekly_timetable(WEEK_START).created_ids) == 2
+
+    result = service.generate_weekly_timetable(WEEK_START)
+
+    assert result.assignments == []
+    # Los contadores leídos con bloqueo no quedan retenidos en una transacción abierta
+    assert not db_session.in_transaction()
+
+def test_dry_run_and_unassigned_when_full(db_session: Session):
+    # 5 días x 6 horas / 2 h por turno = 15 turnos por andador con capacidad 1
+    _community(db_session, users_per_walkway=20, capacity=1, walkways=1)
+
+    result = TimetableService(db_session).generate_weekly_timetable(WEEK_START, duration=datetime.timedelta(hours=2), dry_run=True)
+
+    assert len(result.assignments) == 15
+    assert len(result.unassigned) == 5
+    assert result.created_ids == []
+    assert db_session.query(UserWateringSchedule).count() == 0
+
+def test_inactive_walkways_get_no_slots(db_session: Session):
+    active_id, inactive_id = _community(db_session, users_per_walkway=3, capacity=1)
+    db_session.get(Walkway, inactive_id).is_active = False
+    db_session.commit()
+
+    result = TimetableService(db_session).generate_weekly_timetable(WEEK_START)
+
+    assert len(result.assignments) == 3
+    assert {db_session.get(User, user_id).walkway_id for user_id, _, _ in result.assignments} == {active_id}
+    assert result.unassigned == []
+
+def test_thousands_of_users_within_budget(db_session: Session, monkeypatch):
+    # 5 días x 12 medias horas x 40 riegos simultáneos = 2400 turnos por andador para 2000 solicitados
+    _community(db_session, users_per_walkway=1000, capacity=40, walkways=3)
+    # Reloj detenido: el presupuesto no se agota y se comprueba solo el resultado a escala
+    monkeypatch.setattr(timetable_service, "_clock", lambda: 0.0)
+
+    result = TimetableService(db_session).generate_weekly_timetable(WEEK_START, sessions_per_user=2, time_budget_seconds=10)
+
+    assert not result.timed_out
+    assert result.unassigned == []
+    assert len(result.created_ids) == 6000
+
+def test_time_budget_stops_assignment(db_session: Session, monkeypatch):
+    _community(db_session, users_per_walkway=20, capacity=40, walkways=1)
+    # Cada lectura del reloj avanza un segundo: la primera fija el límite y luego hay una por usuario
+    ticks = itertools.count()
+    monkeypatch.setattr(timetable_service, "_clock", lambda: float(next(ticks)))
+
+    result = TimetableService(db_session).generate_weekly_timetable(WEEK_START, time_budget_seconds=5)
+
+    assert result.timed_out
+    assert len(result.assignments) == 5
+    assert len(result.unassigned) == 15
+    assert not {user_id for user_id, _, _ in result.assignments} & set(result.unassigned)
+    assert db_session.query(UserWateringSchedule).count() == 5
+
+def test_invalid_parameters(db_session: Session):
+    service = TimetableService(db_session)
+    with pytest.raises(ValueError, match="duración máxima"):
+        service.generate_weekly_timetable(WEEK_START, duration=datetime.timedelta(hours=3))
+    with pytest.raises(ValueError, match="entre 1 y 7"):
+        service.generate_weekly_timetable(WEEK_START, sessions_per_user=8)
+    with pytest.raises(ValueError, match="paso"):
+        service.generate_weekly_timetable(WEEK_START, step=datetime.timedelta(0))
@@ -231,4 +231,199 @@ def test_delete_user(user_repo: UserRepository, db_session: Session, prerequisit
     # Assert
     assert is_deleted is True
     retrieved_user = db_session.execute(select(User).filter_by(id=user_id)).scalar_one_or_none()
-    assert retrieved_user is None
\ No newline at end of file
+    assert retrieved_user is None
+
+def test_service_delete_user_removes_dependents_in_one_transaction(user_repo: UserRepository, db_session: Session, prerequisite_data,
+                                                                    count_statements):
+    """Verifica que UserService.delete_user borra las dependencias con un DELETE por tabla y un solo commit."""
+    import datetime
+    from sqlalchemy import event
+    from database.models.notification import Notification
+    from database.models.recurring_watering_schedule import RecurringWateringSchedule, RecurringScheduleException
+    from database.models.user_watering_schedule import UserWateringSchedule
+    from database.models.watering_event import WateringEvent
+    from repositories.walkway_occupancy_repository import WalkwayOccupancyRepository
+    from services.user_service import UserService
+    from services.walkway_occupancy_service import WalkwayOccupancyService
+    from services.watering_event_service import WateringEventService
+    from database.models.daily_water_usage import DailyWaterUsage
+
+    # Arrange
+    admin_type = UserType(name="Admin")
+    db_session.add(admin_type)
+    db_session.commit()
+    base_data = {
+        "password_hash": "hashed_password",
+        "first_name": "Nombre",
+        "last_name": "Apellido",
+        "walkway_id": prerequisite_data["walkway_id"],
+        "access_schedule_rule_id": prerequisite_data["access_schedule_rule_id"],
+    }
+    admin = user_repo.create({**base_data, "name": "admin", "username": "admin", "email": "admin@example.com", "user_type_id": admin_type.id})
+    target = user_repo.create({**base_data, "name": "target", "username": "target", "email": "target@example.com", "user_type_id": prerequisite_data["user_type_id"]})
+    admin_id, target_id = admin.id, target.id
+
+    # Una programación pasada y tres futuras; la plantilla recurrente también empieza en el pasado
+    today = datetime.date.today()
+    first_day, last_day = today - datetime.timedelta(days=30), today + datetime.timedelta(days=120)
+    schedules = [
+        UserWateringSchedule(user_id=target_id, scheduled_date=today + datetime.timedelta(days=offset),
+                             start_time=datetime.time(8, 0), end_time=datetime.time(9, 0))
+        for offset in (-10, 1, 2, 3)
+    ]
+    db_session.add_all(schedules)
+    db_session.flush()
+    db_session.add_all([
+        WateringEvent(user_id=target_id, schedule_id=schedule.id, walkway_id=prerequisite_data["walkway_id"],
+                      start_time=datetime.datetime(2025, 5, 1, 8, 0), end_time=datetime.datetime(2025, 5, 1, 8, 30),
+                      duration_minutes=30, volume_liters=12.0)
+        for schedule in schedules
+    ])
+    db_session.add_all([
+        Notification(user_id=target_id, title=f"Aviso {i}", message="Mensaje", type="info") for i in range(5)
+    ])
+    template = RecurringWateringSchedule(user_id=target_id, weekday_mask=0b11, start_time=datetime.time(6, 0), end_time=datetime.time(7, 0),
+                                         valid_from=first_day, valid_until=last_day)
+    template.exceptions.append(RecurringScheduleException(occurrence_date=today + datetime.timedelta(days=7), is_cancelled=True))
+    db_session.add(template)
+    db_session.commit()
+    WalkwayOccupancyService(db_session).rebuild(prerequisite_data["walkway_id"], first_day, last_day)
+    occupancy_repo = WalkwayOccupancyRepository(db_session)
+    past = (datetime.datetime.combine(first_day, datetime.time()), datetime.datetime.combine(today, datetime.time()))
+    future = (past[1], datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time()))
+    assert occupancy_repo.get_max_occupancy(prerequisite_data["walkway_id"], *past) == 1
+    assert occupancy_repo.get_max_occupancy(prerequisite_data["walkway_id"], *future) == 1
+    assert WateringEventService(db_session).rebuild_usage_rollups() == 1
+
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(session))
+
+    # Act
+    with count_statements() as statements:
+        deleted_counts = UserService(db_session).delete_user(target_id, performing_user_id=admin_id)
+
+    # Assert
+    assert deleted_counts == {
+        "watering_events": 4,
+        "daily_water_usage": 1,
+        "user_watering_schedules": 4,
+        "recurring_schedule_exceptions": 1,
+        "recurring_watering_schedules": 1,
+        "notifications": 5,
+        "users": 1,
+    }
+    assert len([s for s in statements if s.startswith("DELETE")]) == 7
+    assert len(commits) == 1
+    assert user_repo.get_by_id(target_id) is None
+    assert db_session.query(WateringEvent).count() == 0
+    assert db_session.query(Notification).count() == 0
+    assert db_session.query(DailyWaterUsage).count() == 0
+    # La ocupación del andador queda liberada desde hoy; los días pasados no se tocan
+    assert occupancy_repo.get_max_occupancy(prerequisite_data["walkway_id"], *future) == 0
+    assert occupancy_repo.get_max_occupancy(prerequisite_data["walkway_id"], *past) == 1
+    assert user_repo.get_by_id(admin_id) is not None
+
+def test_service_update_user_moves_occupancy_to_new_walkway(user_repo: UserRepository, db_session: Session, prerequisite_data):
+    """Verifica que cambiar de andador traslada las reservas pendientes del usuario en la ocupación."""
+    import datetime
+    from database.models.recurring_watering_schedule import RecurringWateringSchedule
+    from database.models.user_watering_schedule import UserWateringSchedule
+    from repositories.walkway_occupancy_repository import WalkwayOccupancyRepository
+    from services.user_service import UserService
+    from services.walkway_occupancy_service import WalkwayOccupancyService
+
+    # Arrange
+    admin_type = UserType(name="Admin")
+    new_walkway = Walkway(name="Andador Nuevo", location_description="Norte")
+    db_session.add_all([admin_type, new_walkway])
+    db_session.commit()
+    old_walkway_id, new_walkway_id = prerequisite_data["walkway_id"], new_walkway.id
+    base_data = {
+        "password_hash": "hashed_password",
+        "first_name": "Nombre",
+        "last_name": "Apellido",
+        "walkway_id": old_walkway_id,
+        "access_schedule_rule_id": prerequisite_data["access_schedule_rule_id"],
+    }
+    admin = user_repo.create({**base_data, "name": "admin", "username": "admin", "email": "admin@example.com", "user_type_id": admin_type.id})
+    mover = user_repo.create({**base_data, "name": "mover", "username": "mover", "email": "mover@example.com", "user_type_id": prerequisite_data["user_type_id"]})
+
+    today = datetime.date.today()
+    first_day, last_day = today - datetime.timedelta(days=10), today + datetime.timedelta(days=30)
+    db_session.add_all([
+        UserWateringSchedule(user_id=mover.id, scheduled_date=today + datetime.timedelta(days=offset),
+                             start_time=datetime.time(8, 0), end_time=datetime.time(9, 0))
+        for offset in (-5, 2)
+    ])
+    db_session.add(RecurringWateringSchedule(user_id=mover.id, weekday_mask=0b1111111, start_time=datetime.time(6, 0),
+                                             end_time=datetime.time(7, 0), valid_from=first_day, valid_until=last_day))
+    db_session.commit()
+    WalkwayOccupancyService(db_session).rebuild(old_walkway_id, first_day, last_day)
+    occupancy_repo = WalkwayOccupancyRepository(db_session)
+    past = (datetime.datetime.combine(first_day, datetime.time()), datetime.datetime.combine(today, datetime.time()))
+    future = (past[1], datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time()))
+
+    # Act
+    UserService(db_session).update_user(mover.id, {"walkway_id": new_walkway_id}, performing_user_id=admin.id)
+
+    # Assert: desde hoy la carga pasa al andador nuevo; el pasado queda en el anterior
+    assert occupancy_repo.get_max_occupancy(old_walkway_id, *future) == 0
+    assert occupancy_repo.get_max_occupancy(old_walkway_id, *past) == 1
+    assert occupancy_repo.get_max_occupancy(new_walkway_id, *past) == 0
+    assert occupancy_repo.get_max_occupancy(new_walkway_id, *future) == 1
+    # Los contadores trasladados coinciden con los recalculados desde las programaciones
+    days = [today + datetime.timedelta(days=offset) for offset in range(31)]
+    moved = occupancy_repo.get_counters(new_walkway_id, days)
+    WalkwayOccupancyService(db_session).rebuild(new_walkway_id, today, last_day)
+    assert occupancy_repo.get_counters(new_walkway_id, days) == moved
+    # Las ocurrencias recurrentes no se guardan: se suman al leer en el andador actual del usuario
+    tomorrow_6 = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time(6, 0))
+    occupancy_service = WalkwayOccupancyService(db_session)
+    assert occupancy_service.get_max_concurrency(new_walkway_id, tomorrow_6, tomorrow_6 + datetime.timedelta(hours=1)) == 1
+    assert occupancy_service.get_max_concurrency(old_walkway_id, tomorrow_6, tomorrow_6 + datetime.timedelta(hours=1)) == 0
+
+def test_service_update_user_rejects_move_over_capacity(user_repo: UserRepository, db_session: Session, prerequisite_data):
+    """Verifica que no se puede cambiar de andador si las reservas pendientes no caben en el nuevo."""
+    import datetime
+    from database.models.user_watering_schedule import UserWateringSchedule
+    from repositories.walkway_occupancy_repository import WalkwayOccupancyRepository
+    from services.user_service import UserService
+    from services.walkway_occupancy_service import WalkwayOccupancyService
+
+    # Arrange: el andador nuevo admite un riego y ya lo tiene reservado a la misma hora
+    admin_type = UserType(name="Admin")
+    full_walkway = Walkway(name="Andador Lleno", location_description="Norte", max_concurrent_schedules=1)
+    db_session.add_all([admin_type, full_walkway])
+    db_session.commit()
+    old_walkway_id = prerequisite_data["walkway_id"]
+    base_data = {
+        "password_hash": "hashed_password",
+        "first_name": "Nombre",
+        "last_name": "Apellido",
+        "access_schedule_rule_id": prerequisite_data["access_schedule_rule_id"],
+        "user_type_id": prerequisite_data["user_type_id"],
+    }
+    admin = user_repo.create({**base_data, "name": "admin", "username": "admin", "email": "admin@example.com",
+                              "walkway_id": old_walkway_id, "user_type_id": admin_type.id})
+    mover = user_repo.create({**base_data, "name": "mover", "username": "mover", "email": "mover@example.com", "walkway_id": old_walkway_id})
+    resident = user_repo.create({**base_data, "name": "resident", "username": "resident", "email": "resident@example.com",
+                                 "walkway_id": full_walkway.id})
+    day = datetime.date.today() + datetime.timedelta(days=2)
+    db_session.add_all([
+        UserWateringSchedule(user_id=user.id, scheduled_date=day, start_time=datetime.time(8, 0), end_time=datetime.time(9, 0))
+        for user in (mover, resident)
+    ])
+    db_session.commit()
+    WalkwayOccupancyService(db_session).rebuild(old_walkway_id, day, day)
+    WalkwayOccupancyService(db_session).rebuild(full_walkway.id, day, day)
+
+    # Act / Assert
+    with pytest.raises(ValueError, match="máximo de 1 riegos simultáneos"):
+        UserService(db_session).update_user(mover.id, {"walkway_id": full_walkway.id}, performing_user_id=admin.id)
+
+    assert not db_session.in_transaction()
+    assert db_session.get(User, mover.id).walkway_id == old_walkway_id
+    window = (datetime.datetime.combine(day, datetime.time()), datetime.datetime.combine(day, datetime.time(23, 59)))
+    occupancy_repo = WalkwayOccupancyRepository(db_session)
+    assert occupancy_repo.get_max_occupancy(old_walkway_id, *window) == 1
+    assert occupancy_repo.get_max_occupancy(full_walkway.id, *window) == 1
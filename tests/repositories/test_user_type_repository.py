@@ -105,4 +105,41 @@ def test_delete_user_type(db_session: Session):
     # 3. Assert (Verificar)
     assert delete_result is True
     # Comprobar que el usuario ya no existe en la base de datos
-    assert user_type_repo.get_by_id(user_type_to_delete.id) is None
\ No newline at end of file
+    assert user_type_repo.get_by_id(user_type_to_delete.id) is None
+
+
+def test_get_page_walks_all_rows_with_cursor(db_session: Session):
+    """
+    Test para verificar que la paginación por clave recorre todas las filas sin repetir ninguna.
+    """
+    # 1. Arrange (Preparar)
+    user_type_repo = UserTypeRepository(db=db_session)
+    names = [f"Tipo {i:02d}" for i in range(7)]
+    for name in names:
+        user_type_repo.create({"name": name})
+
+    # 2. Act (Actuar)
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page = user_type_repo.get_page(cursor=cursor, limit=3)
+        seen.extend(user_type.name for user_type in page.items)
+        pages += 1
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+
+    # 3. Assert (Verificar)
+    assert pages == 3
+    assert seen == names
+
+def test_get_page_rejects_invalid_cursor(db_session: Session):
+    """
+    Test para verificar que un cursor manipulado produce un error de validación.
+    """
+    from Core.exceptions import ValidationError
+
+    user_type_repo = UserTypeRepository(db=db_session)
+    with pytest.raises(ValidationError):
+        user_type_repo.get_page(cursor="no-es-un-cursor")
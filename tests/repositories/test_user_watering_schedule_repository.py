@@ -1,9 +1,11 @@
 # test_user_watering_schedule_repository.py
 
 from datetime import time
+import random
 from uuid import uuid4
 import pytest
 import datetime
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from database.models.user_watering_schedule import UserWateringSchedule
 from database.models.walkway import Walkway
@@ -11,6 +13,9 @@ from database.models.user import User
 from database.models.access_schedule_rule import AccessScheduleRule
 from database.models.user_type import UserType
 from repositories.user_watering_schedule_repository import UserWateringScheduleRepository
+from repositories.schedule_interval_index import ScheduleIntervalIndex, day_windows
+from services.user_watering_schedule_service import UserWateringScheduleService
+from services.access_rule_engine import get_access_rule_engine, invalidate_access_rule_engine
 from database.models.access_schedule_rule import AccessScheduleRule
 
 
@@ -321,3 +326,344 @@ def test_delete_schedule_not_found(user_watering_schedule_repo: UserWateringSche
     non_existent_id = uuid4()
     result = user_watering_schedule_repo.delete(non_existent_id)
     assert result is False
+
+def test_time_bounds_maintained_on_insert_and_update(user_watering_schedule_repo: UserWateringScheduleRepository, schedule_fixture: UserWateringSchedule):
+    assert schedule_fixture.start_at == datetime.datetime.combine(schedule_fixture.scheduled_date, datetime.time(8, 0))
+    assert schedule_fixture.end_at == datetime.datetime.combine(schedule_fixture.scheduled_date, datetime.time(9, 0))
+
+    updated_schedule = user_watering_schedule_repo.update(schedule_fixture.id, {'end_time': datetime.time(10, 30)})
+
+    assert updated_schedule.end_at == datetime.datetime.combine(schedule_fixture.scheduled_date, datetime.time(10, 30))
+
+def test_bulk_update_keeps_time_bounds_in_sync(user_watering_schedule_repo: UserWateringScheduleRepository, schedule_fixture: UserWateringSchedule, db_session: Session):
+    new_date = schedule_fixture.scheduled_date + datetime.timedelta(days=1)
+    updated = user_watering_schedule_repo.bulk_update(
+        {'user_id': schedule_fixture.user_id},
+        {'scheduled_date': new_date, 'start_time': datetime.time(23, 0), 'end_time': datetime.time(1, 0)},
+    )
+
+    assert updated == 1
+    db_session.refresh(schedule_fixture)
+    assert schedule_fixture.start_at == datetime.datetime.combine(new_date, datetime.time(23, 0))
+    assert schedule_fixture.end_at == datetime.datetime.combine(new_date + datetime.timedelta(days=1), datetime.time(1, 0))
+
+    # Cambios parciales de las columnas de origen o asignación directa de las derivadas
+    with pytest.raises(ValueError):
+        user_watering_schedule_repo.bulk_update({'id': schedule_fixture.id}, {'end_time': datetime.time(2, 0)})
+    with pytest.raises(ValueError):
+        user_watering_schedule_repo.bulk_update({'id': schedule_fixture.id}, {'start_at': datetime.datetime(2025, 1, 1)})
+    # Las columnas no relacionadas se siguen actualizando directamente
+    assert user_watering_schedule_repo.bulk_update({'id': schedule_fixture.id}, {'is_active': False}) == 1
+
+def test_get_overlapping_schedules_across_midnight(user_watering_schedule_repo: UserWateringScheduleRepository, user_fixture: User):
+    ids = user_watering_schedule_repo.bulk_create([{
+        'user_id': user_fixture.id,
+        'scheduled_date': datetime.date(2025, 8, 4),
+        'start_time': datetime.time(23, 30),
+        'end_time': datetime.time(0, 30),
+    }])
+
+    overlapping_schedules = user_watering_schedule_repo.get_overlapping_schedules(
+        user_id=user_fixture.id,
+        start_time=datetime.datetime(2025, 8, 5, 0, 0),
+        end_time=datetime.datetime(2025, 8, 5, 1, 0)
+    )
+
+    assert [schedule.id for schedule in overlapping_schedules] == ids
+    assert overlapping_schedules[0].end_at == datetime.datetime(2025, 8, 5, 0, 30)
+
+def test_get_overlapping_schedules_full_day_at_lower_bound(user_watering_schedule_repo: UserWateringScheduleRepository, user_fixture: User):
+    # end_time == start_time ocupa 24 horas: es la programación más larga que cubre la cota inferior de start_at
+    ids = user_watering_schedule_repo.bulk_create([{
+        'user_id': user_fixture.id,
+        'scheduled_date': datetime.date(2025, 8, 4),
+        'start_time': datetime.time(10, 0),
+        'end_time': datetime.time(10, 0),
+    }])
+
+    overlapping_schedules = user_watering_schedule_repo.get_overlapping_schedules(
+        user_id=user_fixture.id,
+        start_time=datetime.datetime(2025, 8, 5, 9, 59),
+        end_time=datetime.datetime(2025, 8, 5, 11, 0)
+    )
+    assert [schedule.id for schedule in overlapping_schedules] == ids
+
+    assert user_watering_schedule_repo.get_overlapping_schedules(
+        user_id=user_fixture.id,
+        start_time=datetime.datetime(2025, 8, 5, 10, 0),
+        end_time=datetime.datetime(2025, 8, 5, 11, 0)
+    ) == []
+
+def test_backfill_time_bounds(user_watering_schedule_repo: UserWateringScheduleRepository, user_fixture: User, db_session: Session):
+    """Verifica que las filas anteriores a start_at / end_at se pueden convertir."""
+    ids = user_watering_schedule_repo.bulk_create([
+        {'user_id': user_fixture.id, 'scheduled_date': datetime.date(2025, 8, 4),
+         'start_time': datetime.time(8, 0), 'end_time': datetime.time(9, 0)},
+        {'user_id': user_fixture.id, 'scheduled_date': datetime.date(2025, 8, 4),
+         'start_time': datetime.time(23, 30), 'end_time': datetime.time(0, 30)},
+    ])
+
+    # Filas anteriores a las columnas: start_at / end_at = NULL
+    db_session.execute(update(UserWateringSchedule).values(start_at=None, end_at=None))
+    db_session.commit()
+    window = (datetime.datetime(2025, 8, 4), datetime.datetime(2025, 8, 6))
+    assert user_watering_schedule_repo.get_overlapping_schedules(user_fixture.id, *window) == []
+
+    assert user_watering_schedule_repo.backfill_time_bounds(batch_size=1) == 2
+    assert sorted(s.id for s in user_watering_schedule_repo.get_overlapping_schedules(user_fixture.id, *window)) == sorted(ids)
+    late = db_session.get(UserWateringSchedule, ids[1])
+    db_session.refresh(late)
+    assert late.end_at == datetime.datetime(2025, 8, 5, 0, 30)
+    assert user_watering_schedule_repo.backfill_time_bounds() == 0
+
+def test_backfill_time_bounds_reads_in_batches(user_watering_schedule_repo: UserWateringScheduleRepository, user_fixture: User,
+                                               db_session: Session, count_statements):
+    """Verifica que la conversión lee las filas por lotes en lugar de cargarlas todas antes de actualizar."""
+    user_watering_schedule_repo.bulk_create([
+        {'user_id': user_fixture.id, 'scheduled_date': datetime.date(2025, 8, day),
+         'start_time': datetime.time(8, 0), 'end_time': datetime.time(9, 0)}
+        for day in range(1, 6)
+    ])
+    db_session.execute(update(UserWateringSchedule).values(start_at=None, end_at=None))
+    db_session.commit()
+
+    with count_statements() as statements:
+        assert user_watering_schedule_repo.backfill_time_bounds(batch_size=2) == 5
+
+    reads = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+    assert len(reads) == 3
+    assert all("LIMIT" in statement.upper() for statement in reads)
+    assert db_session.query(UserWateringSchedule).filter(UserWateringSchedule.start_at.is_(None)).count() == 0
+
+def test_get_overlapping_schedules_adjacent_not_found(user_watering_schedule_repo: UserWateringScheduleRepository, schedule_fixture: UserWateringSchedule):
+    # Un rango que empieza justo cuando termina otro no se superpone
+    start_time = datetime.datetime.combine(schedule_fixture.scheduled_date, datetime.time(9, 0))
+
+    overlapping_schedules = user_watering_schedule_repo.get_overlapping_schedules(
+        user_id=schedule_fixture.user_id,
+        start_time=start_time,
+        end_time=start_time + datetime.timedelta(hours=1)
+    )
+
+    assert overlapping_schedules == []
+
+def test_get_upcoming_schedules_filtered(user_watering_schedule_repo: UserWateringScheduleRepository, user_fixture: User, db_session: Session):
+    other_walkway = Walkway(name="Upcoming Walkway", location_description="Elsewhere")
+    db_session.add(other_walkway)
+    db_session.flush()
+    other_user = User(
+        name="Upcoming User",
+        username="Upcoming User",
+        email=f"upcoming_{uuid4()}@example.com",
+        password_hash="hashed_password",
+        first_name="Upcoming",
+        last_name="User",
+        user_type_id=user_fixture.user_type_id,
+        walkway_id=other_walkway.id,
+        access_schedule_rule_id=user_fixture.access_schedule_rule_id
+    )
+    db_session.add(other_user)
+    db_session.commit()
+
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    own_ids = user_watering_schedule_repo.bulk_create([
+        {'user_id': user_fixture.id, 'scheduled_date': tomorrow, 'start_time': datetime.time(hour, 0), 'end_time': datetime.time(hour, 30)}
+        for hour in (10, 8, 9)
+    ])
+    other_ids = user_watering_schedule_repo.bulk_create([
+        {'user_id': other_user.id, 'scheduled_date': tomorrow, 'start_time': datetime.time(7, 0), 'end_time': datetime.time(7, 30)}
+    ])
+
+    assert [s.id for s in user_watering_schedule_repo.get_upcoming_schedules(limit=2)] == [other_ids[0], own_ids[1]]
+    assert [s.id for s in user_watering_schedule_repo.get_upcoming_schedules(user_id=user_fixture.id)] == [own_ids[1], own_ids[2], own_ids[0]]
+    assert [s.id for s in user_watering_schedule_repo.get_upcoming_schedules(walkway_id=other_walkway.id)] == other_ids
+
+def test_service_create_schedule_checks_access_rules(user_fixture: User, db_session: Session):
+    service = UserWateringScheduleService(db_session)
+    monday = datetime.date(2025, 8, 4)
+
+    schedule = service.create_schedule({
+        'user_id': user_fixture.id,
+        'start_time': datetime.datetime.combine(monday, datetime.time(9, 0)),
+        'end_time': datetime.datetime.combine(monday, datetime.time(10, 0)),
+    })
+
+    assert schedule.scheduled_date == monday
+    assert schedule.start_time == datetime.time(9, 0)
+
+    # Fuera del horario de la regla (lunes a viernes de 8:00 a 17:00)
+    with pytest.raises(ValueError, match="reglas de acceso"):
+        service.create_schedule({
+            'user_id': user_fixture.id,
+            'start_time': datetime.datetime.combine(monday, datetime.time(16, 30)),
+            'end_time': datetime.datetime.combine(monday, datetime.time(17, 30)),
+        })
+    with pytest.raises(ValueError, match="reglas de acceso"):
+        service.create_schedule({
+            'user_id': user_fixture.id,
+            'start_time': datetime.datetime.combine(monday + datetime.timedelta(days=5), datetime.time(9, 0)),
+            'end_time': datetime.datetime.combine(monday + datetime.timedelta(days=5), datetime.time(10, 0)),
+        })
+
+def _schedule_item(user_id: int, day: datetime.date, start_hour: int, minutes: int = 30) -> dict:
+    start_time = datetime.datetime.combine(day, datetime.time(start_hour, 0))
+    return {'user_id': user_id, 'start_time': start_time, 'end_time': start_time + datetime.timedelta(minutes=minutes)}
+
+def test_service_create_schedules_reports_per_item_errors(user_fixture: User, schedule_fixture: UserWateringSchedule, db_session: Session):
+    service = UserWateringScheduleService(db_session)
+    # schedule_fixture ocupa hoy de 8:00 a 9:00; se usa un lunes para las reglas
+    monday = datetime.date(2025, 8, 4)
+    service.create_schedule(_schedule_item(user_fixture.id, monday, 10))
+
+    result = service.create_schedules([
+        _schedule_item(user_fixture.id, monday, 9),              # válido
+        _schedule_item(user_fixture.id, monday, 9, minutes=15),  # se superpone con el anterior del lote
+        _schedule_item(user_fixture.id, monday, 10),             # se superpone con la base de datos
+        _schedule_item(user_fixture.id, monday, 20),             # fuera de las reglas de acceso
+        _schedule_item(9999, monday, 11),                        # usuario inexistente
+        _schedule_item(user_fixture.id, monday, 12, minutes=180),  # demasiado largo
+        _schedule_item(user_fixture.id, monday + datetime.timedelta(days=1), 9),  # válido
+    ])
+
+    assert sorted(result["created"]) == [0, 6]
+    assert sorted(result["errors"]) == [1, 2, 3, 4, 5]
+    assert "superpone" in result["errors"][1]
+    assert "superpone" in result["errors"][2]
+    assert "reglas de acceso" in result["errors"][3]
+    created = db_session.get(UserWateringSchedule, result["created"][6])
+    assert created.scheduled_date == monday + datetime.timedelta(days=1)
+    assert created.start_at == datetime.datetime.combine(monday + datetime.timedelta(days=1), datetime.time(9, 0))
+
+def test_service_create_schedules_constant_query_count(user_fixture: User, db_session: Session, count_statements):
+    service = UserWateringScheduleService(db_session)
+    user_id = user_fixture.id
+    first_monday = datetime.date(2025, 8, 4)
+
+    def count_batch_statements(batch):
+        with count_statements() as statements:
+            result = service.create_schedules(batch)
+        assert result["errors"] == {}
+        return len(statements)
+
+    # Reglas de acceso compiladas antes de medir: ninguno de los dos lotes las consulta
+    invalidate_access_rule_engine(db_session)
+    get_access_rule_engine(db_session)
+
+    small = count_batch_statements([_schedule_item(user_id, first_monday, 8)])
+    large = count_batch_statements([
+        _schedule_item(user_id, first_monday + datetime.timedelta(weeks=week, days=day), 9)
+        for week in range(1, 11) for day in range(5)
+    ])
+
+    # Las mismas consultas por conjuntos e INSERT sea cual sea el tamaño del lote
+    assert large == small
+
+def test_schedule_interval_index_matches_brute_force():
+    rng = random.Random(7)
+    base = datetime.datetime(2025, 8, 4)
+    intervals = []
+    index = ScheduleIntervalIndex()
+    for schedule_id in range(300):
+        user_id = rng.randint(1, 3)
+        start = base + datetime.timedelta(minutes=rng.randrange(0, 3 * 24 * 60, 5))
+        end = start + datetime.timedelta(minutes=rng.randrange(5, 180, 5))
+        intervals.append((schedule_id, user_id, start, end))
+        index.add(user_id, start, end, schedule_id)
+
+    for _ in range(300):
+        user_id = rng.randint(1, 3)
+        start = base + datetime.timedelta(minutes=rng.randrange(0, 3 * 24 * 60, 5))
+        end = start + datetime.timedelta(minutes=rng.randrange(5, 180, 5))
+        expected = sorted(i for i, u, s, e in intervals if u == user_id and s < end and e > start)
+
+        assert sorted(i for i, _, _ in index.find_overlapping(user_id, start, end)) == expected
+        assert index.overlaps(user_id, start, end) == bool(expected)
+
+def test_schedule_interval_index_across_midnight_and_copy():
+    index = ScheduleIntervalIndex()
+    index.add(1, datetime.datetime(2025, 8, 4, 23, 30), datetime.datetime(2025, 8, 5, 0, 30), 10)
+
+    assert index.overlaps(1, datetime.datetime(2025, 8, 5, 0, 0), datetime.datetime(2025, 8, 5, 1, 0))
+    assert not index.overlaps(1, datetime.datetime(2025, 8, 5, 0, 30), datetime.datetime(2025, 8, 5, 1, 0))
+    assert not index.overlaps(1, datetime.datetime(2025, 8, 5, 0, 0), datetime.datetime(2025, 8, 5, 1, 0), exclude_schedule_id=10)
+
+    simulation = index.copy()
+    simulation.remove(1, datetime.datetime(2025, 8, 4, 23, 30), datetime.datetime(2025, 8, 5, 0, 30), 10)
+    assert len(simulation) == 0 and len(index) == 1
+    assert index.overlaps(1, datetime.datetime(2025, 8, 4, 23, 0), datetime.datetime(2025, 8, 4, 23, 45))
+
+def test_day_windows_merge_consecutive_days():
+    day = datetime.date(2025, 8, 4)
+    at = lambda offset: datetime.datetime.combine(day + datetime.timedelta(days=offset), datetime.time())
+
+    assert day_windows([day + datetime.timedelta(days=offset) for offset in (5, 0, 1, 1, 3)]) == [
+        (at(0), at(2)), (at(3), at(4)), (at(5), at(6)),
+    ]
+    assert day_windows([]) == []
+
+def test_load_interval_index(user_watering_schedule_repo: UserWateringScheduleRepository, schedule_fixture: UserWateringSchedule):
+    day_start = datetime.datetime.combine(schedule_fixture.scheduled_date, datetime.time())
+
+    index = user_watering_schedule_repo.load_interval_index(
+        [schedule_fixture.user_id], day_start, day_start + datetime.timedelta(days=1)
+    )
+
+    assert len(index) == 1
+    assert [i for i, _, _ in index.find_overlapping(schedule_fixture.user_id, day_start, day_start + datetime.timedelta(hours=12))] == [schedule_fixture.id]
+
+def test_load_interval_index_in_windows_reads_only_batch_days(user_watering_schedule_repo: UserWateringScheduleRepository, user_fixture: User):
+    day = datetime.date(2025, 8, 4)
+    ids = user_watering_schedule_repo.bulk_create([
+        # Cruza la medianoche hacia el primer día de la ventana
+        {'user_id': user_fixture.id, 'scheduled_date': day - datetime.timedelta(days=1),
+         'start_time': datetime.time(23, 30), 'end_time': datetime.time(0, 30)},
+        # Entre las dos ventanas: no se carga
+        {'user_id': user_fixture.id, 'scheduled_date': day + datetime.timedelta(days=15),
+         'start_time': datetime.time(8, 0), 'end_time': datetime.time(9, 0)},
+        {'user_id': user_fixture.id, 'scheduled_date': day + datetime.timedelta(days=30),
+         'start_time': datetime.time(8, 0), 'end_time': datetime.time(9, 0)},
+    ])
+
+    windows = day_windows([day, day + datetime.timedelta(days=30)])
+    index = user_watering_schedule_repo.load_interval_index_in_windows([user_fixture.id], windows)
+
+    assert sorted(i for i, _, _ in index.find_overlapping(user_fixture.id, datetime.datetime.combine(day, datetime.time()),
+                                                          datetime.datetime.combine(day + datetime.timedelta(days=31), datetime.time()))) == [ids[0], ids[2]]
+    assert user_watering_schedule_repo.load_interval_index_in_windows([user_fixture.id], []).find_overlapping(
+        user_fixture.id, datetime.datetime.combine(day, datetime.time()), datetime.datetime.combine(day, datetime.time(12, 0))) == []
+
+def test_free_windows_sweep_handles_overlapping_and_spanning_busy_intervals():
+    from services.user_watering_schedule_service import _free_windows
+    at = lambda hour, minute=0: datetime.datetime(2025, 8, 4, hour, minute)
+    allowed = [(at(6), at(9)), (at(10), at(14))]
+    busy = [(at(7), at(8)), (at(7, 30), at(7, 45)), (at(8, 50), at(10, 30)), (at(12), at(12, 10))]
+
+    assert _free_windows(allowed, busy, datetime.timedelta(minutes=30)) == [
+        (at(6), at(7)), (at(8), at(8, 50)), (at(10, 30), at(12)), (at(12, 10), at(14)),
+    ]
+    assert _free_windows(allowed, busy, datetime.timedelta(minutes=51)) == [
+        (at(6), at(7)), (at(10, 30), at(12)), (at(12, 10), at(14)),
+    ]
+    assert _free_windows(allowed, busy, datetime.timedelta(minutes=61)) == [(at(10, 30), at(12)), (at(12, 10), at(14))]
+
+def test_service_find_free_slots(user_fixture: User, db_session: Session):
+    service = UserWateringScheduleService(db_session)
+    monday = datetime.date(2025, 8, 4)
+    at = lambda hour, minute=0: datetime.datetime.combine(monday, datetime.time(hour, minute))
+    neighbour = User(name="Vecino", first_name="Ve", last_name="Cino", username="vecino", email=f"vecino_{uuid4()}@example.com",
+                     password_hash="hashed_password", user_type_id=user_fixture.user_type_id, walkway_id=user_fixture.walkway_id,
+                     access_schedule_rule_id=user_fixture.access_schedule_rule_id)
+    db_session.add(neighbour)
+    db_session.commit()
+    service.create_schedule({'user_id': user_fixture.id, 'start_time': at(9), 'end_time': at(10)})
+    # El andador también está ocupado cuando riega otro usuario
+    service.create_schedule({'user_id': neighbour.id, 'start_time': at(12), 'end_time': at(12, 30)})
+
+    slots = service.find_free_slots(user_fixture.id, monday, datetime.timedelta(minutes=30))
+
+    assert slots == [(at(8), at(9)), (at(10), at(12)), (at(12, 30), at(17))]
+    assert service.find_free_slots(user_fixture.id, monday, datetime.timedelta(minutes=90)) == [(at(10), at(12)), (at(12, 30), at(17))]
+    # Sábado: sin reglas de acceso
+    assert service.find_free_slots(user_fixture.id, monday + datetime.timedelta(days=5), datetime.timedelta(minutes=30)) == []
+    with pytest.raises(ValueError, match="duración máxima"):
+        service.find_free_slots(user_fixture.id, monday, datetime.timedelta(hours=3))
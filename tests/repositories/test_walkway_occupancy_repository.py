@@ -0,0 +1,269 @@
+# test_walkway_occupancy_repository.py
+
+import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from database.models.access_schedule_rule import AccessScheduleRule
+from database.models.user import User
+from database.models.user_type import UserType
+from database.models.walkway import Walkway
+from database.models.walkway_occupancy import WalkwayOccupancy, MINUTES_PER_DAY
+from repositories.walkway_occupancy_repository import WalkwayOccupancyRepository, day_segments
+from services.recurring_schedule_service import RecurringScheduleService
+from services.user_watering_schedule_service import UserWateringScheduleService
+from services import walkway_occupancy_service
+from services.walkway_occupancy_service import WalkwayOccupancyService
+
+
+DAY = datetime.date(2025, 8, 4)  # lunes
+
+
+@pytest.fixture(scope="function")
+def walkway_users(db_session: Session):
+    user_type = UserType(name="Regante")
+    walkway = Walkway(name="Andador Ocupación", location_description="Sur", max_concurrent_schedules=3)
+    db_session.add_all([user_type, walkway])
+    db_session.flush()
+    rule = AccessScheduleRule(rule_name="Siempre", day_of_week="0,1,2,3,4,5,6", start_time=datetime.time(0, 0),
+                              end_time=datetime.time(23, 59), user_type_id=user_type.id, walkway_id=walkway.id)
+    db_session.add(rule)
+    db_session.flush()
+    users = [
+        User(name=f"Ocupante {i}", username=f"ocupante{i}", email=f"ocupante_{uuid4()}@example.com", password_hash="hashed_password",
+             first_name="Ocu", last_name="Pante", user_type_id=user_type.id, walkway_id=walkway.id, access_schedule_rule_id=rule.id)
+        for i in range(2)
+    ]
+    db_session.add_all(users)
+    db_session.commit()
+    return walkway, users
+
+def _at(hour: int, minute: int = 0, day: datetime.date = DAY) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time(hour, minute))
+
+
+def test_day_segments_round_partial_minutes_and_split_at_midnight():
+    start = datetime.datetime(2025, 8, 4, 23, 30, 30)
+    end = datetime.datetime(2025, 8, 5, 0, 10, 15)
+
+    assert list(day_segments(start, end)) == [
+        (DAY, 23 * 60 + 30, MINUTES_PER_DAY),
+        (DAY + datetime.timedelta(days=1), 0, 11),
+    ]
+
+def test_apply_increments_and_releases(db_session: Session, walkway_users):
+    walkway, _ = walkway_users
+    repo = WalkwayOccupancyRepository(db_session)
+
+    repo.apply([(walkway.id, _at(8), _at(9), 1), (walkway.id, _at(8, 30), _at(10), 1)])
+    assert repo.get_max_occupancy(walkway.id, _at(8), _at(9)) == 2
+    assert repo.get_max_occupancy(walkway.id, _at(9), _at(10)) == 1
+    assert repo.get_max_occupancy(walkway.id, _at(10), _at(12)) == 0
+
+    repo.apply([(walkway.id, _at(8, 30), _at(10), -1)])
+    assert repo.get_max_occupancy(walkway.id, _at(8), _at(10)) == 1
+    # Una liberación sobre un día sin fila no crea nada
+    repo.apply([(walkway.id, _at(8, day=DAY + datetime.timedelta(days=3)), _at(9, day=DAY + datetime.timedelta(days=3)), -1)])
+    assert db_session.query(WalkwayOccupancy).count() == 1
+
+def test_services_keep_occupancy_in_sync(db_session: Session, walkway_users):
+    walkway, (first, second) = walkway_users
+    schedule_service = UserWateringScheduleService(db_session)
+    occupancy_service = WalkwayOccupancyService(db_session)
+
+    a = schedule_service.create_schedule({'user_id': first.id, 'start_time': _at(7), 'end_time': _at(8)})
+    schedule_service.create_schedule({'user_id': second.id, 'start_time': _at(7, 30), 'end_time': _at(8, 30)})
+    schedule_service.create_schedules([{'user_id': first.id, 'start_time': _at(23, 30), 'end_time': _at(0, 30, DAY + datetime.timedelta(days=1))}])
+    assert occupancy_service.get_max_concurrency(walkway.id, _at(7), _at(9)) == 2
+    assert not occupancy_service.is_walkway_free(walkway.id, _at(7, 45), _at(8), capacity=2)
+    assert occupancy_service.is_walkway_free(walkway.id, _at(7, 45), _at(8))
+
+    schedule_service.update_schedule(a.id, {'start_time': _at(10), 'end_time': _at(11)})
+    assert occupancy_service.get_max_concurrency(walkway.id, _at(7), _at(9)) == 1
+    assert occupancy_service.get_max_concurrency(walkway.id, _at(10), _at(11)) == 1
+
+    schedule_service.delete_schedule(a.id)
+    assert occupancy_service.is_walkway_free(walkway.id, _at(10), _at(11), capacity=1)
+
+    recurring_service = RecurringScheduleService(db_session)
+    template = recurring_service.create_recurring_schedule({
+        'user_id': second.id, 'weekdays': "Mon", 'start_time': datetime.time(12, 0), 'end_time': datetime.time(13, 0),
+        'valid_from': DAY, 'valid_until': DAY + datetime.timedelta(weeks=3),
+    })
+    recurring_service.cancel_occurrence(template.id, DAY + datetime.timedelta(weeks=1))
+    recurring_service.reschedule_occurrence(template.id, DAY + datetime.timedelta(weeks=2), datetime.time(14, 0), datetime.time(15, 0))
+    recurring_service.materialize_occurrence(template.id, DAY)
+
+    incremental = {
+        day: occupancy_service.get_day_counters(walkway.id, day)
+        for day in (DAY + datetime.timedelta(days=offset) for offset in range(22))
+    }
+    occupancy_service.rebuild(walkway.id, DAY, DAY + datetime.timedelta(days=21))
+    rebuilt = {day: occupancy_service.get_day_counters(walkway.id, day) for day in incremental}
+    assert incremental == rebuilt
+    assert rebuilt[DAY + datetime.timedelta(weeks=1)] == bytes(MINUTES_PER_DAY)
+
+    recurring_service.delete_recurring_schedule(template.id)
+    assert occupancy_service.is_walkway_free(walkway.id, _at(14, day=DAY + datetime.timedelta(weeks=2)),
+                                             _at(15, day=DAY + datetime.timedelta(weeks=2)), capacity=1)
+    # La ocurrencia materializada sigue ocupando el andador
+    assert not occupancy_service.is_walkway_free(walkway.id, _at(12), _at(13), capacity=1)
+
+def test_pending_occurrences_are_overlaid_not_stored(db_session: Session, walkway_users):
+    walkway, (first, _) = walkway_users
+    occupancy_repo = WalkwayOccupancyRepository(db_session)
+    occupancy_service = WalkwayOccupancyService(db_session)
+    recurring_service = RecurringScheduleService(db_session)
+    schedule_service = UserWateringScheduleService(db_session)
+
+    template = recurring_service.create_recurring_schedule({
+        'user_id': first.id, 'weekdays': "Mon", 'start_time': datetime.time(12, 0), 'end_time': datetime.time(13, 0),
+        'valid_from': DAY, 'valid_until': DAY + datetime.timedelta(days=365),
+    })
+    # Una plantilla de un año no escribe ninguna fila de ocupación, pero se ve al leer
+    assert db_session.query(WalkwayOccupancy).filter_by(walkway_id=walkway.id).count() == 0
+    assert occupancy_service.get_max_concurrency(walkway.id, _at(12), _at(13)) == 1
+
+    def assert_stored_matches_rebuild():
+        stored = occupancy_repo.get_counters(walkway.id, [DAY])
+        occupancy_service.rebuild(walkway.id, DAY, DAY)
+        assert occupancy_repo.get_counters(walkway.id, [DAY]) == stored
+
+    materialized = recurring_service.materialize_occurrence(template.id, DAY)
+    assert_stored_matches_rebuild()
+    assert occupancy_service.get_max_concurrency(walkway.id, _at(12), _at(13)) == 1
+
+    # Al borrar la materializada, la ocurrencia vuelve a estar pendiente: ni se pierde ni se cuenta dos veces
+    schedule_service.delete_schedule(materialized.id)
+    assert_stored_matches_rebuild()
+    assert occupancy_repo.get_counters(walkway.id, [DAY])[DAY] == bytes(MINUTES_PER_DAY)
+    assert occupancy_service.get_max_concurrency(walkway.id, _at(12), _at(13)) == 1
+
+def test_schedule_admission_respects_walkway_capacity(db_session: Session, walkway_users):
+    walkway, (first, second) = walkway_users
+    walkway.max_concurrent_schedules = 1
+    db_session.commit()
+    schedule_service = UserWateringScheduleService(db_session)
+
+    schedule = schedule_service.create_schedule({'user_id': first.id, 'start_time': _at(7), 'end_time': _at(8)})
+    with pytest.raises(ValueError, match="máximo de 1 riegos simultáneos"):
+        schedule_service.create_schedule({'user_id': second.id, 'start_time': _at(7, 30), 'end_time': _at(8, 30)})
+    # El rechazo deshace la transacción: los contadores bloqueados no quedan retenidos
+    assert not db_session.in_transaction()
+    # Contiguo sí cabe, y al modificar se descuenta el horario anterior de la propia programación
+    second_schedule = schedule_service.create_schedule({'user_id': second.id, 'start_time': _at(8), 'end_time': _at(9)})
+    schedule_service.update_schedule(schedule.id, {'start_time': _at(6, 30), 'end_time': _at(7, 30)})
+    with pytest.raises(ValueError, match="máximo de 1 riegos simultáneos"):
+        schedule_service.update_schedule(second_schedule.id, {'start_time': _at(7), 'end_time': _at(8)})
+    assert not db_session.in_transaction()
+
+    result = schedule_service.create_schedules([
+        {'user_id': first.id, 'start_time': _at(10), 'end_time': _at(11)},
+        {'user_id': second.id, 'start_time': _at(10, 30), 'end_time': _at(11, 30)},
+    ])
+    assert list(result["created"]) == [0]
+    assert "máximo de 1" in result["errors"][1]
+
+    next_monday = DAY + datetime.timedelta(weeks=1)
+    schedule_service.create_schedule({'user_id': first.id, 'start_time': _at(10, 30, next_monday), 'end_time': _at(11, 0, next_monday)})
+    with pytest.raises(ValueError, match=f"{next_monday} supera el máximo"):
+        RecurringScheduleService(db_session).create_recurring_schedule({
+            'user_id': second.id, 'weekdays': "Mon", 'start_time': datetime.time(10, 30), 'end_time': datetime.time(11, 0),
+            'valid_from': DAY + datetime.timedelta(days=1), 'valid_until': DAY + datetime.timedelta(weeks=4),
+        })
+    assert not db_session.in_transaction()
+
+def test_capacity_check_keeps_the_callers_transaction(db_session: Session, walkway_users):
+    walkway, (first, _) = walkway_users
+    walkway.max_concurrent_schedules = 1
+    db_session.commit()
+    UserWateringScheduleService(db_session).create_schedule({'user_id': first.id, 'start_time': _at(7), 'end_time': _at(8)})
+    first.first_name = "Pendiente"
+
+    assert WalkwayOccupancyService(db_session).first_over_capacity(walkway.id, [(_at(7), _at(8))]) == (0, 1)
+    # La comprobación es de solo lectura: no deshace el trabajo pendiente de quien la llama
+    assert db_session.in_transaction()
+    assert first.first_name == "Pendiente"
+
+def test_capacity_check_streams_intervals_in_chunks(db_session: Session, walkway_users, monkeypatch):
+    walkway, (first, second) = walkway_users
+    walkway.max_concurrent_schedules = 1
+    db_session.commit()
+    monkeypatch.setattr(walkway_occupancy_service, "_CAPACITY_CHECK_CHUNK", 2)
+    occupancy_service = WalkwayOccupancyService(db_session)
+    consumed = []
+
+    def nightly(days: int, last=None):
+        for offset in range(days):
+            day = DAY + datetime.timedelta(days=offset)
+            consumed.append(day)
+            yield _at(23, 30, day), _at(0, 15, day + datetime.timedelta(days=1))
+        if last:
+            yield last
+
+    # El último intervalo choca con el admitido en el lote anterior, que cruza la medianoche
+    next_midnight = _at(0, 0, DAY + datetime.timedelta(days=3))
+    assert occupancy_service.first_over_capacity(
+        walkway.id, nightly(3, (next_midnight, next_midnight + datetime.timedelta(minutes=10)))
+    ) == (3, 1)
+
+    # El generador se consume solo hasta el lote del intervalo que no cabe
+    schedule_service = UserWateringScheduleService(db_session)
+    day = DAY + datetime.timedelta(days=2)
+    schedule_service.create_schedule({'user_id': first.id, 'start_time': _at(23, 40, day), 'end_time': _at(23, 50, day)})
+    consumed.clear()
+    assert occupancy_service.first_over_capacity(walkway.id, nightly(1000)) == (2, 1)
+    assert len(consumed) == 4
+
+    # Una plantilla larga informa de la fecha de la ocurrencia rechazada sin expandirse entera
+    late_monday = DAY + datetime.timedelta(weeks=52)
+    schedule_service.create_schedule({'user_id': first.id, 'start_time': _at(12, day=late_monday), 'end_time': _at(13, day=late_monday)})
+    with pytest.raises(ValueError, match=f"{late_monday} supera el máximo"):
+        RecurringScheduleService(db_session).create_recurring_schedule({
+            'user_id': second.id, 'weekdays': "Mon", 'start_time': datetime.time(12, 0), 'end_time': datetime.time(13, 0),
+            'valid_from': DAY, 'valid_until': DAY + datetime.timedelta(weeks=200),
+        })
+
+def test_admission_locks_occupancy_rows(db_session: Session, walkway_users):
+    walkway, (first, _) = walkway_users
+    schedule_service = UserWateringScheduleService(db_session)
+    schedule_service.create_schedule({'user_id': first.id, 'start_time': _at(7), 'end_time': _at(8)})
+
+    # SQLite no emite FOR UPDATE: se comprueba la sentencia compilada para PostgreSQL
+    reads = []
+    listener = lambda state: state.is_select and reads.append(str(state.statement.compile(dialect=postgresql.dialect())))
+    event.listen(db_session, "do_orm_execute", listener)
+    try:
+        WalkwayOccupancyService(db_session).first_over_capacity(walkway.id, [(_at(7), _at(8))])
+        schedule_service.create_schedules([{'user_id': first.id, 'start_time': _at(9), 'end_time': _at(10)}])
+    finally:
+        event.remove(db_session, "do_orm_execute", listener)
+
+    counter_reads = [statement for statement in reads if "FROM walkway_occupancy" in statement]
+    assert len(counter_reads) >= 2
+    assert all(statement.rstrip().endswith("FOR UPDATE") for statement in counter_reads)
+    # El andador también se bloquea: serializa las admisiones de plantillas, que no escriben contadores
+    assert any("FROM walkways" in statement and statement.rstrip().endswith("FOR UPDATE") for statement in reads)
+
+def test_over_capacity_report(db_session: Session, walkway_users):
+    walkway, (first, second) = walkway_users
+    other = Walkway(name="Andador Lleno", location_description="Este", max_concurrent_schedules=1)
+    db_session.add(other)
+    db_session.commit()
+    schedule_service = UserWateringScheduleService(db_session)
+    schedule_service.create_schedule({'user_id': first.id, 'start_time': _at(7), 'end_time': _at(8)})
+    schedule_service.create_schedule({'user_id': second.id, 'start_time': _at(7, 30), 'end_time': _at(8, 30)})
+    # Se reduce la capacidad después de reservar: el andador queda por encima de su máximo
+    walkway.max_concurrent_schedules = 1
+    db_session.commit()
+
+    report = WalkwayOccupancyService(db_session).get_over_capacity_windows(DAY, DAY)
+
+    assert [(w.walkway_id, w.start_at, w.end_at, w.peak, w.max_concurrent_schedules) for w in report] == [
+        (walkway.id, _at(7, 30), _at(8), 2, 1),
+    ]
+    assert WalkwayOccupancyService(db_session).get_over_capacity_windows(DAY + datetime.timedelta(days=1), DAY + datetime.timedelta(days=2)) == []
@@ -119,4 +119,41 @@ def test_delete_walkway(walkway_repository: WalkwayRepository, existing_walkway:
 def test_delete_walkway_not_found(walkway_repository: WalkwayRepository):
     """Verifica que delete devuelve False si el andador no existe."""
     is_deleted = walkway_repository.delete(9999)
-    assert is_deleted is False
\ No newline at end of file
+    assert is_deleted is False
+
+
+def test_get_capacities(walkway_repository: WalkwayRepository, existing_walkway: Walkway, db_session: Session):
+    """Verifica que la capacidad por defecto es 1 y que se devuelven las capacidades configuradas."""
+    wide = Walkway(name="Canal Ancho", location_description="Zona B", max_concurrent_schedules=4)
+    db_session.add(wide)
+    db_session.commit()
+
+    assert walkway_repository.get_capacities() == {existing_walkway.id: 1, wide.id: 4}
+    assert walkway_repository.get_capacities([wide.id]) == {wide.id: 4}
+    assert walkway_repository.get_capacities([]) == {}
+
+
+def test_get_page_by_non_unique_sort_key(walkway_repository: WalkwayRepository, db_session: Session):
+    """Verifica que el id desempata los andadores con el mismo nombre, también entre páginas."""
+    walkways = [Walkway(name=name, location_description="Zona P") for name in ["B", "A", "B", "A"]]
+    db_session.add_all(walkways)
+    db_session.commit()
+    first_b, first_a, second_b, second_a = (walkway.id for walkway in walkways)
+
+    first = walkway_repository.get_page(limit=3, sort_key="name", descending=True)
+    second = walkway_repository.get_page(cursor=first.next_cursor, limit=3, sort_key="name", descending=True)
+
+    # El cursor cae entre los dos "A": el segundo debe llegar en la página siguiente, sin repetir el primero
+    assert [walkway.id for walkway in first.items] == [second_b, first_b, second_a]
+    assert [walkway.id for walkway in second.items] == [first_a]
+    assert second.next_cursor is None
+
+    ascending = []
+    cursor = None
+    while True:
+        page = walkway_repository.get_page(cursor=cursor, limit=1, sort_key="name")
+        ascending.extend(walkway.id for walkway in page.items)
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    assert ascending == [first_a, second_a, first_b, second_b]
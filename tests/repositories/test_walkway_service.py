@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from Core.exceptions import ValidationError
+from database.models.walkway_occupancy import MAX_TRACKED_CAPACITY
+from services.walkway_service import WalkwayService
+
+
+def test_create_walkway_validates_max_concurrent_schedules(walkway_service: WalkwayService):
+    """Verifica que el máximo de riegos simultáneos es un entero entre 1 y la capacidad que controlan los contadores."""
+    walkway = walkway_service.create_walkway("Canal Máximo", "Zona B", True, max_concurrent_schedules=MAX_TRACKED_CAPACITY)
+    assert walkway.max_concurrent_schedules == 254
+
+    for invalid in (0, -1, MAX_TRACKED_CAPACITY + 1, 2.5, True, None):
+        with pytest.raises(ValidationError, match="entre 1 y 254"):
+            walkway_service.create_walkway("Canal Inválido", "Zona B", True, max_concurrent_schedules=invalid)
+
+
+def test_update_walkway_keeps_or_validates_max_concurrent_schedules(walkway_service: WalkwayService, db_session: Session):
+    """Verifica que update_walkway conserva la capacidad si no se indica y valida la nueva."""
+    walkway = walkway_service.create_walkway("Canal Ancho", "Zona B", True, max_concurrent_schedules=4)
+
+    assert walkway_service.update_walkway(walkway.id, "Canal Ancho", "Zona C", True).max_concurrent_schedules == 4
+    with pytest.raises(ValidationError):
+        walkway_service.update_walkway(walkway.id, "Canal Ancho", "Zona B", True, max_concurrent_schedules=0)
+    with pytest.raises(ValidationError):
+        walkway_service.update_walkway(walkway.id, "Canal Ancho", "Zona B", True, max_concurrent_schedules=MAX_TRACKED_CAPACITY + 1)
+    db_session.refresh(walkway)
+    assert walkway.max_concurrent_schedules == 4
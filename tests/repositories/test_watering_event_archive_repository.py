@@ -0,0 +1,168 @@
+# test_watering_event_archive_repository.py
+
+import datetime
+import sqlite3
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database.base import Base
+from database.engine import create_db_engine, create_session_factory
+from database.models.access_schedule_rule import AccessScheduleRule
+from database.models.daily_water_usage import DailyWaterUsage
+from database.models.user import User
+from database.models.user_type import UserType
+from database.models.user_watering_schedule import UserWateringSchedule
+from database.models.walkway import Walkway
+from database.models.watering_event import WateringEvent
+from database.models.watering_event_archive import WateringEventArchive, ArchivedMonth
+from repositories.watering_event_archive_repository import add_months
+from repositories.watering_event_repository import WateringEventRepository
+from services.watering_event_service import WateringEventService
+
+
+@pytest.fixture(scope="function")
+def event_owner(db_session: Session):
+    user_type = UserType(name="Regante")
+    walkway = Walkway(name="Andador Archivo", location_description="Oeste")
+    db_session.add_all([user_type, walkway])
+    db_session.flush()
+    rule = AccessScheduleRule(rule_name="Siempre", day_of_week="0,1,2,3,4,5,6", start_time=datetime.time(0, 0),
+                              end_time=datetime.time(23, 59), user_type_id=user_type.id, walkway_id=walkway.id)
+    db_session.add(rule)
+    db_session.flush()
+    user = User(name="Archivero", username="archivero", email="archivero@example.com", password_hash="hashed_password",
+                first_name="Ar", last_name="Chivo", user_type_id=user_type.id, walkway_id=walkway.id, access_schedule_rule_id=rule.id)
+    db_session.add(user)
+    db_session.flush()
+    schedule = UserWateringSchedule(user_id=user.id, scheduled_date=datetime.date(2025, 6, 1),
+                                    start_time=datetime.time(6, 0), end_time=datetime.time(7, 0))
+    db_session.add(schedule)
+    db_session.commit()
+    return user, schedule
+
+
+def _monthly_events(user_id: int, walkway_id: int, schedule_id: int) -> list:
+    """Dos eventos por mes, de junio a agosto de 2025 (5 y 7 litros el primero y el segundo)."""
+    return [
+        {
+            "user_id": user_id, "walkway_id": walkway_id, "schedule_id": schedule_id,
+            "start_time": datetime.datetime(2025, month, day, 6, 0), "end_time": datetime.datetime(2025, month, day, 6, 30),
+            "duration_minutes": 30, "volume_liters": volume,
+        }
+        for month in (6, 7, 8) for day, volume in ((1, 5.0), (20, 7.0))
+    ]
+
+
+def test_add_months_crosses_years():
+    assert add_months(datetime.date(2025, 1, 1), -1) == datetime.date(2024, 12, 1)
+    assert add_months(datetime.date(2025, 11, 1), 3) == datetime.date(2026, 2, 1)
+
+
+def test_archive_closed_months_and_route_reads(db_session: Session, event_owner, count_statements):
+    user, schedule = event_owner
+    service = WateringEventService(db_session)
+    repo = WateringEventRepository(db_session)
+    service.record_watering_events(_monthly_events(user.id, user.walkway_id, schedule.id))
+
+    archived = service.archive_closed_months(keep_months=1, today=datetime.date(2025, 8, 15))
+
+    assert archived == {datetime.date(2025, 6, 1): 2}
+    assert db_session.query(WateringEvent).count() == 4
+    assert db_session.query(WateringEventArchive).count() == 2
+    assert [month.month_start for month in repo.archive_repo.get_archived_months()] == [datetime.date(2025, 6, 1)]
+    assert repo.archive_repo.get_horizon() == datetime.datetime(2025, 7, 1)
+
+    # Lecturas que cruzan el horizonte: primero los eventos activos y después los archivados
+    events = repo.get_events_for_user(user.id)
+    assert [event.start_time.month for event in events] == [8, 8, 7, 7, 6, 6]
+    assert [len(chunk) for chunk in repo.stream_events_for_user(user.id, chunk_size=3)] == [3, 1, 2]
+    assert len(repo.get_events_by_schedule(schedule.id)) == 6
+    assert [event.start_time.month for event in repo.get_recent_events(limit=5)] == [8, 8, 7, 7, 6]
+    assert repo.get_total_water_used() == 36.0
+    assert [(row.bucket_start.month, row.volume_liters) for row in repo.aggregate_usage("month")] == [
+        (6, 12.0), (7, 12.0), (8, 12.0)
+    ]
+
+    # Un rango posterior al horizonte no toca el archivo; uno anterior no toca la tabla de eventos
+    with count_statements() as statements:
+        recent = repo.get_events_for_user(user.id, start_date=datetime.date(2025, 7, 10))
+        old_total = repo.get_total_water_used(datetime.date(2025, 6, 1), datetime.date(2025, 6, 25))
+    assert len(recent) == 3
+    assert old_total == 12.0
+    assert len(statements) == 2
+    assert "watering_events_archive" not in statements[0]
+    assert "watering_events_archive" in statements[1]
+
+    # Los meses archivados están cerrados y los totales diarios se reconstruyen también desde el archivo
+    with pytest.raises(ValueError, match="ya está archivado"):
+        service.record_watering_events(_monthly_events(user.id, user.walkway_id, schedule.id)[:1])
+    rollups = {(row.usage_date, row.volume_liters) for row in db_session.query(DailyWaterUsage)}
+    assert service.rebuild_usage_rollups() == 6
+    assert {(row.usage_date, row.volume_liters) for row in db_session.query(DailyWaterUsage)} == rollups
+
+    assert repo.delete_for_user(user.id) == 6
+    assert db_session.query(WateringEventArchive).count() == 0
+
+
+def test_get_by_id_falls_back_to_archive(db_session: Session, event_owner):
+    user, schedule = event_owner
+    service = WateringEventService(db_session)
+    repo = WateringEventRepository(db_session)
+    ids = service.record_watering_events(_monthly_events(user.id, user.walkway_id, schedule.id))
+    service.archive_closed_months(keep_months=1, today=datetime.date(2025, 8, 15))
+
+    # Los eventos archivados conservan su ID; se leen del archivo pero no se modifican
+    archived = repo.get_by_id(ids[0])
+    assert isinstance(archived, WateringEventArchive)
+    assert archived.start_time == datetime.datetime(2025, 6, 1, 6, 0)
+    assert isinstance(service.get_event_by_id(ids[-1]), WateringEvent)
+    assert repo.get_by_id(9999) is None
+    assert repo.update(ids[0], {"volume_liters": 1.0}) is None
+    assert db_session.get(WateringEventArchive, ids[0]).volume_liters == 5.0
+
+
+def test_horizon_is_discarded_when_the_transaction_ends(db_session: Session, event_owner):
+    user, schedule = event_owner
+    service = WateringEventService(db_session)
+    archive_repo = WateringEventRepository(db_session).archive_repo
+    service.record_watering_events(_monthly_events(user.id, user.walkway_id, schedule.id))
+    service.archive_closed_months(keep_months=1, today=datetime.date(2025, 8, 15))
+    assert archive_repo.get_horizon() == datetime.datetime(2025, 7, 1)
+
+    # Un mes archivado por otro proceso no se ve hasta que termina la transacción en curso
+    db_session.execute(insert(ArchivedMonth).values(month_start=datetime.date(2025, 7, 1), event_count=0))
+    assert archive_repo.get_horizon() == datetime.datetime(2025, 7, 1)
+    db_session.commit()
+    assert archive_repo.get_horizon() == datetime.datetime(2025, 8, 1)
+
+    # Tras deshacer un archivado, el horizonte vuelve a calcularse
+    db_session.execute(insert(ArchivedMonth).values(month_start=datetime.date(2025, 8, 1), event_count=0))
+    archive_repo.reset_horizon()
+    assert archive_repo.get_horizon() == datetime.datetime(2025, 9, 1)
+    db_session.rollback()
+    assert archive_repo.get_horizon() == datetime.datetime(2025, 8, 1)
+
+
+def test_local_archive_lives_in_separate_sqlite_file(tmp_path):
+    archive_path = tmp_path / "archivo.db"
+    engine = create_db_engine("sqlite:///:memory:", archive_path=str(archive_path))
+    Base.metadata.create_all(engine)
+    db = create_session_factory(engine)()
+    try:
+        # Sin claves foráneas activas en SQLite: bastan IDs arbitrarios
+        WateringEventRepository(db).bulk_create(_monthly_events(1, 1, 1))
+
+        archived = WateringEventService(db).archive_closed_months(keep_months=0, today=datetime.date(2025, 8, 15))
+
+        assert archived == {datetime.date(2025, 6, 1): 2, datetime.date(2025, 7, 1): 2}
+        assert len(WateringEventRepository(db).get_events_for_user(1)) == 6
+        assert db.query(ArchivedMonth).count() == 2
+    finally:
+        db.close()
+        engine.dispose()
+
+    with sqlite3.connect(archive_path) as archive:
+        assert archive.execute("SELECT COUNT(*) FROM watering_events_archive").fetchone() == (4,)
+        assert archive.execute("SELECT COUNT(*) FROM watering_event_archive_months").fetchone() == (2,)
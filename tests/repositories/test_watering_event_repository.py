@@ -385,3 +385,324 @@ def test_get_total_water_used(watering_event_repo: WateringEventRepository,
         end_date=datetime.date(2023, 7, 26)
     )
     assert total_to_end == (10.5 + 20.0)
+
+# -------------------------------------------------------------------------------------
+# TESTS DE INSERCIÓN MASIVA
+# -------------------------------------------------------------------------------------
+
+def _event_rows(user: User, schedule: UserWateringSchedule, count: int) -> list:
+    """Genera filas de eventos válidas para un usuario y una programación."""
+    base = datetime.datetime(2023, 8, 1, 6, 0, 0)
+    return [
+        {
+            "user_id": user.id,
+            "schedule_id": schedule.id,
+            "start_time": base + datetime.timedelta(hours=i),
+            "end_time": base + datetime.timedelta(hours=i, minutes=20),
+            "volume_liters": 10.0 + i,
+            "duration_minutes": 20,
+        }
+        for i in range(count)
+    ]
+
+
+def test_bulk_create_returns_ids_in_order(watering_event_repo: WateringEventRepository,
+                                          test_user: User,
+                                          test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que bulk_create inserta todas las filas y devuelve sus IDs en orden.
+    """
+    rows = _event_rows(test_user, test_user_watering_schedule, 5)
+    for row in rows:
+        row["walkway_id"] = test_user.walkway_id
+
+    ids = watering_event_repo.bulk_create(rows)
+
+    assert len(ids) == 5
+    for event_id, row in zip(ids, rows):
+        event = watering_event_repo.get_by_id(event_id)
+        assert event.volume_liters == row["volume_liters"]
+
+
+def test_record_watering_events_constant_query_count(db_session: Session,
+                                                     test_user: User,
+                                                     test_user_watering_schedule: UserWateringSchedule,
+                                                     count_statements):
+    """
+    Verifica que el registro por lotes usa el mismo número de sentencias sea cual sea el tamaño del lote.
+    """
+    from services.watering_event_service import WateringEventService
+
+    service = WateringEventService(db_session)
+    rows = _event_rows(test_user, test_user_watering_schedule, 51)
+    # El primer registro fija la cobertura de los totales diarios
+    service.record_watering_events(rows[:1])
+    with count_statements() as statements:
+        ids = service.record_watering_events(rows[1:])
+
+    assert len(ids) == 50
+    # Usuarios + programaciones + horizonte del archivo + INSERT multi-fila
+    # + totales diarios (INSERT ... ON CONFLICT) + cobertura de los totales
+    assert len(statements) == 6
+    stored = db_session.get(WateringEvent, ids[0])
+    assert stored.walkway_id == test_user.walkway_id
+
+
+def test_record_watering_events_rejects_whole_batch(db_session: Session,
+                                                    test_user: User,
+                                                    test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que un lote con errores no inserta ningún evento e informa de cada error.
+    """
+    from services.watering_event_service import WateringEventService
+
+    rows = _event_rows(test_user, test_user_watering_schedule, 3)
+    rows[1]["volume_liters"] = 0
+    rows[2]["schedule_id"] = 9999
+
+    with pytest.raises(ValueError) as exc_info:
+        WateringEventService(db_session).record_watering_events(rows)
+
+    assert "Evento 1" in str(exc_info.value)
+    assert "Evento 2" in str(exc_info.value)
+    assert db_session.query(WateringEvent).count() == 0
+
+
+def test_bulk_update_and_delete_by_filter(watering_event_repo: WateringEventRepository,
+                                          test_user: User,
+                                          test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que bulk_update y bulk_delete actúan con una sola sentencia sobre las filas filtradas.
+    """
+    rows = _event_rows(test_user, test_user_watering_schedule, 4)
+    for row in rows:
+        row["walkway_id"] = test_user.walkway_id
+    ids = watering_event_repo.bulk_create(rows)
+
+    updated_count = watering_event_repo.bulk_update({"id": ids[:2]}, {"volume_liters": 99.0})
+    assert updated_count == 2
+    assert watering_event_repo.get_by_id(ids[0]).volume_liters == 99.0
+    assert watering_event_repo.get_by_id(ids[2]).volume_liters == rows[2]["volume_liters"]
+
+    deleted_count = watering_event_repo.bulk_delete([WateringEvent.volume_liters == 99.0])
+    assert deleted_count == 2
+    assert len(watering_event_repo.get_all()) == 2
+
+
+# -------------------------------------------------------------------------------------
+# TESTS DE STREAMING
+# -------------------------------------------------------------------------------------
+
+def test_stream_events_for_user_yields_bounded_chunks(watering_event_repo: WateringEventRepository,
+                                                      test_user: User,
+                                                      test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que el streaming entrega bloques de tamaño acotado con el mismo orden que la consulta completa.
+    """
+    rows = _event_rows(test_user, test_user_watering_schedule, 10)
+    for row in rows:
+        row["walkway_id"] = test_user.walkway_id
+    watering_event_repo.bulk_create(rows)
+
+    chunks = list(watering_event_repo.stream_events_for_user(test_user.id, chunk_size=4))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    streamed_ids = [event.id for chunk in chunks for event in chunk]
+    assert streamed_ids == [event.id for event in watering_event_repo.get_events_for_user(test_user.id)]
+
+    by_schedule = list(watering_event_repo.stream_events_by_schedule(test_user_watering_schedule.id, chunk_size=6))
+    assert [len(chunk) for chunk in by_schedule] == [6, 4]
+
+
+def test_export_events_for_user_produces_flat_rows(db_session: Session,
+                                                   test_user: User,
+                                                   test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que la exportación del servicio produce diccionarios serializables con las columnas declaradas.
+    """
+    import json
+    from services.watering_event_service import WateringEventService
+
+    service = WateringEventService(db_session)
+    service.record_watering_events(_event_rows(test_user, test_user_watering_schedule, 3))
+
+    exported = service.export_events_for_user(test_user.id, chunk_size=2)
+    first = next(exported)
+    remaining = list(exported)
+
+    assert tuple(first.keys()) == WateringEventService.EXPORT_FIELDS
+    assert len(remaining) == 2
+    assert json.loads(json.dumps(first))["start_time"] == "2023-08-01T08:00:00"
+
+
+# -------------------------------------------------------------------------------------
+# TESTS DE AGREGACIÓN POR INTERVALOS
+# -------------------------------------------------------------------------------------
+
+def test_aggregate_usage_buckets_and_groups_in_one_query(db_session: Session,
+                                                         watering_event_repo: WateringEventRepository,
+                                                         test_user: User,
+                                                         test_user_watering_schedule: UserWateringSchedule,
+                                                         count_statements):
+    """
+    Verifica los totales por hora, día, semana y mes, agrupados o no, con una única sentencia.
+    """
+    from repositories.watering_event_repository import UsageBucket
+
+    # Domingo 3 y lunes 4 de agosto de 2025 (semanas distintas), y 1 de septiembre
+    rows = []
+    for start, volume in [(datetime.datetime(2025, 8, 3, 6, 0), 10.0), (datetime.datetime(2025, 8, 3, 6, 40), 5.0),
+                          (datetime.datetime(2025, 8, 4, 7, 0), 20.0), (datetime.datetime(2025, 9, 1, 8, 0), 40.0)]:
+        rows.append({
+            "user_id": test_user.id, "walkway_id": test_user.walkway_id, "schedule_id": test_user_watering_schedule.id,
+            "start_time": start, "end_time": start + datetime.timedelta(minutes=15),
+            "volume_liters": volume, "duration_minutes": 15,
+        })
+    watering_event_repo.bulk_create(rows)
+    # El horizonte del archivo se consulta una sola vez por transacción
+    assert watering_event_repo.archive_repo.get_horizon() is None
+
+    with count_statements() as statements:
+        by_hour = watering_event_repo.aggregate_usage("hour", group_by="user")
+
+    assert len(statements) == 1
+    assert by_hour[0] == UsageBucket(datetime.datetime(2025, 8, 3, 6, 0), test_user.id, 15.0, 30, 2)
+    assert len(by_hour) == 3
+
+    by_week = watering_event_repo.aggregate_usage("week", start_date=datetime.date(2025, 8, 1), end_date=datetime.date(2025, 8, 31))
+    assert [(row.bucket_start, row.volume_liters, row.event_count) for row in by_week] == [
+        (datetime.datetime(2025, 7, 28), 15.0, 2),
+        (datetime.datetime(2025, 8, 4), 20.0, 1),
+    ]
+
+    by_month = watering_event_repo.aggregate_usage("month", group_by="walkway")
+    assert [(row.bucket_start, row.group_id, row.volume_liters) for row in by_month] == [
+        (datetime.datetime(2025, 8, 1), test_user.walkway_id, 35.0),
+        (datetime.datetime(2025, 9, 1), test_user.walkway_id, 40.0),
+    ]
+
+    by_day = watering_event_repo.aggregate_usage("day", group_by="schedule", end_date=datetime.date(2025, 8, 3))
+    assert by_day == [UsageBucket(datetime.datetime(2025, 8, 3), test_user_watering_schedule.id, 15.0, 30, 2)]
+
+    with pytest.raises(ValueError):
+        watering_event_repo.aggregate_usage("year")
+    with pytest.raises(ValueError):
+        watering_event_repo.aggregate_usage("day", group_by="user_type")
+
+
+# -------------------------------------------------------------------------------------
+# TESTS DE TOTALES DIARIOS
+# -------------------------------------------------------------------------------------
+
+def test_daily_usage_rollups_follow_inserts_and_serve_range_totals(db_session: Session,
+                                                                   test_user: User,
+                                                                   test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que los totales diarios se mantienen al registrar eventos, que coinciden con una
+    reconstrucción completa y que las consultas por rango combinan días completos y extremos.
+    """
+    from database.models.daily_water_usage import DailyWaterUsage
+    from repositories.watering_event_repository import UsageTotal
+    from services.watering_event_service import WateringEventService
+
+    service = WateringEventService(db_session)
+    # 2023-08-01 de 06:00 a 05:00 del día siguiente (una hora entre eventos)
+    rows = _event_rows(test_user, test_user_watering_schedule, 24)
+    service.record_watering_events(rows[:20])
+    service.record_watering_events(rows[20:])
+    single = dict(rows[0], start_time=datetime.datetime(2023, 8, 3, 12, 0), end_time=datetime.datetime(2023, 8, 3, 12, 20))
+    service.record_watering_event(single)
+
+    incremental = {
+        (row.usage_date, row.user_id): (row.volume_liters, row.duration_minutes, row.event_count)
+        for row in db_session.query(DailyWaterUsage)
+    }
+    assert incremental[(datetime.date(2023, 8, 1), test_user.id)] == (sum(10.0 + i for i in range(18)), 18 * 20, 18)
+    assert service.rebuild_usage_rollups() == 3
+    rebuilt = {
+        (row.usage_date, row.user_id): (row.volume_liters, row.duration_minutes, row.event_count)
+        for row in db_session.query(DailyWaterUsage)
+    }
+    assert rebuilt == incremental
+
+    # Día completo del 2 de agosto + tramo parcial del 1 (desde las 22:00) + tramo parcial del 3 (hasta las 13:00)
+    usage = service.get_water_usage(datetime.datetime(2023, 8, 1, 22, 0), datetime.datetime(2023, 8, 3, 13, 0), group_by="user")
+    expected_volume = sum(10.0 + i for i in range(16, 24)) + 10.0
+    assert usage == {test_user.id: UsageTotal(expected_volume, 9 * 20, 9)}
+    # Un rango dentro de un único día solo consulta los eventos
+    assert service.get_water_usage(datetime.datetime(2023, 8, 1, 6, 30), datetime.datetime(2023, 8, 1, 8, 0)) == {
+        None: UsageTotal(11.0, 20, 1)
+    }
+    assert service.get_total_water_used(datetime.date(2023, 8, 2), datetime.date(2023, 8, 2)) == sum(10.0 + i for i in range(18, 24))
+    assert service.get_total_water_used() == sum(10.0 + i for i in range(24)) + 10.0
+    with pytest.raises(ValueError):
+        service.get_water_usage(group_by="schedule")
+
+
+def test_usage_reads_events_before_rollup_coverage(db_session: Session,
+                                                   watering_event_repo: WateringEventRepository,
+                                                   test_user: User,
+                                                   test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que los días sin totales diarios (historial anterior, sin carga inicial) se suman
+    sobre los eventos y que el resultado no cambia tras reconstruir los totales.
+    """
+    from services.watering_event_service import WateringEventService
+
+    service = WateringEventService(db_session)
+    # 2023-08-01 de 06:00 a 05:00 del día siguiente; los 20 primeros se escriben sin pasar por el servicio
+    rows = _event_rows(test_user, test_user_watering_schedule, 24)
+    watering_event_repo.bulk_create([dict(row, walkway_id=test_user.walkway_id) for row in rows[:20]])
+    db_session.commit()
+    assert service.get_total_water_used() == sum(10.0 + i for i in range(20))
+
+    # Los totales diarios empiezan a mantenerse a mitad del 2 de agosto
+    service.record_watering_events(rows[20:])
+    service.record_watering_event(dict(rows[0], start_time=datetime.datetime(2023, 8, 4, 12, 0), end_time=datetime.datetime(2023, 8, 4, 12, 20)))
+    expected = sum(10.0 + i for i in range(24)) + 10.0
+    assert service.get_total_water_used() == expected
+    assert service.get_total_water_used(datetime.date(2023, 8, 2), datetime.date(2023, 8, 2)) == sum(10.0 + i for i in range(18, 24))
+    assert service.get_total_water_used(datetime.date(2023, 8, 4)) == 10.0
+
+    service.rebuild_usage_rollups()
+    assert service.get_total_water_used() == expected
+    assert service.get_total_water_used(datetime.date(2023, 8, 2), datetime.date(2023, 8, 2)) == sum(10.0 + i for i in range(18, 24))
+
+
+def test_backdated_event_does_not_move_rollup_coverage(db_session: Session,
+                                                       watering_event_repo: WateringEventRepository,
+                                                       test_user: User,
+                                                       test_user_watering_schedule: UserWateringSchedule):
+    """
+    Verifica que un evento registrado con fecha anterior a la cobertura de los totales diarios
+    no hace que se lean totales de días que no los tienen.
+    """
+    from services.watering_event_service import WateringEventService
+    from repositories.daily_water_usage_repository import DailyWaterUsageRepository
+
+    service = WateringEventService(db_session)
+    coverage_repo = DailyWaterUsageRepository(db_session)
+    rows = _event_rows(test_user, test_user_watering_schedule, 20)
+    watering_event_repo.bulk_create([dict(row, walkway_id=test_user.walkway_id) for row in rows])
+    db_session.commit()
+    history = sum(10.0 + i for i in range(20))
+    assert coverage_repo.get_coverage() is None
+
+    # La primera escritura incremental fija la cobertura al día siguiente del último evento
+    service.record_watering_event(dict(rows[0], start_time=datetime.datetime(2023, 8, 4, 12, 0), end_time=datetime.datetime(2023, 8, 4, 12, 20)))
+    assert coverage_repo.get_coverage().complete_from == datetime.date(2023, 8, 5)
+    assert service.get_total_water_used() == history + 10.0
+
+    # Un evento con fecha anterior no adelanta la cobertura: el historial se sigue leyendo de los eventos
+    service.record_watering_event(dict(rows[0], start_time=datetime.datetime(2023, 7, 15, 8, 0), end_time=datetime.datetime(2023, 7, 15, 8, 20)))
+    assert coverage_repo.get_coverage().complete_from == datetime.date(2023, 8, 5)
+    assert service.get_total_water_used() == history + 20.0
+    assert service.get_total_water_used(datetime.date(2023, 7, 1), datetime.date(2023, 8, 1)) == 10.0 + sum(10.0 + i for i in range(18))
+
+    # Reconstruir hasta el presente adelanta la cobertura sin cambiar los resultados
+    service.rebuild_usage_rollups(datetime.date(2023, 7, 1))
+    assert coverage_repo.get_coverage().complete_from == datetime.date(2023, 7, 1)
+    assert service.get_total_water_used() == history + 20.0
+    service.rebuild_usage_rollups()
+    assert coverage_repo.get_coverage().complete_from is None
+    assert service.get_total_water_used() == history + 20.0